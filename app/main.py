@@ -1,17 +1,36 @@
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import PlainTextResponse, Response
 from pydantic import BaseModel
 import json
 import asyncio
+import functools
+import hmac
 import os
-from typing import Dict, List, Optional
+import time
+from typing import Callable, Dict, List, Optional, get_type_hints
 import logging
 
 from .services.exchange_service import ExchangeService
 from .services.spread_calculator import SpreadCalculator
+from .services.poll_scheduler import ExchangeLimiter, PollScheduler
+from .services.snapshot_coordinator import SnapshotCoordinator
+from .services.connection_manager import ClientConnection, ConnectionManager
+from .services.wire_protocol import PROTOCOL_DELTA, BookVersioner, MarketTick, dumps, negotiate
+from .services.history_store import HistoryStore
+from .services.cadence_controller import CadenceController
+from .services.metrics import REGISTRY
+from .services.state_bus import StateBusClient, StateBusServer
+from .services.feed_registry import Feed, FeedRegistry, Pair, pair_key
+from .services.alert_engine import AlertEngine, AlertSink
+from .services.opportunity_index import RANK_METRICS, OpportunityIndex, TopKPush
+from .services.static_assets import StaticAsset, StaticAssetStore
+from .services.snapshot_cache import SnapshotCache
+from .services.loop_profiler import LoopWatchdog, SamplingProfiler
+from .services.compute_pool import ComputePool
+from .services.exchanges import parse_mode
 from .models.market_data import MarketData, OrderBook, SpreadData
+from .models.compact_orderbook import CompactOrderBook
 
 # 設置日誌
 logging.basicConfig(level=logging.INFO)
@@ -31,112 +50,582 @@ app.add_middleware(
 # 全域變數儲存服務實例
 exchange_service = ExchangeService()
 spread_calculator = SpreadCalculator()
+snapshot_coordinator = SnapshotCoordinator(
+    exchange_service,
+    max_skew_ms=float(os.environ.get("SPREAD_MAX_SKEW_MS", 500)),
+    max_age_ms=float(os.environ.get("SPREAD_MAX_AGE_MS", 2000)),
+    drop_stale=os.environ.get("STALE_SPREAD_POLICY", "flag") == "drop"
+)
 
-# WebSocket連接管理
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: List[WebSocket] = []
+# 抓取管線自適應輪詢間隔：價差接近 CADENCE_THRESHOLD（%）或變動快時加速，受各交易所每秒請求預算限制
+CADENCE_BUDGETS = {
+    "mx": float(os.environ.get("CADENCE_MX_BUDGET", 3)),
+    "lbank": float(os.environ.get("CADENCE_LBANK_BUDGET", 8)),
+}
 
-    async def connect(self, websocket: WebSocket):
-        await websocket.accept()
-        self.active_connections.append(websocket)
-        logger.info(f"新的WebSocket連接，目前連接數: {len(self.active_connections)}")
+def new_cadence(feeds: int = 1) -> CadenceController:
+    """建立一條抓取管線的輪詢間隔控制（請求預算由所有管線平分）"""
+    return CadenceController(
+        threshold=float(os.environ.get("CADENCE_THRESHOLD", 0.5)),
+        min_interval=float(os.environ.get("CADENCE_MIN_INTERVAL", 0.25)),
+        max_interval=float(os.environ.get("CADENCE_MAX_INTERVAL", 1)),
+        proximity_band=float(os.environ.get("CADENCE_PROXIMITY_BAND", 0.5)),
+        volatility_ref=float(os.environ.get("CADENCE_VOLATILITY_REF", 0.1)),
+        budgets={exchange: budget / max(feeds, 1) for exchange, budget in CADENCE_BUDGETS.items()}
+    )
 
-    def disconnect(self, websocket: WebSocket):
-        if websocket in self.active_connections:
-            self.active_connections.remove(websocket)
-        logger.info(f"WebSocket連接斷開，目前連接數: {len(self.active_connections)}")
+# 每個不同的 (MX交易對, LBank交易對) 一條抓取管線，由WebSocket客戶端訂閱（啟動時建立）
+feed_registry: Optional[FeedRegistry] = None
+default_feed_pair: Optional[Pair] = None  # 全域選擇的交易對（POST /api/symbol），未自行訂閱的客戶端接收此交易對
+WS_MAX_SUBSCRIPTIONS = int(os.environ.get("WS_MAX_SUBSCRIPTIONS", 10))
 
-    async def broadcast(self, message: str):
-        if not self.active_connections:
-            logger.debug(f"沒有WebSocket連接，跳過廣播")
-            return
+# 多交易對輪詢排程器（MULTI_SYMBOL_POLLING=1 時啟用）
+poll_scheduler: Optional[PollScheduler] = None
+universe_spreads: Dict[str, Dict[str, dict]] = {}  # symbol -> mode -> 最新價差
+latest_orderbooks: Dict[str, tuple] = {}  # 交易對組合key -> (MX訂單簿, LBank訂單簿)，供深度收益查詢（OrderBook或CompactOrderBook）
+# 排程器的計算模式（COMPUTE_MODE）：inline 在事件循環上解碼與計算；process 批次交給計算進程池，事件循環只做I/O
+COMPUTE_MODE = os.environ.get("COMPUTE_MODE", "inline")
+compute_pool: Optional[ComputePool] = None
+
+# 套利機會排名（抓取管線與排程器算出的所有價差），前K名變動時最多每 OPPORTUNITY_PUSH_INTERVAL 秒推送一次
+OPPORTUNITY_MAX_K = int(os.environ.get("OPPORTUNITY_MAX_K", 50))
+OPPORTUNITY_PUSH_INTERVAL = float(os.environ.get("OPPORTUNITY_PUSH_INTERVAL", 0.5))
+opportunity_index = OpportunityIndex(
+    watch_k=OPPORTUNITY_MAX_K, max_age=float(os.environ.get("OPPORTUNITY_MAX_AGE", 30))
+)
+opportunity_pushes: Dict[str, TopKPush] = {}  # 指標 -> 最新推送的前K名（新連接先收到這份）
+opportunity_dirty: set = set()
+opportunity_push_handle: Optional[asyncio.TimerHandle] = None
+
+# WebSocket連接管理（WS_MAX_RATE: 每個客戶端每秒最多訊息數；WS_EVICT_LAG: 落後多少秒斷開）
+manager = ConnectionManager(
+    max_queue=int(os.environ.get("WS_MAX_QUEUE", 64)),
+    evict_lag=float(os.environ.get("WS_EVICT_LAG", 10)),
+    default_max_rate=float(os.environ.get("WS_MAX_RATE", 0)) or None
+)
+book_versioner = BookVersioner()  # 訂單簿版本號，用於變化檢測與差異編碼
+# 每條抓取管線最新廣播的tick：新連接立即收到，/api/snapshot 以條件請求/長輪詢讀取
+snapshot_cache = SnapshotCache()
+SNAPSHOT_MAX_WAIT = float(os.environ.get("SNAPSHOT_MAX_WAIT", 30))
+
+# 主循環指標
+FETCH_SECONDS = REGISTRY.histogram("lbmx_fetch_seconds", "Both-leg order book fetch duration", ("symbol",))
+TICK_SECONDS = REGISTRY.histogram(
+    "lbmx_tick_seconds", "market_data_stream iteration duration excluding the wait", ("symbol",)
+)
+TICKS = REGISTRY.counter("lbmx_ticks", "market_data_stream iterations by outcome", ("result",))
+REGISTRY.gauge("lbmx_poll_interval_seconds", "Interval chosen by each feed's cadence controller", ("symbol", "reason"),
+               callback=lambda: [
+                   ((REGISTRY.symbol(feed.key), feed.cadence.reason), feed.cadence.interval)
+                   for feed in (feed_registry.feeds.values() if feed_registry else ()) if feed.cadence
+               ])
+
+# 價差歷史（記憶體環形緩衝 + HISTORY_DIR 下的檔案段；HISTORY_MAX_AGE 秒 / HISTORY_MAX_BYTES 設定時刪除舊檔案段）
+history_store = HistoryStore(
+    os.environ.get("HISTORY_DIR", "data/history"),
+    ring_capacity=int(os.environ.get("HISTORY_RING_SIZE", 3600)),
+    max_age=float(os.environ.get("HISTORY_MAX_AGE", 0)) or None,
+    max_bytes=int(os.environ.get("HISTORY_MAX_BYTES", 0)) or None
+)
+
+# 價差告警規則（持久化到 ALERT_RULES_PATH），事件推送給 /ws?stream=alerts 的客戶端與可選的webhook/檔案
+alert_engine = AlertEngine(os.environ.get("ALERT_RULES_PATH", "data/alert_rules.json"))
+alert_sink = AlertSink(
+    webhook_url=os.environ.get("ALERT_WEBHOOK_URL") or None,
+    file_path=os.environ.get("ALERT_LOG_PATH") or None
+)
+
+# 事件循環診斷：阻塞超過 SLOW_CALLBACK_MS 的回調記錄堆疊（0 停用）；取樣分析器由管理API按需啟動
+# 管理API需要 X-Admin-Token 標頭（或 ?token=）與 ADMIN_TOKEN 相符，未設置 ADMIN_TOKEN 時停用
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN", "")
+loop_watchdog = LoopWatchdog(threshold=float(os.environ.get("SLOW_CALLBACK_MS", 100)) / 1000)
+profiler = SamplingProfiler()
+
+# 前端構建產物（Fly.io 單容器部署時由本應用服務），啟動時載入記憶體並預先壓縮
+FRONTEND_BUILD_DIR = os.environ.get("FRONTEND_BUILD_DIR", "frontend/build")
+static_assets = StaticAssetStore(FRONTEND_BUILD_DIR)
+
+# 部署角色（PROCESS_ROLE）：
+#   all     單進程（預設），抓取與服務客戶端都在同一進程
+#   fetcher 唯一的抓取進程，負責交易所請求與價差計算，經 STATE_BUS_PATH 的Unix socket發佈最新狀態
+#   web     只服務HTTP/WebSocket客戶端，從狀態匯流排讀取tick；需要抓取進程狀態的API轉送給抓取進程
+PROCESS_ROLE = os.environ.get("PROCESS_ROLE", "all")
+STATE_BUS_PATH = os.environ.get("STATE_BUS_PATH", "/tmp/lbmx_state.sock")
+state_bus_server: Optional[StateBusServer] = None
+state_bus_client: Optional[StateBusClient] = None
+fetcher_commands: Dict[str, Callable] = {}
+
+def fetcher_command(name: str):
+    """
+    標記依賴抓取進程狀態的API（目前交易對、排程器、歷史等）
+    web進程中轉送給抓取進程執行，其他角色直接在本進程執行
+    """
+    def decorator(func):
+        hints = get_type_hints(func)
         
-        disconnected = []
-        for connection in self.active_connections:
+        async def handler(args: dict, subscriber: int = 0):
+            # 請求模型以dict傳送，在抓取進程中還原
+            kwargs = {
+                key: hints[key].model_validate(value)
+                if isinstance(hints.get(key), type) and issubclass(hints[key], BaseModel) else value
+                for key, value in args.items()
+            }
+            return await func(**kwargs)
+        fetcher_commands[name] = handler
+        
+        @functools.wraps(func)
+        async def wrapper(**kwargs):
+            if PROCESS_ROLE != "web":
+                return await func(**kwargs)
+            args = {key: value.model_dump() if isinstance(value, BaseModel) else value for key, value in kwargs.items()}
             try:
-                await connection.send_text(message)
+                return await state_bus_client.request(name, args)
             except Exception as e:
-                logger.error(f"發送訊息失敗: {e}")
-                disconnected.append(connection)
-        
-        # 移除斷開的連接
-        for connection in disconnected:
-            self.disconnect(connection)
+                logger.error(f"轉送 {name} 到抓取進程失敗: {e}")
+                return {"status": "error", "message": f"抓取進程不可用: {e}"}
+        return wrapper
+    return decorator
+
+async def on_bus_message(message: dict):
+    """web進程：把抓取進程發佈的tick還原後廣播給本進程訂閱該交易對的客戶端"""
+    if message.get("type") == "alert":
+        await manager.broadcast_alert(message)
+        return
+    if message.get("type") == "opportunities":
+        push = opportunity_pushes[message["by"]] = TopKPush(message["by"], message["top"])
+        await manager.broadcast_opportunities(push)
+        return
+    if message.get("type") == "feed_stopped":
+        snapshot_cache.forget(message["key"])
+        return
+    if message.get("type") != "tick":
+        return
+    try:
+        tick = MarketTick(
+            book_versioner,
+            message["symbol"],
+            OrderBook.model_validate(message["mx_orderbook"]),
+            OrderBook.model_validate(message["lbank_orderbook"]),
+            {mode: SpreadData.model_validate(data) for mode, data in message["spreads"].items()}
+        )
+        pair = tuple(message["pair"])
+        snapshot_cache.update(tick.key, pair, tick, message.get("default", False))
+        await manager.broadcast_tick(tick, pair, message.get("default", False))
+    except Exception as e:
+        logger.error(f"處理匯流排tick失敗: {e}")
+
+def publish_tick(tick: MarketTick, feed: Feed, default: bool):
+    """抓取進程：發佈最新tick（每條管線只保留最新一則，新連接的web進程立即取得目前狀態）"""
+    if state_bus_server is None:
+        return
+    state_bus_server.publish(f"tick:{feed.key}", {
+        "type": "tick",
+        "pair": feed.pair,
+        "default": default,
+        "symbol": tick.symbol,
+        "mx_orderbook": tick.mx_orderbook.model_dump(),
+        "lbank_orderbook": tick.lbank_orderbook.model_dump(),
+        "spreads": tick.spread_data(),
+    })
+
+def record_opportunity(symbol: str, spread_data: SpreadData):
+    """以最新價差更新套利機會排名"""
+    mark_opportunities(opportunity_index.update(symbol, spread_data))
+
+def mark_opportunities(metrics: set):
+    """標記前K名有變動的指標，合併到下一次推送"""
+    global opportunity_push_handle
+    if not metrics:
+        return
+    opportunity_dirty.update(metrics)
+    if opportunity_push_handle is None:
+        opportunity_push_handle = asyncio.get_running_loop().call_later(OPPORTUNITY_PUSH_INTERVAL, push_opportunities)
 
-manager = ConnectionManager()
+def push_opportunities():
+    """推送有變動的前K名給 opportunities 客戶端與web進程"""
+    global opportunity_push_handle
+    opportunity_push_handle = None
+    opportunity_dirty.update(opportunity_index.prune())
+    for by in opportunity_dirty:
+        push = opportunity_pushes[by] = TopKPush(by, opportunity_index.top(OPPORTUNITY_MAX_K, by))
+        asyncio.create_task(manager.broadcast_opportunities(push))
+        if state_bus_server:
+            state_bus_server.publish(f"opportunities:{by}", {"type": "opportunities", "by": by, "top": push.entries})
+    opportunity_dirty.clear()
+
+async def evaluate_alerts(key: str, spread_data: SpreadData):
+    """以最新價差更新告警規則（key為交易對組合），觸發的事件推送給告警客戶端、webhook/檔案與web進程"""
+    for alert in alert_engine.evaluate(spread_data, key):
+        logger.info(f"價差告警 {alert['rule']} {alert['event']}: {alert['symbol']} {alert['mode']} {alert['value']}")
+        await manager.broadcast_alert(alert)
+        alert_sink.submit(alert)
+        if state_bus_server:
+            state_bus_server.publish("alert", alert, retain=False)
 
 @app.on_event("startup")
 async def startup_event():
     """應用啟動時初始化交易所連接"""
+    global state_bus_server, state_bus_client
     try:
+        REGISTRY.start_loop_lag_monitor()
+        loop_watchdog.start()
+        
+        if PROCESS_ROLE != "fetcher" and os.path.exists(FRONTEND_BUILD_DIR):
+            # 壓縮在執行緒中進行，不阻塞事件循環
+            await asyncio.to_thread(static_assets.load)
+        
+        if PROCESS_ROLE == "web":
+            # 不連接交易所，只訂閱抓取進程
+            state_bus_client = StateBusClient(STATE_BUS_PATH, on_bus_message, on_connect=restore_bus_feeds)
+            state_bus_client.start()
+            logger.info(f"web進程已啟動，狀態匯流排: {STATE_BUS_PATH}")
+            return
+        
+        if PROCESS_ROLE == "fetcher":
+            state_bus_server = StateBusServer(STATE_BUS_PATH)
+            state_bus_server.commands.update(fetcher_commands)
+            state_bus_server.commands.update(feed_acquire=bus_feed_acquire, feed_release=bus_feed_release)
+            state_bus_server.disconnect_listeners.append(on_bus_subscriber_closed)
+            await state_bus_server.start()
+        
         await exchange_service.initialize()
         logger.info("交易所服務初始化完成")
         
-        # 開始背景任務
-        asyncio.create_task(market_data_stream())
+        history_store.start()
+        alert_engine.load()
+        alert_sink.start()
+        
+        # 全域選擇的交易對由應用本身持有一條抓取管線
+        global feed_registry
+        feed_registry = FeedRegistry(
+            run_feed,
+            grace_period=float(os.environ.get("FEED_GRACE_PERIOD", 30)),
+            max_feeds=int(os.environ.get("MAX_FEEDS", 50)),
+            on_change=on_feeds_changed
+        )
+        switch_default_feed()
         logger.info("市場數據流任務已啟動")
+        
+        if os.environ.get("MULTI_SYMBOL_POLLING") == "1":
+            await start_poll_scheduler()
     except Exception as e:
         logger.error(f"啟動時發生錯誤: {e}")
 
-async def market_data_stream():
-    """背景任務：處理市場數據並廣播給客戶端"""
-    last_data = {}  # 緩存上次的數據，避免重複廣播
+@app.on_event("shutdown")
+async def shutdown_event():
+    """應用關閉時釋放交易所連接"""
+    REGISTRY.stop()
+    loop_watchdog.stop()
+    profiler.stop()
+    if state_bus_client:
+        await state_bus_client.close()
+    if PROCESS_ROLE == "web":
+        return
+    if state_bus_server:
+        await state_bus_server.close()
+    if feed_registry:
+        await feed_registry.close()
+    if poll_scheduler:
+        await poll_scheduler.stop()
+    if compute_pool:
+        await compute_pool.close()
+    await alert_sink.close()
+    await history_store.close()
+    await exchange_service.close()
+
+async def start_poll_scheduler():
+    """啟動共同交易對的多交易對輪詢"""
+    global poll_scheduler, compute_pool
+    
+    # 每個已啟用的交易所一個限流器，預設值見各適配器（依交易所公開限額設定）
+    limiters = {
+        adapter.name: ExchangeLimiter(
+            adapter.name,
+            rate=float(os.environ.get(f"{key.upper()}_RATE_LIMIT", adapter.rate_limit)),
+            burst=float(os.environ.get(f"{key.upper()}_RATE_BURST", adapter.rate_burst)),
+            concurrency=int(os.environ.get(f"{key.upper()}_MAX_CONCURRENCY", adapter.max_concurrency))
+        )
+        for key, adapter in exchange_service.adapters.items()
+    }
+    tiers = {
+        "hot": float(os.environ.get("SCHEDULER_HOT_INTERVAL", 0.5)),
+        "tail": float(os.environ.get("SCHEDULER_TAIL_INTERVAL", 10)),
+    }
+    if COMPUTE_MODE == "process":
+        compute_pool = ComputePool(
+            exchange_service,
+            workers=int(os.environ.get("COMPUTE_WORKERS", 2)),
+            batch_size=int(os.environ.get("COMPUTE_BATCH_SIZE", 64)),
+            batch_window=float(os.environ.get("COMPUTE_BATCH_WINDOW_MS", 5)) / 1000
+        )
+        await compute_pool.start()
+    poll_scheduler = PollScheduler(
+        exchange_service, tiers, limiters, default_tier="tail", on_update=on_scheduled_books,
+        compute_pool=compute_pool, on_computed=on_computed_books
+    )
+    
+    hot_symbols = [s.strip() for s in os.environ.get("HOT_SYMBOLS", "").split(",") if s.strip()]
+    for symbol in hot_symbols + [exchange_service.current_symbol]:
+        poll_scheduler.set_tier(symbol, "hot")
+    # 先使用快取中的交易對，背景刷新後再同步新增/下架的交易對
+    poll_scheduler.set_symbols(exchange_service.symbol_cache.snapshot.common_sorted)
+    exchange_service.symbol_cache.listeners.append(on_symbols_refreshed)
+    poll_scheduler.start()
+
+def on_symbols_refreshed(snapshot):
+    """交易對快取刷新後同步排程器的監控列表（熱門交易對保留）"""
+    if not poll_scheduler:
+        return
+    for symbol, tier in list(poll_scheduler.symbol_tiers.items()):
+        if tier != "hot" and symbol not in snapshot.common_symbols:
+            poll_scheduler.remove_symbol(symbol)
+            mark_opportunities(opportunity_index.remove_symbol(symbol))
+    poll_scheduler.set_symbols(snapshot.common_sorted)
+
+async def on_scheduled_books(symbol: str, books: Dict[str, Optional[OrderBook]]):
+    """排程器刷新完成後計算該交易對所有有向交易所組合的價差"""
+    mx_orderbook, lbank_orderbook = books.get('mx'), books.get('lbank')
+    if not mx_orderbook or not lbank_orderbook:
+        return
+    
+    # 全市場訂單簿以定點陣列保存，降低數百個交易對的記憶體佔用
+    latest_orderbooks[symbol] = (
+        CompactOrderBook.from_orderbook(mx_orderbook),
+        CompactOrderBook.from_orderbook(lbank_orderbook)
+    )
+    computed = spread_calculator.calculate_all(books)
+    await record_universe_spreads(symbol, computed, books)
+
+async def on_computed_books(symbol: str, books: Dict[str, Optional[CompactOrderBook]], computed: Dict[str, SpreadData]):
+    """計算進程池完成一個交易對（訂單簿已是定點陣列，價差已算好）"""
+    mx_orderbook, lbank_orderbook = books.get('mx'), books.get('lbank')
+    if not mx_orderbook or not lbank_orderbook:
+        return
+    
+    latest_orderbooks[symbol] = (mx_orderbook, lbank_orderbook)
+    await record_universe_spreads(symbol, computed, books)
+
+async def record_universe_spreads(symbol: str, computed: Dict[str, SpreadData], books: Dict[str, object]):
+    """排程器算出的價差：買賣兩邊時間對齊後寫入歷史、排名與告警"""
+    spreads = {}
+    for mode, spread_data in computed.items():
+        buy, sell = parse_mode(mode)
+        spread_data = snapshot_coordinator.annotate(spread_data, books[buy], books[sell])
+        if spread_data:
+            history_store.record(spread_data, symbol)
+            record_opportunity(symbol, spread_data)
+            await evaluate_alerts(symbol, spread_data)
+            spreads[mode] = spread_data.model_dump()
+    universe_spreads[symbol] = spreads
+
+def current_default_pair() -> Pair:
+    """全域選擇的交易對組合；自選模式下LBank使用自選的幣種"""
+    mx_symbol = exchange_service.current_symbol
+    lbank_symbol = mx_symbol
+    if exchange_service.custom_mode and exchange_service.custom_lbank_symbol:
+        lbank_symbol = exchange_service.custom_lbank_symbol
+    return mx_symbol, lbank_symbol
+
+def switch_default_feed():
+    """全域選擇改變後，應用持有的管線改為新的交易對（舊管線沒有其他訂閱者時於寬限期後停止）"""
+    global default_feed_pair
+    pair = current_default_pair()
+    if pair == default_feed_pair or feed_registry is None:
+        return
+    feed_registry.acquire(pair)
+    if default_feed_pair is not None:
+        feed_registry.release(default_feed_pair)
+    default_feed_pair = pair
+
+def on_feeds_changed():
+    """管線啟動/停止後：平分請求預算、取消不再使用的深度推送訂閱、移除已停止管線的保留tick"""
+    feeds = feed_registry.feeds.values()
+    for feed in feeds:
+        if feed.cadence:
+            feed.cadence.budgets = {
+                exchange: budget / len(feeds) for exchange, budget in CADENCE_BUDGETS.items()
+            }
+    if exchange_service.depth_stream:
+        asyncio.create_task(exchange_service.depth_stream.retain_only(*feed_registry.symbols()))
+    active = {feed.key for feed in feeds}
+    for key in [key for key in snapshot_cache.entries if key not in active]:
+        snapshot_cache.forget(key)
+    # 自選組合的訂單簿只由其管線更新（單一交易對的key排程器也會寫入，保留）
+    for key in [key for key in latest_orderbooks if "|" in key and key not in active]:
+        del latest_orderbooks[key]
+    if state_bus_server:
+        for key in list(state_bus_server.latest):
+            if key.startswith("tick:") and key[len("tick:"):] not in active:
+                state_bus_server.forget(key)
+                state_bus_server.publish("feed_stopped", {"type": "feed_stopped", "key": key[len("tick:"):]}, retain=False)
+
+async def acquire_feed(pair: Pair) -> Optional[str]:
+    """驗證交易對並增加一個管線訂閱者，失敗時返回錯誤訊息"""
+    mx_symbol, lbank_symbol = pair
+    has_mx_symbol, has_lbank_symbol = await exchange_service.has_symbols(mx_symbol, lbank_symbol)
+    if not has_mx_symbol:
+        return f"MX交易所沒有 {mx_symbol} 幣種"
+    if not has_lbank_symbol:
+        return f"LBank交易所沒有 {lbank_symbol} 幣種"
+    try:
+        feed_registry.acquire(pair)
+    except ValueError as e:
+        return str(e)
+    return None
+
+# web進程：本進程各交易對組合的訂閱者數，只在 0->1 與 1->0 時通知抓取進程
+web_feed_refs: Dict[Pair, int] = {}
+# 抓取進程：每個web進程連接持有的交易對組合，連接斷開時釋放
+bus_feed_holdings: Dict[int, set] = {}
+
+async def subscribe_pair(pair: Pair) -> Optional[str]:
+    if PROCESS_ROLE != "web":
+        return await acquire_feed(pair)
+    if not web_feed_refs.get(pair):
+        try:
+            result = await state_bus_client.request("feed_acquire", {"pair": pair})
+        except Exception as e:
+            return f"抓取進程不可用: {e}"
+        if result.get("status") != "success":
+            return result.get("message")
+    web_feed_refs[pair] = web_feed_refs.get(pair, 0) + 1
+    return None
+
+def unsubscribe_pair(pair: Pair):
+    if PROCESS_ROLE != "web":
+        if feed_registry:
+            feed_registry.release(pair)
+        return
+    refs = web_feed_refs.get(pair, 0) - 1
+    if refs > 0:
+        web_feed_refs[pair] = refs
+        return
+    web_feed_refs.pop(pair, None)
+    if state_bus_client and state_bus_client.connected:
+        asyncio.create_task(release_bus_feed(pair))
+
+async def release_bus_feed(pair: Pair):
+    try:
+        await state_bus_client.request("feed_release", {"pair": pair})
+    except Exception as e:
+        logger.warning(f"通知抓取進程取消訂閱失敗: {e}")
+
+async def restore_bus_feeds():
+    """web進程重新連接狀態匯流排後，恢復本進程仍有訂閱者的管線"""
+    for pair in list(web_feed_refs):
+        try:
+            await state_bus_client.request("feed_acquire", {"pair": pair})
+        except Exception as e:
+            logger.warning(f"恢復訂閱 {pair} 失敗: {e}")
+
+async def bus_feed_acquire(args: dict, subscriber: int) -> dict:
+    pair = tuple(args["pair"])
+    holdings = bus_feed_holdings.setdefault(subscriber, set())
+    if pair in holdings:
+        return {"status": "success"}
+    error = await acquire_feed(pair)
+    if error:
+        return {"status": "error", "message": error}
+    holdings.add(pair)
+    return {"status": "success"}
+
+async def bus_feed_release(args: dict, subscriber: int) -> dict:
+    pair = tuple(args["pair"])
+    holdings = bus_feed_holdings.get(subscriber, set())
+    if pair in holdings:
+        holdings.discard(pair)
+        feed_registry.release(pair)
+    return {"status": "success"}
+
+def on_bus_subscriber_closed(subscriber: int):
+    for pair in bus_feed_holdings.pop(subscriber, set()):
+        feed_registry.release(pair)
+
+async def run_feed(feed: Feed):
+    """抓取管線：抓取一個交易對組合的兩邊訂單簿、計算價差並廣播給訂閱者"""
+    mx_symbol, lbank_symbol = feed.pair
+    feed.cadence = cadence = new_cadence(len(feed_registry.feeds))
+    last_versions = None  # 上次廣播的訂單簿版本，避免重複廣播
+    stream_version = 0  # 深度推送模式下本組合最後處理的更新版本
     
     while True:
         try:
-            # 獲取當前選中的交易對
-            current_symbol = getattr(exchange_service, 'current_symbol', 'BTC/USDT')
-            
-            # 獲取兩個交易所的訂單簿
-            mx_orderbook = await exchange_service.get_mx_orderbook(current_symbol)
-            # 在自選模式下，LBank使用自選的幣種，否則使用當前幣種
-            lbank_symbol = current_symbol
-            if exchange_service.custom_mode and exchange_service.custom_lbank_symbol:
-                lbank_symbol = exchange_service.custom_lbank_symbol
-            lbank_orderbook = await exchange_service.get_lbank_orderbook(lbank_symbol)
+            # 同時獲取兩個交易所的訂單簿（深度推送優先，未同步或過期時回退到REST）
+            depth_stream = exchange_service.depth_stream
+            fetched_at = time.monotonic()
+            tick_started = time.perf_counter()
+            mx_orderbook, lbank_orderbook = await snapshot_coordinator.fetch(mx_symbol, lbank_symbol)
+            rest_legs = snapshot_coordinator.last_rest_legs
+            metric_symbol = (REGISTRY.symbol(feed.key),)
+            FETCH_SECONDS.observe(time.perf_counter() - tick_started, metric_symbol)
             
             if mx_orderbook and lbank_orderbook:
+                latest_orderbooks[feed.key] = (mx_orderbook, lbank_orderbook)
+                
                 # 計算價差數據
-                for mode in ['mx_buy_lbank_sell', 'lbank_buy_mx_sell']:
-                    spread_data = spread_calculator.calculate_spread(
-                        mx_orderbook, lbank_orderbook, mode
-                    )
+                spreads = {}
+                computed = spread_calculator.calculate_all({'mx': mx_orderbook, 'lbank': lbank_orderbook})
+                if not computed:
+                    logger.warning(f"價差計算失敗: {feed.key}")
+                for mode, spread_data in computed.items():
+                    # 附上兩邊時間差與訂單簿年齡，超限時標記或丟棄
+                    spread_data = snapshot_coordinator.annotate(spread_data, mx_orderbook, lbank_orderbook)
+                    if spread_data is None:
+                        logger.debug(f"兩邊訂單簿未對齊，丟棄價差: {mode}")
+                        continue
+                    spreads[mode] = spread_data
+                    record_opportunity(feed.key, spread_data)
+                    await evaluate_alerts(feed.key, spread_data)
+                
+                if spreads:
+                    tick = MarketTick(book_versioner, mx_symbol, mx_orderbook, lbank_orderbook, spreads)
                     
-                    if spread_data:
-                        # 構建廣播數據
-                        broadcast_data = {
-                            'type': 'market_update',
-                            'symbol': current_symbol,
-                            'mode': mode,
-                            'mx_orderbook': mx_orderbook.model_dump(),
-                            'lbank_orderbook': lbank_orderbook.model_dump(),
-                            'spread_data': spread_data.model_dump(),
-                            'timestamp': spread_data.timestamp.isoformat()
-                        }
-                        
-                        # 檢查數據是否有變化，避免重複廣播
-                        data_key = f"{current_symbol}_{mode}"
-                        data_hash = hash(json.dumps(broadcast_data, default=str, sort_keys=True))
-                        
-                        if last_data.get(data_key) != data_hash:
-                            await manager.broadcast(json.dumps(broadcast_data, default=str))
-                            last_data[data_key] = data_hash
-                            logger.debug(f"廣播數據: {mode}, 價差={spread_data.spread:.6f}, 連接數={len(manager.active_connections)}")
-                        else:
-                            logger.debug(f"數據未變化，跳過廣播: {mode}")
+                    # 以訂單簿版本號檢查數據是否有變化，避免重複廣播
+                    if last_versions != (tick.versions, tuple(spreads)):
+                        default = feed.pair == default_feed_pair
+                        snapshot_cache.update(feed.key, feed.pair, tick, default)
+                        await manager.broadcast_tick(tick, feed.pair, default)
+                        publish_tick(tick, feed, default)
+                        last_versions = (tick.versions, tuple(spreads))
+                        for spread_data in spreads.values():
+                            history_store.record(spread_data, feed.key)
+                        feed.ticks += 1
+                        TICKS.inc(("broadcast",))
+                        logger.debug(f"廣播數據: {feed.key}, 版本={tick.versions}, 訂閱者={feed.refs}")
                     else:
-                        logger.warning(f"價差計算失敗: {mode}")
+                        TICKS.inc(("unchanged",))
+                        logger.debug(f"數據未變化，跳過廣播: {feed.key}")
+                
+                TICK_SECONDS.observe(time.perf_counter() - tick_started, metric_symbol)
+                
+                # 依價差與門檻的距離、變動速度決定下一次輪詢間隔
+                interval = cadence.observe(spreads.values(), rest_legs)
             else:
                 logger.warning(f"訂單簿數據不完整: MX={bool(mx_orderbook)}, LBank={bool(lbank_orderbook)}")
+                TICKS.inc(("incomplete",))
+                interval = cadence.on_error()
             
-            await asyncio.sleep(1)  # 每秒更新一次
+            if depth_stream:
+                # 有訂單簿更新時立即處理，最多等待一個輪詢間隔
+                stream_version = await depth_stream.wait_for_update(
+                    mx_symbol, lbank_symbol, stream_version, timeout=interval
+                )
+                # 推送提前喚醒時，仍需要REST補齊的一邊不可超過請求預算
+                remaining = cadence.budget_floor(rest_legs) - (time.monotonic() - fetched_at)
+                if remaining > 0:
+                    await asyncio.sleep(remaining)
+            else:
+                await asyncio.sleep(interval)
             
+        except asyncio.CancelledError:
+            break
         except Exception as e:
-            logger.error(f"市場數據流錯誤: {e}")
-            await asyncio.sleep(5)
+            logger.error(f"抓取管線錯誤 {feed.key}: {e}")
+            TICKS.inc(("error",))
+            await asyncio.sleep(cadence.on_error())
 
 @app.get("/api/symbols")
+@fetcher_command("symbols")
 async def get_available_symbols():
     """獲取可用的交易對列表"""
     try:
@@ -150,10 +639,14 @@ class SymbolRequest(BaseModel):
     symbol: str
 
 @app.post("/api/symbol")
+@fetcher_command("set_symbol")
 async def set_current_symbol(request: SymbolRequest):
-    """設置當前監控的交易對"""
+    """設置全域選擇的交易對（未透過WebSocket自行訂閱的客戶端接收此交易對）"""
     try:
         exchange_service.current_symbol = request.symbol
+        switch_default_feed()
+        if poll_scheduler:
+            poll_scheduler.set_tier(request.symbol, "hot")
         logger.info(f"切換到交易對: {request.symbol}")
         return {"status": "success", "symbol": request.symbol}
     except Exception as e:
@@ -162,24 +655,426 @@ async def set_current_symbol(request: SymbolRequest):
 
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
-    """WebSocket端點，用於即時數據推送"""
-    await manager.connect(websocket)
+    """
+    WebSocket端點，用於即時數據推送
+    
+    查詢參數:
+        max_rate: 每秒最多接收的訊息數
+        protocol: 1（預設，每個模式一則完整market_update）或 2（每個tick一則合併訊息，訂單簿差異編碼）
+        encoding: json（預設）或 msgpack（僅protocol=2，二進位幀）
+        stream: 逗號分隔的 market（預設，市場數據）、alerts（告警事件）、opportunities（套利機會前K名），或 all
+        top_k: opportunities 的名次數（預設10，最多 OPPORTUNITY_MAX_K）
+        rank_by: opportunities 的排序指標，spread_percentage（預設）或 executable_profit
+    
+    客戶端訊息:
+        {"type": "subscribe", "mx_symbol": "BTC/USDT", "lbank_symbol": "BTC/USDT"}  只接收自行訂閱的交易對組合
+        {"type": "unsubscribe", "mx_symbol": ..., "lbank_symbol": ...}
+        {"type": "resync"}  protocol=2 收到的差異 base 與本地版本不符時發送，立即重送完整訂單簿
+    """
+    try:
+        max_rate = float(websocket.query_params.get("max_rate", 0)) or None
+    except ValueError:
+        max_rate = None
+    protocol, encoding = negotiate(
+        websocket.query_params.get("protocol"), websocket.query_params.get("encoding")
+    )
+    stream = websocket.query_params.get("stream", "market")
+    streams = tuple(
+        name for name in ("market", "alerts", "opportunities") if stream == "all" or name in stream.split(",")
+    ) or ("market",)
+    try:
+        top_k = min(max(int(websocket.query_params.get("top_k", 10)), 1), OPPORTUNITY_MAX_K)
+    except ValueError:
+        top_k = 10
+    rank_by = websocket.query_params.get("rank_by", "spread_percentage")
+    if rank_by not in RANK_METRICS:
+        rank_by = "spread_percentage"
+    client = await manager.connect(
+        websocket, max_rate=max_rate, protocol=protocol, encoding=encoding, streams=streams,
+        top_k=top_k, top_by=rank_by
+    )
+    if "market" in streams:
+        # 先送出全域選擇交易對的最新狀態，不必等到下一次數據變化
+        tick = snapshot_cache.get_default()
+        if tick is not None:
+            manager.send_tick(client, tick)
+    if "opportunities" in streams:
+        # 先送出目前的前K名，之後只推送差異
+        push = opportunity_pushes.get(rank_by)
+        if push is None and PROCESS_ROLE != "web":
+            push = TopKPush(rank_by, opportunity_index.top(OPPORTUNITY_MAX_K, rank_by))
+        if push is not None:
+            client.enqueue(push, f"opportunities:{rank_by}")
     try:
         while True:
-            # 保持連接活躍
-            await websocket.receive_text()
+            text = await websocket.receive_text()
+            try:
+                message = json.loads(text)
+            except ValueError:
+                continue  # 保持連接活躍的文字
+            if not isinstance(message, dict):
+                continue
+            if message.get("type") in ("subscribe", "unsubscribe"):
+                client.enqueue(dumps(await handle_subscription(client, message)))
+            elif message.get("type") == "resync" and client.protocol >= PROTOCOL_DELTA:
+                resync_client(client)
     except WebSocketDisconnect:
         manager.disconnect(websocket)
     except Exception as e:
         logger.error(f"WebSocket錯誤: {e}")
         manager.disconnect(websocket)
+    finally:
+        for pair in client.subscriptions:
+            unsubscribe_pair(pair)
+        client.subscriptions.clear()
+
+def resync_client(client: ClientConnection):
+    """清除連接的差異基準並立即重送其交易對組合的最新tick（完整快照），不必等到訂單簿下一次變化"""
+    client.book_versions.clear()
+    ticks = [snapshot_cache.get(pair) for pair in client.subscriptions]
+    if client.follows_default:
+        ticks.append(snapshot_cache.get_default())
+    for tick in ticks:
+        if tick is not None:
+            manager.send_tick(client, tick)
+
+async def handle_subscription(client: ClientConnection, message: dict) -> dict:
+    """處理客戶端的訂閱/取消訂閱，返回回覆訊息"""
+    mx_symbol = message.get("mx_symbol") or message.get("symbol")
+    lbank_symbol = message.get("lbank_symbol") or mx_symbol
+    if not isinstance(mx_symbol, str) or not isinstance(lbank_symbol, str):
+        return {"type": "error", "message": "缺少 mx_symbol"}
+    pair = (mx_symbol, lbank_symbol)
+    
+    if message["type"] == "unsubscribe":
+        if pair in client.subscriptions:
+            client.subscriptions.discard(pair)
+            unsubscribe_pair(pair)
+        return {"type": "unsubscribed", "mx_symbol": mx_symbol, "lbank_symbol": lbank_symbol}
+    
+    if pair not in client.subscriptions:
+        if len(client.subscriptions) >= WS_MAX_SUBSCRIPTIONS:
+            return {"type": "error", "message": f"每個連接最多訂閱 {WS_MAX_SUBSCRIPTIONS} 個交易對組合"}
+        error = await subscribe_pair(pair)
+        if error:
+            return {"type": "error", "message": error}
+        client.subscriptions.add(pair)
+        client.follows_default = False
+        # 管線已在運行時立即送出最新狀態
+        tick = snapshot_cache.get(pair)
+        if tick is not None:
+            manager.send_tick(client, tick)
+    return {"type": "subscribed", "mx_symbol": mx_symbol, "lbank_symbol": lbank_symbol}
+
+@app.get("/api/opportunities")
+@fetcher_command("opportunities")
+async def get_opportunities(k: int = 10, by: str = "spread_percentage", offset: int = 0):
+    """
+    套利機會排名：所有監控中的 (交易對, 方向) 依價差百分比或可執行收益排序的前k名
+    
+    Args:
+        k: 名次數（最多500）
+        by: spread_percentage 或 executable_profit
+        offset: 從第幾名之後開始（分頁）
+    """
+    try:
+        mark_opportunities(opportunity_index.prune())
+        top = opportunity_index.top(min(max(k, 1), 500), by, max(offset, 0))
+        return {"status": "success", "by": by, "top": top, "stats": opportunity_index.get_stats()}
+    except ValueError as e:
+        return {"status": "error", "message": str(e)}
+
+@app.get("/api/snapshot")
+async def get_snapshot(request: Request, symbol: Optional[str] = None, wait: float = 0):
+    """
+    最新狀態快照：每條抓取管線最新的兩邊訂單簿與各模式價差
+    
+    Args:
+        symbol: 逗號分隔的交易對（MX交易對或 MX|LBank 管線鍵），省略時為全部
+        wait: 帶 If-None-Match 且內容未變時，最多等待幾秒直到版本前進（長輪詢，上限 SNAPSHOT_MAX_WAIT）
+    
+    響應帶 ETag；If-None-Match 相符且等待逾時返回304
+    """
+    symbols = [s.strip() for s in symbol.split(",") if s.strip()] if symbol else None
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        etag = snapshot_cache.etag(snapshot_cache.select(symbols))
+        if if_none_match.strip() == etag:
+            timeout = min(max(wait, 0.0), SNAPSHOT_MAX_WAIT)
+            if timeout <= 0 or not await snapshot_cache.wait_for_change(symbols, etag, timeout):
+                snapshot_cache.not_modified += 1
+                return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
+    etag, body = snapshot_cache.render(symbols)
+    return Response(content=body, media_type="application/json", headers={"ETag": etag, "Cache-Control": "no-cache"})
+
+def require_admin(request: Request):
+    """管理API驗證，token不符或未設置 ADMIN_TOKEN 時拋出403"""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="管理功能未啟用（未設置 ADMIN_TOKEN）")
+    token = request.headers.get("x-admin-token") or request.query_params.get("token") or ""
+    if not hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="無效的管理 token")
+
+@app.post("/api/admin/profiler/start")
+async def start_profiler(request: Request, seconds: float = 30, interval_ms: float = 5):
+    """
+    開始取樣分析本進程的事件循環，seconds 秒後自動停止（多進程部署時抓取進程經 FETCHER_PORT 存取）
+    
+    Args:
+        seconds: 取樣秒數（1-300）
+        interval_ms: 取樣間隔毫秒（1-100）
+    """
+    require_admin(request)
+    try:
+        profiler.start(min(max(seconds, 1.0), 300.0), min(max(interval_ms, 1.0), 100.0) / 1000)
+        return {"status": "success", "profiler": profiler.get_stats()}
+    except RuntimeError as e:
+        return {"status": "error", "message": str(e)}
+
+@app.post("/api/admin/profiler/stop")
+async def stop_profiler(request: Request):
+    """提前停止取樣分析"""
+    require_admin(request)
+    await asyncio.to_thread(profiler.stop)
+    return {"status": "success", "profiler": profiler.get_stats()}
+
+@app.get("/api/admin/profiler")
+async def get_profiler_status(request: Request):
+    """取樣分析器狀態"""
+    require_admin(request)
+    return {"status": "success", "profiler": profiler.get_stats()}
+
+@app.get("/api/admin/profiler/collapsed")
+async def download_profile(request: Request):
+    """下載最近一次取樣結果（collapsed stacks，可交給 flamegraph.pl 或 speedscope）"""
+    require_admin(request)
+    filename = f"profile-{PROCESS_ROLE}-{os.getpid()}-{int(profiler.started_at or 0)}.collapsed"
+    return PlainTextResponse(
+        profiler.collapsed(), headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+@app.get("/api/admin/slow-callbacks")
+async def get_slow_callbacks(request: Request):
+    """最近阻塞事件循環超過 SLOW_CALLBACK_MS 的回調與當時的堆疊"""
+    require_admin(request)
+    return {"status": "success", "role": PROCESS_ROLE, "stats": loop_watchdog.get_stats()}
 
 @app.get("/api/health")
 async def health_check():
     """健康檢查端點"""
     return {"status": "healthy", "service": "lbmx-spread-monitor"}
 
+@app.get("/api/metrics")
+async def get_metrics():
+    """Prometheus文字格式的指標（延遲直方圖、計數器、連接數）"""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/api/scheduler/stats")
+@fetcher_command("scheduler_stats")
+async def get_scheduler_stats():
+    """獲取多交易對輪詢排程器統計（各優先級實際刷新率、各交易所限流狀態）"""
+    if not poll_scheduler:
+        return {"status": "disabled"}
+    return {"status": "success", "stats": poll_scheduler.get_stats()}
+
+class TierRequest(BaseModel):
+    symbol: str
+    tier: str
+
+@app.post("/api/scheduler/tier")
+@fetcher_command("scheduler_tier")
+async def set_symbol_tier(request: TierRequest):
+    """設置交易對的輪詢優先級"""
+    if not poll_scheduler:
+        return {"status": "error", "message": "多交易對輪詢未啟用"}
+    try:
+        poll_scheduler.set_tier(request.symbol, request.tier)
+        return {"status": "success", "symbol": request.symbol, "tier": request.tier}
+    except ValueError as e:
+        return {"status": "error", "message": str(e)}
+
+class ProfitCurveRequest(BaseModel):
+    mode: str = 'mx_buy_lbank_sell'
+    investment_amounts: List[float]
+    symbol: Optional[str] = None  # MX交易對，或交易對組合key（MX交易對|LBank交易對）
+    lbank_symbol: Optional[str] = None  # 自選組合的LBank交易對，預設與symbol相同
+
+@app.post("/api/profit-curve")
+@fetcher_command("profit_curve")
+async def get_profit_curve(request: ProfitCurveRequest):
+    """批量計算多個投資金額在全部深度下的收益，以及可執行價差與邊際價差曲線"""
+    try:
+        if request.symbol:
+            symbol = pair_key((request.symbol, request.lbank_symbol or request.symbol))
+        else:
+            symbol = pair_key(current_default_pair())
+        books = latest_orderbooks.get(symbol)
+        if not books:
+            return {"status": "error", "message": f"沒有 {symbol} 的最新訂單簿"}
+        
+        mx_orderbook, lbank_orderbook = books
+        return {
+            "status": "success",
+            "symbol": symbol,
+            "mode": request.mode,
+            "executable": spread_calculator.calculate_executable_spread(
+                mx_orderbook, lbank_orderbook, request.mode
+            ),
+            "profits": spread_calculator.calculate_depth_profit(
+                mx_orderbook, lbank_orderbook, request.mode, request.investment_amounts
+            ),
+        }
+    except Exception as e:
+        logger.error(f"計算收益曲線失敗: {e}")
+        return {"status": "error", "message": str(e)}
+
+@app.get("/api/alignment")
+@fetcher_command("alignment")
+async def get_alignment_stats():
+    """獲取兩邊訂單簿時間對齊統計（時間差分位數、標記/丟棄數量、時鐘偏差）"""
+    return {"status": "success", "stats": snapshot_coordinator.get_stats()}
+
+@app.get("/api/capture")
+@fetcher_command("capture")
+async def get_capture_status():
+    """獲取原始響應錄製狀態（CAPTURE_DIR 未設置時為停用）"""
+    if not exchange_service.capture:
+        return {"status": "success", "enabled": False}
+    return {"status": "success", "enabled": True, "stats": exchange_service.capture.get_stats()}
+
+@app.get("/api/transport")
+@fetcher_command("transport")
+async def get_transport_stats():
+    """獲取各交易所HTTP傳輸狀態（延遲p50/p95、hedged請求次數、熔斷狀態、可重用連接數）"""
+    return {"status": "success", "stats": exchange_service.get_transport_stats()}
+
+@app.get("/api/cadence")
+@fetcher_command("cadence")
+async def get_cadence_stats():
+    """獲取各抓取管線目前的輪詢間隔、選擇原因與各原因次數（stats 為全域選擇的交易對）"""
+    feeds = feed_registry.feeds if feed_registry else {}
+    default_feed = feeds.get(default_feed_pair)
+    return {
+        "status": "success",
+        "stats": default_feed.cadence.get_stats() if default_feed and default_feed.cadence else None,
+        "feeds": {feed.key: feed.cadence.get_stats() for feed in feeds.values() if feed.cadence},
+    }
+
+class AlertRuleRequest(BaseModel):
+    id: Optional[str] = None
+    kind: str = "above"  # above: 持續高於門檻；cross: 雙向穿越
+    threshold: float
+    field: str = "spread_percentage"
+    hysteresis: float = 0.0
+    hold_ms: float = 0.0
+    symbol: Optional[str] = None
+    mode: Optional[str] = None
+
+@app.get("/api/alerts")
+@fetcher_command("alerts")
+async def get_alerts(limit: int = 50):
+    """獲取告警規則、引擎與輸出統計及最近的告警事件"""
+    return {
+        "status": "success",
+        "rules": [rule.to_dict() for rule in alert_engine.rules.values()],
+        "stats": alert_engine.get_stats(),
+        "sink": alert_sink.get_stats() if alert_sink.enabled else None,
+        "recent": list(alert_engine.recent)[-limit:] if limit > 0 else [],
+    }
+
+@app.post("/api/alerts/rules")
+@fetcher_command("alert_rule_add")
+async def add_alert_rule(request: AlertRuleRequest):
+    """新增或替換告警規則（同id替換）"""
+    try:
+        rule = alert_engine.add_rule(request.model_dump())
+        logger.info(f"新增告警規則: {rule.to_dict()}")
+        return {"status": "success", "rule": rule.to_dict()}
+    except ValueError as e:
+        return {"status": "error", "message": str(e)}
+
+@app.delete("/api/alerts/rules/{rule_id}")
+@fetcher_command("alert_rule_remove")
+async def remove_alert_rule(rule_id: str):
+    """刪除告警規則"""
+    if not alert_engine.remove_rule(rule_id):
+        return {"status": "error", "message": f"沒有規則 {rule_id}"}
+    return {"status": "success", "id": rule_id}
+
+@app.get("/api/feeds")
+@fetcher_command("feeds")
+async def get_feed_stats():
+    """獲取所有抓取管線（每個交易對組合一條）的訂閱者數與運行狀態"""
+    if not feed_registry:
+        return {"status": "disabled"}
+    return {"status": "success", "stats": feed_registry.get_stats()}
+
+@app.get("/api/spreads")
+@fetcher_command("spreads")
+async def get_universe_spreads():
+    """獲取排程器監控的所有交易對最新價差"""
+    return {"status": "success", "spreads": universe_spreads}
+
+@app.get("/api/history")
+@fetcher_command("history")
+async def get_spread_history(
+    symbol: Optional[str] = None,
+    mode: str = "mx_buy_lbank_sell",
+    start: Optional[float] = None,
+    end: Optional[float] = None,
+    resolution: Optional[float] = None,
+    lbank_symbol: Optional[str] = None
+):
+    """
+    查詢價差歷史（min/max/last），由預先計算的1秒/1分/1小時聚合降採樣
+
+    Args:
+        symbol, lbank_symbol: 交易對組合，預設為目前的全域選擇；lbank_symbol 未指定時與 symbol 相同
+        start, end: 時間範圍（epoch秒），預設為最近1小時
+        resolution: 降採樣間隔（秒），未指定時自動選擇
+    """
+    try:
+        if symbol:
+            key = pair_key((symbol, lbank_symbol or symbol))
+        else:
+            key = pair_key(current_default_pair())
+        end = end or time.time()
+        start = start if start is not None else end - 3600
+        if start > end:
+            return {"status": "error", "message": "start 必須小於 end"}
+        
+        history = await history_store.query(key, mode, start, end, resolution)
+        return {"status": "success", "symbol": key, "mode": mode, "start": start, "end": end, **history}
+    except Exception as e:
+        logger.error(f"查詢價差歷史失敗: {e}")
+        return {"status": "error", "message": str(e)}
+
+@app.get("/api/state-bus")
+async def get_state_bus_stats():
+    """獲取部署角色與狀態匯流排狀態（fetcher: 訂閱的web進程數；web: 連接狀態）"""
+    bus = state_bus_server or state_bus_client
+    return {"status": "success", "role": PROCESS_ROLE, "stats": bus.get_stats() if bus else None}
+
+@app.get("/api/static")
+async def get_static_stats():
+    """獲取前端靜態檔案快取狀態（檔案數、各編碼大小、304次數）"""
+    return {"status": "success", "stats": static_assets.get_stats()}
+
+@app.get("/api/connections")
+async def get_connection_stats():
+    """獲取每個WebSocket客戶端的佇列長度、延遲與合併/丟棄計數"""
+    return {"status": "success", "stats": manager.get_stats()}
+
+@app.get("/api/depth-stream")
+@fetcher_command("depth_stream")
+async def get_depth_stream_status():
+    """獲取深度推送的連接與同步狀態"""
+    if not exchange_service.depth_stream:
+        return {"status": "disabled", "mode": exchange_service.depth_feed_mode}
+    return {"status": "success", "feeds": exchange_service.depth_stream.get_stats()}
+
 @app.get("/api/symbols/mx")
+@fetcher_command("symbols_mx")
 async def get_mx_symbols():
     """獲取MX交易所的幣種列表"""
     try:
@@ -190,6 +1085,7 @@ async def get_mx_symbols():
         return {"symbols": [], "status": "error", "message": str(e)}
 
 @app.get("/api/symbols/lbank")
+@fetcher_command("symbols_lbank")
 async def get_lbank_symbols():
     """獲取LBank交易所的幣種列表"""
     try:
@@ -199,22 +1095,28 @@ async def get_lbank_symbols():
         logger.error(f"獲取LBank幣種列表失敗: {e}")
         return {"symbols": [], "status": "error", "message": str(e)}
 
+@app.get("/api/symbols/cache")
+@fetcher_command("symbols_cache")
+async def get_symbol_cache_status():
+    """獲取交易對快取狀態（年齡、數量、刷新次數與最後錯誤）"""
+    return {"status": "success", "stats": exchange_service.symbol_cache.get_stats()}
+
 class CustomSymbolRequest(BaseModel):
     mx_symbol: str
     lbank_symbol: str
 
 @app.post("/api/symbol/custom")
+@fetcher_command("set_custom_symbols")
 async def set_custom_symbols(request: CustomSymbolRequest):
     """設置自選模式的交易對"""
     try:
         # 驗證幣種是否存在
-        mx_symbols = await exchange_service.get_mx_symbols()
-        lbank_symbols = await exchange_service.get_lbank_symbols()
+        has_mx_symbol, has_lbank_symbol = await exchange_service.has_symbols(request.mx_symbol, request.lbank_symbol)
         
-        if request.mx_symbol not in mx_symbols:
+        if not has_mx_symbol:
             return {"status": "error", "message": f"MX交易所沒有 {request.mx_symbol} 幣種"}
         
-        if request.lbank_symbol not in lbank_symbols:
+        if not has_lbank_symbol:
             return {"status": "error", "message": f"LBank交易所沒有 {request.lbank_symbol} 幣種"}
         
         # 設置自選模式
@@ -222,6 +1124,7 @@ async def set_custom_symbols(request: CustomSymbolRequest):
         exchange_service.custom_mode = True
         exchange_service.custom_mx_symbol = request.mx_symbol
         exchange_service.custom_lbank_symbol = request.lbank_symbol
+        switch_default_feed()
         
         logger.info(f"設置自選模式: MX={request.mx_symbol}, LBank={request.lbank_symbol}")
         return {
@@ -233,24 +1136,36 @@ async def set_custom_symbols(request: CustomSymbolRequest):
         logger.error(f"設置自選幣種失敗: {e}")
         return {"status": "error", "message": str(e)}
 
-# 靜態文件服務 (用於 Fly.io 部署)
-if os.path.exists("frontend/build"):
-    app.mount("/static", StaticFiles(directory="frontend/build/static"), name="static")
+# 靜態文件服務 (用於 Fly.io 部署)：構建產物在啟動時載入記憶體並預先壓縮
+if os.path.exists(FRONTEND_BUILD_DIR):
+    def static_response(asset: Optional[StaticAsset], request: Request) -> Response:
+        if asset is None:
+            raise HTTPException(status_code=404, detail="Not found")
+        status, body, headers = static_assets.respond(asset, request.headers)
+        if status == 304:
+            return Response(status_code=304, headers=headers)
+        media_type = headers.pop("Content-Type")
+        return Response(content=body, headers=headers, media_type=media_type)
+    
+    @app.get("/static/{path:path}")
+    async def serve_static(path: str, request: Request):
+        """服務帶hash的打包檔案（immutable長期快取）"""
+        return static_response(static_assets.get(f"static/{path}"), request)
     
     @app.get("/")
-    async def serve_frontend():
+    async def serve_frontend(request: Request):
         """服務前端應用"""
-        return FileResponse("frontend/build/index.html")
+        return static_response(static_assets.get_page("index.html"), request)
     
     @app.get("/{path:path}")
-    async def serve_frontend_routes(path: str):
+    async def serve_frontend_routes(path: str, request: Request):
         """處理前端路由"""
         # 如果是 API 路由或 WebSocket，不處理
         if path.startswith("api/") or path.startswith("ws") or path.startswith("docs") or path.startswith("openapi.json"):
             raise HTTPException(status_code=404, detail="Not found")
         
-        # 否則返回前端 index.html
-        return FileResponse("frontend/build/index.html")
+        # 構建目錄中存在的檔案直接返回，否則返回前端 index.html
+        return static_response(static_assets.get_page(path), request)
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,219 @@
+from datetime import datetime
+from typing import Optional, Sequence, Tuple
+
+import numpy as np
+
+from .market_data import OrderBook, OrderBookEntry
+
+# 定點縮放的最高精度（小數位數）；int64 在此精度下可容納 9e10 以內的價格或數量
+MAX_PRECISION = 8
+
+
+def _inexact(scaled: np.ndarray, rounded: np.ndarray) -> bool:
+    return bool((np.abs(rounded - scaled) > 1e-9 * np.abs(scaled)).any())
+
+
+def lossless_precision(values: np.ndarray, precision: int, max_precision: int = MAX_PRECISION) -> int:
+    """
+    縮放為整數時不截斷任何數值所需的精度：不低於給定的 precision，最多 max_precision
+    （交易所精度資訊缺少或與實際數據不符時，例如數量精度為0但數量有小數，自動提高）
+    """
+    return fixed_point(np.asarray(values, dtype=np.float64), precision, max_precision)[1]
+
+
+def fixed_point(values: np.ndarray, precision: int, max_precision: int = MAX_PRECISION) -> Tuple[np.ndarray, int]:
+    """縮放為定點整數，返回 (int64陣列, 實際使用的精度)；精度不足以無損表示時逐位提高"""
+    while True:
+        scaled = values * (10 ** precision)
+        rounded = np.rint(scaled)
+        if precision >= max_precision or not _inexact(scaled, rounded):
+            return rounded.astype(np.int64), precision
+        precision += 1
+
+
+class CompactOrderBook:
+    """
+    以平行整數陣列儲存的訂單簿（定點數）
+    價格與數量按 price_precision / quantity_precision 縮放為int64，
+    比較完全精確、沒有浮點誤差；只在API邊界轉換為OrderBook或dict
+    精度取各交易所自己的精度，數據需要更多小數位時自動提高（見 lossless_precision），不會截斷
+    """
+
+    __slots__ = (
+        'exchange', 'symbol', 'timestamp', 'price_precision', 'quantity_precision',
+        'bid_prices', 'bid_quantities', 'ask_prices', 'ask_quantities', 'best_bid', 'best_ask',
+        'sent_at', 'received_at', 'exchange_time',
+    )
+
+    def __init__(
+        self,
+        exchange: str,
+        symbol: str,
+        bid_prices: np.ndarray,
+        bid_quantities: np.ndarray,
+        ask_prices: np.ndarray,
+        ask_quantities: np.ndarray,
+        timestamp: datetime,
+        price_precision: int = 4,
+        quantity_precision: int = 6,
+        sent_at: Optional[datetime] = None,
+        received_at: Optional[datetime] = None,
+        exchange_time: Optional[datetime] = None
+    ):
+        self.exchange = exchange
+        self.symbol = symbol
+        self.bid_prices = bid_prices  # 從高到低
+        self.bid_quantities = bid_quantities
+        self.ask_prices = ask_prices  # 從低到高
+        self.ask_quantities = ask_quantities
+        self.timestamp = timestamp
+        self.price_precision = price_precision
+        self.quantity_precision = quantity_precision
+        # 請求時間（與OrderBook相同，供時間對齊使用；由OrderBook轉換時不保留）
+        self.sent_at = sent_at
+        self.received_at = received_at
+        self.exchange_time = exchange_time
+        # 最優價位以Python int快取，比較時不經過numpy標量
+        self.best_bid: Optional[int] = int(bid_prices[0]) if len(bid_prices) else None
+        self.best_ask: Optional[int] = int(ask_prices[0]) if len(ask_prices) else None
+
+    @staticmethod
+    def _levels(levels: Sequence[Sequence]) -> np.ndarray:
+        """[[price, quantity, ...], ...] 轉為 (N, 2) 浮點陣列"""
+        array = np.empty((len(levels), 2), dtype=np.float64)
+        for index, level in enumerate(levels):
+            array[index, 0] = float(level[0])
+            array[index, 1] = float(level[1])
+        return array
+
+    @classmethod
+    def from_levels(
+        cls,
+        exchange: str,
+        symbol: str,
+        bids: Sequence[Sequence],
+        asks: Sequence[Sequence],
+        timestamp: Optional[datetime] = None,
+        price_precision: int = 4,
+        quantity_precision: int = 6,
+        depth: Optional[int] = None
+    ) -> "CompactOrderBook":
+        """由交易所原始價位 [[price, quantity, ...], ...] 直接建立，不經過OrderBookEntry"""
+        bids = bids[:depth] if depth else bids
+        asks = asks[:depth] if depth else asks
+        return cls.from_arrays(
+            exchange,
+            symbol,
+            cls._levels(bids),
+            cls._levels(asks),
+            timestamp or datetime.now(),
+            price_precision,
+            quantity_precision
+        )
+
+    @classmethod
+    def from_arrays(
+        cls,
+        exchange: str,
+        symbol: str,
+        bids: np.ndarray,
+        asks: np.ndarray,
+        timestamp: datetime,
+        price_precision: int = 4,
+        quantity_precision: int = 6,
+        sent_at: Optional[datetime] = None,
+        received_at: Optional[datetime] = None,
+        exchange_time: Optional[datetime] = None
+    ) -> "CompactOrderBook":
+        """由 (N, 2) 浮點價位陣列建立（整批縮放，不逐檔轉換；精度不足以表示數據時自動提高）"""
+        levels = np.concatenate((bids, asks))
+        prices, price_precision = fixed_point(levels[:, 0], price_precision)
+        quantities, quantity_precision = fixed_point(levels[:, 1], quantity_precision)
+        split = len(bids)
+        return cls(
+            exchange, symbol,
+            prices[:split], quantities[:split], prices[split:], quantities[split:],
+            timestamp, price_precision, quantity_precision, sent_at, received_at, exchange_time
+        )
+
+    @classmethod
+    def from_orderbook(cls, orderbook: OrderBook) -> "CompactOrderBook":
+        """由Pydantic OrderBook轉換"""
+        return cls.from_levels(
+            orderbook.exchange,
+            orderbook.symbol,
+            [(entry.price, entry.quantity) for entry in orderbook.bids],
+            [(entry.price, entry.quantity) for entry in orderbook.asks],
+            orderbook.timestamp,
+            orderbook.price_precision,
+            orderbook.quantity_precision
+        )
+
+    @property
+    def price_scale(self) -> int:
+        return 10 ** self.price_precision
+
+    @property
+    def quantity_scale(self) -> int:
+        return 10 ** self.quantity_precision
+
+    @property
+    def nbytes(self) -> int:
+        return (self.bid_prices.nbytes + self.bid_quantities.nbytes
+                + self.ask_prices.nbytes + self.ask_quantities.nbytes)
+
+    def top(self, depth: int) -> "CompactOrderBook":
+        """前N檔視圖（共享底層陣列，不複製）"""
+        return CompactOrderBook(
+            self.exchange, self.symbol,
+            self.bid_prices[:depth], self.bid_quantities[:depth],
+            self.ask_prices[:depth], self.ask_quantities[:depth],
+            self.timestamp, self.price_precision, self.quantity_precision
+        )
+
+    def same_levels(self, other: "CompactOrderBook") -> bool:
+        """逐檔精確比較價格與數量（精度不同時兩邊的整數不可比較，視為不同）"""
+        return (
+            self.price_precision == other.price_precision
+            and self.quantity_precision == other.quantity_precision
+            and np.array_equal(self.bid_prices, other.bid_prices)
+            and np.array_equal(self.bid_quantities, other.bid_quantities)
+            and np.array_equal(self.ask_prices, other.ask_prices)
+            and np.array_equal(self.ask_quantities, other.ask_quantities)
+        )
+
+    def float_levels(self, side: str):
+        """返回 (價格, 數量) 浮點陣列，side為'bids'或'asks'"""
+        if side == 'bids':
+            prices, quantities = self.bid_prices, self.bid_quantities
+        else:
+            prices, quantities = self.ask_prices, self.ask_quantities
+        return prices / self.price_scale, quantities / self.quantity_scale
+
+    def to_dict(self) -> dict:
+        """序列化為與 OrderBook.model_dump() 相同結構的dict"""
+        bid_prices, bid_quantities = self.float_levels('bids')
+        ask_prices, ask_quantities = self.float_levels('asks')
+        return {
+            "exchange": self.exchange,
+            "symbol": self.symbol,
+            "bids": [{"price": p, "quantity": q} for p, q in zip(bid_prices.tolist(), bid_quantities.tolist())],
+            "asks": [{"price": p, "quantity": q} for p, q in zip(ask_prices.tolist(), ask_quantities.tolist())],
+            "timestamp": self.timestamp,
+            "price_precision": self.price_precision,
+            "quantity_precision": self.quantity_precision,
+        }
+
+    def to_orderbook(self) -> OrderBook:
+        """轉換為Pydantic OrderBook（API邊界使用）"""
+        bid_prices, bid_quantities = self.float_levels('bids')
+        ask_prices, ask_quantities = self.float_levels('asks')
+        return OrderBook(
+            exchange=self.exchange,
+            symbol=self.symbol,
+            bids=[OrderBookEntry(price=p, quantity=q) for p, q in zip(bid_prices.tolist(), bid_quantities.tolist())],
+            asks=[OrderBookEntry(price=p, quantity=q) for p, q in zip(ask_prices.tolist(), ask_quantities.tolist())],
+            timestamp=self.timestamp,
+            price_precision=self.price_precision,
+            quantity_precision=self.quantity_precision
+        )
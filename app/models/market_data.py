@@ -18,6 +18,9 @@ class OrderBook(BaseModel):
     timestamp: datetime
     price_precision: int = 4  # 價格精度（小數位數）
     quantity_precision: int = 6  # 數量精度（小數位數）
+    sent_at: Optional[datetime] = None  # 請求發出時間（本地時鐘）
+    received_at: Optional[datetime] = None  # 響應接收時間（本地時鐘）
+    exchange_time: Optional[datetime] = None  # 交易所回報的訂單簿時間
 
 class SpreadData(BaseModel):
     """價差數據模型"""
@@ -33,6 +36,13 @@ class SpreadData(BaseModel):
     buy_exchange: str  # 買入交易所
     sell_exchange: str  # 賣出交易所
     timestamp: datetime
+    skew_ms: Optional[float] = None  # 兩邊訂單簿的時間差（毫秒）
+    book_age_ms: Optional[float] = None  # 較舊一邊訂單簿的年齡（毫秒）
+    stale: bool = False  # 時間差或年齡超過上限
+    executable_quantity: Optional[float] = None  # 走完雙邊深度的最大可獲利數量
+    executable_profit: Optional[float] = None  # 以最大可獲利數量成交的收益
+    vwap_buy_price: Optional[float] = None  # 最大可獲利數量的成交均價（買入）
+    vwap_sell_price: Optional[float] = None  # 最大可獲利數量的成交均價（賣出）
     
     @property
     def color(self) -> str:
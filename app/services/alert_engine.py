@@ -0,0 +1,341 @@
+import asyncio
+import itertools
+import json
+import logging
+import os
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+import aiohttp
+
+from ..models.market_data import SpreadData
+
+logger = logging.getLogger(__name__)
+
+RULE_KINDS = ("above", "cross")
+RULE_FIELDS = ("spread_percentage", "spread", "max_quantity", "executable_quantity", "executable_profit")
+
+
+class AlertRule:
+    """
+    告警規則
+    above: 欄位值持續高於 threshold 達 hold_ms 毫秒時觸發，低於 threshold - hysteresis 時解除
+    cross: 欄位值向上超過 threshold + hysteresis 或向下低於 threshold - hysteresis 時各觸發一次
+    """
+
+    def __init__(self, rule_id: str, kind: str, threshold: float, field: str = "spread_percentage",
+                 hysteresis: float = 0.0, hold_ms: float = 0.0, symbol: Optional[str] = None,
+                 mode: Optional[str] = None):
+        if kind not in RULE_KINDS:
+            raise ValueError(f"不支援的規則類型: {kind}")
+        if field not in RULE_FIELDS:
+            raise ValueError(f"不支援的欄位: {field}")
+        if hysteresis < 0 or hold_ms < 0:
+            raise ValueError("hysteresis 與 hold_ms 不可為負數")
+        self.id = rule_id
+        self.kind = kind
+        self.threshold = threshold
+        self.field = field
+        self.hysteresis = hysteresis
+        self.hold_ms = hold_ms
+        self.symbol = symbol  # 交易對（自選組合為 "MX交易對|LBank交易對"），None表示所有交易對
+        self.mode = mode  # None表示兩個模式
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "threshold": self.threshold,
+            "field": self.field,
+            "hysteresis": self.hysteresis,
+            "hold_ms": self.hold_ms,
+            "symbol": self.symbol,
+            "mode": self.mode,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "AlertRule":
+        return cls(
+            data["id"], data["kind"], float(data["threshold"]), data.get("field", "spread_percentage"),
+            float(data.get("hysteresis") or 0.0), float(data.get("hold_ms") or 0.0),
+            data.get("symbol"), data.get("mode")
+        )
+
+
+class RuleState:
+    """單一 (規則, 交易對, 模式) 的增量狀態"""
+
+    __slots__ = ("active", "pending_since", "side")
+
+    def __init__(self):
+        self.active = False  # above: 已觸發尚未解除
+        self.pending_since: Optional[float] = None  # above: 開始高於門檻的時間
+        self.side: Optional[int] = None  # cross: 1 在門檻上方，-1 在下方
+
+
+class AlertEngine:
+    """
+    增量價差告警引擎
+    每筆價差只更新符合交易對的規則，每條規則O(1)；觸發時返回精簡的告警事件。
+    兩邊訂單簿時間未對齊（stale）的價差不參與判斷：不觸發、不解除、不穿越，並中斷尚未滿足的持續時間
+    """
+
+    def __init__(self, rules_path: Optional[str] = None, history: int = 200):
+        self.rules_path = rules_path
+        self.rules: Dict[str, AlertRule] = {}
+        self._by_symbol: Dict[Optional[str], List[AlertRule]] = {}
+        self._states: Dict[Tuple[str, str, str], RuleState] = {}
+        self.recent: Deque[dict] = deque(maxlen=history)
+        self.evaluated: int = 0
+        self.skipped_stale: int = 0
+        self.fired: int = 0
+        self._ids = itertools.count(1)
+
+    def load(self):
+        """從檔案載入規則"""
+        if not self.rules_path:
+            return
+        try:
+            with open(self.rules_path, 'r') as f:
+                for data in json.load(f):
+                    self._add(AlertRule.from_dict(data))
+            logger.info(f"已載入 {len(self.rules)} 條告警規則")
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.error(f"讀取告警規則失敗: {e}")
+
+    def save(self):
+        if not self.rules_path:
+            return
+        try:
+            directory = os.path.dirname(self.rules_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            tmp_path = f"{self.rules_path}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump([rule.to_dict() for rule in self.rules.values()], f)
+            os.replace(tmp_path, self.rules_path)
+        except Exception as e:
+            logger.error(f"寫入告警規則失敗: {e}")
+
+    def add_rule(self, data: dict) -> AlertRule:
+        """新增或替換規則（未指定id時自動產生），參數錯誤時拋出ValueError"""
+        data = dict(data)
+        if not data.get("id"):
+            rule_id = f"rule-{next(self._ids)}"
+            while rule_id in self.rules:
+                rule_id = f"rule-{next(self._ids)}"
+            data["id"] = rule_id
+        try:
+            rule = AlertRule.from_dict(data)
+        except (KeyError, TypeError) as e:
+            raise ValueError(f"規則參數錯誤: {e}")
+        self.remove_rule(rule.id, save=False)
+        self._add(rule)
+        self.save()
+        return rule
+
+    def _add(self, rule: AlertRule):
+        self.rules[rule.id] = rule
+        self._by_symbol.setdefault(rule.symbol, []).append(rule)
+
+    def remove_rule(self, rule_id: str, save: bool = True) -> bool:
+        rule = self.rules.pop(rule_id, None)
+        if rule is None:
+            return False
+        self._by_symbol[rule.symbol].remove(rule)
+        if not self._by_symbol[rule.symbol]:
+            del self._by_symbol[rule.symbol]
+        for key in [key for key in self._states if key[0] == rule_id]:
+            del self._states[key]
+        if save:
+            self.save()
+        return True
+
+    def evaluate(self, spread_data: SpreadData, key: Optional[str] = None) -> List[dict]:
+        """
+        以一筆價差更新相關規則，返回本次觸發的事件
+
+        Args:
+            key: 交易對組合（抓取管線的key，預設為價差的交易對）；規則的symbol與狀態都以它區分，
+                 自選組合與同一MX交易對的其他組合互不影響
+        """
+        if not self.rules:
+            return []
+        key = key or spread_data.symbol
+        if spread_data.stale:
+            self._suppress(key, spread_data.mode)
+            return []
+        events = []
+        now = spread_data.timestamp.timestamp()
+        for rules in (self._by_symbol.get(key), self._by_symbol.get(None)):
+            if not rules:
+                continue
+            for rule in rules:
+                if rule.mode is not None and rule.mode != spread_data.mode:
+                    continue
+                value = getattr(spread_data, rule.field)
+                if value is None:
+                    continue
+                self.evaluated += 1
+                state = self._states.get((rule.id, key, spread_data.mode))
+                if state is None:
+                    state = self._states[(rule.id, key, spread_data.mode)] = RuleState()
+                event = self._update(rule, state, value, now)
+                if event:
+                    events.append(self._emit(rule, event, key, spread_data, value, now))
+        return events
+
+    def _suppress(self, key: str, mode: str):
+        """未對齊的價差：持續時間必須由對齊的價差重新累計"""
+        self.skipped_stale += 1
+        for rules in (self._by_symbol.get(key), self._by_symbol.get(None)):
+            for rule in rules or ():
+                state = self._states.get((rule.id, key, mode))
+                if state is not None:
+                    state.pending_since = None
+
+    @staticmethod
+    def _update(rule: AlertRule, state: RuleState, value: float, now: float) -> Optional[str]:
+        if rule.kind == "above":
+            if state.active:
+                if value < rule.threshold - rule.hysteresis:
+                    state.active = False
+                    state.pending_since = None
+                    return "cleared"
+                return None
+            if value > rule.threshold:
+                if state.pending_since is None:
+                    state.pending_since = now
+                if (now - state.pending_since) * 1000 >= rule.hold_ms:
+                    state.active = True
+                    return "triggered"
+            else:
+                state.pending_since = None
+            return None
+
+        # cross：第一筆只記錄位置，之後穿越滯後區間才觸發
+        if value > rule.threshold + rule.hysteresis:
+            side = 1
+        elif value < rule.threshold - rule.hysteresis:
+            side = -1
+        else:
+            return None
+        previous, state.side = state.side, side
+        if previous is None or previous == side:
+            return None
+        return "cross_up" if side == 1 else "cross_down"
+
+    def _emit(self, rule: AlertRule, event: str, key: str, spread_data: SpreadData, value: float, now: float) -> dict:
+        alert = {
+            "type": "alert",
+            "rule": rule.id,
+            "event": event,
+            "symbol": key,
+            "mode": spread_data.mode,
+            "field": rule.field,
+            "value": value,
+            "threshold": rule.threshold,
+            "spread_percentage": spread_data.spread_percentage,
+            "ts": now,
+        }
+        self.fired += 1
+        self.recent.append(alert)
+        return alert
+
+    def get_stats(self) -> dict:
+        return {
+            "rules": len(self.rules),
+            "tracked_states": len(self._states),
+            "active": sum(1 for state in self._states.values() if state.active),
+            "evaluated": self.evaluated,
+            "skipped_stale": self.skipped_stale,
+            "fired": self.fired,
+        }
+
+
+class AlertSink:
+    """
+    告警輸出：本機webhook（POST JSON）與/或JSON lines檔案
+    事件先放入佇列，由背景任務寫出，不阻塞價差計算
+    """
+
+    def __init__(self, webhook_url: Optional[str] = None, file_path: Optional[str] = None,
+                 max_queue: int = 1000, timeout: float = 5.0):
+        self.webhook_url = webhook_url
+        self.file_path = file_path
+        self.timeout = timeout
+        self._queue: "asyncio.Queue[dict]" = asyncio.Queue(maxsize=max_queue)
+        self._task: Optional[asyncio.Task] = None
+        self._session: Optional[aiohttp.ClientSession] = None
+        self.delivered: int = 0
+        self.failed: int = 0
+        self.dropped: int = 0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.webhook_url or self.file_path)
+
+    def start(self):
+        if self.enabled and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self._run())
+
+    def submit(self, alert: dict):
+        if not self.enabled:
+            return
+        try:
+            self._queue.put_nowait(alert)
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+    async def _run(self):
+        if self.webhook_url:
+            self._session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=self.timeout))
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            while not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            if self.file_path:
+                try:
+                    await loop.run_in_executor(None, self._append, batch)
+                except Exception as e:
+                    self.failed += len(batch)
+                    logger.error(f"寫入告警檔案失敗: {e}")
+            if self.webhook_url:
+                for alert in batch:
+                    try:
+                        async with self._session.post(self.webhook_url, json=alert) as response:
+                            if response.status >= 400:
+                                raise RuntimeError(f"HTTP {response.status}")
+                        self.delivered += 1
+                    except Exception as e:
+                        self.failed += 1
+                        logger.warning(f"告警webhook發送失敗: {e}")
+            elif self.file_path:
+                self.delivered += len(batch)
+
+    def _append(self, batch: List[dict]):
+        directory = os.path.dirname(self.file_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.file_path, 'a') as f:
+            for alert in batch:
+                f.write(json.dumps(alert, separators=(',', ':')) + "\n")
+
+    async def close(self):
+        if self._task:
+            self._task.cancel()
+        if self._session:
+            await self._session.close()
+
+    def get_stats(self) -> dict:
+        return {
+            "webhook_url": self.webhook_url,
+            "file_path": self.file_path,
+            "queued": self._queue.qsize(),
+            "delivered": self.delivered,
+            "failed": self.failed,
+            "dropped": self.dropped,
+        }
@@ -0,0 +1,132 @@
+import logging
+import random
+import time
+from collections import Counter
+from typing import Dict, Iterable, Optional
+
+from ..models.market_data import SpreadData
+
+logger = logging.getLogger(__name__)
+
+
+class CadenceController:
+    """
+    自適應輪詢間隔
+    價差接近門檻或變動快時縮短間隔，平穩且離門檻遠時放慢（最慢為 max_interval，預設與原固定輪詢相同的1秒，
+    更慢的上限需明確設定）；間隔不低於各交易所請求預算允許的下限，錯誤時以指數退避加抖動恢復
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.5,
+        min_interval: float = 0.25,
+        max_interval: float = 1.0,
+        proximity_band: float = 0.5,
+        volatility_ref: float = 0.1,
+        budgets: Optional[Dict[str, float]] = None,
+        max_backoff: float = 60.0,
+        smoothing: float = 0.3
+    ):
+        self.threshold = threshold  # 目標價差百分比（達到即視為機會）
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.proximity_band = proximity_band  # 距離門檻多少百分點以內開始加速
+        self.volatility_ref = volatility_ref  # 每秒價差百分比變動達到此值時視為最快
+        self.budgets = budgets or {}  # 交易所 -> 主循環可用的每秒請求數
+        self.max_backoff = max_backoff
+        self.smoothing = smoothing  # 變動率EWMA係數
+
+        self.interval: float = 1.0
+        self.reason: str = "initial"
+        self.best_spread: Optional[float] = None
+        self.volatility: float = 0.0  # 價差百分比每秒變動（EWMA）
+        self.urgency: float = 0.0
+        self.consecutive_errors: int = 0
+        self.backoff: float = 0.0
+        self.reason_counts: Counter = Counter()
+        self._last_observed: Optional[float] = None
+
+    def observe(self, spreads: Iterable[SpreadData], rest_legs: Iterable[str] = ()) -> float:
+        """
+        根據最新價差決定下一次輪詢的間隔
+
+        Args:
+            spreads: 本次計算出的各模式價差
+            rest_legs: 本次以REST抓取的交易所（深度推送提供的一邊不消耗請求預算）
+        """
+        now = time.monotonic()
+        best = max((spread.spread_percentage for spread in spreads), default=None)
+        self.consecutive_errors = 0
+        self.backoff = 0.0
+
+        if best is not None:
+            if self.best_spread is not None and self._last_observed is not None:
+                elapsed = max(now - self._last_observed, 1e-3)
+                # 限制單次樣本的影響，避免一次跳動讓間隔長時間停在最快
+                rate = min(abs(best - self.best_spread) / elapsed, self.volatility_ref * 4)
+                self.volatility += self.smoothing * (rate - self.volatility)
+            self.best_spread = best
+            self._last_observed = now
+
+        # 0 表示遠離門檻/平穩，1 表示已達門檻/劇烈變動
+        if self.best_spread is None:
+            proximity = 0.0
+        else:
+            distance = max(self.threshold - self.best_spread, 0.0)
+            proximity = 1.0 - min(distance / self.proximity_band, 1.0) if self.proximity_band > 0 else 0.0
+        movement = min(self.volatility / self.volatility_ref, 1.0) if self.volatility_ref > 0 else 0.0
+        self.urgency = max(proximity, movement)
+
+        # 在對數尺度上插值，urgency每增加一點間隔按相同比例縮短
+        interval = self.max_interval * (self.min_interval / self.max_interval) ** self.urgency
+        if self.urgency < 0.1:
+            reason = "flat"
+        elif proximity >= movement:
+            reason = "near_threshold"
+        else:
+            reason = "volatile"
+
+        floor = self.budget_floor(rest_legs)
+        if interval < floor:
+            interval = floor
+            reason = "budget"
+
+        return self._set(interval, reason)
+
+    def budget_floor(self, rest_legs: Iterable[str]) -> float:
+        """每次輪詢對每個REST交易所發一個請求，間隔不得低於 1/預算"""
+        floor = 0.0
+        for exchange in rest_legs:
+            budget = self.budgets.get(exchange)
+            if budget:
+                floor = max(floor, 1.0 / budget)
+        return floor
+
+    def on_error(self) -> float:
+        """錯誤時指數退避，乘上 [0.5, 1) 的隨機抖動避免與其他實例同步重試"""
+        self.consecutive_errors += 1
+        base = min(self.max_interval * 2 ** (self.consecutive_errors - 1), self.max_backoff)
+        self.backoff = base * (0.5 + random.random() / 2)
+        logger.warning(f"輪詢錯誤 {self.consecutive_errors} 次，{self.backoff:.2f} 秒後重試")
+        return self._set(self.backoff, "error_backoff")
+
+    def _set(self, interval: float, reason: str) -> float:
+        self.interval = interval
+        self.reason = reason
+        self.reason_counts[reason] += 1
+        return interval
+
+    def get_stats(self) -> dict:
+        return {
+            "interval": round(self.interval, 4),
+            "reason": self.reason,
+            "threshold": self.threshold,
+            "best_spread_percentage": self.best_spread,
+            "volatility_per_sec": round(self.volatility, 6),
+            "urgency": round(self.urgency, 3),
+            "min_interval": self.min_interval,
+            "max_interval": self.max_interval,
+            "budgets": self.budgets,
+            "consecutive_errors": self.consecutive_errors,
+            "reason_counts": dict(self.reason_counts),
+        }
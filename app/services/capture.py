@@ -0,0 +1,138 @@
+import asyncio
+import gzip
+import json
+import logging
+import os
+import time
+from datetime import datetime
+from typing import Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class CaptureWriter:
+    """
+    原始深度響應錄製
+    每筆記錄為一行JSON（接收時間、交易所、交易對、原始body），
+    按時間切分為gzip壓縮的檔案塊；寫入與壓縮在執行緒中進行，不阻塞事件循環
+    """
+
+    def __init__(self, directory: str, chunk_seconds: float = 300.0, flush_records: int = 200,
+                 flush_interval: float = 2.0):
+        self.directory = directory
+        self.chunk_seconds = chunk_seconds
+        self.flush_records = flush_records
+        self.flush_interval = flush_interval
+        os.makedirs(directory, exist_ok=True)
+
+        self._buffer: List[bytes] = []
+        self._chunk_path: Optional[str] = None
+        self._chunk_started: float = 0.0
+        self._last_flush: float = time.monotonic()
+        self._flushing: Optional[asyncio.Future] = None
+
+        self.records: int = 0
+        self.bytes_written: int = 0  # 壓縮後
+        self.chunks: int = 0
+
+    def record(self, exchange: str, symbol: str, body: bytes,
+               sent_at: Optional[datetime] = None, received_at: Optional[datetime] = None):
+        """記錄一次原始響應"""
+        received = (received_at or datetime.now()).timestamp()
+        if self._chunk_path is None or received - self._chunk_started >= self.chunk_seconds:
+            self._rotate(received)
+
+        line = json.dumps({
+            "t": received,
+            "sent": sent_at.timestamp() if sent_at else None,
+            "ex": exchange,
+            "sym": symbol,
+            "body": body.decode('utf-8', errors='replace'),
+        }, separators=(',', ':')).encode() + b"\n"
+        self._buffer.append(line)
+        self.records += 1
+
+        if len(self._buffer) >= self.flush_records or time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def _rotate(self, now: float):
+        if self._buffer:
+            self.flush()
+        self._chunk_path = os.path.join(self.directory, f"capture-{int(now * 1000)}.jsonl.gz")
+        self._chunk_started = now
+        self.chunks += 1
+
+    def flush(self):
+        """把緩衝的記錄交給執行緒寫入目前的檔案塊（每批為一個gzip member）"""
+        if not self._buffer:
+            return
+        batch, self._buffer = self._buffer, []
+        path = self._chunk_path
+        self._last_flush = time.monotonic()
+
+        previous = self._flushing
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._write(path, batch)
+            return
+
+        async def write_after_previous():
+            if previous is not None:
+                await asyncio.shield(previous)  # 保持寫入順序
+            await loop.run_in_executor(None, self._write, path, batch)
+
+        self._flushing = asyncio.ensure_future(write_after_previous())
+
+    def _write(self, path: str, batch: List[bytes]):
+        try:
+            data = gzip.compress(b"".join(batch), compresslevel=6)
+            with open(path, 'ab') as f:
+                f.write(data)
+            self.bytes_written += len(data)
+        except Exception as e:
+            logger.error(f"寫入錄製檔案失敗: {e}")
+
+    async def close(self):
+        self.flush()
+        if self._flushing is not None:
+            await self._flushing
+
+    def get_stats(self) -> dict:
+        return {
+            "directory": self.directory,
+            "records": self.records,
+            "chunks": self.chunks,
+            "current_chunk": os.path.basename(self._chunk_path) if self._chunk_path else None,
+            "compressed_bytes": self.bytes_written,
+            "buffered": len(self._buffer),
+        }
+
+
+def read_capture(directory: str, start: Optional[float] = None, end: Optional[float] = None) -> Iterator[dict]:
+    """依時間順序讀取錄製記錄（start/end為epoch秒）"""
+    chunks = sorted(
+        (name for name in os.listdir(directory) if name.startswith("capture-") and name.endswith(".jsonl.gz")),
+        key=lambda name: int(name[len("capture-"):-len(".jsonl.gz")])
+    )
+    for index, name in enumerate(chunks):
+        chunk_start = int(name[len("capture-"):-len(".jsonl.gz")]) / 1000
+        if end is not None and chunk_start > end:
+            break
+        # 下一個檔案塊開始前的資料都在此檔案塊中
+        if start is not None and index + 1 < len(chunks):
+            next_start = int(chunks[index + 1][len("capture-"):-len(".jsonl.gz")]) / 1000
+            if next_start < start:
+                continue
+        try:
+            with gzip.open(os.path.join(directory, name), 'rb') as f:
+                for line in f:
+                    record = json.loads(line)
+                    if start is not None and record["t"] < start:
+                        continue
+                    if end is not None and record["t"] > end:
+                        return
+                    yield record
+        except (EOFError, OSError) as e:
+            # 程式中斷時最後一個gzip member可能不完整
+            logger.warning(f"錄製檔案 {name} 不完整: {e}")
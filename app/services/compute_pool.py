@@ -0,0 +1,384 @@
+"""
+計算進程池
+
+交易對多、深度深時，解碼深度響應與計算價差佔用事件循環，CPU尖峰直接變成所有WebSocket客戶端的延遲。
+COMPUTE_MODE=process 時排程器在事件循環上只做I/O：響應body在短時間窗內湊成一批寫入共享記憶體，
+由進程池解碼並計算所有有向組合的價差（含走深度的可執行數量與VWAP），價位與結果寫回共享記憶體；
+事件循環以numpy視圖讀出並建立 CompactOrderBook 與 SpreadData，不經過Pydantic OrderBook，
+跨進程只序列化偏移量與交易所代號等少量中繼資料
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from multiprocessing.shared_memory import SharedMemory
+from typing import Dict, List, Optional, Sequence, Tuple, TYPE_CHECKING
+
+import numpy as np
+
+from ..models.compact_orderbook import CompactOrderBook, lossless_precision
+from ..models.market_data import SpreadData
+from .depth_decoders import to_coins
+from .depth_engine import DepthIndex, ExecutableSpreadEngine
+from .exchanges import ADAPTERS, mode_name
+from .metrics import REGISTRY
+from .spread_matrix import SpreadMatrix
+
+if TYPE_CHECKING:
+    from .exchange_service import ExchangeService
+
+logger = logging.getLogger(__name__)
+
+COMPUTE_SECONDS = REGISTRY.histogram(
+    "lbmx_compute_batch_seconds", "Process pool batch duration (worker = in the pool, round_trip = seen by the loop)",
+    ("stage",)
+)
+
+# 每個有向組合寫回的欄位（順序即結果陣列最後一維）
+RESULT_FIELDS = (
+    "spread", "spread_percentage", "max_quantity", "buy_price", "sell_price",
+    "executable_quantity", "executable_profit", "vwap_buy_price", "vwap_sell_price",
+)
+
+# 抓取結果: (響應body, 發出時間, 接收時間)
+Fetched = Tuple[bytes, datetime, datetime]
+
+
+def output_size(symbols: int, venues: int, depth: int) -> int:
+    """一批結果所需的共享記憶體位元組數"""
+    return 8 * (symbols * venues * 2 * depth * 2 + symbols * venues * 2 * 2 + symbols * venues
+                + symbols * venues * venues * len(RESULT_FIELDS))
+
+
+def output_views(buffer, symbols: int, venues: int, depth: int) -> Tuple[np.ndarray, ...]:
+    """
+    結果共享記憶體的陣列視圖
+
+    Returns:
+        levels (S, V, 2, D, 2): [交易對, 交易所, bids/asks, 檔位, 價格/數量]
+        counts (S, V, 2): 各邊實際檔數，-1表示缺少或解碼失敗
+        scales (S, V, 2): 各交易所訂單簿的 價格/數量 定點精度（不低於配置精度，數據需要時提高）
+        exchange_times (S, V): 交易所毫秒時間戳，0表示沒有
+        results (S, V, V, F): [交易對, 買入交易所, 賣出交易所, RESULT_FIELDS]，無效組合為NaN
+    """
+    layout = (
+        ((symbols, venues, 2, depth, 2), np.float64),
+        ((symbols, venues, 2), np.int64),
+        ((symbols, venues, 2), np.int64),
+        ((symbols, venues), np.int64),
+        ((symbols, venues, venues, len(RESULT_FIELDS)), np.float64),
+    )
+    views = []
+    offset = 0
+    for shape, dtype in layout:
+        views.append(np.ndarray(shape, dtype=dtype, buffer=buffer, offset=offset))
+        offset += int(np.prod(shape)) * 8
+    return tuple(views)
+
+
+def _warm_up() -> int:
+    """讓worker進程預先完成import（spawn啟動需要重新載入numpy等模組）"""
+    return multiprocessing.current_process().pid
+
+
+def _compute(source, target, spans: Sequence[Tuple[int, int]], precisions: Sequence[Tuple[int, int, float]],
+             venues: Sequence[str], depth: int) -> List[tuple]:
+    symbols = len(spans) // len(venues)
+    levels, counts, scales, exchange_times, results = output_views(target, symbols, len(venues), depth)
+    counts.fill(-1)
+    scales.fill(0)
+    exchange_times.fill(0)
+    results.fill(np.nan)
+
+    errors = []
+    for index, (offset, length) in enumerate(spans):
+        if length < 0:
+            continue
+        s, v = divmod(index, len(venues))
+        try:
+            decoded = ADAPTERS[venues[v]].decoder.decode(bytes(source[offset:offset + length]), depth)
+        except Exception as e:
+            errors.append((s, v, str(e)))
+            continue
+        for side, array in enumerate((decoded.bids, decoded.asks)):
+            count = min(len(array), depth)
+            if precisions[index][2] != 1.0:
+                # 合約張數換算為幣的數量（與 ExchangeService.decode_orderbook 相同）
+                array = to_coins(array[:count], precisions[index][2], precisions[index][1])
+            levels[s, v, side, :count] = array[:count]
+            counts[s, v, side] = count
+        # 每個交易所按自己的精度縮放，數據的小數位多於配置時提高精度（不截斷）
+        book = np.concatenate((levels[s, v, 0, :counts[s, v, 0]], levels[s, v, 1, :counts[s, v, 1]]))
+        scales[s, v] = [lossless_precision(book[:, column], precisions[index][column]) for column in (0, 1)]
+        exchange_times[s, v] = decoded.exchange_time or 0
+
+    # 最優價位 -> 所有交易對、所有有向組合的價差矩陣（與 SpreadCalculator.calculate_matrix 相同）
+    has_bids = counts[:, :, 0] > 0
+    has_asks = counts[:, :, 1] > 0
+    matrix = SpreadMatrix(
+        venues,
+        np.where(has_bids, levels[:, :, 0, 0, 0], np.nan), np.where(has_bids, levels[:, :, 0, 0, 1], np.nan),
+        np.where(has_asks, levels[:, :, 1, 0, 0], np.nan), np.where(has_asks, levels[:, :, 1, 0, 1], np.nan),
+    )
+    indexes: Dict[Tuple[int, int, int], DepthIndex] = {}
+
+    def index(s: int, v: int, side: int) -> DepthIndex:
+        key = (s, v, side)
+        if key not in indexes:
+            count = counts[s, v, side]
+            indexes[key] = DepthIndex(levels[s, v, side, :count, 0], levels[s, v, side, :count, 1])
+        return indexes[key]
+
+    for s, i, j in np.argwhere(matrix.valid).tolist():
+        executable = ExecutableSpreadEngine.analyze_indexes(index(s, i, 1), index(s, j, 0), include_curve=False)
+        results[s, i, j] = (
+            matrix.spread[s, i, j], matrix.spread_percentage[s, i, j], matrix.max_quantity[s, i, j],
+            matrix.ask[s, i], matrix.bid[s, j],
+            executable["max_quantity"], executable["max_profit"],
+            executable["vwap_buy_price"], executable["vwap_sell_price"],
+        )
+    return errors
+
+
+def compute_batch(input_name: str, spans: List[Tuple[int, int]], precisions: List[Tuple[int, int, float]],
+                  venues: List[str], depth: int, output_name: str) -> dict:
+    """
+    在worker進程中執行：解碼一批深度響應並計算價差，結果寫入輸出共享記憶體
+
+    Args:
+        input_name: 響應body所在的共享記憶體
+        spans: 每個 (交易對, 交易所) 的body在輸入中的 (偏移, 長度)，按交易對再按交易所排列；長度-1表示缺少
+        precisions: 與 spans 對應的 (價格精度, 數量精度, 合約面值)，各交易所各自的精度，數量乘以合約面值換算為幣
+        venues: 交易所代號
+        depth: 每邊保留的檔數
+        output_name: 結果共享記憶體（佈局見 output_views）
+
+    Returns:
+        dict: 解碼錯誤 [(交易對序號, 交易所序號, 訊息)] 與耗時
+    """
+    started = time.perf_counter()
+    source = SharedMemory(input_name)
+    target = SharedMemory(output_name)
+    try:
+        errors = _compute(source.buf, target.buf, spans, precisions, venues, depth)
+    finally:
+        source.close()
+        target.close()
+    return {"errors": errors, "seconds": time.perf_counter() - started}
+
+
+class _PendingSymbol:
+    __slots__ = ("symbol", "venue_symbols", "fetched", "future")
+
+    def __init__(self, symbol: str, venue_symbols: Dict[str, str], fetched: Dict[str, Optional[Fetched]],
+                 future: asyncio.Future):
+        self.symbol = symbol
+        self.venue_symbols = venue_symbols
+        self.fetched = fetched
+        self.future = future
+
+
+class ComputePool:
+    """
+    批次計算進程池
+    compute() 把一個交易對的響應body放入待處理批次，批次滿 batch_size 或等待超過 batch_window 秒時送出；
+    共享記憶體每批建立一次、完成後即釋放
+    """
+
+    def __init__(
+        self,
+        exchange_service: "ExchangeService",
+        workers: int = 2,
+        batch_size: int = 64,
+        batch_window: float = 0.005
+    ):
+        self.exchange_service = exchange_service
+        self.workers = workers
+        self.batch_size = batch_size
+        self.batch_window = batch_window
+        self.venues: List[str] = list(exchange_service.venues)
+        self.executor: Optional[ProcessPoolExecutor] = None
+        self._pending: List[_PendingSymbol] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._tasks: set = set()
+
+        self.batches: int = 0
+        self.symbols: int = 0
+        self.decode_errors: int = 0
+        self.failed_batches: int = 0
+        self.worker_seconds: float = 0.0
+        self.round_trip_seconds: float = 0.0
+
+    async def start(self):
+        """建立進程池並等待所有worker完成啟動（spawn，不繼承事件循環與連接）"""
+        self.executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        pids = await asyncio.gather(*(loop.run_in_executor(self.executor, _warm_up) for _ in range(self.workers)))
+        logger.info(
+            f"計算進程池已啟動: {len(set(pids))} 個worker, 批次上限 {self.batch_size}, "
+            f"時間窗 {self.batch_window * 1000:.0f}ms ({(time.perf_counter() - started) * 1000:.0f} ms)"
+        )
+
+    async def close(self):
+        if self._flush_handle:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        for task in list(self._tasks):
+            task.cancel()
+        if self.executor:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+    async def compute(
+        self,
+        symbol: str,
+        fetched: Dict[str, Optional[Fetched]],
+        venue_symbols: Optional[Dict[str, str]] = None
+    ) -> Tuple[Dict[str, Optional[CompactOrderBook]], Dict[str, SpreadData]]:
+        """
+        解碼一個交易對各交易所的深度響應並計算價差
+
+        Args:
+            symbol: 交易對
+            fetched: 交易所代號 -> (響應body, 發出時間, 接收時間)，請求失敗為None
+            venue_symbols: 各交易所實際請求的交易對（自選模式下LBank幣種不同），預設皆為symbol
+
+        Returns:
+            (交易所代號 -> CompactOrderBook（缺少時為None）, 模式名稱 -> SpreadData)
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append(_PendingSymbol(symbol, venue_symbols or {}, fetched, future))
+        if len(self._pending) >= self.batch_size:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_later(self.batch_window, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._flush_handle:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.create_task(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: List[_PendingSymbol]):
+        venues = self.venues
+        depth = self.exchange_service.orderbook_depth
+        bodies = [item.fetched.get(venue) for item in batch for venue in venues]
+        source = SharedMemory(create=True, size=max(1, sum(len(f[0]) for f in bodies if f is not None)))
+        target = SharedMemory(create=True, size=output_size(len(batch), len(venues), depth))
+        started = time.perf_counter()
+        try:
+            spans: List[Tuple[int, int]] = []
+            precisions: List[Tuple[int, int, float]] = []
+            offset = 0
+            for index, fetched in enumerate(bodies):
+                item, venue = batch[index // len(venues)], venues[index % len(venues)]
+                precision = self.exchange_service.precision_for(venue, item.venue_symbols.get(venue, item.symbol))
+                precisions.append((
+                    precision['price_precision'], precision['quantity_precision'],
+                    float(precision.get('contract_size', 1.0))
+                ))
+                if fetched is None:
+                    spans.append((0, -1))
+                    continue
+                body = fetched[0]
+                source.buf[offset:offset + len(body)] = body
+                spans.append((offset, len(body)))
+                offset += len(body)
+
+            report = await asyncio.get_running_loop().run_in_executor(
+                self.executor, compute_batch, source.name, spans, precisions, venues, depth, target.name
+            )
+            self._deliver(batch, target.buf, depth, report["errors"])
+
+            round_trip = time.perf_counter() - started
+            self.batches += 1
+            self.symbols += len(batch)
+            self.worker_seconds += report["seconds"]
+            self.round_trip_seconds += round_trip
+            COMPUTE_SECONDS.observe(report["seconds"], ("worker",))
+            COMPUTE_SECONDS.observe(round_trip, ("round_trip",))
+        except Exception as e:
+            self.failed_batches += 1
+            logger.error(f"計算進程池批次失敗 ({len(batch)} 個交易對): {e}")
+            # 不傳遞原例外：其traceback引用結果視圖，共享記憶體會無法關閉
+            error = RuntimeError(f"計算進程池批次失敗: {e}")
+            for item in batch:
+                if not item.future.done():
+                    item.future.set_exception(error)
+        finally:
+            source.close()
+            source.unlink()
+            target.close()
+            target.unlink()
+
+    def _deliver(self, batch: List[_PendingSymbol], buffer, depth: int, errors: List[tuple]):
+        """由結果視圖建立訂單簿與價差並完成各交易對的等待（陣列先複製，共享記憶體隨後即釋放）"""
+        venues = self.venues
+        adapters = self.exchange_service.adapters
+        levels, counts, scales, exchange_times, results = output_views(buffer, len(batch), len(venues), depth)
+        for s, v, message in errors:
+            self.decode_errors += 1
+            logger.error(f"解析{adapters[venues[v]].name}訂單簿失敗 {batch[s].symbol}: {message}")
+
+        now = datetime.now()
+        valid = ~np.isnan(results[:, :, :, 0])
+        for s, item in enumerate(batch):
+            books: Dict[str, Optional[CompactOrderBook]] = {}
+            for v, venue in enumerate(venues):
+                bid_count, ask_count = counts[s, v].tolist()
+                if bid_count < 0:
+                    books[venue] = None
+                    continue
+                adapter = adapters[venue]
+                symbol = item.venue_symbols.get(venue, item.symbol)
+                price_precision, quantity_precision = scales[s, v].tolist()
+                _, sent_at, received_at = item.fetched[venue]
+                exchange_ms = int(exchange_times[s, v])
+                exchange_time = datetime.fromtimestamp(exchange_ms / 1000) if exchange_ms else None
+                books[venue] = CompactOrderBook.from_arrays(
+                    adapter.name, symbol,
+                    levels[s, v, 0, :bid_count], levels[s, v, 1, :ask_count],
+                    exchange_time or received_at,
+                    price_precision, quantity_precision,
+                    sent_at=sent_at, received_at=received_at, exchange_time=exchange_time
+                )
+
+            spreads: Dict[str, SpreadData] = {}
+            for i, j in np.argwhere(valid[s]).tolist():
+                values = dict(zip(RESULT_FIELDS, results[s, i, j].tolist()))
+                mode = mode_name(venues[i], venues[j])
+                spreads[mode] = SpreadData(
+                    symbol=books[venues[i]].symbol,
+                    mode=mode,
+                    buy_exchange=books[venues[i]].exchange,
+                    sell_exchange=books[venues[j]].exchange,
+                    timestamp=now,
+                    **values
+                )
+            if not item.future.done():
+                item.future.set_result((books, spreads))
+
+    def get_stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "batch_size": self.batch_size,
+            "batch_window_ms": self.batch_window * 1000,
+            "batches": self.batches,
+            "symbols": self.symbols,
+            "avg_batch": round(self.symbols / self.batches, 2) if self.batches else 0,
+            "pending": len(self._pending),
+            "in_flight_batches": len(self._tasks),
+            "decode_errors": self.decode_errors,
+            "failed_batches": self.failed_batches,
+            "avg_worker_ms": round(self.worker_seconds / self.batches * 1000, 3) if self.batches else None,
+            "avg_round_trip_ms": round(self.round_trip_seconds / self.batches * 1000, 3) if self.batches else None,
+        }
@@ -0,0 +1,309 @@
+import asyncio
+import itertools
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from fastapi import WebSocket
+
+from .metrics import REGISTRY
+from .opportunity_index import TopKPush
+from .wire_protocol import PROTOCOL_DELTA, PROTOCOL_LEGACY, MarketTick, dumps
+
+logger = logging.getLogger(__name__)
+
+BROADCAST_SECONDS = REGISTRY.histogram(
+    "lbmx_broadcast_seconds", "Fan-out duration of one broadcast to all client queues", ("kind",)
+)
+SEND_SECONDS = REGISTRY.histogram("lbmx_ws_send_seconds", "Duration of one WebSocket send (render + write)")
+MESSAGES = REGISTRY.counter("lbmx_ws_messages", "WebSocket messages by outcome", ("result",))
+EVICTIONS = REGISTRY.counter("lbmx_ws_evictions", "Clients disconnected for lagging")
+
+
+class ClientConnection:
+    """
+    單一WebSocket客戶端：獨立的待發送佇列與發送任務
+    同一key（例如 symbol_mode）只保留最新一筆，落後的客戶端不會累積舊數據
+    """
+
+    _ids = itertools.count(1)
+
+    def __init__(self, websocket: WebSocket, max_queue: int, max_rate: Optional[float] = None,
+                 protocol: int = PROTOCOL_LEGACY, encoding: str = 'json', streams: Tuple[str, ...] = ("market",),
+                 top_k: int = 10, top_by: str = "spread_percentage"):
+        self.id = next(self._ids)
+        self.websocket = websocket
+        self.max_queue = max_queue
+        self.max_rate = max_rate  # 每秒最多發送的訊息數，None表示不限制
+        self.protocol = protocol
+        self.encoding = encoding
+        self.book_versions: Dict[str, int] = {}  # 已寫入此連接的訂單簿版本（差異的基準），resync時清空
+        self.subscriptions: Set[Tuple[str, str]] = set()  # 自行訂閱的 (MX交易對, LBank交易對)
+        self.follows_default = True  # 未自行訂閱前接收全域選擇的交易對
+        self.streams = set(streams)  # market: 市場數據；alerts: 告警事件；opportunities: 套利機會前K名
+        self.top_k = top_k
+        self.top_by = top_by  # 前K名的排序指標
+        self.top_sent: Dict[str, Dict[Tuple[str, str], dict]] = {}  # 已收到的前K名（差異的基準）
+        self.connected_at = time.monotonic()
+
+        # key -> (訊息, 首次入列時間)；覆蓋時保留原始入列時間以計算延遲
+        # 訊息可為 str（文字幀）、bytes（二進位幀）或在發送時才產生內容的 MarketTick / TopKPush
+        self._pending: "OrderedDict[str, Tuple[Any, float]]" = OrderedDict()
+        self._wakeup = asyncio.Event()
+        self._writer: Optional[asyncio.Task] = None
+        self._keyless = itertools.count()
+
+        self.sent: int = 0
+        self.bytes_sent: int = 0
+        self.conflated: int = 0  # 被較新數據覆蓋的訊息數
+        self.dropped: int = 0  # 佇列已滿被丟棄的訊息數
+        self.last_send_duration: float = 0.0
+        self.max_lag: float = 0.0
+
+    @property
+    def client_address(self) -> str:
+        client = getattr(self.websocket, 'client', None)
+        return f"{client.host}:{client.port}" if client else "unknown"
+
+    def enqueue(self, message: Any, key: Optional[str] = None):
+        """放入待發送佇列（不阻塞）"""
+        if key is None:
+            key = f"__{next(self._keyless)}"
+
+        existing = self._pending.get(key)
+        if existing is not None:
+            self._pending[key] = (message, existing[1])
+            self.conflated += 1
+            MESSAGES.inc(("conflated",))
+        else:
+            if len(self._pending) >= self.max_queue:
+                self._pending.popitem(last=False)
+                self.dropped += 1
+                MESSAGES.inc(("dropped",))
+            self._pending[key] = (message, time.monotonic())
+        self._wakeup.set()
+
+    def lag(self) -> float:
+        """最舊待發送訊息已等待的秒數"""
+        if not self._pending:
+            return 0.0
+        return time.monotonic() - next(iter(self._pending.values()))[1]
+
+    def start(self, on_error):
+        self._writer = asyncio.create_task(self._write_loop(on_error))
+
+    def stop(self):
+        if self._writer and not self._writer.done():
+            self._writer.cancel()
+
+    async def _write_loop(self, on_error):
+        min_interval = 1.0 / self.max_rate if self.max_rate else 0.0
+        try:
+            while True:
+                if not self._pending:
+                    self._wakeup.clear()
+                    await self._wakeup.wait()
+                    continue
+
+                _, (message, enqueued_at) = self._pending.popitem(last=False)
+                started = time.monotonic()
+                self.max_lag = max(self.max_lag, started - enqueued_at)
+                item = message
+                if isinstance(item, (MarketTick, TopKPush)):
+                    message = item.render(self)
+                    if message is None:  # 與已發送的內容相同
+                        continue
+                if isinstance(message, bytes):
+                    await self.websocket.send_bytes(message)
+                else:
+                    await self.websocket.send_text(message)
+                if isinstance(item, MarketTick):
+                    item.delivered(self)
+                self.sent += 1
+                self.bytes_sent += len(message)
+                self.last_send_duration = time.monotonic() - started
+                SEND_SECONDS.observe(self.last_send_duration)
+                MESSAGES.inc(("sent",))
+
+                if min_interval:
+                    await asyncio.sleep(max(0.0, min_interval - self.last_send_duration))
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.error(f"發送訊息失敗: {e}")
+            on_error(self.websocket)
+
+    def get_stats(self) -> dict:
+        return {
+            "id": self.id,
+            "client": self.client_address,
+            "connected_seconds": round(time.monotonic() - self.connected_at, 1),
+            "queue_size": len(self._pending),
+            "lag_ms": round(self.lag() * 1000, 1),
+            "max_lag_ms": round(self.max_lag * 1000, 1),
+            "protocol": self.protocol,
+            "encoding": self.encoding,
+            "sent": self.sent,
+            "bytes_sent": self.bytes_sent,
+            "conflated": self.conflated,
+            "dropped": self.dropped,
+            "last_send_ms": round(self.last_send_duration * 1000, 3),
+            "max_rate": self.max_rate,
+            "subscriptions": sorted("|".join(pair) for pair in self.subscriptions),
+            "follows_default": self.follows_default,
+            "streams": sorted(self.streams),
+            "top_k": self.top_k if "opportunities" in self.streams else None,
+        }
+
+
+# WebSocket連接管理
+class ConnectionManager:
+    """
+    WebSocket廣播管理
+    broadcast只把訊息放入每個客戶端的佇列，由各自的發送任務寫出，
+    慢客戶端不會拖慢其他客戶端；持續落後超過門檻的客戶端會被斷開
+    """
+
+    def __init__(self, max_queue: int = 64, evict_lag: float = 10.0, default_max_rate: Optional[float] = None):
+        self.clients: Dict[WebSocket, ClientConnection] = {}
+        self.max_queue = max_queue
+        self.evict_lag = evict_lag  # 最舊待發送訊息超過此秒數即斷開
+        self.default_max_rate = default_max_rate
+        self.evicted_count: int = 0
+        
+        REGISTRY.gauge("lbmx_ws_connections", "Active WebSocket connections",
+                       callback=lambda: [((), len(self.clients))])
+        REGISTRY.gauge("lbmx_ws_queued_messages", "Messages waiting in client queues",
+                       callback=lambda: [((), sum(len(client._pending) for client in self.clients.values()))])
+        REGISTRY.gauge("lbmx_ws_max_lag_seconds", "Age of the oldest queued message across clients",
+                       callback=lambda: [((), max((client.lag() for client in self.clients.values()), default=0.0))])
+
+    @property
+    def active_connections(self) -> List[WebSocket]:
+        return list(self.clients.keys())
+
+    async def connect(self, websocket: WebSocket, max_rate: Optional[float] = None,
+                      protocol: int = PROTOCOL_LEGACY, encoding: str = 'json',
+                      streams: Tuple[str, ...] = ("market",), top_k: int = 10,
+                      top_by: str = "spread_percentage") -> ClientConnection:
+        await websocket.accept()
+        client = ClientConnection(
+            websocket, self.max_queue, max_rate or self.default_max_rate, protocol, encoding, streams, top_k, top_by
+        )
+        self.clients[websocket] = client
+        if protocol != PROTOCOL_LEGACY:
+            # 告知客戶端協商結果
+            await websocket.send_text(dumps({"type": "hello", "protocol": protocol, "encoding": encoding}))
+        client.start(self.disconnect)
+        logger.info(f"新的WebSocket連接 (protocol={protocol}, encoding={encoding})，目前連接數: {len(self.clients)}")
+        return client
+
+    def get_client(self, websocket: WebSocket) -> Optional[ClientConnection]:
+        return self.clients.get(websocket)
+
+    def disconnect(self, websocket: WebSocket):
+        client = self.clients.pop(websocket, None)
+        if client:
+            client.stop()
+        logger.info(f"WebSocket連接斷開，目前連接數: {len(self.clients)}")
+
+    async def broadcast(self, message: str, key: Optional[str] = None):
+        """
+        廣播訊息給所有客戶端
+
+        Args:
+            message: 訊息內容
+            key: 合併鍵，同一key的舊訊息尚未發送時會被新訊息取代
+        """
+        if not self.clients:
+            logger.debug(f"沒有WebSocket連接，跳過廣播")
+            return
+
+        started = time.perf_counter()
+        for client in self._live_clients():
+            client.enqueue(message, key)
+        BROADCAST_SECONDS.observe(time.perf_counter() - started, ("message",))
+
+    async def broadcast_tick(self, tick: MarketTick, pair: Optional[Tuple[str, str]] = None, default: bool = True):
+        """
+        廣播一次tick：舊協議客戶端收到共用的 market_update，
+        新協議客戶端以交易對為合併鍵，發送時才依已收到的版本產生差異
+
+        Args:
+            pair: tick所屬的 (MX交易對, LBank交易對)；None時發給所有客戶端
+            default: 是否為全域選擇的交易對（未自行訂閱的客戶端也會收到）
+        """
+        if not self.clients:
+            logger.debug(f"沒有WebSocket連接，跳過廣播")
+            return
+
+        started = time.perf_counter()
+        for client in self._live_clients():
+            if "market" not in client.streams:
+                continue
+            if pair is not None and pair not in client.subscriptions and not (default and client.follows_default):
+                continue
+            self.send_tick(client, tick)
+        BROADCAST_SECONDS.observe(time.perf_counter() - started, ("tick",))
+
+    @staticmethod
+    def send_tick(client: ClientConnection, tick: MarketTick):
+        """把一次tick放入單一客戶端的佇列（廣播與新連接的快照共用）"""
+        if client.protocol >= PROTOCOL_DELTA:
+            client.enqueue(tick, tick.key)
+        else:
+            for key, message in tick.legacy_messages():
+                client.enqueue(message, key)
+
+    async def broadcast_alert(self, alert: dict):
+        """廣播告警事件給訂閱 alerts 的客戶端（只序列化一次，不合併）"""
+        message = None
+        for client in self._live_clients():
+            if "alerts" not in client.streams:
+                continue
+            if message is None:
+                message = dumps(alert)
+            client.enqueue(message)
+
+    async def broadcast_opportunities(self, push: TopKPush):
+        """推送前K名給訂閱 opportunities 且使用同一排序指標的客戶端（同一指標只保留最新一份）"""
+        for client in self._live_clients():
+            if "opportunities" in client.streams and client.top_by == push.by:
+                client.enqueue(push, f"opportunities:{push.by}")
+
+    def _live_clients(self) -> List[ClientConnection]:
+        """返回未落後的客戶端，並斷開持續落後的客戶端"""
+        live_clients = []
+        slow_clients = []
+        for client in self.clients.values():
+            if client.lag() > self.evict_lag:
+                slow_clients.append(client)
+            else:
+                live_clients.append(client)
+
+        # 斷開持續落後的客戶端
+        for client in slow_clients:
+            logger.warning(
+                f"客戶端 {client.client_address} 落後 {client.lag():.1f} 秒，斷開連接"
+            )
+            self.evicted_count += 1
+            EVICTIONS.inc()
+            self.disconnect(client.websocket)
+            asyncio.create_task(self._close(client.websocket))
+        return live_clients
+
+    async def _close(self, websocket: WebSocket):
+        try:
+            await asyncio.wait_for(websocket.close(code=1008), timeout=1)
+        except Exception:
+            pass
+
+    def get_stats(self) -> dict:
+        return {
+            "connections": len(self.clients),
+            "evicted": self.evicted_count,
+            "evict_lag_seconds": self.evict_lag,
+            "max_queue": self.max_queue,
+            "clients": [client.get_stats() for client in self.clients.values()],
+        }
@@ -0,0 +1,196 @@
+"""
+交易所深度響應解碼
+
+直接從響應bytes解碼，只截取需要的前N檔再交給JSON解碼器（有orjson時使用orjson），
+結果為 (N, 2) 的float64陣列 [價格, 數量]；深度很大時解析成本只與實際使用的檔數相關
+"""
+
+import json
+import logging
+import re
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson為可選依賴
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = b" \t\r\n"
+_EMPTY = np.empty((0, 2), dtype=np.float64)
+
+
+def loads(body: bytes):
+    return orjson.loads(body) if orjson is not None else json.loads(body)
+
+
+class DepthDecodeError(ValueError):
+    """交易所返回錯誤或響應格式無法解析"""
+
+
+class DepthLevels:
+    """解碼後的深度：bids從高到低、asks從低到高，exchange_time為交易所毫秒時間戳"""
+
+    __slots__ = ("bids", "asks", "exchange_time")
+
+    def __init__(self, bids: np.ndarray, asks: np.ndarray, exchange_time: Optional[int] = None):
+        self.bids = bids
+        self.asks = asks
+        self.exchange_time = exchange_time
+
+
+def _to_array(levels: list) -> np.ndarray:
+    """價位列表 [[price, quantity, ...], ...] 轉為 (N, 2) float64陣列（數值或字串皆可）"""
+    if not levels:
+        return _EMPTY
+    return np.array([level[:2] for level in levels], dtype=np.float64)
+
+
+def to_coins(levels: np.ndarray, contract_size: float, quantity_precision: int) -> np.ndarray:
+    """合約張數換算為幣的數量：數量欄乘以合約面值，四捨五入到幣的精度（去掉浮點尾數）"""
+    if not len(levels):
+        return levels
+    converted = levels.copy()
+    converted[:, 1] = np.round(converted[:, 1] * contract_size, int(quantity_precision))
+    return converted
+
+
+_LEVEL_PATTERNS: Dict[Tuple[bytes, int], "re.Pattern"] = {}
+
+
+def _levels_pattern(key: bytes, depth: int) -> "re.Pattern":
+    """匹配 "key": [ 之後最多depth個價位的正則（依 (欄位, 深度) 快取）"""
+    pattern = _LEVEL_PATTERNS.get((key, depth))
+    if pattern is None:
+        pattern = re.compile(
+            rb'"' + key + rb'"\s*:\s*(\[\s*(?:\[[^\[\]]*\]\s*,?\s*){0,%d})' % depth
+        )
+        _LEVEL_PATTERNS[(key, depth)] = pattern
+    return pattern
+
+
+def slice_levels(body: bytes, key: bytes, depth: int) -> Optional[bytes]:
+    """
+    截取陣列欄位的前depth個價位，返回可解碼的JSON陣列bytes；找不到欄位時返回None
+    價位本身不含巢狀陣列，由正則在C層一次匹配完成
+    """
+    match = _levels_pattern(key, depth).search(body)
+    if match is None:
+        return None
+    return match.group(1).rstrip(_WHITESPACE).rstrip(b",") + b"]"
+
+
+def _find_int(body: bytes, pattern: "re.Pattern") -> Optional[int]:
+    match = pattern.search(body)
+    return int(match.group(1)) if match else None
+
+
+class DepthDecoder:
+    """交易所深度解碼器基底：子類別處理各交易所的外層格式"""
+
+    exchange = ""
+    TIMESTAMP = re.compile(rb'"timestamp"\s*:\s*"?(\d+)')
+
+    def decode(self, body: bytes, depth: Optional[int] = None) -> DepthLevels:
+        """解碼響應，depth為None時保留全部價位；失敗時拋出DepthDecodeError"""
+        if depth and self.check_envelope(body):
+            bids = slice_levels(body, b"bids", depth)
+            asks = slice_levels(body, b"asks", depth)
+            if bids is not None and asks is not None:
+                try:
+                    return DepthLevels(_to_array(loads(bids)), _to_array(loads(asks)), self.exchange_time(body))
+                except ValueError as e:
+                    logger.debug(f"{self.exchange} 截取解碼失敗，改為完整解碼: {e}")
+        return self.decode_full(body, depth)
+
+    def check_envelope(self, body: bytes) -> bool:
+        """不解碼整個響應即可確認為成功響應時返回True，否則走完整解碼（由其處理錯誤）"""
+        return True
+
+    def exchange_time(self, body: bytes) -> Optional[int]:
+        return _find_int(body, self.TIMESTAMP)
+
+    def order_data(self, data) -> dict:
+        raise NotImplementedError
+
+    def decode_full(self, body: bytes, depth: Optional[int] = None) -> DepthLevels:
+        try:
+            data = loads(body)
+        except ValueError as e:
+            raise DepthDecodeError(f"{self.exchange} 響應不是有效的JSON: {e}")
+        order_data = self.order_data(data)
+        try:
+            return DepthLevels(
+                _to_array(order_data.get('bids', [])[:depth]),
+                _to_array(order_data.get('asks', [])[:depth]),
+                self.full_exchange_time(data, order_data)
+            )
+        except (TypeError, ValueError, IndexError) as e:
+            raise DepthDecodeError(f"{self.exchange} 價位格式錯誤: {e}")
+
+    @staticmethod
+    def full_exchange_time(data: dict, order_data: dict) -> Optional[int]:
+        value = order_data.get('timestamp')
+        try:
+            return int(value) if value else None
+        except (TypeError, ValueError):
+            return None
+
+
+class MxDepthDecoder(DepthDecoder):
+    """MX合約 /api/v1/contract/depth：{"success": true, "code": 0, "data": {"asks": [[價格, 張數, 訂單數], ...], ...}}"""
+
+    exchange = "Mexc"
+    SUCCESS = re.compile(rb'"success"\s*:\s*true')
+
+    def check_envelope(self, body: bytes) -> bool:
+        return self.SUCCESS.search(body) is not None
+
+    def order_data(self, data) -> dict:
+        if not isinstance(data, dict) or not data.get('success') or not isinstance(data.get('data'), dict):
+            raise DepthDecodeError(f"MX合約API返回錯誤: {data}")
+        return data['data']
+
+
+class LBankDepthDecoder(DepthDecoder):
+    """
+    LBank /v1/depth.do：{"result": "true", "data": {"asks": [["價格", "數量"], ...], ...}, "ts": ...}
+    也接受沒有外層的 {"bids": [...], "asks": [...]}
+    """
+
+    exchange = "LBank"
+    RESULT = re.compile(rb'"result"\s*:\s*"?(\w+)')
+    TS = re.compile(rb'"ts"\s*:\s*(\d+)')
+
+    def check_envelope(self, body: bytes) -> bool:
+        match = self.RESULT.search(body)
+        return match is None or match.group(1) == b"true"
+
+    def exchange_time(self, body: bytes) -> Optional[int]:
+        return _find_int(body, self.TIMESTAMP) or _find_int(body, self.TS)
+
+    def order_data(self, data) -> dict:
+        if not isinstance(data, dict):
+            raise DepthDecodeError(f"LBank API返回錯誤: {data}")
+        # result 可能是字串 "true" 或布林值（與 check_envelope 一致）
+        if 'result' in data and data.get('result') not in ('true', True):
+            raise DepthDecodeError(f"LBank API返回錯誤: {data}")
+        order_data = data['data'] if 'data' in data else data
+        if not isinstance(order_data, dict):
+            raise DepthDecodeError(f"LBank API返回錯誤: {data}")
+        return order_data
+
+    @staticmethod
+    def full_exchange_time(data: dict, order_data: dict) -> Optional[int]:
+        value = order_data.get('timestamp') or data.get('ts')
+        try:
+            return int(value) if value else None
+        except (TypeError, ValueError):
+            return None
+
+
+MX_DECODER = MxDepthDecoder()
+LBANK_DECODER = LBankDepthDecoder()
@@ -0,0 +1,211 @@
+import logging
+from typing import Dict, List, Mapping, Sequence, Tuple, Union
+
+import numpy as np
+
+from ..models.compact_orderbook import CompactOrderBook
+from ..models.market_data import OrderBook, OrderBookEntry
+from .exchanges import parse_mode
+
+logger = logging.getLogger(__name__)
+
+
+class DepthIndex:
+    """單邊訂單簿的累積深度索引（數量與金額前綴和），查詢以二分搜尋完成"""
+
+    __slots__ = ('prices', 'quantities', 'cum_quantity', 'cum_notional')
+
+    def __init__(self, prices: np.ndarray, quantities: np.ndarray):
+        self.prices = prices
+        self.quantities = quantities
+        self.cum_quantity = np.cumsum(quantities)
+        self.cum_notional = np.cumsum(prices * quantities)
+
+    @classmethod
+    def from_entries(cls, entries: Sequence[OrderBookEntry]) -> "DepthIndex":
+        prices = np.fromiter((entry.price for entry in entries), dtype=np.float64, count=len(entries))
+        quantities = np.fromiter((entry.quantity for entry in entries), dtype=np.float64, count=len(entries))
+        return cls(prices, quantities)
+
+    @classmethod
+    def from_compact(cls, orderbook: CompactOrderBook, side: str) -> "DepthIndex":
+        """由定點陣列訂單簿建立，side為'bids'或'asks'"""
+        prices, quantities = orderbook.float_levels(side)
+        return cls(prices, quantities)
+
+    @property
+    def total_quantity(self) -> float:
+        return float(self.cum_quantity[-1]) if len(self.cum_quantity) else 0.0
+
+    @property
+    def total_notional(self) -> float:
+        return float(self.cum_notional[-1]) if len(self.cum_notional) else 0.0
+
+    def _level(self, cumulative: np.ndarray, values: np.ndarray) -> np.ndarray:
+        """values所在的價位索引（values恰好吃完某一檔時歸屬該檔）"""
+        return np.minimum(np.searchsorted(cumulative, values, side='left'), len(cumulative) - 1)
+
+    def notional_for_quantity(self, quantity: np.ndarray) -> np.ndarray:
+        """逐檔成交指定數量所需的金額，超過總深度的部分截斷"""
+        quantity = np.minimum(np.asarray(quantity, dtype=np.float64), self.total_quantity)
+        if not len(self.prices):
+            return np.zeros_like(quantity)
+        level = self._level(self.cum_quantity, quantity)
+        filled_quantity = self.cum_quantity[level] - self.quantities[level]
+        filled_notional = self.cum_notional[level] - self.prices[level] * self.quantities[level]
+        return filled_notional + (quantity - filled_quantity) * self.prices[level]
+
+    def quantity_for_notional(self, notional: np.ndarray) -> np.ndarray:
+        """以指定金額逐檔成交可得的數量，超過總深度的部分截斷"""
+        notional = np.minimum(np.asarray(notional, dtype=np.float64), self.total_notional)
+        if not len(self.prices):
+            return np.zeros_like(notional)
+        level = self._level(self.cum_notional, notional)
+        filled_quantity = self.cum_quantity[level] - self.quantities[level]
+        filled_notional = self.cum_notional[level] - self.prices[level] * self.quantities[level]
+        return filled_quantity + (notional - filled_notional) / self.prices[level]
+
+    def price_at(self, quantity: np.ndarray) -> np.ndarray:
+        """成交到指定累積數量時的邊際價格"""
+        return self.prices[self._level(self.cum_quantity, np.asarray(quantity, dtype=np.float64))]
+
+
+class ExecutableSpreadEngine:
+    """
+    可執行價差引擎
+    走完買方ask與賣方bid的全部深度，計算最大可獲利數量、VWAP買賣價與邊際價差曲線；
+    每份訂單簿的前綴和只建立一次，投資金額查詢以二分搜尋回答
+    """
+
+    def __init__(self):
+        # (exchange, symbol, side) -> (訂單簿, 索引)；同一份訂單簿重複查詢時直接使用
+        self._cache: Dict[Tuple[str, str, str], Tuple[OrderBook, DepthIndex]] = {}
+
+    def index(self, orderbook: Union[OrderBook, CompactOrderBook], side: str) -> DepthIndex:
+        """取得訂單簿單邊（'asks'或'bids'）的深度索引，支援OrderBook與CompactOrderBook"""
+        key = (orderbook.exchange, orderbook.symbol, side)
+        cached = self._cache.get(key)
+        if cached is not None and cached[0] is orderbook:
+            return cached[1]
+        if isinstance(orderbook, CompactOrderBook):
+            index = DepthIndex.from_compact(orderbook, side)
+        else:
+            index = DepthIndex.from_entries(getattr(orderbook, side))
+        self._cache[key] = (orderbook, index)
+        return index
+
+    def books_for_mode(
+        self,
+        mx_orderbook: OrderBook,
+        lbank_orderbook: OrderBook,
+        mode: str
+    ) -> Tuple[OrderBook, OrderBook]:
+        """返回 (買入訂單簿, 賣出訂單簿)"""
+        return self.books_for(mode, {'mx': mx_orderbook, 'lbank': lbank_orderbook})
+
+    @staticmethod
+    def books_for(mode: str, books: Mapping[str, OrderBook]) -> Tuple[OrderBook, OrderBook]:
+        """依模式名稱（{買入}_buy_{賣出}_sell）從 {交易所代號: 訂單簿} 取出 (買入訂單簿, 賣出訂單簿)"""
+        buy, sell = parse_mode(mode)
+        if buy not in books or sell not in books:
+            raise ValueError(f"不支援的交易模式: {mode}")
+        return books[buy], books[sell]
+
+    def analyze(self, buy_book: OrderBook, sell_book: OrderBook, include_curve: bool = True) -> dict:
+        """
+        計算可執行價差
+
+        Returns:
+            dict: 最大可獲利數量、VWAP買賣價、最大收益與邊際價差曲線
+        """
+        return self.analyze_indexes(self.index(buy_book, 'asks'), self.index(sell_book, 'bids'), include_curve)
+
+    @staticmethod
+    def analyze_indexes(asks: DepthIndex, bids: DepthIndex, include_curve: bool = True) -> dict:
+        """analyze 的陣列版本：直接以買方ask與賣方bid的深度索引計算（計算進程池使用，不需要訂單簿物件）"""
+        limit = min(asks.total_quantity, bids.total_quantity)
+
+        # 兩邊累積數量的聯集即邊際價差變化的斷點
+        ends = np.union1d(asks.cum_quantity, bids.cum_quantity)
+        ends = ends[(ends > 0) & (ends < limit)]
+        ends = np.append(ends, limit) if limit > 0 else ends
+        starts = np.concatenate(([0.0], ends[:-1]))
+        midpoints = (starts + ends) / 2
+
+        if len(ends):
+            ask_prices = asks.price_at(midpoints)
+            bid_prices = bids.price_at(midpoints)
+        else:
+            ask_prices = bid_prices = np.zeros(0)
+        marginal_spread = bid_prices - ask_prices
+
+        # ask遞增、bid遞減，邊際價差單調不增，可獲利區段必為前綴
+        profitable = int(np.count_nonzero(marginal_spread > 0))
+        max_quantity = float(ends[profitable - 1]) if profitable else 0.0
+
+        cost = float(asks.notional_for_quantity(max_quantity))
+        proceeds = float(bids.notional_for_quantity(max_quantity))
+        vwap_buy = cost / max_quantity if max_quantity > 0 else (float(asks.prices[0]) if len(asks.prices) else 0.0)
+        vwap_sell = proceeds / max_quantity if max_quantity > 0 else (float(bids.prices[0]) if len(bids.prices) else 0.0)
+        max_profit = proceeds - cost
+
+        result = {
+            "max_quantity": max_quantity,
+            "vwap_buy_price": vwap_buy,
+            "vwap_sell_price": vwap_sell,
+            "max_investment": cost,
+            "max_profit": max_profit,
+            "profit_rate": (max_profit / cost) * 100 if cost > 0 else 0,
+            "executable_depth": limit,
+        }
+
+        if include_curve:
+            segment_profit = marginal_spread * (ends - starts)
+            result["curve"] = {
+                "cum_quantity": ends.tolist(),
+                "ask_price": ask_prices.tolist(),
+                "bid_price": bid_prices.tolist(),
+                "marginal_spread": marginal_spread.tolist(),
+                "cum_profit": np.cumsum(segment_profit).tolist(),
+            }
+        return result
+
+    def profit_for_investments(
+        self,
+        buy_book: OrderBook,
+        sell_book: OrderBook,
+        investment_amounts: Sequence[float]
+    ) -> List[dict]:
+        """
+        批量計算多個投資金額的收益（向量化二分搜尋，不重新走訂單簿）
+
+        Returns:
+            List[dict]: 每個投資金額的實際投入、可成交數量、VWAP與收益
+        """
+        asks = self.index(buy_book, 'asks')
+        bids = self.index(sell_book, 'bids')
+        amounts = np.asarray(investment_amounts, dtype=np.float64)
+
+        quantity = asks.quantity_for_notional(amounts)
+        quantity = np.minimum(quantity, bids.total_quantity)
+        cost = asks.notional_for_quantity(quantity)
+        proceeds = bids.notional_for_quantity(quantity)
+        profit = proceeds - cost
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            vwap_buy = np.where(quantity > 0, cost / quantity, 0.0)
+            vwap_sell = np.where(quantity > 0, proceeds / quantity, 0.0)
+            profit_rate = np.where(cost > 0, profit / cost * 100, 0.0)
+
+        return [
+            {
+                "investment_amount": float(amounts[i]),
+                "actual_investment": float(cost[i]),
+                "tradeable_quantity": float(quantity[i]),
+                "vwap_buy_price": float(vwap_buy[i]),
+                "vwap_sell_price": float(vwap_sell[i]),
+                "potential_profit": float(profit[i]),
+                "profit_rate": float(profit_rate[i]),
+            }
+            for i in range(len(amounts))
+        ]
@@ -0,0 +1,483 @@
+import aiohttp
+import asyncio
+import json
+import logging
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Set, Tuple, TYPE_CHECKING
+
+from ..models.market_data import OrderBook, OrderBookEntry
+
+if TYPE_CHECKING:
+    from .exchange_service import ExchangeService
+
+logger = logging.getLogger(__name__)
+
+
+class LocalOrderBook:
+    """本地維護的訂單簿（快照 + 增量更新）"""
+
+    def __init__(self, exchange: str, symbol: str):
+        self.exchange = exchange
+        self.symbol = symbol
+        self.bids: Dict[float, float] = {}
+        self.asks: Dict[float, float] = {}
+        self.sequence: Optional[int] = None  # 交易所版本號
+        self.exchange_ts: Optional[int] = None  # 交易所時間戳（毫秒）
+        self.updated_at: float = 0.0  # 本地最後更新時間 (monotonic)
+        self.received_at: Optional[datetime] = None  # 本地最後更新時間（牆上時鐘）
+        self.synced: bool = False
+
+    @staticmethod
+    def _levels(levels: list) -> Dict[float, float]:
+        book = {}
+        for level in levels:
+            quantity = float(level[1])
+            if quantity > 0:
+                book[float(level[0])] = quantity
+        return book
+
+    def apply_snapshot(self, bids: list, asks: list, sequence: Optional[int] = None,
+                       exchange_ts: Optional[int] = None):
+        """以完整快照覆蓋本地訂單簿"""
+        self.bids = self._levels(bids)
+        self.asks = self._levels(asks)
+        self.sequence = sequence
+        self.exchange_ts = exchange_ts
+        self.updated_at = time.monotonic()
+        self.received_at = datetime.now()
+        self.synced = True
+
+    def apply_delta(self, bids: list, asks: list, sequence: Optional[int],
+                    exchange_ts: Optional[int] = None) -> bool:
+        """
+        套用增量更新（數量為0表示移除該價位）
+
+        Returns:
+            bool: 序號不連續（需要重新同步）時返回False
+        """
+        if not self.synced:
+            return False
+
+        if sequence is not None and self.sequence is not None:
+            if sequence <= self.sequence:
+                # 快照之前的舊消息，直接忽略
+                return True
+            if sequence != self.sequence + 1:
+                logger.warning(
+                    f"{self.exchange} {self.symbol} 訂單簿序號不連續: "
+                    f"本地={self.sequence}, 收到={sequence}"
+                )
+                self.synced = False
+                return False
+
+        for side, levels in ((self.bids, bids), (self.asks, asks)):
+            for level in levels:
+                price = float(level[0])
+                quantity = float(level[1])
+                if quantity > 0:
+                    side[price] = quantity
+                else:
+                    side.pop(price, None)
+
+        if sequence is not None:
+            self.sequence = sequence
+        if exchange_ts is not None:
+            self.exchange_ts = exchange_ts
+        self.updated_at = time.monotonic()
+        self.received_at = datetime.now()
+        return True
+
+    def age(self) -> float:
+        """距離上次更新的秒數"""
+        return time.monotonic() - self.updated_at
+
+    @staticmethod
+    def _coins(quantity: float, contract_size: float, quantity_precision: int) -> float:
+        return quantity if contract_size == 1.0 else round(quantity * contract_size, quantity_precision)
+
+    def to_orderbook(self, depth: int, price_precision: int, quantity_precision: int,
+                     contract_size: float = 1.0) -> OrderBook:
+        """轉換為API使用的OrderBook模型，數量乘以 contract_size（合約張數換算為幣，四捨五入到數量精度）"""
+        bids = sorted(self.bids.items(), key=lambda item: -item[0])[:depth]
+        asks = sorted(self.asks.items())[:depth]
+        exchange_time = datetime.fromtimestamp(self.exchange_ts / 1000) if self.exchange_ts else None
+        return OrderBook(
+            exchange=self.exchange,
+            symbol=self.symbol,
+            bids=[OrderBookEntry(price=price, quantity=self._coins(quantity, contract_size, quantity_precision))
+                  for price, quantity in bids],
+            asks=[OrderBookEntry(price=price, quantity=self._coins(quantity, contract_size, quantity_precision))
+                  for price, quantity in asks],
+            timestamp=exchange_time or self.received_at or datetime.now(),
+            price_precision=price_precision,
+            quantity_precision=quantity_precision,
+            received_at=self.received_at,
+            exchange_time=exchange_time
+        )
+
+
+class DepthFeed:
+    """單一交易所的WebSocket深度訂閱（自動重連、重新訂閱）"""
+
+    exchange = ""
+    ping_interval = 15
+
+    def __init__(self, manager: "DepthStreamManager", url: str):
+        self.manager = manager
+        self.url = url
+        self.books: Dict[str, LocalOrderBook] = {}
+        self.symbols: Set[str] = set()
+        self.ws: Optional[aiohttp.ClientWebSocketResponse] = None
+        self.connected: bool = False
+        self.resync_count: int = 0
+        self.gap_count: int = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._task = None
+        if self.ws and not self.ws.closed:
+            await self.ws.close()
+        self.connected = False
+
+    async def subscribe(self, symbol: str):
+        """訂閱交易對的深度頻道"""
+        if symbol in self.symbols:
+            return
+        self.symbols.add(symbol)
+        self.books[symbol] = LocalOrderBook(self.exchange, symbol)
+        if self.connected:
+            await self._send_subscribe(symbol)
+
+    async def unsubscribe(self, symbol: str):
+        """取消訂閱交易對"""
+        if symbol not in self.symbols:
+            return
+        self.symbols.discard(symbol)
+        self.books.pop(symbol, None)
+        if self.connected:
+            await self._send_unsubscribe(symbol)
+
+    def get_book(self, symbol: str) -> Optional[LocalOrderBook]:
+        book = self.books.get(symbol)
+        if book and book.synced:
+            return book
+        return None
+
+    async def _run(self):
+        backoff = 1
+        while True:
+            try:
+                async with self.manager.exchange_service.session.ws_connect(
+                    self.url, heartbeat=None, autoping=True
+                ) as ws:
+                    self.ws = ws
+                    self.connected = True
+                    backoff = 1
+                    logger.info(f"{self.exchange} 深度WebSocket已連接: {self.url}")
+
+                    for book in self.books.values():
+                        book.synced = False
+                    for symbol in list(self.symbols):
+                        await self._send_subscribe(symbol)
+
+                    ping_task = asyncio.create_task(self._ping_loop(ws))
+                    try:
+                        async for msg in ws:
+                            if msg.type == aiohttp.WSMsgType.TEXT:
+                                await self._handle_message(json.loads(msg.data))
+                            elif msg.type in (aiohttp.WSMsgType.CLOSED, aiohttp.WSMsgType.ERROR):
+                                break
+                    finally:
+                        ping_task.cancel()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"{self.exchange} 深度WebSocket錯誤: {e}")
+
+            self.connected = False
+            self.ws = None
+            for book in self.books.values():
+                book.synced = False
+            logger.warning(f"{self.exchange} 深度WebSocket斷開，{backoff}秒後重連")
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 30)
+
+    async def _ping_loop(self, ws: aiohttp.ClientWebSocketResponse):
+        while not ws.closed:
+            await asyncio.sleep(self.ping_interval)
+            try:
+                await self._send_ping(ws)
+            except Exception as e:
+                logger.debug(f"{self.exchange} 發送ping失敗: {e}")
+
+    async def _send_ping(self, ws: aiohttp.ClientWebSocketResponse):
+        pass
+
+    async def _send_subscribe(self, symbol: str):
+        raise NotImplementedError
+
+    async def _send_unsubscribe(self, symbol: str):
+        raise NotImplementedError
+
+    async def _handle_message(self, message: dict):
+        raise NotImplementedError
+
+
+class MxDepthFeed(DepthFeed):
+    """
+    MX合約深度訂閱
+    push.depth 為增量更新，帶有連續的version；
+    序號不連續時以REST快照重新同步，期間收到的增量先緩存後重放
+    """
+
+    exchange = "Mexc"
+
+    def __init__(self, manager: "DepthStreamManager", url: str):
+        super().__init__(manager, url)
+        self._pending: Dict[str, List[dict]] = {}
+        self._resync_tasks: Dict[str, asyncio.Task] = {}
+
+    async def _send_ping(self, ws: aiohttp.ClientWebSocketResponse):
+        await ws.send_str(json.dumps({"method": "ping"}))
+
+    async def _send_subscribe(self, symbol: str):
+        await self.ws.send_str(json.dumps({
+            "method": "sub.depth",
+            "param": {"symbol": symbol.replace('/', '_')}
+        }))
+        self._schedule_resync(symbol)
+
+    async def _send_unsubscribe(self, symbol: str):
+        await self.ws.send_str(json.dumps({
+            "method": "unsub.depth",
+            "param": {"symbol": symbol.replace('/', '_')}
+        }))
+        task = self._resync_tasks.pop(symbol, None)
+        if task:
+            task.cancel()
+        self._pending.pop(symbol, None)
+
+    async def _handle_message(self, message: dict):
+        if message.get('channel') != 'push.depth':
+            return
+
+        symbol = message.get('symbol', '').replace('_', '/')
+        book = self.books.get(symbol)
+        if book is None:
+            return
+
+        data = message.get('data') or {}
+        if not book.synced:
+            # 重新同步中，先緩存增量
+            self._pending.setdefault(symbol, []).append(data)
+            self._schedule_resync(symbol)
+            return
+
+        if book.apply_delta(data.get('bids', []), data.get('asks', []),
+                            data.get('version'), message.get('ts')):
+            self.manager.notify(self.exchange, symbol)
+        else:
+            self.gap_count += 1
+            self._pending[symbol] = [data]
+            self._schedule_resync(symbol)
+
+    def _schedule_resync(self, symbol: str):
+        task = self._resync_tasks.get(symbol)
+        if task is None or task.done():
+            self._resync_tasks[symbol] = asyncio.create_task(self._resync(symbol))
+
+    async def _resync(self, symbol: str):
+        """以REST快照重建本地訂單簿並重放緩存的增量"""
+        for attempt in range(5):
+            book = self.books.get(symbol)
+            if book is None:
+                return
+
+            snapshot = await self.manager.exchange_service.get_mx_depth_snapshot(symbol)
+            if not snapshot:
+                await asyncio.sleep(min(2 ** attempt, 10))
+                continue
+
+            self.resync_count += 1
+            book.apply_snapshot(
+                snapshot.get('bids', []), snapshot.get('asks', []),
+                snapshot.get('version'), snapshot.get('timestamp')
+            )
+
+            pending = self._pending.pop(symbol, [])
+            replayed = True
+            for data in pending:
+                if not book.apply_delta(data.get('bids', []), data.get('asks', []), data.get('version')):
+                    replayed = False
+                    break
+
+            if replayed:
+                logger.info(f"MX {symbol} 訂單簿已同步: version={book.sequence}")
+                self.manager.notify(self.exchange, symbol)
+                return
+
+            # 快照比緩存的增量還舊，稍後重試
+            self.gap_count += 1
+            await asyncio.sleep(0.2)
+
+        logger.error(f"MX {symbol} 訂單簿重新同步失敗")
+
+
+class LBankDepthFeed(DepthFeed):
+    """
+    LBank深度訂閱
+    V2 depth 頻道每次推送完整的前N檔，直接以快照覆蓋
+    """
+
+    exchange = "LBank"
+
+    def __init__(self, manager: "DepthStreamManager", url: str, depth: int = 50):
+        super().__init__(manager, url)
+        self.depth = depth
+
+    async def _send_subscribe(self, symbol: str):
+        await self.ws.send_str(json.dumps({
+            "action": "subscribe",
+            "subscribe": "depth",
+            "depth": str(self.depth),
+            "pair": symbol.lower().replace('/', '_')
+        }))
+
+    async def _send_unsubscribe(self, symbol: str):
+        await self.ws.send_str(json.dumps({
+            "action": "unsubscribe",
+            "subscribe": "depth",
+            "depth": str(self.depth),
+            "pair": symbol.lower().replace('/', '_')
+        }))
+
+    async def _handle_message(self, message: dict):
+        if message.get('action') == 'ping':
+            await self.ws.send_str(json.dumps({"action": "pong", "pong": message.get('ping')}))
+            return
+
+        if message.get('type') != 'depth':
+            return
+
+        symbol = message.get('pair', '').upper().replace('_', '/')
+        book = self.books.get(symbol)
+        if book is None:
+            return
+
+        depth = message.get('depth') or {}
+        book.apply_snapshot(depth.get('bids', []), depth.get('asks', []))
+        self.manager.notify(self.exchange, symbol)
+
+
+class DepthStreamManager:
+    """管理兩個交易所的深度推送，並通知價差計算流程"""
+
+    def __init__(self, exchange_service: "ExchangeService", mx_ws_url: str, lbank_ws_url: str,
+                 max_book_age: float = 5.0, depth: int = 20):
+        self.exchange_service = exchange_service
+        self.max_book_age = max_book_age  # 超過此秒數未更新視為過期，回退到REST
+        self.depth = depth
+        self.mx_feed = MxDepthFeed(self, mx_ws_url)
+        self.lbank_feed = LBankDepthFeed(self, lbank_ws_url)
+        # 每個 (交易所, 交易對) 各自的更新版本與等待者，一個交易對的推送只喚醒等待它的抓取管線
+        self.versions: Dict[Tuple[str, str], int] = {}
+        self._waiters: Dict[Tuple[str, str], Set[asyncio.Future]] = {}
+
+    def start(self):
+        self.mx_feed.start()
+        self.lbank_feed.start()
+        logger.info("深度推送服務已啟動")
+
+    async def close(self):
+        await self.mx_feed.stop()
+        await self.lbank_feed.stop()
+
+    async def ensure_subscribed(self, mx_symbol: str, lbank_symbol: str):
+        """確保已訂閱交易對（多條抓取管線可同時訂閱不同交易對）"""
+        await self.mx_feed.subscribe(mx_symbol)
+        await self.lbank_feed.subscribe(lbank_symbol)
+
+    async def retain_only(self, mx_symbols: set, lbank_symbols: set):
+        """取消訂閱已沒有抓取管線使用的交易對"""
+        for feed, symbols in ((self.mx_feed, mx_symbols), (self.lbank_feed, lbank_symbols)):
+            for old_symbol in list(feed.symbols - symbols):
+                await feed.unsubscribe(old_symbol)
+
+    def notify(self, exchange: str, symbol: str):
+        """訂單簿有更新時喚醒等待該交易對的價差計算"""
+        key = (exchange, symbol)
+        self.versions[key] = self.versions.get(key, 0) + 1
+        for waiter in self._waiters.pop(key, ()):
+            if not waiter.done():
+                waiter.set_result(None)
+
+    def _pair_keys(self, mx_symbol: str, lbank_symbol: str) -> Tuple[Tuple[str, str], Tuple[str, str]]:
+        return (self.mx_feed.exchange, mx_symbol), (self.lbank_feed.exchange, lbank_symbol)
+
+    def pair_version(self, mx_symbol: str, lbank_symbol: str) -> int:
+        """交易對組合的更新版本（兩邊版本之和，任一邊更新即改變）"""
+        return sum(self.versions.get(key, 0) for key in self._pair_keys(mx_symbol, lbank_symbol))
+
+    async def wait_for_update(self, mx_symbol: str, lbank_symbol: str, last_version: int, timeout: float) -> int:
+        """等待交易對組合任一邊的訂單簿更新，逾時也返回（供REST回退使用）；返回組合目前的版本"""
+        version = self.pair_version(mx_symbol, lbank_symbol)
+        if version != last_version:
+            return version
+        keys = self._pair_keys(mx_symbol, lbank_symbol)
+        waiter = asyncio.get_running_loop().create_future()
+        for key in keys:
+            self._waiters.setdefault(key, set()).add(waiter)
+        try:
+            await asyncio.wait_for(waiter, timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            for key in keys:
+                waiters = self._waiters.get(key)
+                if waiters is not None:
+                    waiters.discard(waiter)
+                    if not waiters:
+                        del self._waiters[key]
+        return self.pair_version(mx_symbol, lbank_symbol)
+
+    def _to_orderbook(self, book: Optional[LocalOrderBook], venue: str) -> Optional[OrderBook]:
+        if book is None or book.age() > self.max_book_age:
+            return None
+        precision_info = self.exchange_service.precision_for(venue, book.symbol)
+        return book.to_orderbook(
+            self.depth,
+            precision_info['price_precision'],
+            precision_info['quantity_precision'],
+            float(precision_info.get('contract_size', 1.0))
+        )
+
+    def get_mx_orderbook(self, symbol: str) -> Optional[OrderBook]:
+        """取得本地維護的MX訂單簿，未同步或過期時返回None"""
+        return self._to_orderbook(self.mx_feed.get_book(symbol), 'mx')
+
+    def get_lbank_orderbook(self, symbol: str) -> Optional[OrderBook]:
+        """取得本地維護的LBank訂單簿，未同步或過期時返回None"""
+        return self._to_orderbook(self.lbank_feed.get_book(symbol), 'lbank')
+
+    def get_stats(self) -> dict:
+        return {
+            feed.exchange: {
+                "connected": feed.connected,
+                "symbols": sorted(feed.symbols),
+                "synced": sorted(symbol for symbol, book in feed.books.items() if book.synced),
+                "resync_count": feed.resync_count,
+                "gap_count": feed.gap_count,
+            }
+            for feed in (self.mx_feed, self.lbank_feed)
+        }
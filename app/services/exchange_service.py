@@ -2,262 +2,336 @@ import aiohttp
 import asyncio
 import json
 import logging
+import os
+import time
 from datetime import datetime
-from typing import Dict, List, Optional, Set
+from typing import Callable, Dict, FrozenSet, List, Optional, Tuple
 
 from ..models.market_data import OrderBook, OrderBookEntry, Symbol
+from .depth_decoders import DepthDecodeError, to_coins
+from .exchanges import ADAPTERS, ExchangeAdapter
+from .depth_stream import DepthStreamManager
+from .symbol_cache import SymbolCache
+from .capture import CaptureWriter
+from .metrics import REGISTRY
+from .transport import CircuitOpenError, VenueTransport
 
 logger = logging.getLogger(__name__)
 
+REQUEST_SECONDS = REGISTRY.histogram(
+    "lbmx_exchange_request_seconds", "Depth REST round-trip time including body read", ("exchange", "symbol")
+)
+RESPONSES = REGISTRY.counter("lbmx_exchange_responses", "Depth REST responses by HTTP status", ("exchange", "status"))
+PARSE_SECONDS = REGISTRY.histogram(
+    "lbmx_parse_seconds", "Depth payload to OrderBook parse time", ("exchange", "symbol")
+)
+
 class ExchangeService:
     """交易所服務，處理MX和LBank的API請求"""
     
     def __init__(self):
         self.session: Optional[aiohttp.ClientSession] = None
         self.current_symbol: str = "BTC/USDT"
-        self.mx_symbols: Set[str] = set()
-        self.lbank_symbols: Set[str] = set()
-        self.symbol_precision: Dict[str, Dict[str, int]] = {}  # 存儲精度信息
         
         # 自選模式相關
         self.custom_mode: bool = False  # 是否為自選模式
         self.custom_mx_symbol: str = ""  # 自選模式下的MX幣種
         self.custom_lbank_symbol: str = ""  # 自選模式下的LBank幣種
         
-        # API端點
-        self.mx_base_url = "https://contract.mexc.com"  # 合約API
-        self.lbank_base_url = "https://api.lbank.info"
+        # 交易所適配器（mx、lbank 為必需，其餘以 EXCHANGES 啟用）
+        venues = [key.strip() for key in os.environ.get("EXCHANGES", "mx,lbank").split(",") if key.strip()]
+        for required in ("lbank", "mx"):
+            if required not in venues:
+                venues.insert(0, required)
+        unknown = [key for key in venues if key not in ADAPTERS]
+        if unknown:
+            logger.error(f"未知的交易所: {unknown}，可用: {sorted(ADAPTERS)}")
+        self.adapters: Dict[str, ExchangeAdapter] = {key: ADAPTERS[key]() for key in venues if key in ADAPTERS}
+        
+        # 每個交易所獨立的HTTP傳輸（連接池、hedged請求、熔斷），可用 <KEY>_REQUEST_TIMEOUT 個別設置超時
+        self.transports: Dict[str, VenueTransport] = {
+            key: VenueTransport(
+                adapter.name,
+                timeout=float(os.environ.get(f"{key.upper()}_REQUEST_TIMEOUT", os.environ.get("REQUEST_TIMEOUT", 3))),
+                pool_size=int(os.environ.get("HTTP_POOL_SIZE", 16)),
+                hedge=os.environ.get("HEDGE_REQUESTS", "true").lower() == "true",
+                hedge_max_ratio=float(os.environ.get("HEDGE_MAX_RATIO", 0.1)),
+                failure_threshold=int(os.environ.get("CIRCUIT_FAILURE_THRESHOLD", 5)),
+                reset_timeout=float(os.environ.get("CIRCUIT_RESET_TIMEOUT", 10))
+            )
+            for key, adapter in self.adapters.items()
+        }
+        
+        # 交易對與精度快取（啟動時從磁碟載入，背景按TTL刷新）
+        self.symbol_cache = SymbolCache(
+            os.environ.get("SYMBOL_CACHE_PATH", "data/symbols.json"),
+            ttl=float(os.environ.get("SYMBOL_CACHE_TTL", 3600)),
+            loaders={key: self._symbol_loader(key) for key in self.adapters}
+        )
+        self.symbol_wait_timeout = float(os.environ.get("SYMBOL_WAIT_TIMEOUT", 10))
+        
+        self.warmup_connections = int(os.environ.get("WARMUP_CONNECTIONS", 2))
+        self.warmup_task: Optional[asyncio.Task] = None
+        
+        # 訂單簿保留的檔數（REST響應只解碼這麼多檔）
+        self.orderbook_depth = int(os.environ.get("ORDERBOOK_DEPTH", 20))
+        
+        # WebSocket深度推送（DEPTH_FEED_MODE=websocket 時啟用，REST輪詢作為回退）
+        self.depth_feed_mode = os.environ.get("DEPTH_FEED_MODE", "rest")
+        self.mx_ws_url = os.environ.get("MX_WS_URL", "wss://contract.mexc.com/edge")
+        self.lbank_ws_url = os.environ.get("LBANK_WS_URL", "wss://www.lbkex.net/ws/V2/")
+        self.depth_stream: Optional[DepthStreamManager] = None
+        
+        # 原始深度響應錄製（設置 CAPTURE_DIR 時啟用，供回放使用）
+        self.capture_dir = os.environ.get("CAPTURE_DIR")
+        self.capture: Optional[CaptureWriter] = None
+        
+        # 訂單簿請求的HTTP狀態監聽器 (exchange, status)，供排程器退避使用
+        self.response_listeners: List[Callable[[str, int], None]] = []
     
     async def initialize(self):
         """初始化服務"""
+        # 共用session只用於WebSocket深度推送，REST請求走各交易所的傳輸
         self.session = aiohttp.ClientSession(
             timeout=aiohttp.ClientTimeout(total=10)
         )
+        for transport in self.transports.values():
+            await transport.start()
+        # 背景預熱連接，不阻塞啟動
+        if self.warmup_connections > 0:
+            self.warmup_task = asyncio.create_task(self.warm_up())
+        
+        if self.capture_dir:
+            self.capture = CaptureWriter(
+                self.capture_dir, chunk_seconds=float(os.environ.get("CAPTURE_CHUNK_SECONDS", 300))
+            )
+            logger.info(f"錄製原始深度響應到 {self.capture_dir}")
+        
+        # 從快取載入交易對列表，不等待交易所API；過期或沒有快取時在背景刷新
+        self.symbol_cache.load()
+        self.symbol_cache.start()
+        
+        if self.depth_feed_mode == "websocket":
+            self.depth_stream = DepthStreamManager(self, self.mx_ws_url, self.lbank_ws_url)
+            self.depth_stream.start()
         
-        # 獲取交易對列表
-        await self._load_exchange_symbols()
         logger.info("交易所服務初始化完成")
     
     async def close(self):
         """關閉服務"""
+        await self.symbol_cache.close()
+        if self.capture:
+            await self.capture.close()
+        if self.depth_stream:
+            await self.depth_stream.close()
+        if self.warmup_task:
+            self.warmup_task.cancel()
+        for transport in self.transports.values():
+            await transport.close()
         if self.session:
             await self.session.close()
     
-    async def _load_exchange_symbols(self):
-        """載入兩個交易所的交易對列表"""
-        try:
-            # 同時獲取兩個交易所的交易對
-            mx_task = self._get_mx_symbols()
-            lbank_task = self._get_lbank_symbols()
-            
-            mx_symbols, lbank_symbols = await asyncio.gather(
-                mx_task, lbank_task, return_exceptions=True
-            )
-            
-            if isinstance(mx_symbols, Exception):
-                logger.error(f"獲取MX交易對失敗: {mx_symbols}")
-                mx_symbols = set()
-            
-            if isinstance(lbank_symbols, Exception):
-                logger.error(f"獲取LBank交易對失敗: {lbank_symbols}")
-                lbank_symbols = set()
-            
-            self.mx_symbols = mx_symbols
-            self.lbank_symbols = lbank_symbols
-            
-            common_count = len(self.mx_symbols & self.lbank_symbols)
-            logger.info(f"MX交易對數量: {len(self.mx_symbols)}, LBank交易對數量: {len(self.lbank_symbols)}, 共同交易對: {common_count}")
-            
-        except Exception as e:
-            logger.error(f"載入交易對列表失敗: {e}")
+    async def warm_up(self):
+        """為每個交易所預先建立 warmup_connections 條keep-alive連接"""
+        await asyncio.gather(*(
+            self.transports[key].warm_up(adapter.ping_url, self.warmup_connections)
+            for key, adapter in self.adapters.items()
+        ))
     
-    async def _get_mx_symbols(self) -> Set[str]:
-        """獲取MX合約交易所的交易對列表"""
-        try:
-            url = f"{self.mx_base_url}/api/v1/contract/detail"
-            async with self.session.get(url) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    symbols = set()
-                    
-                    # 合約API返回格式: {"success": true, "code": 0, "data": [...]}
-                    if data.get('success') and data.get('data'):
-                        for contract_info in data['data']:
-                            symbol = contract_info.get('symbol', '')
-                            # 合約格式：BTC_USDT，轉換為 BTC/USDT
-                            if '_USDT' in symbol:
-                                formatted_symbol = symbol.replace('_', '/')
-                                symbols.add(formatted_symbol)
-                                
-                                # 保存精度信息（合約通常是4位小數）
-                                self.symbol_precision[formatted_symbol] = {
-                                    'price_precision': contract_info.get('priceScale', 4),
-                                    'quantity_precision': contract_info.get('volScale', 0)
-                                }
-                    
-                    return symbols
-                else:
-                    logger.error(f"MX合約API請求失敗: {response.status}")
-                    return set()
-        except Exception as e:
-            logger.error(f"獲取MX合約交易對失敗: {e}")
-            return set()
+    def _symbol_loader(self, venue: str):
+        """交易對快取的載入函數（交易所傳輸的session在initialize後才建立，呼叫時再取）"""
+        return lambda: self.adapters[venue].fetch_symbols(self.transports[venue].session)
     
-    async def _get_lbank_symbols(self) -> Set[str]:
-        """獲取LBank交易所的交易對列表"""
-        try:
-            url = f"{self.lbank_base_url}/v1/currencyPairs.do"
-            async with self.session.get(url) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    symbols = set()
-                    
-                    # LBank API直接返回數組
-                    symbol_list = data if isinstance(data, list) else data.get('data', [])
-                    
-                    for symbol in symbol_list:
-                        # LBank格式：btc_usdt -> BTC/USDT
-                        if '_usdt' in symbol.lower():
-                            parts = symbol.upper().split('_')
-                            if len(parts) == 2:
-                                formatted_symbol = f"{parts[0]}/{parts[1]}"
-                                symbols.add(formatted_symbol)
-                    
-                    return symbols
-                else:
-                    logger.error(f"LBank API請求失敗: {response.status}")
-                    return set()
-        except Exception as e:
-            logger.error(f"獲取LBank交易對失敗: {e}")
-            return set()
+    def get_transport_stats(self) -> Dict[str, dict]:
+        return {key: transport.get_stats() for key, transport in self.transports.items()}
+    
+    @property
+    def venues(self) -> List[str]:
+        """已啟用的交易所代號（順序即價差矩陣的行列順序）"""
+        return list(self.adapters)
+    
+    @property
+    def mx_base_url(self) -> str:
+        return self.adapters['mx'].base_url
+    
+    @mx_base_url.setter
+    def mx_base_url(self, value: str):
+        self.adapters['mx'].base_url = value
+    
+    @property
+    def lbank_base_url(self) -> str:
+        return self.adapters['lbank'].base_url
+    
+    @lbank_base_url.setter
+    def lbank_base_url(self, value: str):
+        self.adapters['lbank'].base_url = value
+    
+    @property
+    def mx_symbols(self) -> FrozenSet[str]:
+        return self.symbol_cache.snapshot.mx_symbols
+    
+    @property
+    def lbank_symbols(self) -> FrozenSet[str]:
+        return self.symbol_cache.snapshot.lbank_symbols
+    
+    def precision_for(self, venue: str, symbol: str) -> Dict[str, int]:
+        """該交易所該交易對的價格/數量精度（各交易所各自的精度，缺少時用該交易所適配器的預設值）"""
+        precision = self.symbol_cache.snapshot.precision.get(venue, {}).get(symbol)
+        return precision or self.adapters[venue].default_precision
+
+    def contract_size(self, venue: str, symbol: str) -> float:
+        """每張合約的幣數量（深度數量以張計的交易所，例如MX合約），現貨為1"""
+        return float(self.precision_for(venue, symbol).get('contract_size', 1.0))
     
     async def get_common_symbols(self) -> List[str]:
         """獲取兩個交易所共同的交易對"""
-        if not self.mx_symbols or not self.lbank_symbols:
-            await self._load_exchange_symbols()
-        
-        common_symbols = sorted(list(self.mx_symbols & self.lbank_symbols))
-        return common_symbols
+        snapshot = await self.symbol_cache.ready(self.symbol_wait_timeout)
+        return snapshot.common_sorted
     
     async def get_mx_symbols(self) -> List[str]:
         """獲取MX交易所的幣種列表"""
-        if not self.mx_symbols:
-            await self._load_exchange_symbols()
-        return sorted(list(self.mx_symbols))
+        snapshot = await self.symbol_cache.ready(self.symbol_wait_timeout)
+        return snapshot.mx_sorted
     
     async def get_lbank_symbols(self) -> List[str]:
         """獲取LBank交易所的幣種列表"""
-        if not self.lbank_symbols:
-            await self._load_exchange_symbols()
-        return sorted(list(self.lbank_symbols))
+        snapshot = await self.symbol_cache.ready(self.symbol_wait_timeout)
+        return snapshot.lbank_sorted
     
-    async def get_mx_orderbook(self, symbol: str) -> Optional[OrderBook]:
-        """獲取MX合約交易所的訂單簿"""
+    async def has_symbols(self, mx_symbol: str, lbank_symbol: str) -> Tuple[bool, bool]:
+        """以集合索引檢查兩個交易所是否有該幣種"""
+        snapshot = await self.symbol_cache.ready(self.symbol_wait_timeout)
+        return mx_symbol in snapshot.mx_symbols, lbank_symbol in snapshot.lbank_symbols
+    
+    def _notify_response(self, exchange: str, status: int):
+        """通知監聽器訂單簿請求的HTTP狀態"""
+        RESPONSES.inc((exchange, str(status)))
+        for listener in self.response_listeners:
+            try:
+                listener(exchange, status)
+            except Exception as e:
+                logger.error(f"響應監聽器錯誤: {e}")
+    
+    @staticmethod
+    def _parse_exchange_time(value) -> Optional[datetime]:
+        """將交易所回報的毫秒時間戳轉換為本地datetime"""
+        try:
+            return datetime.fromtimestamp(int(value) / 1000) if value else None
+        except (TypeError, ValueError, OverflowError):
+            return None
+    
+    async def _fetch_depth(self, venue: str, symbol: str) -> Optional[Tuple[bytes, datetime, datetime]]:
+        """請求交易所深度，返回 (響應body, 發出時間, 接收時間)，失敗時返回None"""
+        adapter = self.adapters[venue]
+        sent_at = datetime.now()
+        started = time.perf_counter()
+        try:
+            status, body = await adapter.fetch_depth(self.transports[venue], symbol, self.orderbook_depth)
+        except CircuitOpenError:
+            # 熔斷中直接跳過，不每個tick都記錄錯誤
+            logger.debug(f"{adapter.name}熔斷中，跳過 {symbol}")
+            return None
+        self._notify_response(adapter.name, status)
+        if status != 200:
+            logger.error(f"{adapter.name}訂單簿API請求失敗: {status}")
+            return None
+        REQUEST_SECONDS.observe(time.perf_counter() - started, (adapter.name, REGISTRY.symbol(symbol)))
+        received_at = datetime.now()
+        if self.capture:
+            self.capture.record(venue, symbol, body, sent_at, received_at)
+        return body, sent_at, received_at
+    
+    async def fetch_depth(self, venue: str, symbol: str) -> Optional[Tuple[bytes, datetime, datetime]]:
+        """請求深度響應但不解碼，返回 (響應body, 發出時間, 接收時間)（由計算進程池批次解碼）"""
         try:
-            # 轉換格式：BTC/USDT -> BTC_USDT
-            mx_symbol = symbol.replace('/', '_')
-            url = f"{self.mx_base_url}/api/v1/contract/depth/{mx_symbol}"
+            return await self._fetch_depth(venue, symbol)
+        except Exception as e:
+            logger.error(f"獲取{self.adapters[venue].name}訂單簿失敗: {e}")
+            return None
+    
+    async def get_mx_depth_snapshot(self, symbol: str) -> Optional[dict]:
+        """獲取MX合約訂單簿原始快照（包含version，供深度推送重新同步使用）"""
+        try:
+            fetched = await self._fetch_depth('mx', symbol)
+            if fetched is None:
+                return None
+            data = json.loads(fetched[0])
             
-            async with self.session.get(url) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    
-                    # 合約API返回格式: {"success": true, "code": 0, "data": {"asks": [...], "bids": [...]}}
-                    if not data.get('success') or not data.get('data'):
-                        logger.error(f"MX合約API返回錯誤: {data}")
-                        return None
-                    
-                    order_data = data['data']
-                    
-                    # 解析買單和賣單
-                    # 合約API格式: [[price, quantity, unknown], ...]
-                    bids = [
-                        OrderBookEntry(price=float(bid[0]), quantity=float(bid[1]))
-                        for bid in order_data.get('bids', [])[:20]
-                    ]
-                    asks = [
-                        OrderBookEntry(price=float(ask[0]), quantity=float(ask[1]))
-                        for ask in order_data.get('asks', [])[:20]
-                    ]
-                    
-                    # 獲取精度信息
-                    precision_info = self.symbol_precision.get(symbol, {
-                        'price_precision': 4,
-                        'quantity_precision': 0
-                    })
-                    
-                    return OrderBook(
-                        exchange="Mexc",
-                        symbol=symbol,
-                        bids=bids,
-                        asks=asks,
-                        timestamp=datetime.now(),
-                        price_precision=precision_info['price_precision'],
-                        quantity_precision=precision_info['quantity_precision']
-                    )
-                else:
-                    logger.error(f"MX合約訂單簿API請求失敗: {response.status}")
-                    return None
+            # 合約API返回格式: {"success": true, "code": 0, "data": {"asks": [...], "bids": [...], "version": ...}}
+            if not data.get('success') or not data.get('data'):
+                logger.error(f"MX合約API返回錯誤: {data}")
+                return None
+            
+            return data['data']
         except Exception as e:
             logger.error(f"獲取MX合約訂單簿失敗: {e}")
             return None
     
-    async def get_lbank_orderbook(self, symbol: str = None) -> Optional[OrderBook]:
+    async def get_orderbook(self, venue: str, symbol: str) -> Optional[OrderBook]:
+        """獲取指定交易所的訂單簿（直接從響應bytes解碼前N檔）"""
+        try:
+            fetched = await self._fetch_depth(venue, symbol)
+            if fetched is None:
+                return None
+            return self.decode_orderbook(venue, symbol, *fetched)
+        except Exception as e:
+            logger.error(f"獲取{self.adapters[venue].name}訂單簿失敗: {e}")
+            return None
+    
+    async def get_orderbooks(self, symbol: str, venues: Optional[List[str]] = None) -> Dict[str, Optional[OrderBook]]:
+        """同時獲取多個交易所（預設全部已啟用的）同一交易對的訂單簿"""
+        venues = venues or self.venues
+        books = await asyncio.gather(*(self.get_orderbook(venue, symbol) for venue in venues))
+        return dict(zip(venues, books))
+    
+    async def get_mx_orderbook(self, symbol: str) -> Optional[OrderBook]:
+        """獲取MX合約交易所的訂單簿"""
+        return await self.get_orderbook('mx', symbol)
+    
+    async def get_lbank_orderbook(self, symbol: str) -> Optional[OrderBook]:
         """獲取LBank交易所的訂單簿"""
+        return await self.get_orderbook('lbank', symbol)
+    
+    def decode_orderbook(
+        self,
+        venue: str,
+        symbol: str,
+        body: bytes,
+        sent_at: Optional[datetime] = None,
+        received_at: Optional[datetime] = None
+    ) -> Optional[OrderBook]:
+        """從深度響應bytes解碼訂單簿（只保留 orderbook_depth 檔）"""
+        adapter = self.adapters[venue]
+        started = time.perf_counter()
         try:
-            # 在自選模式下使用自選的LBank幣種
-            if self.custom_mode and self.custom_lbank_symbol:
-                symbol = self.custom_lbank_symbol
+            received_at = received_at or datetime.now()
+            levels = adapter.decode_depth(body, self.orderbook_depth)
             
-            # 轉換格式：BTC/USDT -> btc_usdt
-            lbank_symbol = symbol.lower().replace('/', '_')
-            url = f"{self.lbank_base_url}/v1/depth.do"
-            params = {'symbol': lbank_symbol, 'size': 20}
+            precision_info = self.precision_for(venue, symbol)
+            exchange_time = self._parse_exchange_time(levels.exchange_time)
+            bids, asks = levels.bids, levels.asks
+            contract_size = float(precision_info.get('contract_size', 1.0))
+            if contract_size != 1.0:
+                # 合約張數換算為幣的數量（四捨五入到幣的精度，避免浮點尾數），兩邊的數量與金額才是同一單位
+                bids, asks = (to_coins(side, contract_size, precision_info['quantity_precision']) for side in (bids, asks))
             
-            async with self.session.get(url, params=params) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    
-                    # LBank API可能直接返回訂單簿數據或包含result字段
-                    if 'result' in data and data.get('result') != 'true':
-                        logger.error(f"LBank API返回錯誤: {data}")
-                        return None
-                    
-                    # 解析買單和賣單 - 處理不同的響應格式
-                    if 'data' in data:
-                        # 格式1: {"result": "true", "data": {"bids": [...], "asks": [...]}}
-                        order_data = data['data']
-                    else:
-                        # 格式2: {"bids": [...], "asks": [...]}
-                        order_data = data
-                    
-                    bids = [
-                        OrderBookEntry(price=float(bid[0]), quantity=float(bid[1]))
-                        for bid in order_data.get('bids', [])
-                    ]
-                    asks = [
-                        OrderBookEntry(price=float(ask[0]), quantity=float(ask[1]))
-                        for ask in order_data.get('asks', [])
-                    ]
-                    
-                    # 使用與MX相同的精度信息
-                    precision_info = self.symbol_precision.get(symbol, {
-                        'price_precision': 4,
-                        'quantity_precision': 6
-                    })
-                    
-                    return OrderBook(
-                        exchange="LBank",
-                        symbol=symbol,  # 使用傳入的symbol參數，而不是轉換後的lbank_symbol
-                        bids=bids,
-                        asks=asks,
-                        timestamp=datetime.now(),
-                        price_precision=precision_info['price_precision'],
-                        quantity_precision=precision_info['quantity_precision']
-                    )
-                else:
-                    logger.error(f"LBank訂單簿API請求失敗: {response.status}")
-                    return None
+            orderbook = OrderBook(
+                exchange=adapter.name,
+                symbol=symbol,
+                bids=[OrderBookEntry(price=price, quantity=quantity) for price, quantity in bids.tolist()],
+                asks=[OrderBookEntry(price=price, quantity=quantity) for price, quantity in asks.tolist()],
+                timestamp=exchange_time or received_at,
+                price_precision=precision_info['price_precision'],
+                quantity_precision=precision_info['quantity_precision'],
+                sent_at=sent_at,
+                received_at=received_at,
+                exchange_time=exchange_time
+            )
+            PARSE_SECONDS.observe(time.perf_counter() - started, (adapter.name, REGISTRY.symbol(symbol)))
+            return orderbook
+        except DepthDecodeError as e:
+            logger.error(f"{e}")
+            return None
         except Exception as e:
-            logger.error(f"獲取LBank訂單簿失敗: {e}")
+            logger.error(f"解析{adapter.name}訂單簿失敗: {e}")
             return None
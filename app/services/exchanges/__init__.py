@@ -0,0 +1,33 @@
+"""
+交易所適配器註冊表
+
+新增交易所：在此目錄新增一個 ExchangeAdapter 子類別檔案並加入 ADAPTERS，
+再以 EXCHANGES 環境變量啟用（例如 EXCHANGES=mx,lbank,okx）
+"""
+
+from typing import Dict, Tuple, Type
+
+from .base import ExchangeAdapter
+from .lbank import LBankAdapter
+from .mexc import MexcAdapter
+
+ADAPTERS: Dict[str, Type[ExchangeAdapter]] = {
+    MexcAdapter.key: MexcAdapter,
+    LBankAdapter.key: LBankAdapter,
+}
+
+
+def mode_name(buy: str, sell: str) -> str:
+    """交易模式名稱，例如 mx_buy_lbank_sell"""
+    return f"{buy}_buy_{sell}_sell"
+
+
+def parse_mode(mode: str) -> Tuple[str, str]:
+    """交易模式名稱拆為 (買入交易所, 賣出交易所)，格式錯誤時拋出ValueError"""
+    buy, sep, sell = mode.partition("_buy_")
+    if not sep or not buy or not sell.endswith("_sell") or len(sell) <= len("_sell"):
+        raise ValueError(f"不支援的交易模式: {mode}")
+    return buy, sell[:-len("_sell")]
+
+
+__all__ = ["ADAPTERS", "ExchangeAdapter", "LBankAdapter", "MexcAdapter", "mode_name", "parse_mode"]
@@ -0,0 +1,72 @@
+import logging
+import os
+from typing import Dict, Optional, Set, Tuple
+
+import aiohttp
+
+from ..depth_decoders import DepthDecoder, DepthLevels
+from ..transport import VenueTransport
+
+logger = logging.getLogger(__name__)
+
+# 交易對 -> {'price_precision', 'quantity_precision'}，合約交易所另有 'contract_size'（每張的幣數量）
+Precision = Dict[str, Dict[str, float]]
+
+
+class ExchangeAdapter:
+    """
+    交易所適配器：交易對列表與精度、深度請求、交易對格式轉換、限流預設值
+    新增交易所繼承此類別並在 exchanges/__init__.py 註冊後，交易對快取、限流器、
+    多交易對排程器、計算進程池與價差矩陣即包含該交易所；
+    單一交易對的抓取管線（WebSocket market_update、深度推送）仍只處理MX與LBank
+
+    key 為內部代號（用於模式名稱 {買入}_buy_{賣出}_sell 與錄製記錄），name 為顯示名稱
+    """
+
+    key: str = ""
+    name: str = ""
+    default_base_url: str = ""
+    decoder: DepthDecoder
+    # 沒有精度資訊時使用的預設值（足夠高的固定精度，不截斷小數）
+    default_precision: Dict[str, int] = {'price_precision': 8, 'quantity_precision': 8}
+    # 啟動時預熱連接用的輕量端點
+    ping_path: str = "/"
+    # 多交易對排程器的限流預設值（每秒請求數、突發量、並發上限），
+    # 可用 <KEY>_RATE_LIMIT / <KEY>_RATE_BURST / <KEY>_MAX_CONCURRENCY 覆寫
+    rate_limit: float = 5.0
+    rate_burst: float = 10.0
+    max_concurrency: int = 4
+
+    def __init__(self, base_url: Optional[str] = None):
+        # 可用 <KEY>_BASE_URL 環境變量覆寫（例如指向本地測試伺服器）
+        self.base_url = base_url or os.environ.get(f"{self.key.upper()}_BASE_URL", self.default_base_url)
+
+    def normalize_symbol(self, symbol: str) -> str:
+        """內部格式（BTC/USDT）轉為交易所格式"""
+        raise NotImplementedError
+
+    def depth_request(self, symbol: str, depth: int) -> Tuple[str, Optional[dict]]:
+        """返回深度請求的 (url, query參數)"""
+        raise NotImplementedError
+
+    async def fetch_symbols(self, session: aiohttp.ClientSession) -> Optional[Tuple[Set[str], Precision]]:
+        """獲取交易對列表（內部格式）與精度，失敗時返回None"""
+        raise NotImplementedError
+
+    @property
+    def ping_url(self) -> str:
+        return f"{self.base_url}{self.ping_path}"
+
+    async def fetch_depth(self, transport: VenueTransport, symbol: str, depth: int) -> Tuple[int, bytes]:
+        """
+        請求深度，返回 (HTTP狀態, 響應body)；非200時body為空
+
+        Raises:
+            CircuitOpenError: 該交易所熔斷中
+        """
+        url, params = self.depth_request(symbol, depth)
+        return await transport.get(url, params)
+
+    def decode_depth(self, body: bytes, depth: Optional[int]) -> DepthLevels:
+        """解碼深度響應，失敗時拋出DepthDecodeError"""
+        return self.decoder.decode(body, depth)
@@ -0,0 +1,81 @@
+import logging
+from typing import Dict, Optional, Set, Tuple
+
+import aiohttp
+
+from ..depth_decoders import LBANK_DECODER
+from .base import ExchangeAdapter, Precision
+
+logger = logging.getLogger(__name__)
+
+
+class LBankAdapter(ExchangeAdapter):
+    """LBank現貨交易所"""
+
+    key = "lbank"
+    name = "LBank"
+    default_base_url = "https://api.lbank.info"
+    ping_path = "/v2/timestamp.do"
+    decoder = LBANK_DECODER
+    # 公開限額 200次/10秒
+    rate_limit = 15.0
+    rate_burst = 30.0
+    max_concurrency = 8
+
+    def normalize_symbol(self, symbol: str) -> str:
+        # BTC/USDT -> btc_usdt
+        return symbol.lower().replace('/', '_')
+
+    def depth_request(self, symbol: str, depth: int) -> Tuple[str, Optional[dict]]:
+        return f"{self.base_url}/v1/depth.do", {'symbol': self.normalize_symbol(symbol), 'size': depth}
+
+    async def fetch_symbols(self, session: aiohttp.ClientSession) -> Optional[Tuple[Set[str], Precision]]:
+        """獲取LBank交易所的交易對列表與精度，失敗時返回None"""
+        try:
+            url = f"{self.base_url}/v1/currencyPairs.do"
+            async with session.get(url) as response:
+                if response.status == 200:
+                    data = await response.json()
+                    symbols = set()
+
+                    # LBank API直接返回數組
+                    symbol_list = data if isinstance(data, list) else data.get('data', [])
+
+                    for symbol in symbol_list:
+                        # LBank格式：btc_usdt -> BTC/USDT
+                        if '_usdt' in symbol.lower():
+                            parts = symbol.upper().split('_')
+                            if len(parts) == 2:
+                                formatted_symbol = f"{parts[0]}/{parts[1]}"
+                                symbols.add(formatted_symbol)
+
+                    return symbols, await self._fetch_accuracy(session)
+                else:
+                    logger.error(f"LBank API請求失敗: {response.status}")
+                    return None
+        except Exception as e:
+            logger.error(f"獲取LBank交易對失敗: {e}")
+            return None
+
+    async def _fetch_accuracy(self, session: aiohttp.ClientSession) -> Precision:
+        """獲取LBank各交易對的價格/數量精度，失敗時返回空dict（使用預設的高精度）"""
+        try:
+            url = f"{self.base_url}/v2/accuracy.do"
+            async with session.get(url) as response:
+                if response.status != 200:
+                    logger.warning(f"LBank精度API請求失敗: {response.status}")
+                    return {}
+                data = await response.json(content_type=None)
+                precision: Dict[str, Dict[str, int]] = {}
+                # 格式: {"result": "true", "data": [{"symbol": "btc_usdt", "priceAccuracy": "2", "quantityAccuracy": "4"}, ...]}
+                for item in data.get('data') or []:
+                    parts = str(item.get('symbol', '')).upper().split('_')
+                    if len(parts) == 2:
+                        precision[f"{parts[0]}/{parts[1]}"] = {
+                            'price_precision': int(item['priceAccuracy']),
+                            'quantity_precision': int(item['quantityAccuracy'])
+                        }
+                return precision
+        except Exception as e:
+            logger.warning(f"獲取LBank精度失敗: {e}")
+            return {}
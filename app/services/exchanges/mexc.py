@@ -0,0 +1,78 @@
+import logging
+from decimal import Decimal
+from typing import Dict, Optional, Set, Tuple
+
+import aiohttp
+
+from ..depth_decoders import MX_DECODER
+from .base import ExchangeAdapter, Precision
+
+logger = logging.getLogger(__name__)
+
+
+def contract_precision(contract_info: dict) -> Dict[str, float]:
+    """
+    合約的價格精度、以幣計的數量精度與合約面值
+    深度中的數量是張數（volScale位小數），乘以 contractSize 後才是幣的數量，
+    所以幣數量的精度為 volScale 加上面值的小數位數
+    """
+    contract_size = float(contract_info.get('contractSize') or 1)
+    size_decimals = max(0, -Decimal(str(contract_size)).normalize().as_tuple().exponent)
+    return {
+        'price_precision': contract_info.get('priceScale', 4),
+        'quantity_precision': contract_info.get('volScale', 0) + size_decimals,
+        'contract_size': contract_size,
+    }
+
+
+class MexcAdapter(ExchangeAdapter):
+    """MX合約交易所（深度數量為張數，解碼後按 contract_size 換算為幣的數量）"""
+
+    key = "mx"
+    name = "Mexc"
+    default_base_url = "https://contract.mexc.com"  # 合約API
+    ping_path = "/api/v1/contract/ping"
+    decoder = MX_DECODER
+    default_precision = {'price_precision': 4, 'quantity_precision': 0}
+    # 公開限額 20次/2秒
+    rate_limit = 8.0
+    rate_burst = 16.0
+    max_concurrency = 8
+
+    def normalize_symbol(self, symbol: str) -> str:
+        # 合約格式：BTC/USDT -> BTC_USDT
+        return symbol.replace('/', '_')
+
+    def depth_request(self, symbol: str, depth: int) -> Tuple[str, Optional[dict]]:
+        # 深度接口不支援指定檔數，由解碼器只截取需要的部分
+        return f"{self.base_url}/api/v1/contract/depth/{self.normalize_symbol(symbol)}", None
+
+    async def fetch_symbols(self, session: aiohttp.ClientSession) -> Optional[Tuple[Set[str], Precision]]:
+        """獲取MX合約交易所的交易對列表與精度，失敗時返回None"""
+        try:
+            url = f"{self.base_url}/api/v1/contract/detail"
+            async with session.get(url) as response:
+                if response.status == 200:
+                    data = await response.json()
+                    symbols = set()
+                    precision: Dict[str, Dict[str, int]] = {}
+
+                    # 合約API返回格式: {"success": true, "code": 0, "data": [...]}
+                    if data.get('success') and data.get('data'):
+                        for contract_info in data['data']:
+                            symbol = contract_info.get('symbol', '')
+                            # 合約格式：BTC_USDT，轉換為 BTC/USDT
+                            if '_USDT' in symbol:
+                                formatted_symbol = symbol.replace('_', '/')
+                                symbols.add(formatted_symbol)
+
+                                # 保存精度與合約面值（合約價格通常是4位小數）
+                                precision[formatted_symbol] = contract_precision(contract_info)
+
+                    return symbols, precision
+                else:
+                    logger.error(f"MX合約API請求失敗: {response.status}")
+                    return None
+        except Exception as e:
+            logger.error(f"獲取MX合約交易對失敗: {e}")
+            return None
@@ -0,0 +1,149 @@
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from .cadence_controller import CadenceController
+
+logger = logging.getLogger(__name__)
+
+Pair = Tuple[str, str]  # (MX交易對, LBank交易對)
+
+
+def pair_key(pair: Pair) -> str:
+    """交易對組合的識別字串：兩邊相同時為交易對本身，否則為 MX交易對|LBank交易對"""
+    mx_symbol, lbank_symbol = pair
+    return mx_symbol if mx_symbol == lbank_symbol else f"{mx_symbol}|{lbank_symbol}"
+
+
+class Feed:
+    """一條抓取管線：一個交易對組合的抓取任務與訂閱者計數"""
+
+    def __init__(self, pair: Pair):
+        self.pair = pair
+        self.refs: int = 0
+        self.task: Optional[asyncio.Task] = None
+        self.cadence: Optional[CadenceController] = None  # 管線自己的輪詢間隔控制
+        self.started_at = time.monotonic()
+        self.released_at: Optional[float] = None  # 最後一個訂閱者離開的時間
+        self.ticks: int = 0
+        self._expire: Optional[asyncio.TimerHandle] = None
+
+    @property
+    def key(self) -> str:
+        return pair_key(self.pair)
+
+    def get_stats(self) -> dict:
+        return {
+            "mx_symbol": self.pair[0],
+            "lbank_symbol": self.pair[1],
+            "subscribers": self.refs,
+            "running_seconds": round(time.monotonic() - self.started_at, 1),
+            "idle_seconds": round(time.monotonic() - self.released_at, 1) if self.released_at else None,
+            "ticks": self.ticks,
+            "interval": self.cadence.interval if self.cadence else None,
+        }
+
+
+class FeedRegistry:
+    """
+    抓取管線登記表
+    每個不同的 (MX交易對, LBank交易對) 只運行一條管線，不論有多少訂閱者；
+    以引用計數管理，最後一個訂閱者離開後等待寬限期才停止，期間重新訂閱直接沿用
+    """
+
+    def __init__(
+        self,
+        run_feed: Callable[[Feed], Awaitable[None]],
+        grace_period: float = 30.0,
+        max_feeds: int = 50,
+        on_change: Optional[Callable[[], None]] = None
+    ):
+        self.run_feed = run_feed
+        self.grace_period = grace_period
+        self.max_feeds = max_feeds  # 同時運行的管線上限，避免訂閱過多交易對造成請求量失控
+        self.on_change = on_change  # 管線啟動/停止後的回呼（例如重新分配請求預算）
+        self.feeds: Dict[Pair, Feed] = {}
+        self.started_count: int = 0
+        self.stopped_count: int = 0
+
+    def acquire(self, pair: Pair) -> Feed:
+        """增加一個訂閱者，沒有對應管線時啟動；超過上限時拋出ValueError"""
+        feed = self.feeds.get(pair)
+        if feed is None:
+            if len(self.feeds) >= self.max_feeds:
+                raise ValueError(f"同時監控的交易對組合已達上限 {self.max_feeds}")
+            feed = Feed(pair)
+            feed.task = asyncio.create_task(self.run_feed(feed))
+            self.feeds[pair] = feed
+            self.started_count += 1
+            logger.info(f"啟動抓取管線: MX={pair[0]}, LBank={pair[1]}，目前管線數: {len(self.feeds)}")
+            self._changed()
+        elif feed._expire is not None:
+            # 寬限期內重新訂閱
+            feed._expire.cancel()
+            feed._expire = None
+            feed.released_at = None
+        feed.refs += 1
+        return feed
+
+    def release(self, pair: Pair):
+        """減少一個訂閱者，歸零後寬限期結束才停止管線"""
+        feed = self.feeds.get(pair)
+        if feed is None or feed.refs <= 0:
+            return
+        feed.refs -= 1
+        if feed.refs == 0:
+            feed.released_at = time.monotonic()
+            if self.grace_period > 0:
+                feed._expire = asyncio.get_running_loop().call_later(self.grace_period, self._stop, pair)
+            else:
+                self._stop(pair)
+
+    def _stop(self, pair: Pair):
+        feed = self.feeds.get(pair)
+        if feed is None or feed.refs > 0:
+            return
+        del self.feeds[pair]
+        if feed.task and not feed.task.done():
+            feed.task.cancel()
+        self.stopped_count += 1
+        logger.info(f"停止抓取管線: MX={pair[0]}, LBank={pair[1]}，目前管線數: {len(self.feeds)}")
+        self._changed()
+
+    def _changed(self):
+        if self.on_change:
+            try:
+                self.on_change()
+            except Exception as e:
+                logger.error(f"管線變更回呼失敗: {e}")
+
+    def get(self, pair: Pair) -> Optional[Feed]:
+        return self.feeds.get(pair)
+
+    def symbols(self) -> Tuple[set, set]:
+        """目前所有管線使用的 (MX交易對, LBank交易對) 集合"""
+        return {pair[0] for pair in self.feeds}, {pair[1] for pair in self.feeds}
+
+    async def close(self):
+        tasks = []
+        for feed in self.feeds.values():
+            if feed._expire is not None:
+                feed._expire.cancel()
+            if feed.task and not feed.task.done():
+                feed.task.cancel()
+                tasks.append(feed.task)
+        self.feeds.clear()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def get_stats(self) -> dict:
+        feeds: List[dict] = [feed.get_stats() for feed in self.feeds.values()]
+        return {
+            "feeds": len(feeds),
+            "subscribers": sum(feed["subscribers"] for feed in feeds),
+            "grace_period_seconds": self.grace_period,
+            "max_feeds": self.max_feeds,
+            "started": self.started_count,
+            "stopped": self.stopped_count,
+            "pipelines": feeds,
+        }
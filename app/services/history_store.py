@@ -0,0 +1,581 @@
+import asyncio
+import logging
+import os
+import re
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from ..models.market_data import SpreadData
+
+logger = logging.getLogger(__name__)
+
+# 原始價差點（固定長度記錄）
+RAW_DTYPE = np.dtype([
+    ('ts', '<f8'),
+    ('spread', '<f8'),
+    ('spread_percentage', '<f8'),
+    ('buy_price', '<f8'),
+    ('sell_price', '<f8'),
+])
+
+# 聚合記錄：每個時間桶的 spread_percentage 最小/最大/最後值與最後價差
+ROLLUP_DTYPE = np.dtype([
+    ('ts', '<f8'),
+    ('min', '<f8'),
+    ('max', '<f8'),
+    ('last', '<f8'),
+    ('last_spread', '<f8'),
+    ('count', '<u8'),
+])
+
+# 聚合層級（秒）-> 每個檔案段的記錄數
+ROLLUP_LEVELS: Dict[int, int] = {1: 3600, 60: 1440, 3600: 720}
+RAW_SEGMENT_CAPACITY = 4096
+
+# 查詢用的一致視圖：[(檔案段, 已公開的記錄數)] 與尚未寫入磁碟的記錄
+StoreView = Tuple[List[Tuple["SegmentFile", int]], List[np.ndarray]]
+
+
+class SegmentFile:
+    """
+    固定記錄長度、只追加的檔案段
+    檔頭16位元組：8位元組魔數 + 8位元組記錄數
+
+    不常駐開啟任何檔案描述符：追加時開檔寫入即關閉，查詢時建立唯讀記憶體映射、讀完即釋放；
+    記錄數與首尾時間戳保存在記憶體中。append() 在寫入執行緒執行，寫入的記錄由 commit() 公開給查詢
+    """
+
+    MAGIC = b'LBMXSEG1'
+    HEADER_SIZE = 16
+
+    def __init__(self, path: str, dtype: np.dtype, capacity: int):
+        self.path = path
+        self.dtype = dtype
+        self.capacity = capacity
+        self.count = 0  # 已公開給查詢的記錄數
+        self.written = 0  # 已寫入檔案的記錄數
+        self.first_ts: Optional[float] = None
+        self.last_ts: Optional[float] = None
+        self._written_last_ts: Optional[float] = None
+
+        if not os.path.exists(path):
+            with open(path, 'wb') as f:
+                f.write(self.MAGIC + np.uint64(0).tobytes())
+                f.truncate(self.HEADER_SIZE + dtype.itemsize * capacity)
+            return
+
+        with open(path, 'rb') as f:
+            header = f.read(self.HEADER_SIZE)
+            if len(header) != self.HEADER_SIZE or header[:8] != self.MAGIC:
+                raise ValueError(f"無效的歷史檔案: {path}")
+            self.capacity = (os.path.getsize(path) - self.HEADER_SIZE) // dtype.itemsize
+            self.count = self.written = min(int(np.frombuffer(header[8:], dtype='<u8')[0]), self.capacity)
+            if self.count:
+                self.first_ts = self._read_ts(f, 0)
+                self.last_ts = self._written_last_ts = self._read_ts(f, self.count - 1)
+
+    def _read_ts(self, f, index: int) -> float:
+        f.seek(self.HEADER_SIZE + index * self.dtype.itemsize + self.dtype.fields['ts'][1])
+        return float(np.frombuffer(f.read(8), dtype='<f8')[0])
+
+    @property
+    def full(self) -> bool:
+        return self.written >= self.capacity
+
+    def append(self, records: np.ndarray) -> int:
+        """追加記錄，返回實際寫入的數量（檔案段已滿時少於輸入）；先寫記錄再更新檔頭記錄數"""
+        count = self.written
+        written = min(len(records), self.capacity - count)
+        if written > 0:
+            with open(self.path, 'r+b') as f:
+                f.seek(self.HEADER_SIZE + count * self.dtype.itemsize)
+                f.write(np.ascontiguousarray(records[:written], dtype=self.dtype).tobytes())
+                f.seek(8)
+                f.write(np.uint64(count + written).tobytes())
+            self.written = count + written
+            if self.first_ts is None:
+                self.first_ts = float(records['ts'][0])
+            self._written_last_ts = float(records['ts'][written - 1])
+        return written
+
+    def commit(self):
+        """公開已寫入的記錄（由 SegmentStore 在鎖內呼叫）"""
+        self.count = self.written
+        self.last_ts = self._written_last_ts
+
+    def read(self, start: float, end: float, count: Optional[int] = None) -> np.ndarray:
+        """讀取時間範圍內的前count筆記錄（時間戳遞增，以二分搜尋定位），count預設為已公開的記錄數"""
+        count = self.count if count is None else count
+        if not count or self.last_ts < start or self.first_ts > end:
+            return np.zeros(0, dtype=self.dtype)
+        try:
+            records = np.memmap(self.path, dtype=self.dtype, mode='r', offset=self.HEADER_SIZE, shape=(count,))
+        except FileNotFoundError:
+            # 查詢期間被保留策略刪除
+            return np.zeros(0, dtype=self.dtype)
+        try:
+            ts = records['ts']
+            lo = int(np.searchsorted(ts, start, side='left'))
+            hi = int(np.searchsorted(ts, end, side='right'))
+            return np.array(records[lo:hi])
+        finally:
+            # 只複製出需要的記錄，映射隨引用釋放而關閉
+            del records
+
+
+class SegmentStore:
+    """
+    一個序列在某一層級的所有檔案段，寫滿後滾動到新檔案
+    追加的記錄先留在記憶體（pending，事件循環），take() 移到 writing 後由 write() 在寫入執行緒批次寫入；
+    寫完才在鎖內同時公開新的記錄數並清空 writing，查詢執行緒以 view() 取得的視圖讀取，不會重複或遺漏
+    """
+
+    def __init__(self, directory: str, dtype: np.dtype, segment_capacity: int):
+        self.directory = directory
+        self.dtype = dtype
+        self.segment_capacity = segment_capacity
+        self.pending: List[np.ndarray] = []
+        self.writing: List[np.ndarray] = []
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+        self.segments: List[SegmentFile] = []
+        for name in sorted(os.listdir(directory), key=lambda n: int(n.split('.')[0]) if n[0].isdigit() else 0):
+            if name.endswith('.seg'):
+                try:
+                    self.segments.append(SegmentFile(os.path.join(directory, name), dtype, segment_capacity))
+                except ValueError as e:
+                    logger.error(str(e))
+
+    @property
+    def last_ts(self) -> Optional[float]:
+        if self.pending:
+            return float(self.pending[-1]['ts'][-1])
+        for segment in reversed(self.segments):
+            if segment.count:
+                return segment.last_ts
+        return None
+
+    def append(self, records: np.ndarray):
+        if len(records):
+            self.pending.append(records)
+
+    def view(self) -> StoreView:
+        """（事件循環）目前的一致視圖，供查詢執行緒讀取"""
+        with self.lock:
+            segments = [(segment, segment.count) for segment in self.segments]
+            memory = self.writing + self.pending
+        return segments, memory
+
+    def read(self, start: float, end: float, view: Optional[StoreView] = None) -> np.ndarray:
+        segments, memory = view or self.view()
+        parts = [segment.read(start, end, count) for segment, count in segments]
+        for records in memory:
+            ts = records['ts']
+            parts.append(records[(ts >= start) & (ts <= end)])
+        parts = [part for part in parts if len(part)]
+        if not parts:
+            return np.zeros(0, dtype=self.dtype)
+        return np.concatenate(parts)
+
+    def take(self):
+        """（事件循環）把待寫入的記錄交給下一次 write()；上次寫入失敗的記錄保留重試"""
+        if self.pending:
+            with self.lock:
+                self.writing = self.writing + self.pending
+            self.pending = []
+
+    def write(self):
+        """（寫入執行緒）把 writing 寫入檔案段，寫滿時滾動到新檔案"""
+        if not self.writing:
+            return
+        records = np.concatenate(self.writing) if len(self.writing) > 1 else self.writing[0]
+        segments = list(self.segments)
+        touched = []
+        while len(records):
+            if not segments or segments[-1].full:
+                name = f"{int(records['ts'][0] * 1000)}.seg"
+                segments.append(SegmentFile(os.path.join(self.directory, name), self.dtype, self.segment_capacity))
+            written = segments[-1].append(records)
+            touched.append(segments[-1])
+            records = records[written:]
+        with self.lock:
+            for segment in touched:
+                segment.commit()
+            self.segments = segments
+            self.writing = []
+
+    def flush(self):
+        self.take()
+        self.write()
+
+    def discard(self, paths: set):
+        """移除已被保留策略刪除的檔案段"""
+        with self.lock:
+            self.segments = [segment for segment in self.segments if segment.path not in paths]
+
+
+class RollupLevel:
+    """增量聚合：每個新點只更新目前時間桶，時間桶結束時寫入檔案段"""
+
+    def __init__(self, interval: int, store: SegmentStore):
+        self.interval = interval
+        self.store = store
+        self.current: Optional[np.ndarray] = None  # 尚未結束的時間桶
+
+    def add(self, ts: float, spread_percentage: float, spread: float):
+        bucket = ts - ts % self.interval
+        current = self.current
+        if current is not None and current['ts'] == bucket:
+            current['min'] = min(current['min'], spread_percentage)
+            current['max'] = max(current['max'], spread_percentage)
+            current['last'] = spread_percentage
+            current['last_spread'] = spread
+            current['count'] += 1
+            return
+
+        if current is not None:
+            self.store.append(current.reshape(1))
+        self.current = np.array(
+            (bucket, spread_percentage, spread_percentage, spread_percentage, spread, 1), dtype=ROLLUP_DTYPE
+        )
+
+    def view(self) -> Tuple[StoreView, Optional[np.ndarray]]:
+        """（事件循環）檔案段視圖與目前時間桶的複本"""
+        return self.store.view(), None if self.current is None else self.current.copy()
+
+    def read(self, start: float, end: float, view: Optional[Tuple[StoreView, Optional[np.ndarray]]] = None) -> np.ndarray:
+        store_view, current = view or self.view()
+        records = self.store.read(start, end, store_view)
+        if current is not None and start <= current['ts'] <= end:
+            records = np.concatenate([records, current.reshape(1)])
+        return records
+
+
+class SeriesView:
+    """查詢用的快照：在事件循環上取得，之後在查詢執行緒讀取，不再碰觸會被寫入的狀態"""
+
+    __slots__ = ("recent", "unflushed", "raw", "levels")
+
+    def __init__(self, recent: np.ndarray, unflushed: int, raw: StoreView,
+                 levels: Dict[int, Tuple[StoreView, Optional[np.ndarray]]]):
+        self.recent = recent
+        self.unflushed = unflushed
+        self.raw = raw
+        self.levels = levels
+
+
+class SpreadSeries:
+    """
+    單一 (交易對, 模式) 的價差歷史：記憶體環形緩衝 + 磁碟檔案段 + 多層聚合
+    add/take/view 在事件循環上執行，write/query 在執行緒中執行（query 只讀 view 的快照）
+    """
+
+    def __init__(self, directory: str, ring_capacity: int):
+        self.ring = np.zeros(ring_capacity, dtype=RAW_DTYPE)
+        self.ring_capacity = ring_capacity
+        self.head = 0  # 下一個寫入位置
+        self.size = 0
+        self.unflushed = 0  # 環形緩衝中尚未寫入磁碟的點數
+
+        self.raw = SegmentStore(os.path.join(directory, 'raw'), RAW_DTYPE, RAW_SEGMENT_CAPACITY)
+        self.levels: Dict[int, RollupLevel] = {
+            interval: RollupLevel(
+                interval, SegmentStore(os.path.join(directory, f'{interval}s'), ROLLUP_DTYPE, capacity)
+            )
+            for interval, capacity in ROLLUP_LEVELS.items()
+        }
+        self.last_ts = self.raw.last_ts or 0.0
+
+    def add(self, ts: float, spread: float, spread_percentage: float, buy_price: float, sell_price: float) -> bool:
+        """追加一個點，時間戳不大於最後一點時（重複或亂序）忽略並返回False"""
+        if ts <= self.last_ts:
+            return False
+        self.last_ts = ts
+
+        self.ring[self.head] = (ts, spread, spread_percentage, buy_price, sell_price)
+        self.head = (self.head + 1) % self.ring_capacity
+        self.size = min(self.size + 1, self.ring_capacity)
+        self.unflushed += 1
+
+        for level in self.levels.values():
+            level.add(ts, spread_percentage, spread)
+
+        if self.unflushed >= self.ring_capacity // 2:
+            # 只移到待寫入的記憶體列表，避免環形緩衝覆蓋尚未寫入的點；磁碟寫入由背景執行緒完成
+            self._stage()
+        return True
+
+    def _ring_tail(self, count: int) -> np.ndarray:
+        """環形緩衝中最新的count個點（依時間排序）"""
+        count = min(count, self.size)
+        start = (self.head - count) % self.ring_capacity
+        if start + count <= self.ring_capacity:
+            return self.ring[start:start + count]
+        return np.concatenate([self.ring[start:], self.ring[:self.head]])
+
+    def _stage(self):
+        if self.unflushed:
+            self.raw.append(self._ring_tail(self.unflushed).copy())
+            self.unflushed = 0
+
+    def close_buckets(self):
+        """把尚未結束的聚合時間桶也列入待寫入（關閉前呼叫）"""
+        for level in self.levels.values():
+            if level.current is not None:
+                level.store.append(level.current.reshape(1))
+                level.current = None
+
+    def take(self):
+        """（事件循環）把環形緩衝中未寫入的點與聚合記錄交給下一次 write()"""
+        self._stage()
+        self.raw.take()
+        for level in self.levels.values():
+            level.store.take()
+
+    def write(self):
+        """（寫入執行緒）批次寫入磁碟"""
+        self.raw.write()
+        for level in self.levels.values():
+            level.store.write()
+
+    def flush(self):
+        self.take()
+        self.write()
+
+    def discard(self, paths: set):
+        self.raw.discard(paths)
+        for level in self.levels.values():
+            level.store.discard(paths)
+
+    def view(self) -> SeriesView:
+        """（事件循環）複製環形緩衝並取得各層級檔案段的視圖"""
+        return SeriesView(
+            self._ring_tail(self.size).copy(), self.unflushed, self.raw.view(),
+            {interval: level.view() for interval, level in self.levels.items()}
+        )
+
+    def read_raw(self, start: float, end: float, view: SeriesView) -> np.ndarray:
+        recent = view.recent
+        if len(recent) and recent['ts'][0] <= start:
+            # 整個範圍都在記憶體中
+            mask = (recent['ts'] >= start) & (recent['ts'] <= end)
+            return recent[mask]
+
+        unflushed = recent[len(recent) - view.unflushed:]
+        unflushed = unflushed[(unflushed['ts'] >= start) & (unflushed['ts'] <= end)]
+        return np.concatenate([self.raw.read(start, end, view.raw), unflushed])
+
+    def query(self, start: float, end: float, resolution: float, view: Optional[SeriesView] = None) -> dict:
+        """
+        查詢時間範圍，按resolution秒降採樣（min/max/last）
+        使用不超過resolution的最粗聚合層級，不掃描原始點；view 未指定時在呼叫端取得（只限事件循環上呼叫）
+        """
+        view = view or self.view()
+        level_interval = max((interval for interval in self.levels if interval <= resolution), default=0)
+        if level_interval:
+            # 包含start所在的時間桶
+            records = self.levels[level_interval].read(
+                start - start % level_interval, end, view.levels[level_interval]
+            )
+            ts, lows, highs = records['ts'], records['min'], records['max']
+            lasts, last_spreads = records['last'], records['last_spread']
+        else:
+            records = self.read_raw(start, end, view)
+            ts = records['ts']
+            lows = highs = lasts = records['spread_percentage']
+            last_spreads = records['spread']
+
+        if resolution and len(ts):
+            # 以 reduceat 把同一目標時間桶的聚合記錄合併（重啟前後寫入的同一時間桶也在此合併）
+            buckets = np.floor(ts / resolution)
+            starts = np.flatnonzero(np.concatenate(([True], buckets[1:] != buckets[:-1])))
+            ends = np.append(starts[1:], len(ts)) - 1
+            ts = buckets[starts] * resolution
+            lows = np.minimum.reduceat(lows, starts)
+            highs = np.maximum.reduceat(highs, starts)
+            lasts = lasts[ends]
+            last_spreads = last_spreads[ends]
+
+        return {
+            "resolution": resolution,
+            "source": f"{level_interval}s" if level_interval else "raw",
+            "t": ts.tolist(),
+            "min": lows.tolist(),
+            "max": highs.tolist(),
+            "last": lasts.tolist(),
+            "last_spread": last_spreads.tolist(),
+        }
+
+
+class HistoryStore:
+    """
+    價差歷史儲存，按 (交易對組合, 模式) 分開保存
+    交易對組合以抓取管線的key識別（兩邊交易對相同時即交易對本身，自選模式為 "MX交易對|LBank交易對"），
+    不同的組合即使MX交易對相同也不會寫進同一個序列
+    max_age（秒）/ max_bytes 設定時定期刪除過舊的檔案段，每個目錄最新（仍在寫入）的檔案段不刪除
+    記錄只寫入記憶體；磁碟寫入、保留策略與查詢都以 asyncio.to_thread 執行，不阻塞事件循環
+    """
+
+    def __init__(self, base_dir: str, ring_capacity: int = 3600, flush_interval: float = 5.0,
+                 max_age: Optional[float] = None, max_bytes: Optional[int] = None,
+                 retention_interval: float = 60.0):
+        self.base_dir = base_dir
+        self.ring_capacity = ring_capacity
+        self.flush_interval = flush_interval
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        self.retention_interval = retention_interval
+        self.series: Dict[Tuple[str, str], SpreadSeries] = {}
+        self.deleted_segments: int = 0
+        self._last_retention: float = 0.0
+        self._task: Optional[asyncio.Task] = None
+        self._io: Optional[asyncio.Future] = None  # 進行中的寫入或保留策略
+
+    def _directory(self, key: str, mode: str) -> str:
+        # 交易對與模式來自外部輸入，只保留安全字元作為目錄名；組合的兩邊以+連接
+        name = '+'.join(re.sub(r'[^A-Za-z0-9_-]', '_', part) for part in key.split('|'))
+        return os.path.join(self.base_dir, name, re.sub(r'[^A-Za-z0-9_-]', '_', mode))
+
+    def _series(self, key: str, mode: str) -> SpreadSeries:
+        series = self.series.get((key, mode))
+        if series is None:
+            series = SpreadSeries(self._directory(key, mode), self.ring_capacity)
+            self.series[(key, mode)] = series
+        return series
+
+    def record(self, spread_data: SpreadData, key: Optional[str] = None):
+        """記錄一筆價差，key為交易對組合（預設為價差的交易對）"""
+        try:
+            self._series(key or spread_data.symbol, spread_data.mode).add(
+                spread_data.timestamp.timestamp(),
+                spread_data.spread,
+                spread_data.spread_percentage,
+                spread_data.buy_price,
+                spread_data.sell_price
+            )
+        except Exception as e:
+            logger.error(f"記錄價差歷史失敗: {e}")
+
+    async def query(self, key: str, mode: str, start: float, end: float,
+                    resolution: Optional[float] = None, max_points: int = 600) -> dict:
+        """
+        查詢價差歷史：在事件循環上取得記憶體快照，讀檔與降採樣在執行緒中完成
+
+        Args:
+            start, end: 時間範圍（epoch秒）
+            resolution: 降採樣間隔（秒），未指定時依max_points自動選擇
+        """
+        if resolution is None:
+            resolution = max((end - start) / max_points, 0.0)
+        series = self.series.get((key, mode))
+        if series is None:
+            directory = self._directory(key, mode)
+            if not await asyncio.to_thread(os.path.isdir, directory):
+                return {"resolution": resolution, "source": None, "t": [], "min": [], "max": [], "last": [], "last_spread": []}
+            # 載入既有的檔案段（讀檔頭）也在執行緒中；期間被 record 建立時沿用已建立的序列
+            loaded = await asyncio.to_thread(SpreadSeries, directory, self.ring_capacity)
+            series = self.series.setdefault((key, mode), loaded)
+        return await asyncio.to_thread(series.query, start, end, resolution, series.view())
+
+    def flush(self):
+        """同步寫入所有序列（沒有背景寫入進行時呼叫）"""
+        for series in list(self.series.values()):
+            series.flush()
+
+    def _write(self, series: List[SpreadSeries]):
+        for item in series:
+            try:
+                item.write()
+            except Exception as e:
+                logger.error(f"寫入價差歷史失敗: {e}")
+
+    async def _run_io(self, func, *args):
+        """在執行緒中執行磁碟I/O；被取消時執行緒仍會完成，close() 會等它結束"""
+        self._io = asyncio.ensure_future(asyncio.to_thread(func, *args))
+        return await asyncio.shield(self._io)
+
+    def apply_retention(self, now: Optional[float] = None) -> int:
+        """
+        按 max_age / max_bytes 刪除舊檔案段，返回刪除數量
+        檔案名為首筆記錄的毫秒時間戳，所以一個檔案段的記錄都早於同目錄下一個檔案段的開始時間，
+        不需要開啟檔案即可判斷是否過期
+        """
+        if not self.max_age and not self.max_bytes:
+            return 0
+        now = time.time() if now is None else now
+
+        # (下一個檔案段的開始時間, 大小, 路徑)，每個目錄的最新檔案段不列入
+        candidates: List[Tuple[float, int, str]] = []
+        total = 0
+        for directory, _, names in os.walk(self.base_dir):
+            segments = sorted(
+                (int(name[:-4]), name) for name in names if name.endswith('.seg') and name[:-4].isdigit()
+            )
+            for index, (_, name) in enumerate(segments):
+                size = os.path.getsize(os.path.join(directory, name))
+                total += size
+                if index + 1 < len(segments):
+                    candidates.append((segments[index + 1][0] / 1000, size, os.path.join(directory, name)))
+
+        candidates.sort()
+        deleted = set()
+        for next_start, size, path in candidates:
+            expired = bool(self.max_age) and next_start < now - self.max_age
+            oversized = bool(self.max_bytes) and total > self.max_bytes
+            if not expired and not oversized:
+                break
+            try:
+                os.remove(path)
+            except OSError as e:
+                logger.error(f"刪除價差歷史檔案失敗 {path}: {e}")
+                continue
+            deleted.add(path)
+            total -= size
+
+        if deleted:
+            # 在執行緒中執行時序列字典可能同時新增項目，先複製
+            for series in list(self.series.values()):
+                series.discard(deleted)
+            self.deleted_segments += len(deleted)
+            logger.info(f"價差歷史保留策略刪除了 {len(deleted)} 個檔案段，剩餘 {total / 1048576:.1f} MB")
+        return len(deleted)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._flush_loop())
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                # 待寫入的資料在事件循環上交出，寫檔在執行緒中
+                series = list(self.series.values())
+                for item in series:
+                    item.take()
+                await self._run_io(self._write, series)
+            except Exception as e:
+                logger.error(f"寫入價差歷史失敗: {e}")
+            if time.monotonic() - self._last_retention >= self.retention_interval:
+                self._last_retention = time.monotonic()
+                try:
+                    await self._run_io(self.apply_retention)
+                except Exception as e:
+                    logger.error(f"執行價差歷史保留策略失敗: {e}")
+
+    async def close(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        if self._io is not None:
+            # 等進行中的寫入完成，才能安全地交出剩餘資料
+            await asyncio.gather(self._io, return_exceptions=True)
+            self._io = None
+        series = list(self.series.values())
+        for item in series:
+            item.close_buckets()
+            item.take()
+        await asyncio.to_thread(self._write, series)
@@ -0,0 +1,193 @@
+"""
+事件循環診斷
+
+SamplingProfiler：背景執行緒定期讀取事件循環執行緒的呼叫堆疊並計數，輸出 collapsed stacks
+（每行「frame;frame;... 次數」，可直接交給 flamegraph.pl / speedscope）
+LoopWatchdog：事件循環定期更新心跳，監視執行緒發現心跳停滯超過門檻時，
+當場擷取事件循環執行緒的堆疊並記錄，找出阻塞事件循環的回調
+"""
+
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Deque, Dict, List, Optional
+
+from .metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+SLOW_CALLBACKS = REGISTRY.counter("lbmx_slow_callbacks", "Event loop stalls longer than the watchdog threshold")
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    path = code.co_filename
+    directory, filename = os.path.split(path)
+    return f"{os.path.basename(directory)}/{filename}:{code.co_name}"
+
+
+def collapse_stack(frame) -> str:
+    """把堆疊轉為 collapsed 格式（最外層在前，以分號分隔）"""
+    labels: List[str] = []
+    while frame is not None:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    labels.reverse()
+    return ";".join(labels)
+
+
+class SamplingProfiler:
+    """
+    對單一執行緒（事件循環）做定時取樣的分析器
+    只在執行期間有一個取樣執行緒，每次取樣為一次 sys._current_frames() 與堆疊走訪，預設每5毫秒一次
+    """
+
+    def __init__(self):
+        self.target_thread: Optional[int] = None
+        self.interval: float = 0.005
+        self.samples: Dict[str, int] = {}
+        self.sample_count: int = 0
+        self.started_at: Optional[float] = None
+        self.stopped_at: Optional[float] = None
+        self.duration: float = 0.0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, seconds: float, interval: float = 0.005, target_thread: Optional[int] = None):
+        """
+        開始取樣 seconds 秒（到時自動停止），上一次的結果會被清除
+
+        Raises:
+            RuntimeError: 已在執行中
+        """
+        if self.running:
+            raise RuntimeError("分析器已在執行中")
+        self.target_thread = target_thread or threading.get_ident()
+        self.interval = interval
+        self.duration = seconds
+        self.samples = {}
+        self.sample_count = 0
+        self.started_at = time.time()
+        self.stopped_at = None
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(seconds,), name="loop-profiler", daemon=True)
+        self._thread.start()
+        logger.info(f"開始取樣分析 {seconds}s，間隔 {interval * 1000:.1f}ms")
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+
+    def _run(self, seconds: float):
+        deadline = time.monotonic() + seconds
+        target = self.target_thread
+        samples = self.samples
+        while not self._stop.wait(self.interval) and time.monotonic() < deadline:
+            frame = sys._current_frames().get(target)
+            if frame is None:
+                break
+            stack = collapse_stack(frame)
+            del frame
+            samples[stack] = samples.get(stack, 0) + 1
+            self.sample_count += 1
+        self.stopped_at = time.time()
+        logger.info(f"取樣分析結束，共 {self.sample_count} 個樣本，{len(samples)} 種堆疊")
+
+    def collapsed(self) -> str:
+        """collapsed stacks 文字（依次數由多到少）"""
+        items = sorted(self.samples.items(), key=lambda item: item[1], reverse=True)
+        return "".join(f"{stack} {count}\n" for stack, count in items)
+
+    def get_stats(self) -> dict:
+        return {
+            "running": self.running,
+            "started_at": self.started_at,
+            "stopped_at": self.stopped_at,
+            "duration_seconds": self.duration,
+            "interval_ms": self.interval * 1000,
+            "samples": self.sample_count,
+            "distinct_stacks": len(self.samples),
+        }
+
+
+class LoopWatchdog:
+    """
+    慢回調偵測：事件循環每 threshold/4 秒更新一次心跳；
+    監視執行緒發現心跳超過 threshold 未更新時，擷取事件循環執行緒當下的堆疊並記錄（每次停滯只記錄一次）
+    """
+
+    def __init__(self, threshold: float = 0.1, max_events: int = 50):
+        self.threshold = threshold
+        self.events: Deque[dict] = deque(maxlen=max_events)
+        self.stalls: int = 0
+        self._beat = time.monotonic()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[int] = None
+        self._handle: Optional[asyncio.TimerHandle] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        """在事件循環中呼叫"""
+        if self.threshold <= 0 or self._thread is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self._beat = time.monotonic()
+        self._heartbeat()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._thread.start()
+        logger.info(f"慢回調偵測已啟動，門檻 {self.threshold * 1000:.0f}ms")
+
+    def stop(self):
+        self._stop.set()
+        if self._handle:
+            self._handle.cancel()
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+            self._thread = None
+
+    def _heartbeat(self):
+        self._beat = time.monotonic()
+        self._handle = self._loop.call_later(self.threshold / 4, self._heartbeat)
+
+    def _watch(self):
+        reported_beat = None
+        pending: Optional[dict] = None
+        while not self._stop.wait(self.threshold / 4):
+            beat = self._beat
+            if pending is not None and beat != reported_beat:
+                # 心跳恢復：補上整次停滯的長度
+                pending["total_ms"] = round(max(0.0, beat - reported_beat - self.threshold / 4) * 1000, 1)
+                pending = None
+            stalled = time.monotonic() - beat
+            if stalled < self.threshold or beat == reported_beat:
+                continue
+            reported_beat = beat
+            frame = sys._current_frames().get(self._loop_thread)
+            stack = "".join(traceback.format_stack(frame)) if frame is not None else ""
+            del frame
+            self.stalls += 1
+            SLOW_CALLBACKS.inc()
+            pending = {"at": time.time(), "stalled_ms": round(stalled * 1000, 1), "total_ms": None, "stack": stack}
+            self.events.append(pending)
+            logger.warning(f"事件循環被阻塞超過 {stalled * 1000:.0f}ms，目前堆疊:\n{stack}")
+
+    def get_stats(self) -> dict:
+        return {
+            "enabled": self._thread is not None,
+            "threshold_ms": self.threshold * 1000,
+            "stalls": self.stalls,
+            "recent": list(self.events),
+        }
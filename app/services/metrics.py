@@ -0,0 +1,198 @@
+import asyncio
+import logging
+import os
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 延遲分桶（秒）：50微秒到10秒
+LATENCY_BUCKETS = (
+    0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+    0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+Labels = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return "+Inf"
+    if isinstance(value, int) or float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, registry: "MetricsRegistry", name: str, help_text: str, labelnames: Sequence[str] = ()):
+        self.registry = registry
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(Metric):
+    """只增不減的計數器"""
+
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.values: Dict[Labels, float] = {}
+
+    def inc(self, labels: Labels = (), amount: float = 1):
+        if self.registry.enabled:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        for labels, value in self.values.items():
+            lines.append(f"{self.name}_total{_format_labels(self.labelnames, labels)} {_format_value(value)}")
+        return lines
+
+
+class Histogram(Metric):
+    """固定分桶直方圖，記錄時只做一次二分搜尋與計數，渲染時才累加"""
+
+    kind = "histogram"
+
+    def __init__(self, *args, buckets: Sequence[float] = LATENCY_BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(buckets)
+        # labels -> [各分桶計數..., +Inf計數, 總和, 次數]
+        self.values: Dict[Labels, list] = {}
+
+    def observe(self, value: float, labels: Labels = ()):
+        if not self.registry.enabled:
+            return
+        state = self.values.get(labels)
+        if state is None:
+            state = self.values[labels] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+        state[bisect_left(self.buckets, value)] += 1
+        state[-2] += value
+        state[-1] += 1
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        bounds = self.buckets + (float('inf'),)
+        for labels, state in self.values.items():
+            cumulative = 0
+            for bound, count in zip(bounds, state):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(state[-2])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {state[-1]}")
+        return lines
+
+
+class Gauge(Metric):
+    """
+    即時數值，渲染時呼叫callback取得 [(labels, value)]；
+    用於連接數、佇列長度等已經由其他元件維護的狀態
+    """
+
+    kind = "gauge"
+
+    def __init__(self, *args, callback: Optional[Callable[[], Iterable[Tuple[Labels, float]]]] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.callback = callback
+        self.values: Dict[Labels, float] = {}
+
+    def set(self, value: float, labels: Labels = ()):
+        if self.registry.enabled:
+            self.values[labels] = value
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        values = dict(self.values)
+        if self.callback:
+            try:
+                values.update(self.callback())
+            except Exception as e:
+                logger.error(f"指標 {self.name} 取值失敗: {e}")
+        for labels, value in values.items():
+            if value is not None:
+                lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}")
+        return lines
+
+
+class MetricsRegistry:
+    """指標註冊表，以Prometheus文字格式輸出"""
+
+    def __init__(self, enabled: bool = True, symbol_labels: bool = True):
+        self.enabled = enabled
+        self.symbol_labels = symbol_labels  # False時symbol標籤一律為空，避免大量交易對的高基數
+        self.metrics: Dict[str, Metric] = {}
+        self._lag_task: Optional[asyncio.Task] = None
+
+    def _get_or_create(self, cls, name: str, help_text: str, labelnames: Sequence[str], **kwargs):
+        metric = self.metrics.get(name)
+        if metric is None:
+            metric = cls(self, name, help_text, labelnames, **kwargs)
+            self.metrics[name] = metric
+        return metric
+
+    def counter(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._get_or_create(Counter, name, help_text, labelnames)
+
+    def histogram(self, name: str, help_text: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, help_text, labelnames, buckets=buckets)
+
+    def gauge(self, name: str, help_text: str, labelnames: Sequence[str] = (), callback=None) -> Gauge:
+        metric = self._get_or_create(Gauge, name, help_text, labelnames)
+        if callback is not None:
+            metric.callback = callback
+        return metric
+
+    def symbol(self, symbol: str) -> str:
+        return symbol if self.symbol_labels else ""
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self.metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def start_loop_lag_monitor(self, interval: float = 0.5):
+        """定期量測事件循環延遲（實際喚醒時間 - 預定喚醒時間）"""
+        if self._lag_task is None or self._lag_task.done():
+            self._lag_task = asyncio.create_task(self._loop_lag_monitor(interval))
+
+    async def _loop_lag_monitor(self, interval: float):
+        histogram = self.histogram(
+            "lbmx_event_loop_lag_seconds", "Event loop wake-up delay beyond the scheduled sleep"
+        )
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(interval)
+            histogram.observe(max(0.0, time.perf_counter() - started - interval))
+
+    def stop(self):
+        if self._lag_task and not self._lag_task.done():
+            self._lag_task.cancel()
+
+
+# 全域註冊表（METRICS_ENABLED=0 時記錄操作為空操作）
+REGISTRY = MetricsRegistry(
+    enabled=os.environ.get("METRICS_ENABLED", "1") != "0",
+    symbol_labels=os.environ.get("METRICS_SYMBOL_LABELS", "1") != "0"
+)
@@ -0,0 +1,376 @@
+import asyncio
+import heapq
+import logging
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, Tuple, TYPE_CHECKING
+
+from ..models.compact_orderbook import CompactOrderBook
+from ..models.market_data import OrderBook, SpreadData
+
+if TYPE_CHECKING:
+    from .compute_pool import ComputePool
+    from .exchange_service import ExchangeService
+
+logger = logging.getLogger(__name__)
+
+# 刷新完成回調: (symbol, 交易所代號 -> 訂單簿)
+UpdateCallback = Callable[[str, Dict[str, Optional[OrderBook]]], Awaitable[None]]
+# 計算進程池完成回調: (symbol, 交易所代號 -> 訂單簿, 模式 -> 價差)
+ComputedCallback = Callable[[str, Dict[str, Optional[CompactOrderBook]], Dict[str, SpreadData]], Awaitable[None]]
+
+
+class TokenBucket:
+    """令牌桶限流器"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate  # 每秒補充的令牌數
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    async def acquire(self):
+        """取得一個令牌，不足時等待"""
+        while True:
+            self._refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class ExchangeLimiter:
+    """單一交易所的並發上限、令牌桶限流與429/5xx退避"""
+
+    def __init__(self, exchange: str, rate: float, burst: float, concurrency: int,
+                 max_backoff: float = 60.0):
+        self.exchange = exchange
+        self.bucket = TokenBucket(rate, burst)
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.concurrency = concurrency
+        self.max_backoff = max_backoff
+        self.backoff: float = 0.0
+        self.paused_until: float = 0.0
+        self.in_flight: int = 0
+        self.requests: int = 0
+        self.throttled: int = 0  # HTTP 429
+        self.server_errors: int = 0  # HTTP 5xx
+
+    async def __aenter__(self):
+        await self.semaphore.acquire()
+        try:
+            while True:
+                delay = self.paused_until - time.monotonic()
+                if delay <= 0:
+                    break
+                await asyncio.sleep(delay)
+            await self.bucket.acquire()
+        except BaseException:
+            self.semaphore.release()
+            raise
+        self.in_flight += 1
+        self.requests += 1
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.in_flight -= 1
+        self.semaphore.release()
+
+    def report_status(self, status: int):
+        """根據HTTP狀態調整退避時間"""
+        if status == 429 or status >= 500:
+            if status == 429:
+                self.throttled += 1
+            else:
+                self.server_errors += 1
+            self.backoff = min(max(self.backoff * 2, 1.0), self.max_backoff)
+            self.paused_until = time.monotonic() + self.backoff
+            logger.warning(f"{self.exchange} 返回 {status}，暫停請求 {self.backoff:.1f} 秒")
+        elif status == 200 and self.backoff:
+            self.backoff = self.backoff / 2 if self.backoff > 1.0 else 0.0
+
+    def get_stats(self) -> dict:
+        return {
+            "rate_limit": self.bucket.rate,
+            "burst": self.bucket.capacity,
+            "concurrency": self.concurrency,
+            "in_flight": self.in_flight,
+            "requests": self.requests,
+            "throttled": self.throttled,
+            "server_errors": self.server_errors,
+            "backoff": self.backoff,
+            "paused": self.paused_until > time.monotonic(),
+        }
+
+
+class PollingTier:
+    """輪詢優先級（例如熱門交易對500ms，長尾10秒）"""
+
+    def __init__(self, name: str, interval: float):
+        self.name = name
+        self.interval = interval
+        self.symbols: set = set()
+        self.refresh_count: int = 0
+        self.refresh_times: Deque[float] = deque()  # 最近一段時間的刷新完成時間
+        self.total_delay: float = 0.0  # 實際開始時間晚於預定時間的累計秒數
+
+    def record_refresh(self, now: float, delay: float, window: float):
+        self.refresh_count += 1
+        self.total_delay += delay
+        self.refresh_times.append(now)
+        while self.refresh_times and self.refresh_times[0] < now - window:
+            self.refresh_times.popleft()
+
+    def get_stats(self, window: float, elapsed: float) -> dict:
+        now = time.monotonic()
+        while self.refresh_times and self.refresh_times[0] < now - window:
+            self.refresh_times.popleft()
+        # 啟動不久時以實際運行時間計算
+        window = max(min(window, elapsed), 1e-3)
+        target_rate = len(self.symbols) / self.interval if self.interval > 0 else 0
+        achieved_rate = len(self.refresh_times) / window
+        return {
+            "interval": self.interval,
+            "symbols": len(self.symbols),
+            "target_refresh_per_sec": round(target_rate, 3),
+            "achieved_refresh_per_sec": round(achieved_rate, 3),
+            "achieved_ratio": round(achieved_rate / target_rate, 3) if target_rate else None,
+            "refresh_count": self.refresh_count,
+            "avg_delay": round(self.total_delay / self.refresh_count, 4) if self.refresh_count else 0,
+        }
+
+
+class PollScheduler:
+    """
+    多交易對輪詢排程器
+    依優先級安排每個交易對的刷新時間，同時抓取所有已啟用交易所的訂單簿
+    （MX與LBank必定抓取，其餘交易所只抓取其上市的交易對），
+    並受各交易所的並發上限與令牌桶限流約束
+    """
+
+    def __init__(
+        self,
+        exchange_service: "ExchangeService",
+        tiers: Dict[str, float],
+        limiters: Dict[str, ExchangeLimiter],
+        default_tier: str,
+        on_update: Optional[UpdateCallback] = None,
+        max_workers: int = 8,
+        stats_window: float = 30.0,
+        compute_pool: Optional["ComputePool"] = None,
+        on_computed: Optional[ComputedCallback] = None
+    ):
+        self.exchange_service = exchange_service
+        # 間隔越短優先級越高，調度時優先處理
+        self.tiers: Dict[str, PollingTier] = {
+            name: PollingTier(name, interval)
+            for name, interval in sorted(tiers.items(), key=lambda item: item[1])
+        }
+        self.limiters = limiters
+        self.default_tier = default_tier
+        self.on_update = on_update
+        self.max_workers = max_workers
+        self.stats_window = stats_window
+        # 設置計算進程池時只抓取響應body，解碼與價差計算交給進程池，完成後呼叫on_computed（取代on_update）
+        self.compute_pool = compute_pool
+        self.on_computed = on_computed
+
+        self.symbol_tiers: Dict[str, str] = {}
+        self.lbank_symbols: Dict[str, str] = {}  # 自選模式下MX與LBank幣種不同
+        self._generation: Dict[str, int] = {}
+        self._heaps: Dict[str, List[Tuple[float, int, str]]] = {name: [] for name in self.tiers}
+        self._started_at: float = time.monotonic()
+        self._wakeup = asyncio.Event()
+        self._workers = asyncio.Semaphore(max_workers)
+        self._task: Optional[asyncio.Task] = None
+        self._in_progress: set = set()
+
+        exchange_service.response_listeners.append(self._on_response)
+
+    def _on_response(self, exchange: str, status: int):
+        limiter = self.limiters.get(exchange)
+        if limiter:
+            limiter.report_status(status)
+
+    def set_symbols(self, symbols: List[str], tier: Optional[str] = None):
+        """加入交易對，已存在的交易對保留原有優先級；首次刷新在一個間隔內錯開"""
+        tier = tier or self.default_tier
+        new_symbols = [symbol for symbol in symbols if symbol not in self.symbol_tiers]
+        if not new_symbols:
+            return
+        now = time.monotonic()
+        step = self.tiers[tier].interval / len(new_symbols)
+        for index, symbol in enumerate(new_symbols):
+            self.set_tier(symbol, tier, due=now + index * step)
+
+    def set_tier(self, symbol: str, tier: str, lbank_symbol: Optional[str] = None,
+                 due: Optional[float] = None):
+        """設置交易對的優先級，立即重新排程"""
+        if tier not in self.tiers:
+            raise ValueError(f"未知的優先級: {tier}")
+
+        old_tier = self.symbol_tiers.get(symbol)
+        if old_tier:
+            self.tiers[old_tier].symbols.discard(symbol)
+        self.tiers[tier].symbols.add(symbol)
+        self.symbol_tiers[symbol] = tier
+        if lbank_symbol:
+            self.lbank_symbols[symbol] = lbank_symbol
+
+        self._schedule(symbol, due if due is not None else time.monotonic())
+
+    def remove_symbol(self, symbol: str):
+        tier = self.symbol_tiers.pop(symbol, None)
+        if tier:
+            self.tiers[tier].symbols.discard(symbol)
+        self.lbank_symbols.pop(symbol, None)
+        # 舊的排程項目會因世代號不符而被丟棄
+        self._generation[symbol] = self._generation.get(symbol, 0) + 1
+
+    def _schedule(self, symbol: str, due: float):
+        generation = self._generation.get(symbol, 0) + 1
+        self._generation[symbol] = generation
+        heapq.heappush(self._heaps[self.symbol_tiers[symbol]], (due, generation, symbol))
+        self._wakeup.set()
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._started_at = time.monotonic()
+            self._task = asyncio.create_task(self._dispatch_loop())
+            logger.info(f"輪詢排程器已啟動，交易對數量: {len(self.symbol_tiers)}")
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._task = None
+
+    def _next_due(self) -> Optional[Tuple[float, str]]:
+        """返回最早的排程時間；依優先級順序找出第一個已到期的優先級"""
+        now = time.monotonic()
+        earliest = None
+        for name, heap in self._heaps.items():
+            while heap:
+                due, generation, symbol = heap[0]
+                if self._generation.get(symbol) == generation and self.symbol_tiers.get(symbol) == name:
+                    break
+                heapq.heappop(heap)
+            if not heap:
+                continue
+            if heap[0][0] <= now:
+                return heap[0][0], name
+            if earliest is None or heap[0][0] < earliest[0]:
+                earliest = (heap[0][0], name)
+        return earliest
+
+    async def _dispatch_loop(self):
+        while True:
+            next_due = self._next_due()
+            if next_due is None:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            delay = next_due[0] - time.monotonic()
+            if delay > 0:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            # 等待空閒worker後重新選取，期間可能有更高優先級的交易對到期
+            await self._workers.acquire()
+            next_due = self._next_due()
+            if next_due is None or next_due[0] > time.monotonic():
+                self._workers.release()
+                continue
+
+            due, _, symbol = heapq.heappop(self._heaps[next_due[1]])
+            if symbol in self._in_progress:
+                self._workers.release()
+                continue
+
+            self._in_progress.add(symbol)
+            asyncio.create_task(self._refresh(symbol, due))
+
+    def _venue_symbols(self, symbol: str) -> Dict[str, str]:
+        """各交易所要抓取的幣種（自選模式下LBank可不同）"""
+        snapshot = self.exchange_service.symbol_cache.snapshot
+        venue_symbols = {}
+        for venue in self.exchange_service.venues:
+            venue_symbol = self.lbank_symbols.get(symbol, symbol) if venue == 'lbank' else symbol
+            if venue in ('mx', 'lbank') or venue_symbol in snapshot.venue_symbols(venue):
+                venue_symbols[venue] = venue_symbol
+        return venue_symbols
+
+    async def _fetch(self, venue: str, fetch: Callable[[str, str], Awaitable], symbol: str):
+        async with self.limiters[self.exchange_service.adapters[venue].name]:
+            return await fetch(venue, symbol)
+
+    async def _refresh(self, symbol: str, due: float):
+        started = time.monotonic()
+        try:
+            venue_symbols = self._venue_symbols(symbol)
+            if self.compute_pool is not None:
+                await self._refresh_offloaded(symbol, venue_symbols, started, due)
+                return
+            orderbooks = await asyncio.gather(*(
+                self._fetch(venue, self.exchange_service.get_orderbook, venue_symbol)
+                for venue, venue_symbol in venue_symbols.items()
+            ))
+            self._record_refresh(symbol, started, due)
+
+            if self.on_update:
+                await self.on_update(symbol, dict(zip(venue_symbols, orderbooks)))
+        except Exception as e:
+            logger.error(f"刷新交易對失敗 {symbol}: {e}")
+        finally:
+            self._in_progress.discard(symbol)
+            self._workers.release()
+            tier_name = self.symbol_tiers.get(symbol)
+            if tier_name:
+                # 以開始時間計算下一次刷新，落後時立即排入
+                self._schedule(symbol, max(started + self.tiers[tier_name].interval, time.monotonic()))
+
+    async def _refresh_offloaded(self, symbol: str, venue_symbols: Dict[str, str], started: float, due: float):
+        """只抓取響應body，解碼與價差計算由計算進程池批次完成"""
+        fetched = await asyncio.gather(*(
+            self._fetch(venue, self.exchange_service.fetch_depth, venue_symbol)
+            for venue, venue_symbol in venue_symbols.items()
+        ))
+        self._record_refresh(symbol, started, due)
+        fetched = dict(zip(venue_symbols, fetched))
+        if fetched.get('mx') is None or fetched.get('lbank') is None:
+            return
+
+        books, spreads = await self.compute_pool.compute(symbol, fetched, venue_symbols)
+        if self.on_computed:
+            await self.on_computed(symbol, books, spreads)
+
+    def _record_refresh(self, symbol: str, started: float, due: float):
+        tier = self.tiers.get(self.symbol_tiers.get(symbol, ""))
+        if tier:
+            tier.record_refresh(time.monotonic(), max(0.0, started - due), self.stats_window)
+
+    def get_stats(self) -> dict:
+        """排程器統計：各優先級的實際刷新率與各交易所限流狀態"""
+        elapsed = time.monotonic() - self._started_at
+        return {
+            "symbols": len(self.symbol_tiers),
+            "in_progress": len(self._in_progress),
+            "max_workers": self.max_workers,
+            "window": self.stats_window,
+            "tiers": {name: tier.get_stats(self.stats_window, elapsed) for name, tier in self.tiers.items()},
+            "exchanges": {name: limiter.get_stats() for name, limiter in self.limiters.items()},
+            "compute_pool": self.compute_pool.get_stats() if self.compute_pool else None,
+        }
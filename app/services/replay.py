@@ -0,0 +1,179 @@
+"""
+錄製數據回放
+
+把 CAPTURE_DIR 錄製的原始響應依序送入與線上相同的解析與價差計算，不需要網路
+
+用法:
+    python -m app.services.replay data/capture --speed 0 --threshold 0.3
+    python -m app.services.replay data/capture --speed 10 --start 1700000000 --end 1700003600 --csv spreads.csv
+"""
+
+import argparse
+import asyncio
+import csv
+import json
+import logging
+import time
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from ..models.market_data import OrderBook, SpreadData
+from .capture import read_capture
+from .exchange_service import ExchangeService
+from .spread_calculator import SpreadCalculator
+
+logger = logging.getLogger(__name__)
+
+SpreadCallback = Callable[[float, SpreadData], Optional[Awaitable[None]]]
+
+
+class ReplayEngine:
+    """
+    回放引擎
+    speed=1 按錄製時的節奏回放，speed=N 加速N倍，speed=0 不等待（最快）
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        speed: float = 0.0,
+        exchange_service: Optional[ExchangeService] = None,
+        spread_calculator: Optional[SpreadCalculator] = None,
+        pairs: Optional[Dict[str, str]] = None
+    ):
+        self.directory = directory
+        self.speed = speed
+        # 只使用解析方法與精度資訊，不建立HTTP連接
+        self.exchange_service = exchange_service or ExchangeService()
+        self.spread_calculator = spread_calculator or SpreadCalculator()
+        self.pairs = pairs or {}  # LBank交易對 -> MX交易對（自選模式錄製時兩邊不同）
+
+        self.books: Dict[str, Dict[str, OrderBook]] = {}  # MX交易對 -> {交易所代號: 最新訂單簿}
+        self.records: int = 0
+        self.parse_errors: int = 0
+        self.spreads: int = 0
+        self.first_ts: Optional[float] = None
+        self.last_ts: Optional[float] = None
+
+    def parse(self, record: dict) -> Optional[OrderBook]:
+        """以線上相同的解析方法轉換一筆錄製記錄"""
+        received_at = datetime.fromtimestamp(record["t"])
+        sent_at = datetime.fromtimestamp(record["sent"]) if record.get("sent") else None
+        return self.exchange_service.decode_orderbook(
+            record["ex"], record["sym"], record["body"].encode(), sent_at, received_at
+        )
+
+    async def run(self, on_spread: Optional[SpreadCallback] = None,
+                  start: Optional[float] = None, end: Optional[float] = None) -> dict:
+        """回放時間範圍內的記錄，每次任一交易所更新後重新計算該交易對所有方向的價差"""
+        wall_started = time.perf_counter()
+
+        for record in read_capture(self.directory, start, end):
+            self.records += 1
+            ts = record["t"]
+            if self.first_ts is None:
+                self.first_ts = ts
+            self.last_ts = ts
+
+            if self.speed > 0:
+                delay = (ts - self.first_ts) / self.speed - (time.perf_counter() - wall_started)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+
+            try:
+                orderbook = self.parse(record)
+            except Exception as e:
+                logger.debug(f"解析錄製記錄失敗: {e}")
+                orderbook = None
+            if orderbook is None:
+                self.parse_errors += 1
+                continue
+
+            symbol = self.pairs.get(record["sym"], record["sym"]) if record["ex"] != "mx" else record["sym"]
+            books = self.books.setdefault(symbol, {})
+            books[record["ex"]] = orderbook
+            if len(books) < 2:
+                continue
+
+            # 價差時間戳為錄製時間，而不是回放時的現在
+            spreads = self.spread_calculator.calculate_all(books, datetime.fromtimestamp(ts))
+            for spread_data in spreads.values():
+                self.spreads += 1
+                if on_spread:
+                    result = on_spread(ts, spread_data)
+                    if asyncio.iscoroutine(result):
+                        await result
+
+            if self.speed == 0 and self.records % 1000 == 0:
+                await asyncio.sleep(0)  # 最快模式下定期讓出事件循環
+
+        elapsed = time.perf_counter() - wall_started
+        span = (self.last_ts - self.first_ts) if self.first_ts is not None else 0.0
+        return {
+            "records": self.records,
+            "parse_errors": self.parse_errors,
+            "spreads": self.spreads,
+            "captured_seconds": round(span, 3),
+            "replay_seconds": round(elapsed, 3),
+            "speedup": round(span / elapsed, 1) if elapsed > 0 else None,
+        }
+
+
+async def _main(args):
+    pairs = dict(pair.split('=', 1)[::-1] for pair in args.pair) if args.pair else None
+    engine = ReplayEngine(args.directory, speed=args.speed, pairs=pairs)
+
+    writer = None
+    csv_file = open(args.csv, 'w', newline='') if args.csv else None
+    if csv_file:
+        writer = csv.writer(csv_file)
+        writer.writerow(["received", "symbol", "mode", "spread", "spread_percentage", "buy_price", "sell_price",
+                         "max_quantity", "executable_profit"])
+
+    best: Dict[str, float] = {}
+    events: List[Tuple[float, SpreadData]] = []
+    above: Dict[Tuple[str, str], bool] = {}
+
+    def on_spread(ts: float, spread_data: SpreadData):
+        key = (spread_data.symbol, spread_data.mode)
+        best[f"{spread_data.symbol} {spread_data.mode}"] = max(
+            best.get(f"{spread_data.symbol} {spread_data.mode}", float('-inf')), spread_data.spread_percentage
+        )
+        # 只計算由下往上穿越門檻的次數
+        is_above = args.threshold is not None and spread_data.spread_percentage >= args.threshold
+        if is_above and not above.get(key):
+            events.append((ts, spread_data))
+        above[key] = is_above
+        if writer:
+            writer.writerow([ts, spread_data.symbol, spread_data.mode, spread_data.spread,
+                             spread_data.spread_percentage, spread_data.buy_price, spread_data.sell_price,
+                             spread_data.max_quantity, spread_data.executable_profit])
+
+    try:
+        summary = await engine.run(on_spread, args.start, args.end)
+    finally:
+        if csv_file:
+            csv_file.close()
+
+    print(json.dumps(summary, indent=2))
+    for name, value in sorted(best.items()):
+        print(f"最大價差 {name}: {value:.4f}%")
+    if args.threshold is not None:
+        print(f"價差達到 {args.threshold}% 的次數: {len(events)}")
+        for ts, spread_data in events[:args.show]:
+            print(f"  {datetime.fromtimestamp(ts).isoformat()} {spread_data.symbol} {spread_data.mode} "
+                  f"{spread_data.spread_percentage:.4f}%")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    parser = argparse.ArgumentParser(description="回放錄製的交易所深度響應")
+    parser.add_argument("directory", help="CAPTURE_DIR 錄製目錄")
+    parser.add_argument("--speed", type=float, default=0.0, help="回放倍速，0表示最快")
+    parser.add_argument("--start", type=float, help="開始時間（epoch秒）")
+    parser.add_argument("--end", type=float, help="結束時間（epoch秒）")
+    parser.add_argument("--threshold", type=float, help="統計價差百分比達到此門檻的次數")
+    parser.add_argument("--show", type=int, default=20, help="列出前N次達到門檻的時間")
+    parser.add_argument("--csv", help="輸出每筆價差到CSV")
+    parser.add_argument("--pair", nargs="+", help="自選模式的交易對對應 MX=LBank，例如 BTC/USDT=WBTC/USDT")
+    asyncio.run(_main(parser.parse_args()))
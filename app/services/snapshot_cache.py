@@ -0,0 +1,142 @@
+import asyncio
+import logging
+import os
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .wire_protocol import MarketTick, dumps
+
+logger = logging.getLogger(__name__)
+
+Pair = Tuple[str, str]
+
+
+class SnapshotEntry:
+    """一條抓取管線最新的tick；序列化結果在第一次讀取時產生並快取到下一次更新"""
+
+    __slots__ = ("key", "pair", "tick", "version", "_json")
+
+    def __init__(self, key: str, pair: Pair, tick: MarketTick, version: int):
+        self.key = key
+        self.pair = pair
+        self.tick = tick
+        self.version = version
+        self._json: Optional[str] = None
+
+    def to_json(self) -> str:
+        if self._json is None:
+            tick = self.tick
+            self._json = dumps({
+                "key": self.key,
+                "pair": list(self.pair),
+                "version": self.version,
+                "symbol": tick.symbol,
+                "mx_orderbook": tick.mx_orderbook.model_dump(),
+                "lbank_orderbook": tick.lbank_orderbook.model_dump(),
+                "spreads": tick.spread_data(),
+                "timestamp": tick.timestamp.isoformat(),
+            })
+        return self._json
+
+
+class SnapshotCache:
+    """
+    最新狀態快取：每條抓取管線（交易對組合）保留最新一次廣播的tick
+    新WebSocket連接直接收到快取中的tick；/api/snapshot 以版本號作為ETag，支援條件請求與長輪詢
+    更新只替換引用並遞增版本號，序列化延後到有人讀取時才做，不增加抓取管線的負擔
+    """
+
+    def __init__(self):
+        self.entries: Dict[str, SnapshotEntry] = {}
+        self.default_key: Optional[str] = None  # 全域選擇的交易對所屬管線
+        self.version: int = 0
+        # ETag帶進程識別，多web進程之間版本號不同也不會誤判為未修改
+        self.instance = f"{os.getpid():x}"
+        self._changed = asyncio.Event()
+        self._rendered: Dict[Tuple[str, ...], Tuple[str, str]] = {}
+        self.renders: int = 0
+        self.not_modified: int = 0
+
+    def update(self, key: str, pair: Pair, tick: MarketTick, default: bool = False) -> int:
+        """記錄一條管線的最新tick，返回新的版本號"""
+        self.version += 1
+        if default:
+            self.default_key = key
+        self.entries[key] = SnapshotEntry(key, pair, tick, self.version)
+        self._notify()
+        return self.version
+
+    def forget(self, key: str):
+        """管線停止後移除其快取"""
+        if self.default_key == key:
+            self.default_key = None
+        if self.entries.pop(key, None) is not None:
+            self.version += 1
+            self._notify()
+
+    def _notify(self):
+        event, self._changed = self._changed, asyncio.Event()
+        event.set()
+
+    def get(self, pair: Pair) -> Optional[MarketTick]:
+        for entry in self.entries.values():
+            if entry.pair == pair:
+                return entry.tick
+        return None
+
+    def get_default(self) -> Optional[MarketTick]:
+        entry = self.entries.get(self.default_key) if self.default_key else None
+        return entry.tick if entry else None
+
+    def select(self, symbols: Optional[Iterable[str]] = None) -> List[SnapshotEntry]:
+        """依管線鍵或MX交易對篩選（None為全部）"""
+        if symbols is None:
+            return list(self.entries.values())
+        wanted = set(symbols)
+        return [entry for entry in self.entries.values() if entry.key in wanted or entry.pair[0] in wanted]
+
+    def etag(self, entries: List[SnapshotEntry]) -> str:
+        """篩選結果的ETag：內容的最大版本號加上條目數（條目被移除時也會改變）"""
+        version = max((entry.version for entry in entries), default=0)
+        return f'"{self.instance}-{version}-{len(entries)}"'
+
+    def render(self, symbols: Optional[Iterable[str]] = None) -> Tuple[str, str]:
+        """返回 (ETag, JSON body)；同一篩選條件在版本不變時重用上次的結果"""
+        cache_key = tuple(sorted(symbols)) if symbols is not None else ("*",)
+        entries = self.select(symbols)
+        etag = self.etag(entries)
+        cached = self._rendered.get(cache_key)
+        if cached is not None and cached[0] == etag:
+            return etag, cached[1]
+        self.renders += 1
+        body = (
+            f'{{"status":"success","version":{max((e.version for e in entries), default=0)},'
+            f'"default":{dumps(self.default_key)},'
+            f'"snapshots":[{",".join(entry.to_json() for entry in entries)}]}}'
+        )
+        if len(self._rendered) > 64:
+            self._rendered.clear()
+        self._rendered[cache_key] = (etag, body)
+        return etag, body
+
+    async def wait_for_change(self, symbols: Optional[Iterable[str]], etag: str, timeout: float) -> bool:
+        """等待篩選結果的ETag改變，逾時返回False"""
+        symbols = list(symbols) if symbols is not None else None
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while self.etag(self.select(symbols)) == etag:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return False
+            try:
+                await asyncio.wait_for(self._changed.wait(), remaining)
+            except asyncio.TimeoutError:
+                return False
+        return True
+
+    def get_stats(self) -> dict:
+        return {
+            "version": self.version,
+            "feeds": {key: entry.version for key, entry in self.entries.items()},
+            "renders": self.renders,
+            "not_modified": self.not_modified,
+        }
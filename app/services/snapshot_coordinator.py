@@ -0,0 +1,142 @@
+import asyncio
+import logging
+from collections import deque
+from datetime import datetime
+from typing import Deque, Dict, Optional, Tuple, TYPE_CHECKING
+
+from ..models.market_data import OrderBook, SpreadData
+
+if TYPE_CHECKING:
+    from .exchange_service import ExchangeService
+
+logger = logging.getLogger(__name__)
+
+
+class SnapshotCoordinator:
+    """
+    跨交易所快照協調器
+    同時抓取兩邊訂單簿，估算每邊訂單簿在本地時鐘上的生成時間，
+    為價差附上兩邊時間差與訂單簿年齡，超過上限時標記或丟棄
+    """
+
+    def __init__(
+        self,
+        exchange_service: "ExchangeService",
+        max_skew_ms: float = 500.0,
+        max_age_ms: float = 2000.0,
+        drop_stale: bool = False,
+        offset_window: int = 100
+    ):
+        self.exchange_service = exchange_service
+        self.max_skew_ms = max_skew_ms
+        self.max_age_ms = max_age_ms
+        self.drop_stale = drop_stale  # True: 丟棄超限價差；False: 只標記stale
+
+        # 每個交易所最近的 (接收時間 - 交易所時間) 樣本，取最小值估算時鐘偏差
+        self._offsets: Dict[str, Deque[float]] = {}
+        self._offset_window = offset_window
+        self._last_sample: Dict[str, Tuple[datetime, datetime]] = {}
+
+        self.last_rest_legs: Tuple[str, ...] = ()  # 最近一次以REST抓取的交易所
+        self.snapshot_count: int = 0
+        self.flagged_count: int = 0
+        self.dropped_count: int = 0
+        self._recent_skew: Deque[float] = deque(maxlen=1000)
+
+    async def fetch(self, mx_symbol: str, lbank_symbol: str) -> Tuple[Optional[OrderBook], Optional[OrderBook]]:
+        """同時獲取兩邊訂單簿（深度推送優先，缺少的一邊以REST並行補齊）"""
+        mx_orderbook = None
+        lbank_orderbook = None
+        depth_stream = self.exchange_service.depth_stream
+        if depth_stream:
+            await depth_stream.ensure_subscribed(mx_symbol, lbank_symbol)
+            mx_orderbook = depth_stream.get_mx_orderbook(mx_symbol)
+            lbank_orderbook = depth_stream.get_lbank_orderbook(lbank_symbol)
+
+        tasks = {}
+        if mx_orderbook is None:
+            tasks['mx'] = self.exchange_service.get_mx_orderbook(mx_symbol)
+        if lbank_orderbook is None:
+            tasks['lbank'] = self.exchange_service.get_lbank_orderbook(lbank_symbol)
+        if tasks:
+            results = dict(zip(tasks.keys(), await asyncio.gather(*tasks.values())))
+            mx_orderbook = results.get('mx', mx_orderbook)
+            lbank_orderbook = results.get('lbank', lbank_orderbook)
+
+        self.last_rest_legs = tuple(tasks)
+        self.snapshot_count += 1
+        return mx_orderbook, lbank_orderbook
+
+    def leg_time(self, orderbook: OrderBook) -> datetime:
+        """
+        估算訂單簿在本地時鐘上的生成時間
+        有交易所時間時以 交易所時間 + min(接收時間 - 交易所時間) 校正時鐘偏差，
+        否則取請求發出與響應接收的中點
+        """
+        received_at = orderbook.received_at or orderbook.timestamp
+        if orderbook.exchange_time is not None and orderbook.received_at is not None:
+            offsets = self._offsets.setdefault(orderbook.exchange, deque(maxlen=self._offset_window))
+            sample = (orderbook.exchange_time, orderbook.received_at)
+            if self._last_sample.get(orderbook.exchange) != sample:
+                # 同一份訂單簿會被兩個模式重複使用，只記錄一次
+                self._last_sample[orderbook.exchange] = sample
+                offsets.append((orderbook.received_at - orderbook.exchange_time).total_seconds())
+            local_time = orderbook.exchange_time.timestamp() + min(offsets)
+            return datetime.fromtimestamp(local_time)
+        if orderbook.sent_at is not None:
+            return orderbook.sent_at + (received_at - orderbook.sent_at) / 2
+        return received_at
+
+    def annotate(
+        self,
+        spread_data: SpreadData,
+        mx_orderbook: OrderBook,
+        lbank_orderbook: OrderBook
+    ) -> Optional[SpreadData]:
+        """為價差附上兩邊（買入與賣出交易所，順序不影響結果）的時間差與訂單簿年齡；超限且設定為丟棄時返回None"""
+        mx_time = self.leg_time(mx_orderbook)
+        lbank_time = self.leg_time(lbank_orderbook)
+        now = datetime.now()
+
+        skew_ms = abs((mx_time - lbank_time).total_seconds()) * 1000
+        book_age_ms = max(0.0, (now - min(mx_time, lbank_time)).total_seconds() * 1000)
+        stale = skew_ms > self.max_skew_ms or book_age_ms > self.max_age_ms
+
+        self._recent_skew.append(skew_ms)
+        spread_data.skew_ms = round(skew_ms, 3)
+        spread_data.book_age_ms = round(book_age_ms, 3)
+        spread_data.stale = stale
+
+        if stale:
+            if self.drop_stale:
+                self.dropped_count += 1
+                logger.debug(
+                    f"丟棄未對齊的價差 {spread_data.symbol} {spread_data.mode}: "
+                    f"skew={skew_ms:.1f}ms, age={book_age_ms:.1f}ms"
+                )
+                return None
+            self.flagged_count += 1
+        return spread_data
+
+    def get_stats(self) -> dict:
+        skews = sorted(self._recent_skew)
+
+        def percentile(p: float) -> Optional[float]:
+            if not skews:
+                return None
+            return round(skews[min(len(skews) - 1, int(len(skews) * p))], 3)
+
+        return {
+            "max_skew_ms": self.max_skew_ms,
+            "max_age_ms": self.max_age_ms,
+            "drop_stale": self.drop_stale,
+            "snapshots": self.snapshot_count,
+            "flagged": self.flagged_count,
+            "dropped": self.dropped_count,
+            "skew_ms_p50": percentile(0.5),
+            "skew_ms_p99": percentile(0.99),
+            "clock_offset_ms": {
+                exchange: round(min(offsets) * 1000, 3)
+                for exchange, offsets in self._offsets.items() if offsets
+            },
+        }
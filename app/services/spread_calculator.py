@@ -1,126 +1,123 @@
 import logging
+import time
 from datetime import datetime
-from typing import Optional
+from typing import Dict, List, Optional, Sequence
 
 from ..models.market_data import OrderBook, SpreadData
+from .depth_engine import ExecutableSpreadEngine
+from .exchanges import parse_mode
+from .metrics import REGISTRY
+from .spread_matrix import SpreadMatrix
 
 logger = logging.getLogger(__name__)
 
+SPREAD_SECONDS = REGISTRY.histogram(
+    "lbmx_spread_compute_seconds", "SpreadCalculator.calculate_matrix duration", ("symbol", "mode")
+)
+
 class SpreadCalculator:
     """價差計算服務"""
     
-    def calculate_spread(
-        self, 
-        mx_orderbook: OrderBook, 
-        lbank_orderbook: OrderBook, 
-        mode: str
-    ) -> Optional[SpreadData]:
+    def __init__(self):
+        self.depth_engine = ExecutableSpreadEngine()
+    
+    def calculate_all(
+        self,
+        books: Dict[str, Optional[OrderBook]],
+        timestamp: Optional[datetime] = None
+    ) -> Dict[str, SpreadData]:
         """
-        計算價差
+        計算單一交易對所有有向交易所組合的價差
         
         Args:
-            mx_orderbook: MX交易所訂單簿
-            lbank_orderbook: LBank交易所訂單簿
-            mode: 交易模式 ('mx_buy_lbank_sell' 或 'lbank_buy_mx_sell')
+            books: 交易所代號 -> 訂單簿，例如 {'mx': ..., 'lbank': ...}
+            timestamp: 價差的時間戳，預設為現在（回放時為錄製時間）
         
         Returns:
-            SpreadData: 價差數據
+            Dict[str, SpreadData]: 模式名稱 -> 價差數據（缺少報價的組合不包含在內）
         """
-        try:
-            if mode == "mx_buy_lbank_sell":
-                return self._calculate_mx_buy_lbank_sell(mx_orderbook, lbank_orderbook)
-            elif mode == "lbank_buy_mx_sell":
-                return self._calculate_lbank_buy_mx_sell(mx_orderbook, lbank_orderbook)
-            else:
-                logger.error(f"不支援的交易模式: {mode}")
-                return None
-        except Exception as e:
-            logger.error(f"計算價差失敗: {e}")
-            return None
+        results = self.calculate_matrix([books], timestamp=timestamp)
+        return results[0] if results else {}
     
-    def _calculate_mx_buy_lbank_sell(
-        self, 
-        mx_orderbook: OrderBook, 
-        lbank_orderbook: OrderBook
-    ) -> Optional[SpreadData]:
+    def calculate_matrix(
+        self,
+        books_by_symbol: Sequence[Dict[str, Optional[OrderBook]]],
+        venues: Optional[Sequence[str]] = None,
+        timestamp: Optional[datetime] = None
+    ) -> List[Dict[str, SpreadData]]:
         """
-        計算MX買入、LBank賣出的價差
-        MX買入 = MX的ask（最低賣價）
-        LBank賣出 = LBank的bid（最高買價）
-        價差 = LBank的bid - MX的ask
-        """
-        if not mx_orderbook.asks or not lbank_orderbook.bids:
-            return None
-        
-        # MX的ask最低價（我們在這裡買入）
-        mx_lowest_ask = mx_orderbook.asks[0]
-        buy_price = mx_lowest_ask.price
-        
-        # LBank的bid最高價（我們在這裡賣出）
-        lbank_highest_bid = lbank_orderbook.bids[0]
-        sell_price = lbank_highest_bid.price
-        
-        # 計算價差：LBank bid - MX ask
-        spread = lbank_highest_bid.price - mx_lowest_ask.price
-        spread_percentage = (spread / buy_price) * 100 if buy_price > 0 else 0
+        以一次陣列運算計算多個交易對、N個交易所之間所有有向組合的價差
         
-        # 可開最大數量（取較小者）
-        max_quantity = min(mx_lowest_ask.quantity, lbank_highest_bid.quantity)
+        Args:
+            books_by_symbol: 每個交易對的 {交易所代號: 訂單簿}
+            venues: 矩陣的交易所順序，預設依出現順序
+            timestamp: 價差的時間戳，預設為現在
         
-        return SpreadData(
-            symbol=mx_orderbook.symbol,
-            mode="mx_buy_lbank_sell",
-            spread=spread,
-            spread_percentage=spread_percentage,
-            max_quantity=max_quantity,
-            buy_price=buy_price,
-            sell_price=sell_price,
-            buy_exchange="Mexc",
-            sell_exchange="LBank",
-            timestamp=datetime.now()
-        )
-    
-    def _calculate_lbank_buy_mx_sell(
-        self, 
-        mx_orderbook: OrderBook, 
-        lbank_orderbook: OrderBook
-    ) -> Optional[SpreadData]:
+        Returns:
+            List[Dict[str, SpreadData]]: 與輸入同順序的 {模式: 價差數據}
         """
-        計算LBank買入、MX賣出的價差
-        LBank買入 = LBank的ask（最低賣價）
-        MX賣出 = MX的bid（最高買價）
-        價差 = MX的bid - LBank的ask
+        started = time.perf_counter()
+        try:
+            if venues is None:
+                venues = list(dict.fromkeys(venue for books in books_by_symbol for venue in books))
+            matrix = SpreadMatrix.from_books(venues, books_by_symbol)
+            results = matrix.to_spreads(books_by_symbol, timestamp)
+            for books, spreads in zip(books_by_symbol, results):
+                for mode, spread_data in spreads.items():
+                    buy, sell = parse_mode(mode)
+                    self._attach_executable(spread_data, books[buy], books[sell])
+            symbols = {book.symbol for books in books_by_symbol for book in books.values() if book}
+            label = REGISTRY.symbol(symbols.pop()) if len(symbols) == 1 else "batch"
+            SPREAD_SECONDS.observe(time.perf_counter() - started, (label, "matrix"))
+            return results
+        except Exception as e:
+            logger.error(f"計算價差矩陣失敗: {e}")
+            return []
+    
+    def _attach_executable(self, spread_data: SpreadData, buy_book: OrderBook, sell_book: OrderBook):
+        """附上走完雙邊深度後的可執行數量、收益與VWAP"""
+        executable = self.depth_engine.analyze(buy_book, sell_book, include_curve=False)
+        spread_data.executable_quantity = executable['max_quantity']
+        spread_data.executable_profit = executable['max_profit']
+        spread_data.vwap_buy_price = executable['vwap_buy_price']
+        spread_data.vwap_sell_price = executable['vwap_sell_price']
+    
+    def calculate_executable_spread(
+        self,
+        mx_orderbook: OrderBook,
+        lbank_orderbook: OrderBook,
+        mode: str
+    ) -> dict:
         """
-        if not lbank_orderbook.asks or not mx_orderbook.bids:
-            return None
-        
-        # LBank的ask最低價（我們在這裡買入）
-        lbank_lowest_ask = lbank_orderbook.asks[0]
-        buy_price = lbank_lowest_ask.price
+        計算走完全部深度的可執行價差
         
-        # MX的bid最高價（我們在這裡賣出）
-        mx_highest_bid = mx_orderbook.bids[0]
-        sell_price = mx_highest_bid.price
-        
-        # 計算價差：MX bid - LBank ask
-        spread = mx_highest_bid.price - lbank_lowest_ask.price
-        spread_percentage = (spread / buy_price) * 100 if buy_price > 0 else 0
+        Returns:
+            dict: 最大可獲利數量、VWAP買賣價、最大收益與邊際價差曲線
+        """
+        buy_book, sell_book = self.depth_engine.books_for_mode(mx_orderbook, lbank_orderbook, mode)
+        return self.depth_engine.analyze(buy_book, sell_book)
+    
+    def calculate_depth_profit(
+        self,
+        mx_orderbook: OrderBook,
+        lbank_orderbook: OrderBook,
+        mode: str,
+        investment_amounts: Sequence[float]
+    ) -> List[dict]:
+        """
+        批量計算多個投資金額在全部深度下的收益（用於滑價曲線）
         
-        # 可開最大數量（取較小者）
-        max_quantity = min(lbank_lowest_ask.quantity, mx_highest_bid.quantity)
+        Args:
+            mx_orderbook: MX交易所訂單簿
+            lbank_orderbook: LBank交易所訂單簿
+            mode: 交易模式
+            investment_amounts: 投資金額列表（USDT）
         
-        return SpreadData(
-            symbol=lbank_orderbook.symbol,
-            mode="lbank_buy_mx_sell",
-            spread=spread,
-            spread_percentage=spread_percentage,
-            max_quantity=max_quantity,
-            buy_price=buy_price,
-            sell_price=sell_price,
-            buy_exchange="LBank",
-            sell_exchange="Mexc",
-            timestamp=datetime.now()
-        )
+        Returns:
+            List[dict]: 每個投資金額的收益計算
+        """
+        buy_book, sell_book = self.depth_engine.books_for_mode(mx_orderbook, lbank_orderbook, mode)
+        return self.depth_engine.profit_for_investments(buy_book, sell_book, investment_amounts)
     
     def calculate_profit_potential(
         self, 
@@ -128,7 +125,7 @@ class SpreadCalculator:
         investment_amount: float
     ) -> dict:
         """
-        計算潛在收益
+        計算潛在收益（僅考慮最優一檔，走深度的計算見 calculate_depth_profit）
         
         Args:
             spread_data: 價差數據
@@ -0,0 +1,79 @@
+import logging
+from datetime import datetime
+from typing import Dict, List, Mapping, Optional, Sequence
+
+import numpy as np
+
+from ..models.market_data import OrderBook, SpreadData
+from .exchanges import mode_name
+
+logger = logging.getLogger(__name__)
+
+
+class SpreadMatrix:
+    """
+    N個交易所之間的有向價差矩陣
+    S個交易對的最優買賣價排成 (S, N) 陣列，一次陣列運算得到 (S, N, N) 的結果：
+    [s, i, j] 為在交易所i以ask買入、在交易所j以bid賣出；對角線與缺少報價的組合為無效
+    """
+
+    def __init__(self, venues: Sequence[str], bid: np.ndarray, bid_qty: np.ndarray,
+                 ask: np.ndarray, ask_qty: np.ndarray):
+        self.venues = list(venues)
+        self.bid, self.bid_qty, self.ask, self.ask_qty = bid, bid_qty, ask, ask_qty
+        buy_price = ask[:, :, None]
+        self.spread = bid[:, None, :] - buy_price
+        with np.errstate(divide='ignore', invalid='ignore'):
+            self.spread_percentage = np.where(buy_price > 0, self.spread / buy_price * 100, 0.0)
+        self.max_quantity = np.minimum(ask_qty[:, :, None], bid_qty[:, None, :])
+        self.valid = ~np.isnan(self.spread)
+        diagonal = np.arange(len(self.venues))
+        self.valid[:, diagonal, diagonal] = False
+
+    @classmethod
+    def from_books(cls, venues: Sequence[str],
+                   books_by_symbol: Sequence[Mapping[str, Optional[OrderBook]]]) -> "SpreadMatrix":
+        """以每個交易對的 {交易所: 訂單簿} 建立矩陣，缺少或空的一邊以NaN表示"""
+        shape = (len(books_by_symbol), len(venues))
+        bid, bid_qty, ask, ask_qty = (np.full(shape, np.nan) for _ in range(4))
+        for s, books in enumerate(books_by_symbol):
+            for v, venue in enumerate(venues):
+                book = books.get(venue)
+                if book is None:
+                    continue
+                if book.bids:
+                    bid[s, v] = book.bids[0].price
+                    bid_qty[s, v] = book.bids[0].quantity
+                if book.asks:
+                    ask[s, v] = book.asks[0].price
+                    ask_qty[s, v] = book.asks[0].quantity
+        return cls(venues, bid, bid_qty, ask, ask_qty)
+
+    def mode(self, buy: int, sell: int) -> str:
+        return mode_name(self.venues[buy], self.venues[sell])
+
+    def to_spreads(self, books_by_symbol: Sequence[Mapping[str, Optional[OrderBook]]],
+                   timestamp: Optional[datetime] = None) -> List[Dict[str, SpreadData]]:
+        """
+        把有效組合轉為每個交易對的 {模式: SpreadData}
+        交易對名稱與交易所名稱取自買入一邊的訂單簿（自選模式下兩邊幣種可能不同）
+        """
+        timestamp = timestamp or datetime.now()
+        results: List[Dict[str, SpreadData]] = [{} for _ in books_by_symbol]
+        for s, i, j in np.argwhere(self.valid).tolist():
+            buy_book = books_by_symbol[s][self.venues[i]]
+            sell_book = books_by_symbol[s][self.venues[j]]
+            mode = self.mode(i, j)
+            results[s][mode] = SpreadData(
+                symbol=buy_book.symbol,
+                mode=mode,
+                spread=float(self.spread[s, i, j]),
+                spread_percentage=float(self.spread_percentage[s, i, j]),
+                max_quantity=float(self.max_quantity[s, i, j]),
+                buy_price=float(self.ask[s, i]),
+                sell_price=float(self.bid[s, j]),
+                buy_exchange=buy_book.exchange,
+                sell_exchange=sell_book.exchange,
+                timestamp=timestamp
+            )
+        return results
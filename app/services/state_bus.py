@@ -0,0 +1,234 @@
+import asyncio
+import itertools
+import json
+import logging
+import os
+import struct
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+from .wire_protocol import dumps
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson為可選依賴
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+# 幀格式：4位元組長度（大端序）+ JSON
+HEADER = struct.Struct(">I")
+MAX_FRAME = 64 * 1024 * 1024
+
+MessageHandler = Callable[[dict], Optional[Awaitable[None]]]
+CommandHandler = Callable[[dict, int], Awaitable[Any]]  # (參數, 發出指令的web進程連接id) -> 結果
+
+
+def _loads(data: bytes):
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
+
+def encode_frame(message: dict) -> bytes:
+    body = dumps(message).encode()
+    return HEADER.pack(len(body)) + body
+
+
+async def read_frame(reader: asyncio.StreamReader) -> dict:
+    header = await reader.readexactly(HEADER.size)
+    (length,) = HEADER.unpack(header)
+    if length > MAX_FRAME:
+        raise ValueError(f"幀過大: {length}")
+    return _loads(await reader.readexactly(length))
+
+
+class StateBusServer:
+    """
+    本機Unix socket狀態匯流排（抓取進程端）
+    發佈最新的訂單簿與價差給所有web進程；每個key保留最新一則，
+    新連接的web進程先收到全部最新狀態；也接收web進程轉送的指令並回覆結果
+    """
+
+    def __init__(self, path: str, max_buffer: int = 8 * 1024 * 1024):
+        self.path = path
+        self.max_buffer = max_buffer  # 訂閱者未送出的位元組超過此值時斷開，重連後重新取得最新狀態
+        self.latest: Dict[str, bytes] = {}  # key -> 已編碼的幀
+        self.subscribers: Set[asyncio.StreamWriter] = set()
+        self.commands: Dict[str, CommandHandler] = {}
+        self.disconnect_listeners: List[Callable[[int], None]] = []  # web進程斷開時以連接id呼叫
+        self._server: Optional[asyncio.AbstractServer] = None
+        self.published: int = 0
+        self.disconnected_slow: int = 0
+
+    async def start(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self._server = await asyncio.start_unix_server(self._handle, path=self.path)
+        logger.info(f"狀態匯流排監聽 {self.path}")
+
+    async def close(self):
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+        for writer in list(self.subscribers):
+            writer.close()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+    def forget(self, key: str):
+        """移除保留的最新訊息（例如抓取管線停止後）"""
+        self.latest.pop(key, None)
+
+    def publish(self, key: str, message: dict, retain: bool = True):
+        """發佈訊息（只編碼一次，所有訂閱者共用）"""
+        frame = encode_frame(message)
+        if retain:
+            self.latest[key] = frame
+        self.published += 1
+        for writer in list(self.subscribers):
+            self._write(writer, frame)
+
+    def _write(self, writer: asyncio.StreamWriter, frame: bytes):
+        transport = writer.transport
+        if transport.is_closing():
+            self.subscribers.discard(writer)
+            return
+        if transport.get_write_buffer_size() > self.max_buffer:
+            logger.warning("web進程讀取落後，斷開狀態匯流排連接")
+            self.disconnected_slow += 1
+            self.subscribers.discard(writer)
+            writer.close()
+            return
+        writer.write(frame)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        for frame in list(self.latest.values()):
+            writer.write(frame)
+        self.subscribers.add(writer)
+        logger.info(f"web進程已連接狀態匯流排，目前連接數: {len(self.subscribers)}")
+        try:
+            while True:
+                message = await read_frame(reader)
+                if message.get("type") == "command":
+                    asyncio.create_task(self._run_command(writer, message))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except Exception as e:
+            logger.error(f"狀態匯流排連接錯誤: {e}")
+        finally:
+            self.subscribers.discard(writer)
+            writer.close()
+            for listener in self.disconnect_listeners:
+                try:
+                    listener(id(writer))
+                except Exception as e:
+                    logger.error(f"狀態匯流排斷開回呼失敗: {e}")
+            logger.info(f"web進程已斷開狀態匯流排，目前連接數: {len(self.subscribers)}")
+
+    async def _run_command(self, writer: asyncio.StreamWriter, message: dict):
+        handler = self.commands.get(message.get("name"))
+        try:
+            if handler is None:
+                raise ValueError(f"未知的指令: {message.get('name')}")
+            reply = {"type": "reply", "id": message.get("id"), "result": await handler(message.get("args") or {}, id(writer))}
+        except Exception as e:
+            logger.error(f"執行指令 {message.get('name')} 失敗: {e}")
+            reply = {"type": "reply", "id": message.get("id"), "error": str(e)}
+        if not writer.transport.is_closing():
+            writer.write(encode_frame(reply))
+
+    def get_stats(self) -> dict:
+        return {
+            "path": self.path,
+            "subscribers": len(self.subscribers),
+            "retained_keys": len(self.latest),
+            "published": self.published,
+            "disconnected_slow": self.disconnected_slow,
+        }
+
+
+class StateBusClient:
+    """狀態匯流排訂閱端（web進程），斷線時自動重連"""
+
+    def __init__(self, path: str, on_message: MessageHandler, request_timeout: float = 10.0,
+                 on_connect: Optional[Callable[[], Awaitable[None]]] = None):
+        self.path = path
+        self.on_message = on_message
+        self.on_connect = on_connect  # 每次（重新）連接後呼叫，例如恢復抓取進程端的訂閱
+        self.request_timeout = request_timeout
+        self.connected = False
+        self.received: int = 0
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._task: Optional[asyncio.Task] = None
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._ids = itertools.count(1)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task:
+            self._task.cancel()
+        if self._writer:
+            self._writer.close()
+
+    async def _run(self):
+        backoff = 0.1
+        while True:
+            try:
+                reader, self._writer = await asyncio.open_unix_connection(self.path)
+                self.connected = True
+                backoff = 0.1
+                logger.info(f"已連接狀態匯流排 {self.path}")
+                if self.on_connect:
+                    # 回呼可能發出指令，必須在讀取循環之外執行才收得到回覆
+                    asyncio.create_task(self.on_connect())
+                while True:
+                    message = await read_frame(reader)
+                    self.received += 1
+                    if message.get("type") == "reply":
+                        future = self._pending.pop(message.get("id"), None)
+                        if future and not future.done():
+                            future.set_result(message)
+                        continue
+                    result = self.on_message(message)
+                    if asyncio.iscoroutine(result):
+                        await result
+            except asyncio.CancelledError:
+                break
+            except (FileNotFoundError, ConnectionRefusedError):
+                pass  # 抓取進程尚未啟動
+            except (asyncio.IncompleteReadError, ConnectionError):
+                logger.warning("狀態匯流排連接中斷，準備重連")
+            except Exception as e:
+                logger.error(f"狀態匯流排錯誤: {e}")
+            self.connected = False
+            for future in self._pending.values():
+                if not future.done():
+                    future.set_exception(ConnectionError("狀態匯流排連接中斷"))
+            self._pending.clear()
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 5.0)
+
+    async def request(self, name: str, args: Optional[dict] = None) -> Any:
+        """轉送指令給抓取進程並等待結果"""
+        if not self.connected or self._writer is None:
+            raise ConnectionError("尚未連接抓取進程")
+        request_id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        self._writer.write(encode_frame({"type": "command", "id": request_id, "name": name, "args": args or {}}))
+        try:
+            reply = await asyncio.wait_for(future, self.request_timeout)
+        finally:
+            self._pending.pop(request_id, None)
+        if "error" in reply:
+            raise RuntimeError(reply["error"])
+        return reply.get("result")
+
+    def get_stats(self) -> dict:
+        return {
+            "path": self.path,
+            "connected": self.connected,
+            "received": self.received,
+            "pending_requests": len(self._pending),
+        }
@@ -0,0 +1,186 @@
+import gzip
+import hashlib
+import logging
+import mimetypes
+import os
+import time
+from typing import Dict, Mapping, Optional, Tuple
+
+try:
+    import brotli
+except ImportError:  # brotli 為可選依賴，未安裝時只提供 gzip
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# 值得壓縮的內容類型（圖片、字型等已壓縮格式直接送出）
+COMPRESSIBLE_TYPES = (
+    "text/", "application/javascript", "application/json", "application/manifest+json",
+    "application/xml", "image/svg+xml", "image/x-icon", "image/vnd.microsoft.icon",
+)
+MIN_COMPRESS_BYTES = 256
+
+# 帶hash的打包檔案內容永不變，可長期快取；其餘檔案（index.html等）每次向伺服器驗證ETag
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE = "no-cache"
+
+
+class StaticAsset:
+    """單一靜態檔案：原始內容與預先壓縮的各編碼版本（只保留比原始小的版本）"""
+
+    __slots__ = ("path", "content_type", "cache_control", "variants", "etags")
+
+    def __init__(self, path: str, body: bytes, content_type: str, cache_control: str):
+        self.path = path
+        self.content_type = content_type
+        self.cache_control = cache_control
+        self.variants: Dict[str, bytes] = {"identity": body}
+        digest = hashlib.sha256(body).hexdigest()[:20]
+        if self._compressible(content_type, body):
+            if brotli is not None:
+                self._add_variant("br", brotli.compress(body, quality=11))
+            self._add_variant("gzip", gzip.compress(body, compresslevel=9, mtime=0))
+        # 強ETag：每個編碼版本位元組不同，各自一個標籤
+        self.etags: Dict[str, str] = {
+            encoding: f'"{digest}"' if encoding == "identity" else f'"{digest}-{encoding}"'
+            for encoding in self.variants
+        }
+
+    @staticmethod
+    def _compressible(content_type: str, body: bytes) -> bool:
+        return len(body) >= MIN_COMPRESS_BYTES and content_type.startswith(COMPRESSIBLE_TYPES)
+
+    def _add_variant(self, encoding: str, compressed: bytes):
+        if len(compressed) < len(self.variants["identity"]):
+            self.variants[encoding] = compressed
+
+    @property
+    def size(self) -> int:
+        return sum(len(body) for body in self.variants.values())
+
+
+def parse_accept_encoding(header: str) -> Dict[str, float]:
+    """解析 Accept-Encoding 為 {編碼: q值}"""
+    accepted: Dict[str, float] = {}
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name] = q
+    return accepted
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """If-None-Match 是否包含此ETag（弱比較，依RFC 9110用於GET的條件請求）"""
+    if if_none_match.strip() == "*":
+        return True
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return any((tag[2:] if tag.startswith("W/") else tag) == etag for tag in candidates)
+
+
+class StaticAssetStore:
+    """
+    前端構建產物的記憶體快取
+    啟動時一次讀入並預先壓縮（brotli/gzip），請求時只做編碼協商與ETag比對，不讀磁碟也不壓縮
+    """
+
+    def __init__(self, root: str, immutable_prefix: str = "static/", index: str = "index.html"):
+        self.root = root
+        self.immutable_prefix = immutable_prefix
+        self.index = index
+        self.assets: Dict[str, StaticAsset] = {}
+        self.load_seconds: float = 0.0
+        self.hits: Dict[str, int] = {}
+        self.not_modified: int = 0
+
+    @property
+    def loaded(self) -> bool:
+        return self.index in self.assets
+
+    def load(self) -> int:
+        """讀入 root 下所有檔案，返回檔案數（阻塞，啟動時以執行緒呼叫）"""
+        started = time.perf_counter()
+        assets: Dict[str, StaticAsset] = {}
+        for directory, _, files in os.walk(self.root):
+            for filename in files:
+                full_path = os.path.join(directory, filename)
+                path = os.path.relpath(full_path, self.root).replace(os.sep, "/")
+                try:
+                    with open(full_path, "rb") as f:
+                        body = f.read()
+                except OSError as e:
+                    logger.error(f"讀取靜態檔案失敗 {full_path}: {e}")
+                    continue
+                content_type = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+                cache_control = IMMUTABLE_CACHE if path.startswith(self.immutable_prefix) else REVALIDATE_CACHE
+                assets[path] = StaticAsset(path, body, content_type, cache_control)
+        self.assets = assets
+        self.load_seconds = time.perf_counter() - started
+        logger.info(
+            f"前端靜態檔案已載入記憶體: {len(assets)} 個檔案, "
+            f"{sum(asset.size for asset in assets.values()) / 1024:.0f} KB（含壓縮版本）, "
+            f"{self.load_seconds:.2f}s, brotli={'啟用' if brotli is not None else '未安裝'}"
+        )
+        return len(assets)
+
+    def get(self, path: str) -> Optional[StaticAsset]:
+        return self.assets.get(path.lstrip("/"))
+
+    def get_page(self, path: str) -> Optional[StaticAsset]:
+        """前端路由：存在的檔案（favicon.ico、manifest.json 等）直接返回，其餘返回 index.html"""
+        return self.get(path) or self.assets.get(self.index)
+
+    def select(self, asset: StaticAsset, accept_encoding: str) -> str:
+        """依 Accept-Encoding 選擇編碼，偏好順序 br > gzip > identity"""
+        if len(asset.variants) == 1:
+            return "identity"
+        accepted = parse_accept_encoding(accept_encoding)
+        wildcard = accepted.get("*", 0.0)
+        for encoding in ("br", "gzip"):
+            if encoding in asset.variants and accepted.get(encoding, wildcard) > 0:
+                return encoding
+        return "identity"
+
+    def respond(self, asset: StaticAsset, request_headers: Mapping[str, str]) -> Tuple[int, bytes, Dict[str, str]]:
+        """
+        產生響應
+
+        Returns:
+            (HTTP狀態, body, headers)：ETag相符時為304與空body
+        """
+        encoding = self.select(asset, request_headers.get("accept-encoding", ""))
+        etag = asset.etags[encoding]
+        headers = {"ETag": etag, "Cache-Control": asset.cache_control}
+        if len(asset.variants) > 1:
+            headers["Vary"] = "Accept-Encoding"
+        if_none_match = request_headers.get("if-none-match")
+        if if_none_match and etag_matches(if_none_match, etag):
+            self.not_modified += 1
+            return 304, b"", headers
+        self.hits[encoding] = self.hits.get(encoding, 0) + 1
+        headers["Content-Type"] = asset.content_type
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+        return 200, asset.variants[encoding], headers
+
+    def get_stats(self) -> dict:
+        return {
+            "root": self.root,
+            "files": len(self.assets),
+            "bytes": {
+                encoding: sum(len(asset.variants.get(encoding, b"")) for asset in self.assets.values())
+                for encoding in ("identity", "gzip", "br")
+            },
+            "load_seconds": round(self.load_seconds, 3),
+            "brotli": brotli is not None,
+            "responses": dict(self.hits),
+            "not_modified": self.not_modified,
+        }
@@ -0,0 +1,239 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Awaitable, Callable, Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+Precision = Dict[str, Dict[str, int]]
+# 返回 (交易對集合, 精度信息)，失敗時返回None
+SymbolLoader = Callable[[], Awaitable[Optional[Tuple[set, Precision]]]]
+
+
+class SymbolSnapshot:
+    """
+    某一時刻各交易所的交易對與精度（建立後不再修改）
+    排序列表與集合索引在建立時一次算好，刷新時整份替換
+    """
+
+    __slots__ = ('symbols', 'precision', 'updated_at_by_venue', 'sorted_symbols', 'common_symbols', 'common_sorted')
+
+    def __init__(
+        self,
+        symbols: Dict[str, Iterable[str]],
+        precision: Dict[str, Precision],
+        updated_at: Optional[Dict[str, float]] = None
+    ):
+        self.symbols: Dict[str, FrozenSet[str]] = {venue: frozenset(items) for venue, items in symbols.items()}
+        self.precision = precision  # 交易所代號 -> 交易對 -> 精度
+        self.updated_at_by_venue: Dict[str, float] = dict(updated_at or {})
+        self.sorted_symbols: Dict[str, List[str]] = {venue: sorted(items) for venue, items in self.symbols.items()}
+        # 共同交易對以MX與LBank為準（抓取管線與前端的交易對列表）
+        self.common_symbols: FrozenSet[str] = self.venue_symbols("mx") & self.venue_symbols("lbank")
+        self.common_sorted = sorted(self.common_symbols)
+
+    def venue_symbols(self, venue: str) -> FrozenSet[str]:
+        return self.symbols.get(venue, frozenset())
+
+    def venue_sorted(self, venue: str) -> List[str]:
+        return self.sorted_symbols.get(venue, [])
+
+    @property
+    def mx_symbols(self) -> FrozenSet[str]:
+        return self.venue_symbols("mx")
+
+    @property
+    def lbank_symbols(self) -> FrozenSet[str]:
+        return self.venue_symbols("lbank")
+
+    @property
+    def mx_sorted(self) -> List[str]:
+        return self.venue_sorted("mx")
+
+    @property
+    def lbank_sorted(self) -> List[str]:
+        return self.venue_sorted("lbank")
+
+    @property
+    def updated_at(self) -> float:
+        """各交易所中最舊的更新時間"""
+        return min((self.updated_at_by_venue.get(venue, 0.0) for venue in self.symbols), default=0.0)
+
+    @property
+    def empty(self) -> bool:
+        return not self.mx_symbols or not self.lbank_symbols
+
+    def to_dict(self) -> dict:
+        return {
+            "symbols": self.sorted_symbols,
+            "precision": self.precision,
+            "updated_at": self.updated_at_by_venue,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "SymbolSnapshot":
+        if "symbols" not in data:
+            # 舊版快取：只有MX與LBank，精度為MX的
+            snapshot = cls(
+                {"mx": data.get("mx_symbols", []), "lbank": data.get("lbank_symbols", [])},
+                {"mx": data.get("precision", {})},
+                {"mx": data.get("mx_updated_at", 0.0), "lbank": data.get("lbank_updated_at", 0.0)}
+            )
+        else:
+            snapshot = cls(data["symbols"], data.get("precision", {}), data.get("updated_at", {}))
+        mx_precision = snapshot.precision.get("mx", {})
+        if mx_precision and not all("contract_size" in info for info in mx_precision.values()):
+            # 沒有合約面值的舊快取：MX數量無法換算為幣，視為過期立即刷新
+            snapshot.updated_at_by_venue["mx"] = 0.0
+        return snapshot
+
+
+class SymbolCache:
+    """
+    交易對元數據快取
+    啟動時從本地檔案立即載入，之後按TTL在背景刷新；
+    每個交易所一個載入函數（由適配器註冊表產生），某一交易所刷新失敗時沿用該交易所的舊數據
+    """
+
+    def __init__(self, path: str, ttl: float, loaders: Dict[str, SymbolLoader], retry_interval: float = 30.0):
+        self.path = path
+        self.ttl = ttl
+        self.retry_interval = retry_interval
+        self.loaders = loaders
+        self.snapshot = SymbolSnapshot({venue: [] for venue in loaders}, {})
+        self.refresh_count: int = 0
+        self.failed_refreshes: int = 0
+        self.last_error: Optional[str] = None
+        self._refreshing: Optional[asyncio.Task] = None
+        self._task: Optional[asyncio.Task] = None
+        # 快照替換後的回呼（例如排程器同步交易對）
+        self.listeners: List[Callable[[SymbolSnapshot], None]] = []
+
+    def load(self) -> bool:
+        """從磁碟載入快取，返回是否成功"""
+        try:
+            with open(self.path, 'r') as f:
+                self.snapshot = SymbolSnapshot.from_dict(json.load(f))
+            counts = ", ".join(f"{venue} {len(items)}" for venue, items in self.snapshot.symbols.items())
+            logger.info(f"已從快取載入交易對: {counts}, 快取年齡 {self.age():.0f} 秒")
+            return True
+        except FileNotFoundError:
+            return False
+        except Exception as e:
+            logger.error(f"讀取交易對快取失敗: {e}")
+            return False
+
+    def save(self):
+        """寫入暫存檔後替換，避免寫到一半的檔案"""
+        try:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(self.snapshot.to_dict(), f)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            logger.error(f"寫入交易對快取失敗: {e}")
+
+    def age(self) -> float:
+        updated_at = self.snapshot.updated_at
+        return time.time() - updated_at if updated_at else float('inf')
+
+    def refresh(self) -> "asyncio.Task":
+        """刷新交易對（同時只有一個刷新在進行，重複呼叫共用同一任務）"""
+        if self._refreshing is None or self._refreshing.done():
+            self._refreshing = asyncio.create_task(self._refresh())
+        return self._refreshing
+
+    async def _refresh(self) -> bool:
+        venues = list(self.loaders)
+        results = await asyncio.gather(*(self.loaders[venue]() for venue in venues), return_exceptions=True)
+        current = self.snapshot
+        now = time.time()
+
+        symbols = {venue: current.venue_symbols(venue) for venue in venues}
+        precision = {venue: current.precision.get(venue, {}) for venue in venues}
+        updated_at = {venue: current.updated_at_by_venue.get(venue, 0.0) for venue in venues}
+        errors = []
+
+        for venue, result in zip(venues, results):
+            if isinstance(result, tuple) and result[0]:
+                symbols[venue], precision[venue] = result
+                updated_at[venue] = now
+            else:
+                errors.append(f"{venue}: {result}")
+
+        if len(errors) < len(venues):
+            # 整份替換，讀取方不會看到更新到一半的狀態
+            self.snapshot = SymbolSnapshot(symbols, precision, updated_at)
+            self.save()
+            self.refresh_count += 1
+            for listener in self.listeners:
+                try:
+                    listener(self.snapshot)
+                except Exception as e:
+                    logger.error(f"交易對更新回呼失敗: {e}")
+            counts = ", ".join(f"{venue} {len(items)}" for venue, items in self.snapshot.symbols.items())
+            logger.info(f"交易對數量: {counts}, 共同交易對: {len(self.snapshot.common_symbols)}")
+
+        if errors:
+            self.failed_refreshes += 1
+            self.last_error = "; ".join(errors)
+            logger.error(f"刷新交易對失敗，沿用快取數據: {self.last_error}")
+            return False
+        self.last_error = None
+        return True
+
+    async def ready(self, timeout: float) -> SymbolSnapshot:
+        """快取為空時等待刷新完成（最多timeout秒），返回目前的快照"""
+        if self.snapshot.empty:
+            try:
+                await asyncio.wait_for(asyncio.shield(self.refresh()), timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f"等待交易對刷新超過 {timeout} 秒")
+        return self.snapshot
+
+    def start(self):
+        """啟動背景刷新：快取過期時立即刷新，之後每TTL秒刷新一次"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._refresh_loop())
+
+    async def _refresh_loop(self):
+        while True:
+            try:
+                if self.age() >= self.ttl:
+                    ok = await self.refresh()
+                    # 失敗時以較短間隔重試
+                    delay = self.ttl if ok else min(self.ttl, self.retry_interval)
+                else:
+                    delay = self.ttl - self.age()
+                await asyncio.sleep(delay)
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.error(f"交易對背景刷新錯誤: {e}")
+                await asyncio.sleep(self.retry_interval)
+
+    async def close(self):
+        for task in (self._task, self._refreshing):
+            if task and not task.done():
+                task.cancel()
+        self._task = None
+
+    def get_stats(self) -> dict:
+        snapshot = self.snapshot
+        return {
+            "path": self.path,
+            "ttl_seconds": self.ttl,
+            "age_seconds": round(self.age(), 1) if snapshot.updated_at else None,
+            "mx_symbols": len(snapshot.mx_symbols),
+            "lbank_symbols": len(snapshot.lbank_symbols),
+            "venues": {venue: len(items) for venue, items in snapshot.symbols.items()},
+            "common_symbols": len(snapshot.common_symbols),
+            "refresh_count": self.refresh_count,
+            "failed_refreshes": self.failed_refreshes,
+            "last_error": self.last_error,
+        }
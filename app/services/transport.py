@@ -0,0 +1,300 @@
+"""
+交易所HTTP傳輸層
+
+每個交易所一個獨立的連接池（keep-alive、DNS快取、啟動時預熱），
+深度請求超過該交易所近期p95延遲仍未返回時發出第二個請求（hedged request），取先返回2xx者；
+連續失敗時熔斷，在恢復前直接跳過該交易所而不是每個tick都等到超時
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Deque, List, Optional, Tuple
+
+import aiohttp
+
+from .metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+TRANSPORT_REQUESTS = REGISTRY.counter(
+    "lbmx_transport_requests", "Exchange REST requests by outcome", ("exchange", "result")
+)
+HEDGES = REGISTRY.counter("lbmx_transport_hedges", "Hedged requests fired and won", ("exchange", "outcome"))
+
+# 已建立的傳輸（供熔斷狀態指標使用）
+_TRANSPORTS: List["VenueTransport"] = []
+
+REGISTRY.gauge(
+    "lbmx_transport_circuit_open", "1 while the venue's circuit breaker is open", ("exchange",),
+    callback=lambda: [((t.name,), 0.0 if t.breaker.state == "closed" else 1.0) for t in _TRANSPORTS]
+)
+
+
+class CircuitOpenError(Exception):
+    """熔斷中，請求未發出"""
+
+
+class LatencyWindow:
+    """最近N次成功請求的延遲，分位數每隔幾筆重新計算一次"""
+
+    def __init__(self, size: int = 200, refresh_every: int = 10):
+        self.samples: Deque[float] = deque(maxlen=size)
+        self.refresh_every = refresh_every
+        self._since_refresh = 0
+        self._sorted: list = []
+
+    def add(self, seconds: float):
+        self.samples.append(seconds)
+        self._since_refresh += 1
+        if self._since_refresh >= self.refresh_every or len(self.samples) <= self.refresh_every:
+            self._since_refresh = 0
+            self._sorted = sorted(self.samples)
+
+    def percentile(self, p: float) -> Optional[float]:
+        if not self._sorted:
+            return None
+        return self._sorted[min(len(self._sorted) - 1, int(len(self._sorted) * p))]
+
+
+class CircuitBreaker:
+    """
+    熔斷器：連續 failure_threshold 次失敗後打開，reset_timeout 秒後放行一個試探請求（half_open），
+    試探成功則關閉，失敗則重新打開
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 10.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.opened_count = 0
+        self._probing = False
+
+    def allow(self) -> bool:
+        if self.state == "closed":
+            return True
+        if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self.state = "half_open"
+            self._probing = False
+        if self.state == "half_open" and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def release_probe(self):
+        """試探請求沒有結果（被取消）時釋放試探名額，下一個請求可以再試探"""
+        self._probing = False
+
+    def record_success(self):
+        self.state = "closed"
+        self.failures = 0
+        self._probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            if self.state != "open":
+                self.opened_count += 1
+            self.state = "open"
+            self.opened_at = time.monotonic()
+            self._probing = False
+
+    def get_stats(self) -> dict:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "opened_count": self.opened_count,
+            "retry_in_seconds": round(max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at)), 1)
+            if self.state == "open" else None,
+        }
+
+
+class VenueTransport:
+    """單一交易所的HTTP傳輸：獨立連接池、hedged GET與熔斷"""
+
+    def __init__(
+        self,
+        name: str,
+        timeout: float = 3.0,
+        pool_size: int = 16,
+        dns_ttl: int = 300,
+        hedge: bool = True,
+        hedge_percentile: float = 0.95,
+        hedge_min_delay: float = 0.02,
+        hedge_max_ratio: float = 0.1,
+        min_samples: int = 20,
+        failure_threshold: int = 5,
+        reset_timeout: float = 10.0
+    ):
+        self.name = name
+        self.timeout = timeout  # 深度請求的總超時（秒）
+        self.pool_size = pool_size
+        self.dns_ttl = dns_ttl
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_delay = hedge_min_delay
+        self.hedge_max_ratio = hedge_max_ratio  # hedge請求佔全部請求的上限，避免在交易所整體變慢時加倍負載
+        self.min_samples = min_samples
+        self.latency = LatencyWindow()
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.session: Optional[aiohttp.ClientSession] = None
+
+        self.requests: int = 0
+        self.hedged: int = 0
+        self.hedge_wins: int = 0
+        self.failures: int = 0
+        self.rejected: int = 0  # 熔斷中被跳過的請求
+        _TRANSPORTS.append(self)
+
+    async def start(self):
+        connector = aiohttp.TCPConnector(
+            limit=self.pool_size,
+            limit_per_host=self.pool_size,
+            ttl_dns_cache=self.dns_ttl,
+            keepalive_timeout=60
+        )
+        # 交易對列表等大響應使用較寬的預設超時，深度請求另外指定 self.timeout
+        self.session = aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=10))
+
+    async def warm_up(self, url: str, connections: int = 2):
+        """預先建立連接（DNS解析、TCP與TLS握手），第一個tick不用承擔建連延遲"""
+        async def touch():
+            try:
+                async with self.session.get(url, timeout=aiohttp.ClientTimeout(total=self.timeout)) as response:
+                    await response.read()
+            except Exception as e:
+                logger.debug(f"{self.name} 連接預熱失敗: {e}")
+
+        started = time.perf_counter()
+        await asyncio.gather(*(touch() for _ in range(connections)))
+        logger.info(f"{self.name} 連接預熱完成 ({connections} 條, {(time.perf_counter() - started) * 1000:.0f} ms)")
+
+    async def close(self):
+        if self in _TRANSPORTS:
+            _TRANSPORTS.remove(self)
+        if self.session:
+            await self.session.close()
+
+    def hedge_delay(self) -> Optional[float]:
+        """發出hedge請求前等待的秒數，樣本不足或已達hedge比例上限時返回None"""
+        if not self.hedge or len(self.latency.samples) < self.min_samples:
+            return None
+        if self.hedged >= self.hedge_max_ratio * self.requests:
+            return None
+        p = self.latency.percentile(self.hedge_percentile)
+        return max(p, self.hedge_min_delay) if p is not None else None
+
+    async def _request(self, url: str, params: Optional[dict]) -> Tuple[int, bytes]:
+        async with self.session.get(
+            url, params=params, timeout=aiohttp.ClientTimeout(total=self.timeout)
+        ) as response:
+            if response.status != 200:
+                return response.status, b""
+            return response.status, await response.read()
+
+    async def get(self, url: str, params: Optional[dict] = None) -> Tuple[int, bytes]:
+        """
+        GET請求，返回 (HTTP狀態, 響應body)；非200時body為空
+
+        Raises:
+            CircuitOpenError: 熔斷中
+            asyncio.TimeoutError / aiohttp.ClientError: 請求失敗
+        """
+        if not self.breaker.allow():
+            self.rejected += 1
+            TRANSPORT_REQUESTS.inc((self.name, "circuit_open"))
+            raise CircuitOpenError(f"{self.name} 熔斷中")
+
+        self.requests += 1
+        started = time.perf_counter()
+        tasks = [asyncio.create_task(self._request(url, params))]
+        try:
+            delay = self.hedge_delay()
+            if delay is not None:
+                done, _ = await asyncio.wait(tasks, timeout=delay)
+                if not done:
+                    # 超過p95仍未返回，再發一個請求，取先成功者
+                    self.hedged += 1
+                    HEDGES.inc((self.name, "fired"))
+                    tasks.append(asyncio.create_task(self._request(url, params)))
+            status, body, winner = await self._first_result(tasks)
+        except asyncio.CancelledError:
+            # 調用方取消（例如管線停止）不計入失敗，但必須釋放試探名額，否則熔斷器永遠停在half_open
+            self.breaker.release_probe()
+            raise
+        except Exception as e:
+            self.failures += 1
+            self.breaker.record_failure()
+            TRANSPORT_REQUESTS.inc((self.name, "timeout" if isinstance(e, asyncio.TimeoutError) else "error"))
+            raise
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+        if winner == 1:
+            self.hedge_wins += 1
+            HEDGES.inc((self.name, "won"))
+        if status >= 500:
+            self.failures += 1
+            self.breaker.record_failure()
+            TRANSPORT_REQUESTS.inc((self.name, "server_error"))
+        else:
+            # 429等客戶端錯誤由排程器退避處理，不計入熔斷
+            self.breaker.record_success()
+            TRANSPORT_REQUESTS.inc((self.name, "ok" if status == 200 else "client_error"))
+            if status == 200:
+                self.latency.add(time.perf_counter() - started)
+        return status, body
+
+    @staticmethod
+    async def _first_result(tasks: list) -> Tuple[int, bytes, int]:
+        """
+        等待第一個返回2xx的請求，返回 (狀態, body, 第幾個請求)
+        非2xx響應或例外不算勝出，繼續等待另一個請求；全部結束都沒有2xx時返回最後的非2xx響應，
+        沒有任何響應時拋出最後的錯誤
+        """
+        pending = set(tasks)
+        error: Optional[BaseException] = None
+        fallback: Optional[Tuple[int, bytes, int]] = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is not None:
+                    error = task.exception()
+                    continue
+                status, body = task.result()
+                if 200 <= status < 300:
+                    return status, body, tasks.index(task)
+                fallback = (status, body, tasks.index(task))
+        if fallback is not None:
+            return fallback
+        raise error
+
+    def _idle_connections(self) -> int:
+        """連接池中可重用的keep-alive連接數"""
+        connector = self.session.connector if self.session else None
+        if connector is None:
+            return 0
+        return sum(len(conns) for conns in getattr(connector, "_conns", {}).values())
+
+    def get_stats(self) -> dict:
+        p50 = self.latency.percentile(0.5)
+        p95 = self.latency.percentile(self.hedge_percentile)
+        return {
+            "timeout_seconds": self.timeout,
+            "pool_size": self.pool_size,
+            "idle_connections": self._idle_connections(),
+            "requests": self.requests,
+            "failures": self.failures,
+            "rejected": self.rejected,
+            "hedged": self.hedged,
+            "hedge_wins": self.hedge_wins,
+            "p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+            "p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+            "hedge_delay_ms": round(self.hedge_delay() * 1000, 1) if self.hedge_delay() is not None else None,
+            "circuit": self.breaker.get_stats(),
+        }
@@ -0,0 +1,253 @@
+import json
+import logging
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple, Union, TYPE_CHECKING
+
+from ..models.market_data import OrderBook, SpreadData
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson為可選依賴
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - msgpack為可選依賴
+    msgpack = None
+
+if TYPE_CHECKING:
+    from .connection_manager import ClientConnection
+
+logger = logging.getLogger(__name__)
+
+PROTOCOL_LEGACY = 1  # 每個模式一則market_update，完整訂單簿
+PROTOCOL_DELTA = 2  # 每個tick一則合併訊息，訂單簿以價位差異傳送
+
+Levels = Tuple[Tuple[float, float], ...]
+
+
+def dumps(data) -> str:
+    """序列化為JSON字串（有orjson時使用orjson）"""
+    if orjson is not None:
+        return orjson.dumps(data, default=str).decode()
+    return json.dumps(data, default=_json_default)
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def _msgpack_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def encode(data, encoding: str) -> Union[str, bytes]:
+    """依協商的編碼序列化：'json' 返回文字幀，'msgpack' 返回二進位幀"""
+    if encoding == 'msgpack' and msgpack is not None:
+        return msgpack.packb(data, default=_msgpack_default, use_bin_type=True)
+    return dumps(data)
+
+
+def negotiate(protocol: Optional[str], encoding: Optional[str]) -> Tuple[int, str]:
+    """根據客戶端請求決定協議版本與編碼，不支援時回退"""
+    try:
+        version = int(protocol) if protocol else PROTOCOL_LEGACY
+    except ValueError:
+        version = PROTOCOL_LEGACY
+    if version not in (PROTOCOL_LEGACY, PROTOCOL_DELTA):
+        version = PROTOCOL_LEGACY
+
+    # 二進位幀只用於新協議
+    if encoding == 'msgpack' and msgpack is not None and version == PROTOCOL_DELTA:
+        return version, 'msgpack'
+    return version, 'json'
+
+
+class BookVersioner:
+    """
+    訂單簿版本管理
+    價位有變化時才遞增序號，取代對整份JSON做hash的變化檢測；
+    保留最近的版本以計算任意兩個版本之間的價位差異
+    """
+
+    def __init__(self, history: int = 64, diff_cache: int = 256):
+        self.history = history
+        self._versions: Dict[str, "OrderedDict[int, Tuple[Levels, Levels]]"] = {}
+        self._latest: Dict[str, int] = {}
+        self._meta: Dict[str, dict] = {}
+        self._diff_cache: "OrderedDict[Tuple[str, Optional[int], int], dict]" = OrderedDict()
+        self._diff_cache_size = diff_cache
+
+    @staticmethod
+    def key(orderbook: OrderBook) -> str:
+        return f"{orderbook.exchange}:{orderbook.symbol}"
+
+    def update(self, orderbook: OrderBook) -> int:
+        """記錄訂單簿，返回其版本號（價位未變化時沿用上一版本）"""
+        key = self.key(orderbook)
+        bids = tuple((entry.price, entry.quantity) for entry in orderbook.bids)
+        asks = tuple((entry.price, entry.quantity) for entry in orderbook.asks)
+
+        versions = self._versions.setdefault(key, OrderedDict())
+        latest = self._latest.get(key)
+        if latest is not None and versions[latest] == (bids, asks):
+            return latest
+
+        seq = (latest or 0) + 1
+        versions[seq] = (bids, asks)
+        while len(versions) > self.history:
+            versions.popitem(last=False)
+        self._latest[key] = seq
+        self._meta[key] = {
+            "exchange": orderbook.exchange,
+            "symbol": orderbook.symbol,
+            "price_precision": orderbook.price_precision,
+            "quantity_precision": orderbook.quantity_precision,
+        }
+        return seq
+
+    def latest(self, key: str) -> Optional[int]:
+        return self._latest.get(key)
+
+    @staticmethod
+    def _diff(old: Levels, new: Levels) -> List[List[float]]:
+        """新增或變更的價位，以及數量為0的移除價位"""
+        old_levels = dict(old)
+        new_levels = dict(new)
+        changes = [[price, quantity] for price, quantity in new if old_levels.get(price) != quantity]
+        changes.extend([price, 0] for price in old_levels if price not in new_levels)
+        return changes
+
+    def encode(self, key: str, base: Optional[int], seq: int) -> dict:
+        """
+        編碼版本 seq 相對於 base 的訂單簿
+        base為None或已不在歷史中時返回完整快照
+        """
+        versions = self._versions[key]
+        if base is not None and base not in versions:
+            base = None
+
+        cache_key = (key, base, seq)
+        cached = self._diff_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        bids, asks = versions[seq]
+        if base is None:
+            encoded = {
+                "seq": seq,
+                "full": True,
+                "bids": [list(level) for level in bids],
+                "asks": [list(level) for level in asks],
+                **self._meta[key],
+            }
+        else:
+            base_bids, base_asks = versions[base]
+            encoded = {
+                "seq": seq,
+                "base": base,
+                "bids": self._diff(base_bids, bids),
+                "asks": self._diff(base_asks, asks),
+            }
+
+        self._diff_cache[cache_key] = encoded
+        while len(self._diff_cache) > self._diff_cache_size:
+            self._diff_cache.popitem(last=False)
+        return encoded
+
+
+class MarketTick:
+    """
+    一次tick的市場數據
+    舊協議客戶端共用預先序列化的 market_update；
+    新協議客戶端在發送時依該連接已送達的版本產生差異訊息。
+    差異以「已寫入該連接的版本」為基準：同一WebSocket連接上的幀按順序送達，幀寫入失敗時連接即關閉，
+    新連接從完整快照開始；每則差異帶有 base，客戶端持有的版本與 base 不符時發送 resync 取得完整快照
+    """
+
+    def __init__(
+        self,
+        versioner: BookVersioner,
+        symbol: str,
+        mx_orderbook: OrderBook,
+        lbank_orderbook: OrderBook,
+        spreads: Dict[str, SpreadData]
+    ):
+        self.versioner = versioner
+        self.symbol = symbol
+        self.mx_orderbook = mx_orderbook
+        self.lbank_orderbook = lbank_orderbook
+        self.spreads = spreads
+        self.books = {
+            'mx': (versioner.key(mx_orderbook), versioner.update(mx_orderbook)),
+            'lbank': (versioner.key(lbank_orderbook), versioner.update(lbank_orderbook)),
+        }
+        self.timestamp = max(spread.timestamp for spread in spreads.values()) if spreads else datetime.now()
+        self._spread_data: Optional[Dict[str, dict]] = None
+        self._legacy: Optional[List[Tuple[str, str]]] = None
+        self._rendered: Dict[tuple, Union[str, bytes]] = {}
+
+    @property
+    def key(self) -> str:
+        """合併鍵：兩邊交易對相同時為交易對，自選組合時為 MX|LBank"""
+        lbank_symbol = self.lbank_orderbook.symbol
+        return self.symbol if lbank_symbol == self.symbol else f"{self.symbol}|{lbank_symbol}"
+
+    @property
+    def versions(self) -> Tuple[int, int]:
+        return self.books['mx'][1], self.books['lbank'][1]
+
+    def spread_data(self) -> Dict[str, dict]:
+        if self._spread_data is None:
+            self._spread_data = {mode: spread.model_dump() for mode, spread in self.spreads.items()}
+        return self._spread_data
+
+    def legacy_messages(self) -> List[Tuple[str, str]]:
+        """舊協議訊息 [(合併鍵, JSON)]，所有舊協議客戶端共用"""
+        if self._legacy is None:
+            mx_orderbook_data = self.mx_orderbook.model_dump()
+            lbank_orderbook_data = self.lbank_orderbook.model_dump()
+            self._legacy = [
+                (f"{self.key}_{mode}", dumps({
+                    'type': 'market_update',
+                    'symbol': self.symbol,
+                    'mode': mode,
+                    'mx_orderbook': mx_orderbook_data,
+                    'lbank_orderbook': lbank_orderbook_data,
+                    'spread_data': spread_data,
+                    'timestamp': self.timestamp.isoformat()
+                }))
+                for mode, spread_data in self.spread_data().items()
+            ]
+        return self._legacy
+
+    def render(self, client: "ClientConnection") -> Union[str, bytes]:
+        """為新協議客戶端產生合併訊息（不修改連接狀態，送達後由 delivered 記錄版本）"""
+        bases = tuple(client.book_versions.get(key) for key, _ in self.books.values())
+        cache_key = (bases, client.encoding)
+        payload = self._rendered.get(cache_key)
+        if payload is None:
+            books = {
+                name: self.versioner.encode(key, base, seq)
+                for (name, (key, seq)), base in zip(self.books.items(), bases)
+            }
+            payload = encode({
+                'type': 'tick',
+                'v': PROTOCOL_DELTA,
+                'symbol': self.symbol,
+                'books': books,
+                'spreads': self.spread_data(),
+                'timestamp': self.timestamp.isoformat(),
+            }, client.encoding)
+            self._rendered[cache_key] = payload
+        return payload
+
+    def delivered(self, client: "ClientConnection"):
+        """訊息已寫入連接：記錄該連接持有的版本，作為下一則差異的基準"""
+        for key, seq in self.books.values():
+            client.book_versions[key] = seq
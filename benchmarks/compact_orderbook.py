@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+CompactOrderBook 與 Pydantic OrderBook 的記憶體與吞吐量比較
+
+用法:
+    python benchmarks/compact_orderbook.py
+    python benchmarks/compact_orderbook.py --depths 20 200 1000 --symbols 300
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models.compact_orderbook import CompactOrderBook  # noqa: E402
+from app.models.market_data import OrderBook, OrderBookEntry  # noqa: E402
+
+
+def make_levels(depth: int, mid: float = 100.0, tick: float = 0.01):
+    """產生交易所格式的原始價位 [[price, quantity], ...]（字串，與LBank/MX響應一致）"""
+    bids = [[f"{mid - tick * (i + 1):.4f}", f"{random.uniform(0.1, 50):.6f}"] for i in range(depth)]
+    asks = [[f"{mid + tick * (i + 1):.4f}", f"{random.uniform(0.1, 50):.6f}"] for i in range(depth)]
+    return bids, asks
+
+
+def build_pydantic(bids, asks) -> OrderBook:
+    return OrderBook(
+        exchange="LBank",
+        symbol="BTC/USDT",
+        bids=[OrderBookEntry(price=float(b[0]), quantity=float(b[1])) for b in bids],
+        asks=[OrderBookEntry(price=float(a[0]), quantity=float(a[1])) for a in asks],
+        timestamp=datetime.now(),
+        price_precision=4,
+        quantity_precision=6
+    )
+
+
+def build_compact(bids, asks) -> CompactOrderBook:
+    return CompactOrderBook.from_levels("LBank", "BTC/USDT", bids, asks, price_precision=4, quantity_precision=6)
+
+
+def measure(func, iterations: int) -> float:
+    """返回每秒操作數"""
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    elapsed = time.perf_counter() - start
+    return iterations / elapsed if elapsed > 0 else float('inf')
+
+
+def memory_per_book(factory, count: int) -> float:
+    """建立count份訂單簿後的平均記憶體（位元組）"""
+    tracemalloc.start()
+    books = [factory() for _ in range(count)]
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del books
+    return current / count
+
+
+def run(depths, symbols: int, iterations: int):
+    print(f"{'depth':>6} {'stage':<14} {'pydantic ops/s':>16} {'compact ops/s':>16} {'speedup':>8}")
+    for depth in depths:
+        bids, asks = make_levels(depth)
+        pydantic_book = build_pydantic(bids, asks)
+        compact_book = build_compact(bids, asks)
+        n = max(10, iterations // depth)
+
+        stages = [
+            ("build", lambda: build_pydantic(bids, asks), lambda: build_compact(bids, asks)),
+            ("serialize", pydantic_book.model_dump, compact_book.to_dict),
+            ("top20", lambda: pydantic_book.bids[:20], lambda: compact_book.top(20)),
+            ("best_compare",
+             lambda: pydantic_book.bids[0].price < pydantic_book.asks[0].price,
+             lambda: compact_book.best_bid < compact_book.best_ask),
+        ]
+        for name, pydantic_func, compact_func in stages:
+            p = measure(pydantic_func, n)
+            c = measure(compact_func, n)
+            print(f"{depth:>6} {name:<14} {p:>16,.0f} {c:>16,.0f} {c / p:>7.1f}x")
+
+        p_mem = memory_per_book(lambda: build_pydantic(bids, asks), symbols)
+        c_mem = memory_per_book(lambda: build_compact(bids, asks), symbols)
+        print(f"{depth:>6} {'memory/book':<14} {p_mem:>15,.0f}B {c_mem:>15,.0f}B {p_mem / c_mem:>7.1f}x")
+        print(f"{depth:>6} {'memory total':<14} {p_mem * symbols / 1e6:>14.2f}MB "
+              f"{c_mem * symbols / 1e6:>14.2f}MB   ({symbols} symbols x 2 exchanges: "
+              f"{p_mem * symbols * 2 / 1e6:.1f}MB vs {c_mem * symbols * 2 / 1e6:.1f}MB)")
+        print()
+
+    # 精度檢查：浮點累加誤差 vs 定點整數
+    book = build_compact([["0.1", "1"]], [["0.3", "1"]])
+    drift = 0.1 + 0.2 == 0.3
+    exact = book.best_bid + round(0.2 * book.price_scale) == book.best_ask
+    print(f"float 0.1+0.2==0.3: {drift}, fixed-point: {exact}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="CompactOrderBook vs Pydantic OrderBook")
+    parser.add_argument("--depths", type=int, nargs="+", default=[20, 200, 1000])
+    parser.add_argument("--symbols", type=int, default=300, help="記憶體估算的交易對數量")
+    parser.add_argument("--iterations", type=int, default=20000)
+    args = parser.parse_args()
+    random.seed(42)
+    run(args.depths, args.symbols, args.iterations)
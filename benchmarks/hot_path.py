@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+熱路徑微基準：響應解析、OrderBook建立、價差計算、廣播序列化
+
+每個階段報告 ops/s、p50/p99延遲與每次操作的記憶體峰值，
+結果可寫成JSON，並與另一次的結果比較找出退化
+
+用法:
+    python benchmarks/hot_path.py
+    python benchmarks/hot_path.py --depths 20 200 1000 --symbols 1 50 300 --output results.json
+    python benchmarks/hot_path.py --output new.json --compare baseline.json --threshold 0.1
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from legacy_path import calculate_spread, parse_lbank_orderbook, parse_mx_orderbook  # noqa: E402
+from payloads import load_payloads, symbol_payloads  # noqa: E402
+from app.services.exchange_service import ExchangeService  # noqa: E402
+from app.services.spread_calculator import SpreadCalculator  # noqa: E402
+from app.services.wire_protocol import BookVersioner, MarketTick  # noqa: E402
+
+MODES = ['mx_buy_lbank_sell', 'lbank_buy_mx_sell']
+
+
+def measure(func: Callable, iterations: int, min_time: float) -> dict:
+    """逐次計時，返回 ops/s 與延遲分位數（微秒），以及單次操作的記憶體峰值"""
+    for _ in range(min(iterations, 10)):
+        func()  # 預熱
+
+    samples: List[int] = []
+    started = time.perf_counter()
+    while len(samples) < iterations or time.perf_counter() - started < min_time:
+        t0 = time.perf_counter_ns()
+        func()
+        samples.append(time.perf_counter_ns() - t0)
+    total = sum(samples)
+    samples.sort()
+
+    def percentile(p: float) -> float:
+        return samples[min(len(samples) - 1, int(len(samples) * p))] / 1000
+
+    # 記憶體峰值單獨測量（tracemalloc會拖慢計時）
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    baseline, _ = tracemalloc.get_traced_memory()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "iterations": len(samples),
+        "ops_per_sec": round(len(samples) / (total / 1e9), 2) if total else None,
+        "p50_us": round(percentile(0.5), 2),
+        "p99_us": round(percentile(0.99), 2),
+        "alloc_peak_bytes": peak - baseline,
+    }
+
+
+def stages_for_depth(depth: int, payload_dir: Optional[str]) -> Dict[str, Callable]:
+    """單一交易對在指定深度下的各階段"""
+    service = ExchangeService()
+    calculator = SpreadCalculator()
+    versioner = BookVersioner()
+    mx_raw, lbank_raw = load_payloads(depth, payload_dir)
+    mx_data = json.loads(mx_raw)
+    lbank_data = json.loads(lbank_raw)
+    mx_book = parse_mx_orderbook(service, "BTC/USDT", mx_data['data'], depth=None)
+    lbank_book = parse_lbank_orderbook(service, "BTC/USDT", lbank_data, depth=None)
+    spreads = calculator.calculate_all({'mx': mx_book, 'lbank': lbank_book})
+
+    return {
+        "decode_mx": lambda: json.loads(mx_raw),
+        "decode_lbank": lambda: json.loads(lbank_raw),
+        # 舊版路徑（benchmarks/legacy_path.py）：完整JSON解碼後逐檔建立OrderBook
+        "build_mx": lambda: parse_mx_orderbook(service, "BTC/USDT", mx_data['data'], depth=None),
+        "build_lbank": lambda: parse_lbank_orderbook(service, "BTC/USDT", lbank_data, depth=None),
+        # 線上路徑：直接從bytes解碼前 ORDERBOOK_DEPTH 檔並建立OrderBook
+        "fast_mx": lambda: service.decode_orderbook("mx", "BTC/USDT", mx_raw),
+        "fast_lbank": lambda: service.decode_orderbook("lbank", "BTC/USDT", lbank_raw),
+        # 舊版逐模式計算，與 spread_matrix 比較
+        "spread": lambda: [calculate_spread(calculator.depth_engine, mx_book, lbank_book, mode) for mode in MODES],
+        "spread_matrix": lambda: calculator.calculate_all({'mx': mx_book, 'lbank': lbank_book}),
+        "serialize_legacy": lambda: MarketTick(
+            versioner, "BTC/USDT", mx_book, lbank_book, spreads
+        ).legacy_messages(),
+        "json_dumps": lambda: json.dumps(
+            {"mx_orderbook": mx_book.model_dump(), "lbank_orderbook": lbank_book.model_dump()}, default=str
+        ),
+    }
+
+
+def tick_stage(symbols: int, depth: int, payload_dir: Optional[str], fast: bool = False) -> Callable:
+    """一次完整tick：所有交易對從原始響應到廣播訊息（fast為線上路徑：bytes解碼 + calculate_all，否則為舊版路徑）"""
+    service = ExchangeService()
+    calculator = SpreadCalculator()
+    versioner = BookVersioner()
+    payloads = symbol_payloads(symbols, depth, payload_dir)
+
+    def run():
+        for symbol, (mx_raw, lbank_raw) in payloads.items():
+            if fast:
+                mx_book = service.decode_orderbook("mx", symbol, mx_raw)
+                lbank_book = service.decode_orderbook("lbank", symbol, lbank_raw)
+                spreads = calculator.calculate_all({'mx': mx_book, 'lbank': lbank_book})
+            else:
+                mx_book = parse_mx_orderbook(service, symbol, json.loads(mx_raw)['data'], depth=None)
+                lbank_book = parse_lbank_orderbook(service, symbol, json.loads(lbank_raw), depth=None)
+                spreads = {mode: calculate_spread(calculator.depth_engine, mx_book, lbank_book, mode) for mode in MODES}
+            MarketTick(versioner, symbol, mx_book, lbank_book, spreads).legacy_messages()
+
+    return run
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).strip()
+    except Exception:
+        return None
+
+
+def run(depths: List[int], symbol_counts: List[int], iterations: int, min_time: float,
+        payload_dir: Optional[str], stage_filter: Optional[List[str]]) -> dict:
+    results: Dict[str, dict] = {}
+
+    def record(name: str, func: Callable, n: int):
+        if stage_filter and not any(name.startswith(prefix) for prefix in stage_filter):
+            return
+        result = measure(func, n, min_time)
+        results[name] = result
+        print(f"{name:<28} {result['ops_per_sec']:>12,.1f} {result['p50_us']:>12,.1f} "
+              f"{result['p99_us']:>12,.1f} {result['alloc_peak_bytes']:>14,}")
+
+    print(f"{'stage':<28} {'ops/s':>12} {'p50 us':>12} {'p99 us':>12} {'alloc peak B':>14}")
+    for depth in depths:
+        n = max(20, iterations // depth)
+        for stage, func in stages_for_depth(depth, payload_dir).items():
+            record(f"{stage}@{depth}", func, n)
+
+    for symbols in symbol_counts:
+        depth = 20
+        n = max(3, iterations // (symbols * 20))
+        record(f"tick@{depth}x{symbols}", tick_stage(symbols, depth, payload_dir), n)
+        record(f"tick_fast@{depth}x{symbols}", tick_stage(symbols, depth, payload_dir, fast=True), n)
+
+    return {
+        "meta": {
+            "timestamp": datetime.now().isoformat(),
+            "git": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "payload_dir": payload_dir,
+        },
+        "results": results,
+    }
+
+
+def compare(current: dict, baseline: dict, threshold: float) -> int:
+    """比較兩次結果，ops/s 下降或 p99 上升超過threshold視為退化，返回退化數量"""
+    regressions = 0
+    print()
+    print(f"{'stage':<28} {'ops/s':>10} {'p99':>10}")
+    for name, result in current["results"].items():
+        base = baseline["results"].get(name)
+        if not base or not base.get("ops_per_sec"):
+            continue
+        ops_change = result["ops_per_sec"] / base["ops_per_sec"] - 1
+        p99_change = result["p99_us"] / base["p99_us"] - 1 if base["p99_us"] else 0.0
+        regressed = ops_change < -threshold or p99_change > threshold
+        regressions += regressed
+        flag = "  REGRESSION" if regressed else ""
+        print(f"{name:<28} {ops_change:>+9.1%} {p99_change:>+9.1%}{flag}")
+    print(f"\n{regressions} 個階段退化超過 {threshold:.0%}（基準: {baseline['meta'].get('git')}）")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="熱路徑微基準")
+    parser.add_argument("--depths", type=int, nargs="+", default=[20, 200, 1000])
+    parser.add_argument("--symbols", type=int, nargs="+", default=[1, 50, 300], help="整體tick測試的交易對數量")
+    parser.add_argument("--iterations", type=int, default=20000, help="深度20時的迭代次數，深度越大越少")
+    parser.add_argument("--min-time", type=float, default=0.5, help="每個階段最少運行秒數")
+    parser.add_argument("--payload-dir", help="錄製的響應目錄（mx_depth_<N>.json / lbank_depth_<N>.json）")
+    parser.add_argument("--stages", nargs="+", help="只運行名稱以這些前綴開頭的階段")
+    parser.add_argument("--output", help="結果JSON輸出路徑")
+    parser.add_argument("--compare", help="與此基準結果JSON比較")
+    parser.add_argument("--threshold", type=float, default=0.1, help="退化門檻（比例）")
+    args = parser.parse_args()
+
+    current = run(args.depths, args.symbols, args.iterations, args.min_time, args.payload_dir, args.stages)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(current, f, indent=2)
+        print(f"\n結果已寫入 {args.output}")
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        sys.exit(1 if compare(current, baseline, args.threshold) else 0)
@@ -0,0 +1,92 @@
+"""
+舊版熱路徑（只供基準比較，線上不使用）
+
+先以 json.loads 解碼整個響應，再逐檔建立 OrderBookEntry，價差按模式逐一計算；
+線上路徑為 ExchangeService.decode_orderbook（直接從bytes只解碼前N檔）與
+SpreadCalculator.calculate_all（所有有向組合一次陣列運算）
+"""
+
+import os
+import sys
+from datetime import datetime
+from typing import Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models.market_data import OrderBook, OrderBookEntry, SpreadData  # noqa: E402
+from app.services.depth_engine import ExecutableSpreadEngine  # noqa: E402
+from app.services.exchange_service import ExchangeService  # noqa: E402
+
+
+def parse_mx_orderbook(service: ExchangeService, symbol: str, order_data: dict,
+                       depth: Optional[int] = 20) -> OrderBook:
+    """解析MX合約訂單簿響應的data部分（[[price, quantity, unknown], ...]）"""
+    received_at = datetime.now()
+    precision_info = service.precision_for('mx', symbol)
+    exchange_time = ExchangeService._parse_exchange_time(order_data.get('timestamp'))
+    return OrderBook(
+        exchange="Mexc",
+        symbol=symbol,
+        bids=[OrderBookEntry(price=float(bid[0]), quantity=float(bid[1])) for bid in order_data.get('bids', [])[:depth]],
+        asks=[OrderBookEntry(price=float(ask[0]), quantity=float(ask[1])) for ask in order_data.get('asks', [])[:depth]],
+        timestamp=exchange_time or received_at,
+        price_precision=precision_info['price_precision'],
+        quantity_precision=precision_info['quantity_precision'],
+        received_at=received_at,
+        exchange_time=exchange_time
+    )
+
+
+def parse_lbank_orderbook(service: ExchangeService, symbol: str, data: dict,
+                          depth: Optional[int] = None) -> Optional[OrderBook]:
+    """解析LBank訂單簿響應（完整響應body，可能有或沒有 result/data 外層）"""
+    if 'result' in data and data.get('result') != 'true':
+        return None
+    order_data = data['data'] if 'data' in data else data
+    received_at = datetime.now()
+    precision_info = service.precision_for('lbank', symbol)
+    exchange_time = ExchangeService._parse_exchange_time(order_data.get('timestamp') or data.get('ts'))
+    return OrderBook(
+        exchange="LBank",
+        symbol=symbol,
+        bids=[OrderBookEntry(price=float(bid[0]), quantity=float(bid[1])) for bid in order_data.get('bids', [])[:depth]],
+        asks=[OrderBookEntry(price=float(ask[0]), quantity=float(ask[1])) for ask in order_data.get('asks', [])[:depth]],
+        timestamp=exchange_time or received_at,
+        price_precision=precision_info['price_precision'],
+        quantity_precision=precision_info['quantity_precision'],
+        received_at=received_at,
+        exchange_time=exchange_time
+    )
+
+
+def calculate_spread(engine: ExecutableSpreadEngine, mx_orderbook: OrderBook, lbank_orderbook: OrderBook,
+                     mode: str) -> Optional[SpreadData]:
+    """
+    計算單一模式的價差（'mx_buy_lbank_sell' 或 'lbank_buy_mx_sell'）
+    價差 = 賣出交易所的bid - 買入交易所的ask，並附上走完雙邊深度的可執行數量、收益與VWAP
+    """
+    buy_book, sell_book = engine.books_for_mode(mx_orderbook, lbank_orderbook, mode)
+    if not buy_book.asks or not sell_book.bids:
+        return None
+
+    lowest_ask = buy_book.asks[0]
+    highest_bid = sell_book.bids[0]
+    buy_price = lowest_ask.price
+    spread = highest_bid.price - buy_price
+    executable = engine.analyze(buy_book, sell_book, include_curve=False)
+    return SpreadData(
+        symbol=buy_book.symbol,
+        mode=mode,
+        spread=spread,
+        spread_percentage=(spread / buy_price) * 100 if buy_price > 0 else 0,
+        max_quantity=min(lowest_ask.quantity, highest_bid.quantity),
+        buy_price=buy_price,
+        sell_price=highest_bid.price,
+        buy_exchange=buy_book.exchange,
+        sell_exchange=sell_book.exchange,
+        timestamp=datetime.now(),
+        executable_quantity=executable['max_quantity'],
+        executable_profit=executable['max_profit'],
+        vwap_buy_price=executable['vwap_buy_price'],
+        vwap_sell_price=executable['vwap_sell_price'],
+    )
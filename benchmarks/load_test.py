@@ -0,0 +1,445 @@
+#!/usr/bin/env python3
+"""
+端到端壓力測試：模擬交易所 + 應用 + 大量WebSocket客戶端
+
+每個情境（交易對數 x 客戶端數）：
+1. 啟動本地模擬交易所（benchmarks/stub_exchanges.py，可設定延遲與抖動、可用錄製的響應）
+2. 以 MX_BASE_URL / LBANK_BASE_URL 指向模擬交易所啟動應用（uvicorn，或 --web-workers>1 時經 run.py 啟動多進程）
+3. 在 --ramp 秒內連上所有客戶端，每個客戶端訂閱其中一個交易對（輪流分配，每個交易對一條抓取管線）；
+   --slow-ratio 比例的客戶端每收到一則訊息就暫停 --slow-delay-ms，模擬網路或處理速度跟不上的客戶端
+4. 預熱後量測 --duration 秒：
+   - 延遲：客戶端收到訊息的時間 - 兩邊訂單簿中較晚的交易所響應時間（模擬交易所在響應中寫入的送出時間）
+   - 每秒訊息數、被伺服器斷開的客戶端數、伺服器端合併/丟棄的訊息數
+   - 應用進程（含子進程）的CPU與RSS
+客戶端與應用在同一台機器時會互相搶CPU；--client-processes 可把客戶端分散到多個進程，
+正式容量規劃時建議把客戶端放在另一台機器（--url 指向已部署的實例，不啟動模擬交易所與應用）
+
+用法:
+    python benchmarks/load_test.py --symbols 1 10 --clients 100 1000
+    python benchmarks/load_test.py --symbols 20 --clients 2000 --slow-ratio 0.05 --client-processes 4 --output result.json
+    python benchmarks/load_test.py --symbols 5 --clients 500 --app-env COMPUTE_MODE=process METRICS_ENABLED=0
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import aiohttp
+import numpy as np
+
+try:
+    import psutil
+except ImportError:  # psutil 為可選依賴，未安裝時讀取 /proc（僅Linux）
+    psutil = None
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from stub_exchanges import stub_symbols  # noqa: E402
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class ProcessSampler:
+    """每秒取樣一個進程及其所有子進程（多web進程模式）的CPU時間與RSS"""
+
+    def __init__(self, pid: int, interval: float = 1.0):
+        self.pid = pid
+        self.interval = interval
+        self.cpu_percent: List[float] = []
+        self.rss: List[int] = []
+        self._page_size = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+        self._clock_ticks = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+
+    def _tree(self) -> List[int]:
+        if psutil is not None:
+            try:
+                process = psutil.Process(self.pid)
+                return [self.pid] + [child.pid for child in process.children(recursive=True)]
+            except psutil.Error:
+                return []
+        parents: Dict[int, int] = {}
+        for entry in os.listdir("/proc"):
+            if not entry.isdigit():
+                continue
+            try:
+                with open(f"/proc/{entry}/stat") as f:
+                    parents[int(entry)] = int(f.read().rsplit(")", 1)[1].split()[1])
+            except (OSError, IndexError, ValueError):
+                continue
+        tree, frontier = [self.pid], [self.pid]
+        while frontier:
+            frontier = [pid for pid, parent in parents.items() if parent in frontier]
+            tree.extend(frontier)
+        return tree
+
+    def _usage(self, pid: int) -> Tuple[float, int]:
+        """返回 (累計CPU秒數, RSS位元組)"""
+        if psutil is not None:
+            process = psutil.Process(pid)
+            times = process.cpu_times()
+            return times.user + times.system, process.memory_info().rss
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        with open(f"/proc/{pid}/statm") as f:
+            resident = int(f.read().split()[1])
+        return (int(fields[11]) + int(fields[12])) / self._clock_ticks, resident * self._page_size
+
+    def sample(self) -> Tuple[float, int]:
+        cpu, rss = 0.0, 0
+        for pid in self._tree():
+            try:
+                pid_cpu, pid_rss = self._usage(pid)
+            except Exception:
+                continue  # 進程在取樣期間結束
+            cpu += pid_cpu
+            rss += pid_rss
+        return cpu, rss
+
+    async def run(self, stop: asyncio.Event):
+        last_cpu, _ = self.sample()
+        last_at = time.monotonic()
+        while not stop.is_set():
+            try:
+                await asyncio.wait_for(stop.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            cpu, rss = self.sample()
+            now = time.monotonic()
+            self.cpu_percent.append((cpu - last_cpu) / max(now - last_at, 1e-6) * 100)
+            self.rss.append(rss)
+            last_cpu, last_at = cpu, now
+
+    def summary(self) -> dict:
+        return {
+            "cpu_avg_percent": round(float(np.mean(self.cpu_percent)), 1) if self.cpu_percent else None,
+            "cpu_max_percent": round(float(np.max(self.cpu_percent)), 1) if self.cpu_percent else None,
+            "rss_start_mb": round(self.rss[0] / 1048576, 1) if self.rss else None,
+            "rss_max_mb": round(max(self.rss) / 1048576, 1) if self.rss else None,
+        }
+
+
+def _book_time(message: dict) -> Optional[float]:
+    """兩邊訂單簿中較晚的交易所響應時間（epoch秒）"""
+    try:
+        return max(
+            datetime.fromisoformat(message["mx_orderbook"]["timestamp"]).timestamp(),
+            datetime.fromisoformat(message["lbank_orderbook"]["timestamp"]).timestamp(),
+        )
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+async def _client(session: aiohttp.ClientSession, url: str, symbol: str, slow_delay: float,
+                  connect_at: float, measure_from: float, deadline: float, stats: dict):
+    await asyncio.sleep(max(0.0, connect_at - time.time()))
+    latencies = stats["slow_latencies"] if slow_delay else stats["latencies"]
+    try:
+        ws = await session.ws_connect(url, timeout=30, heartbeat=None, max_msg_size=0)
+    except Exception:
+        stats["failed"] += 1
+        return
+    stats["connected"] += 1
+    try:
+        await ws.send_str(json.dumps({"type": "subscribe", "mx_symbol": symbol, "lbank_symbol": symbol}))
+        while True:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return
+            try:
+                msg = await ws.receive(timeout=remaining)
+            except asyncio.TimeoutError:
+                return
+            received = time.time()
+            if msg.type != aiohttp.WSMsgType.TEXT:
+                if msg.type in (aiohttp.WSMsgType.CLOSE, aiohttp.WSMsgType.CLOSED, aiohttp.WSMsgType.ERROR):
+                    stats["disconnected"] += 1
+                    return
+                continue
+            if received >= measure_from:
+                message = json.loads(msg.data)
+                if message.get("type") == "market_update" and message.get("symbol") == symbol:
+                    stats["messages"] += 1
+                    book_time = _book_time(message)
+                    if book_time is not None:
+                        latencies.append(received - book_time)
+            if slow_delay:
+                await asyncio.sleep(slow_delay)
+    except Exception:
+        stats["disconnected"] += 1
+    finally:
+        await ws.close()
+
+
+async def _run_clients(config: dict) -> dict:
+    stats = {"connected": 0, "failed": 0, "disconnected": 0, "messages": 0, "latencies": [], "slow_latencies": []}
+    connector = aiohttp.TCPConnector(limit=0)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        await asyncio.gather(*(
+            _client(session, config["url"], symbol, slow_delay, connect_at,
+                    config["measure_from"], config["deadline"], stats)
+            for symbol, slow_delay, connect_at in config["clients"]
+        ))
+    return stats
+
+
+def client_worker(config: dict) -> dict:
+    """客戶端進程入口（--client-processes > 1）"""
+    return asyncio.run(_run_clients(config))
+
+
+class AppProcess:
+    """以模擬交易所為後端啟動的應用"""
+
+    def __init__(self, stub_url: str, symbols: int, args, workdir: str):
+        self.port = free_port()
+        self.url = f"ws://127.0.0.1:{self.port}/ws"
+        self.http_url = f"http://127.0.0.1:{self.port}"
+        self.log_path = os.path.join(workdir, f"app_{self.port}.log")
+        env = {
+            **os.environ,
+            "MX_BASE_URL": stub_url,
+            "LBANK_BASE_URL": stub_url,
+            "SYMBOL_CACHE_PATH": os.path.join(workdir, f"symbols_{self.port}.json"),
+            "HISTORY_DIR": os.path.join(workdir, f"history_{self.port}"),
+            "ALERT_RULES_PATH": os.path.join(workdir, f"alert_rules_{self.port}.json"),
+            "FRONTEND_BUILD_DIR": os.path.join(workdir, "no_frontend"),
+            "STATE_BUS_PATH": os.path.join(workdir, f"state_{self.port}.sock"),
+            # 固定輪詢間隔、不受請求預算與限速限制，每條管線每 poll_interval 秒一個tick（--app-env 可覆蓋）
+            "CADENCE_MIN_INTERVAL": str(args.poll_interval),
+            "CADENCE_MAX_INTERVAL": str(args.poll_interval),
+            "CADENCE_MX_BUDGET": "100000",
+            "CADENCE_LBANK_BUDGET": "100000",
+            "MX_RATE_LIMIT": "100000",
+            "MX_RATE_BURST": "100000",
+            "MX_MAX_CONCURRENCY": "64",
+            "LBANK_RATE_LIMIT": "100000",
+            "LBANK_RATE_BURST": "100000",
+            "LBANK_MAX_CONCURRENCY": "64",
+            "MAX_FEEDS": str(max(50, symbols + 1)),
+        }
+        for item in args.app_env:
+            key, _, value = item.partition("=")
+            env[key] = value
+        if args.web_workers > 1:
+            env.update(PORT=str(self.port), WEB_WORKERS=str(args.web_workers), ENVIRONMENT="production",
+                       FETCHER_PORT=str(free_port()))
+            command = [sys.executable, "run.py"]
+        else:
+            command = [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1",
+                       "--port", str(self.port), "--log-level", "warning", "--no-access-log"]
+        self.log = open(self.log_path, "w")
+        self.process = subprocess.Popen(command, cwd=ROOT, env=env, stdout=self.log, stderr=subprocess.STDOUT)
+
+    async def wait_ready(self, timeout: float = 60.0):
+        deadline = time.monotonic() + timeout
+        async with aiohttp.ClientSession() as session:
+            while time.monotonic() < deadline:
+                if self.process.poll() is not None:
+                    raise RuntimeError(f"應用啟動失敗，見 {self.log_path}")
+                try:
+                    async with session.get(f"{self.http_url}/api/symbols", timeout=2) as response:
+                        data = await response.json()
+                        if data.get("status") == "success" and data.get("symbols"):
+                            return
+                except Exception:
+                    pass
+                await asyncio.sleep(0.5)
+        raise RuntimeError(f"應用在 {timeout}s 內未就緒，見 {self.log_path}")
+
+    async def connection_stats(self, at: float) -> Optional[dict]:
+        await asyncio.sleep(max(0.0, at - time.time()))
+        try:
+            async with aiohttp.ClientSession() as session:
+                async with session.get(f"{self.http_url}/api/connections", timeout=10) as response:
+                    return (await response.json()).get("stats")
+        except Exception:
+            return None
+
+    def stop(self):
+        if self.process.poll() is None:
+            self.process.send_signal(signal.SIGINT)
+            try:
+                self.process.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+        self.log.close()
+
+
+def _percentiles(values: List[float]) -> dict:
+    if not values:
+        return {"p50_ms": None, "p90_ms": None, "p99_ms": None, "max_ms": None}
+    ms = np.asarray(values) * 1000
+    return {
+        "p50_ms": round(float(np.percentile(ms, 50)), 2),
+        "p90_ms": round(float(np.percentile(ms, 90)), 2),
+        "p99_ms": round(float(np.percentile(ms, 99)), 2),
+        "max_ms": round(float(ms.max()), 2),
+    }
+
+
+async def run_scenario(symbols: int, clients: int, args, stub_url: Optional[str], workdir: str) -> dict:
+    app = None
+    sampler = None
+    if args.url:
+        url = args.url
+    else:
+        app = AppProcess(stub_url, symbols, args, workdir)
+        await app.wait_ready()
+        url = app.url
+
+    try:
+        names = args.symbol_names[:symbols] if args.symbol_names else stub_symbols(symbols)
+        symbols = len(names)
+        slow_every = round(1 / args.slow_ratio) if args.slow_ratio > 0 else 0
+        start = time.time() + 1.0
+        measure_from = start + args.ramp + args.warmup
+        deadline = measure_from + args.duration
+        specs = [
+            (
+                names[i % symbols],
+                args.slow_delay_ms / 1000 if slow_every and i % slow_every == slow_every - 1 else 0.0,
+                start + args.ramp * i / max(clients, 1),
+            )
+            for i in range(clients)
+        ]
+        shares = [specs[i::args.client_processes] for i in range(args.client_processes)]
+        configs = [{"url": url, "clients": share, "measure_from": measure_from, "deadline": deadline}
+                   for share in shares if share]
+
+        stop = asyncio.Event()
+        if app:
+            sampler = ProcessSampler(app.process.pid)
+            sampler_task = asyncio.create_task(sampler.run(stop))
+            # 客戶端斷開前讀取伺服器端的連接統計（斷開後每客戶端的合併/丟棄計數即被移除）
+            server_task = asyncio.create_task(app.connection_stats(at=deadline - 1.0))
+        if len(configs) > 1:
+            loop = asyncio.get_running_loop()
+            with ProcessPoolExecutor(len(configs)) as executor:
+                results = await asyncio.gather(*(loop.run_in_executor(executor, client_worker, c) for c in configs))
+        else:
+            results = [await _run_clients(configs[0])]
+        stop.set()
+        if sampler:
+            await sampler_task
+        server = await server_task if app else None
+    finally:
+        if app:
+            app.stop()
+
+    latencies = [value for result in results for value in result["latencies"]]
+    slow_latencies = [value for result in results for value in result["slow_latencies"]]
+    messages = sum(result["messages"] for result in results)
+    report = {
+        "symbols": symbols,
+        "clients": clients,
+        "slow_clients": sum(1 for spec in specs if spec[1]),
+        "connected": sum(result["connected"] for result in results),
+        "failed": sum(result["failed"] for result in results),
+        "disconnected": sum(result["disconnected"] for result in results),
+        "messages": messages,
+        "messages_per_sec": round(messages / args.duration, 1),
+        "latency": _percentiles(latencies),
+        "slow_latency": _percentiles(slow_latencies),
+    }
+    if sampler:
+        report["app"] = sampler.summary()
+    if server:
+        report["server"] = {
+            "evicted": server.get("evicted"),
+            "conflated": sum(client.get("conflated", 0) for client in server.get("clients", [])),
+            "dropped": sum(client.get("dropped", 0) for client in server.get("clients", [])),
+        }
+    return report
+
+
+async def run(args) -> List[dict]:
+    workdir = tempfile.mkdtemp(prefix="lbmx_load_")
+    stub = None
+    stub_url = None
+    try:
+        if not args.url:
+            stub_port = free_port()
+            stub_url = f"http://127.0.0.1:{stub_port}"
+            command = [sys.executable, os.path.join(ROOT, "benchmarks", "stub_exchanges.py"),
+                       "--port", str(stub_port), "--symbols", str(max(args.symbols)), "--depth", str(args.depth),
+                       "--latency-ms", str(args.latency_ms), "--jitter-ms", str(args.jitter_ms)]
+            if args.payload_dir:
+                command += ["--payload-dir", args.payload_dir]
+            stub = subprocess.Popen(command, stdout=subprocess.DEVNULL)
+            await asyncio.sleep(1.0)
+
+        reports = []
+        for symbols in args.symbols:
+            for clients in args.clients:
+                print(f"情境: {symbols} 交易對, {clients} 客戶端 ...", flush=True)
+                reports.append(await run_scenario(symbols, clients, args, stub_url, workdir))
+        return reports
+    finally:
+        if stub:
+            stub.terminate()
+            stub.wait()
+        if not args.keep_logs:
+            shutil.rmtree(workdir, ignore_errors=True)
+        else:
+            print(f"日誌: {workdir}")
+
+
+def print_reports(reports: List[dict]):
+    print(f"{'交易對':>6} {'客戶端':>7} {'慢':>4} {'斷開':>5} {'訊息/秒':>9} "
+          f"{'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'max ms':>8} {'慢p50 ms':>9} "
+          f"{'CPU% 平均':>9} {'CPU% 最大':>9} {'RSS MB':>8}")
+    for report in reports:
+        latency, slow, app = report["latency"], report["slow_latency"], report.get("app", {})
+        print(f"{report['symbols']:>6} {report['clients']:>7} {report['slow_clients']:>4} "
+              f"{report['disconnected'] + report['failed']:>5} {report['messages_per_sec']:>9} "
+              f"{latency['p50_ms']!s:>8} {latency['p90_ms']!s:>8} {latency['p99_ms']!s:>8} {latency['max_ms']!s:>8} "
+              f"{slow['p50_ms']!s:>9} {app.get('cpu_avg_percent')!s:>9} {app.get('cpu_max_percent')!s:>9} "
+              f"{app.get('rss_max_mb')!s:>8}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="端到端壓力測試")
+    parser.add_argument("--symbols", type=int, nargs="+", default=[1, 10], help="訂閱的交易對數（每個一條抓取管線）")
+    parser.add_argument("--clients", type=int, nargs="+", default=[100, 500], help="WebSocket客戶端數")
+    parser.add_argument("--slow-ratio", type=float, default=0.05, help="慢客戶端比例")
+    parser.add_argument("--slow-delay-ms", type=float, default=500, help="慢客戶端每則訊息後暫停的毫秒數")
+    parser.add_argument("--ramp", type=float, default=5, help="在幾秒內連上所有客戶端")
+    parser.add_argument("--warmup", type=float, default=3)
+    parser.add_argument("--duration", type=float, default=20, help="量測秒數")
+    parser.add_argument("--client-processes", type=int, default=1)
+    parser.add_argument("--poll-interval", type=float, default=0.5, help="每條抓取管線的輪詢間隔（秒）")
+    parser.add_argument("--depth", type=int, default=20)
+    parser.add_argument("--latency-ms", type=float, default=30, help="模擬交易所的響應延遲")
+    parser.add_argument("--jitter-ms", type=float, default=20)
+    parser.add_argument("--payload-dir", default=None, help="錄製的深度響應目錄（見 benchmarks/payloads.py）")
+    parser.add_argument("--web-workers", type=int, default=1, help=">1 時經 run.py 啟動抓取進程與多個web進程")
+    parser.add_argument("--app-env", nargs="*", default=[], metavar="KEY=VALUE", help="應用的額外環境變量")
+    parser.add_argument("--url", default=None, help="直接測試已運行的實例（ws://.../ws），不啟動模擬交易所與應用")
+    parser.add_argument("--symbol-names", nargs="+", default=None, help="訂閱的交易對名稱（--url 時使用實際交易對，如 BTC/USDT）")
+    parser.add_argument("--output", default=None, help="結果寫入JSON檔案")
+    parser.add_argument("--keep-logs", action="store_true", help="保留應用日誌與臨時目錄")
+    args = parser.parse_args()
+
+    reports = asyncio.run(run(args))
+    print_reports(reports)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"args": vars(args), "results": reports}, f, indent=2, ensure_ascii=False)
+        print(f"結果已寫入 {args.output}")
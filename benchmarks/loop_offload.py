@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+事件循環延遲：排程器的解碼與價差計算在事件循環上執行（inline）與交給計算進程池（process）的比較
+
+模擬多交易對輪詢：每一輪所有交易對的兩邊響應在一個輪詢間隔內隨機到達，
+到達後執行與排程器相同的工作（inline: 解碼 -> calculate_all -> CompactOrderBook -> 時間對齊；
+process: ComputePool.compute -> 時間對齊），同時以1ms間隔的探測計時器量測事件循環延遲
+（實際喚醒時間晚於預定時間的部分，即WebSocket發送會多等的時間）
+
+用法:
+    python benchmarks/loop_offload.py
+    python benchmarks/loop_offload.py --symbols 300 --depth 200 --workers 4 --rounds 5
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from payloads import symbol_payloads  # noqa: E402
+from app.models.compact_orderbook import CompactOrderBook  # noqa: E402
+from app.services.compute_pool import ComputePool  # noqa: E402
+from app.services.exchange_service import ExchangeService  # noqa: E402
+from app.services.snapshot_coordinator import SnapshotCoordinator  # noqa: E402
+from app.services.spread_calculator import SpreadCalculator  # noqa: E402
+
+PROBE_INTERVAL = 0.001
+
+
+async def probe_lag(samples: list, stop: asyncio.Event):
+    """每1ms喚醒一次，記錄晚於預定時間的秒數"""
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        expected = loop.time() + PROBE_INTERVAL
+        await asyncio.sleep(PROBE_INTERVAL)
+        samples.append(max(0.0, loop.time() - expected))
+
+
+async def run_mode(mode: str, symbols: int, depth: int, rounds: int, interval: float, workers: int,
+                   batch_size: int, batch_window: float) -> dict:
+    service = ExchangeService()
+    service.orderbook_depth = depth
+    calculator = SpreadCalculator()
+    coordinator = SnapshotCoordinator(service, max_skew_ms=1e9, max_age_ms=1e9)
+    payloads = symbol_payloads(symbols, depth)
+    pool = None
+    if mode == "process":
+        pool = ComputePool(service, workers=workers, batch_size=batch_size, batch_window=batch_window)
+        await pool.start()
+
+    completed = 0
+
+    async def handle(symbol: str, mx_raw: bytes, lbank_raw: bytes, delay: float):
+        nonlocal completed
+        await asyncio.sleep(delay)
+        now = datetime.now()
+        if pool is None:
+            mx_book = service.decode_orderbook('mx', symbol, mx_raw, now, now)
+            lbank_book = service.decode_orderbook('lbank', symbol, lbank_raw, now, now)
+            spreads = calculator.calculate_all({'mx': mx_book, 'lbank': lbank_book})
+            books = (CompactOrderBook.from_orderbook(mx_book), CompactOrderBook.from_orderbook(lbank_book))
+        else:
+            compact, spreads = await pool.compute(symbol, {'mx': (mx_raw, now, now), 'lbank': (lbank_raw, now, now)})
+            mx_book, lbank_book = compact["mx"], compact["lbank"]
+        for spread_data in spreads.values():
+            coordinator.annotate(spread_data, mx_book, lbank_book)
+        completed += 1
+
+    samples: list = []
+    stop = asyncio.Event()
+    probe = asyncio.create_task(probe_lag(samples, stop))
+    rng = random.Random(0)
+    started = time.perf_counter()
+    for _ in range(rounds):
+        await asyncio.gather(*(
+            handle(symbol, mx_raw, lbank_raw, rng.uniform(0, interval))
+            for symbol, (mx_raw, lbank_raw) in payloads.items()
+        ))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await probe
+    if pool:
+        pool_stats = pool.get_stats()
+        await pool.close()
+    else:
+        pool_stats = None
+
+    lag_ms = np.array(samples) * 1000
+    return {
+        "mode": mode,
+        "symbols_per_sec": round(completed / elapsed, 1),
+        "lag_p50_ms": round(float(np.percentile(lag_ms, 50)), 3),
+        "lag_p99_ms": round(float(np.percentile(lag_ms, 99)), 3),
+        "lag_p999_ms": round(float(np.percentile(lag_ms, 99.9)), 3),
+        "lag_max_ms": round(float(lag_ms.max()), 3),
+        "probes": len(samples),
+        "pool": pool_stats,
+    }
+
+
+async def run(args) -> list:
+    results = []
+    for mode in args.modes:
+        results.append(await run_mode(
+            mode, args.symbols, args.depth, args.rounds, args.interval, args.workers,
+            args.batch_size, args.batch_window_ms / 1000
+        ))
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="事件循環延遲: inline vs 計算進程池")
+    parser.add_argument("--symbols", type=int, default=200)
+    parser.add_argument("--depth", type=int, default=100)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--interval", type=float, default=1.0, help="每輪的輪詢間隔（秒），響應在間隔內隨機到達")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--batch-window-ms", type=float, default=5)
+    parser.add_argument("--modes", nargs="+", default=["inline", "process"], choices=["inline", "process"])
+    args = parser.parse_args()
+
+    print(f"{args.symbols} 交易對, 深度 {args.depth}, {args.rounds} 輪 x {args.interval}s, CPU {os.cpu_count()}")
+    print(f"{'模式':<8} {'交易對/秒':>10} {'p50 ms':>9} {'p99 ms':>9} {'p99.9 ms':>9} {'max ms':>9}")
+    for result in asyncio.run(run(args)):
+        print(f"{result['mode']:<8} {result['symbols_per_sec']:>10} {result['lag_p50_ms']:>9} "
+              f"{result['lag_p99_ms']:>9} {result['lag_p999_ms']:>9} {result['lag_max_ms']:>9}")
+        if result["pool"]:
+            pool = result["pool"]
+            print(f"         進程池: {pool['batches']} 批, 平均 {pool['avg_batch']} 個交易對/批, "
+                  f"worker {pool['avg_worker_ms']} ms, 往返 {pool['avg_round_trip_ms']} ms")
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+指標收集的開銷：線上熱路徑在 METRICS 開啟與關閉下的耗時比較
+
+熱路徑與 run_feed 相同：decode_orderbook 解碼兩邊響應bytes -> calculate_all（含可執行深度）
+-> MarketTick -> 廣播到客戶端佇列，並記錄 run_feed 自己的抓取/tick直方圖與tick計數器
+
+兩種判斷方式:
+- 估計值：每tick的直方圖記錄次數 x 單次記錄耗時 + 計數器遞增次數 x 單次遞增耗時，
+  單次耗時含標籤與 perf_counter 呼叫（上界），不受整體耗時的雜訊影響
+- 實測值：逐tick交替開啟/關閉（相鄰兩個tick為一組，順序輪替），取每組耗時比的中位數，
+  並以 1.58 x IQR / sqrt(組數) 作為中位數的95%信賴區間
+退出碼: 估計值與實測信賴區間上限都不超過上限時為0（通過）；
+估計值超過上限，或實測信賴區間下限超過上限時為1（失敗）；其餘為2（無法判斷，可增加 --pairs 縮小區間）
+
+用法:
+    python benchmarks/metrics_overhead.py
+    python benchmarks/metrics_overhead.py --symbols 50 --clients 20 --pairs 2000 --max-overhead 0.01
+"""
+
+import argparse
+import asyncio
+import math
+import os
+import statistics
+import sys
+import time
+from typing import List, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from payloads import symbol_payloads  # noqa: E402
+from app.services.connection_manager import ClientConnection, ConnectionManager  # noqa: E402
+from app.services.exchange_service import ExchangeService  # noqa: E402
+from app.services.metrics import REGISTRY, Counter, Histogram  # noqa: E402
+from app.services.spread_calculator import SpreadCalculator  # noqa: E402
+from app.services.wire_protocol import BookVersioner, MarketTick  # noqa: E402
+
+# 與 app/main.py 的主循環指標相同（同名取得同一個指標）
+FETCH_SECONDS = REGISTRY.histogram("lbmx_fetch_seconds", "Both-leg order book fetch duration", ("symbol",))
+TICK_SECONDS = REGISTRY.histogram(
+    "lbmx_tick_seconds", "market_data_stream iteration duration excluding the wait", ("symbol",)
+)
+TICKS = REGISTRY.counter("lbmx_ticks", "market_data_stream iterations by outcome", ("result",))
+
+
+class NullWebSocket:
+    """不發送的WebSocket，只讓廣播走到佇列"""
+    client = None
+
+
+def instrument_counts():
+    """目前所有直方圖的記錄次數與計數器的遞增總量"""
+    observations = increments = 0
+    for metric in REGISTRY.metrics.values():
+        if isinstance(metric, Histogram):
+            observations += sum(state[-1] for state in metric.values.values())
+        elif isinstance(metric, Counter):
+            increments += sum(metric.values.values())
+    return observations, increments
+
+
+def per_call_seconds(symbols: List[str], calls: int = 100000) -> Tuple[float, float]:
+    """單次直方圖記錄與計數器遞增的耗時（含標籤組裝與 perf_counter，與線上呼叫點相同，標籤輪流使用各交易對）"""
+    histogram = REGISTRY.histogram("lbmx_benchmark_seconds", "benchmark only", ("symbol", "mode"))
+    counter = REGISTRY.counter("lbmx_benchmark", "benchmark only", ("result",))
+    try:
+        started = time.perf_counter()
+        for index in range(calls):
+            histogram.observe(time.perf_counter() - started, (REGISTRY.symbol(symbols[index % len(symbols)]), "matrix"))
+        observe_seconds = (time.perf_counter() - started) / calls
+        started = time.perf_counter()
+        for _ in range(calls):
+            counter.inc(("broadcast",))
+        inc_seconds = (time.perf_counter() - started) / calls
+    finally:
+        del REGISTRY.metrics["lbmx_benchmark_seconds"]
+        del REGISTRY.metrics["lbmx_benchmark"]
+    return observe_seconds, inc_seconds
+
+
+async def run(symbols: int, depth: int, clients: int, pairs: int) -> dict:
+    service = ExchangeService()
+    calculator = SpreadCalculator()
+    versioner = BookVersioner()
+    manager = ConnectionManager(max_queue=1024, evict_lag=3600)
+    for _ in range(clients):
+        websocket = NullWebSocket()
+        manager.clients[websocket] = ClientConnection(websocket, manager.max_queue)
+    payloads = symbol_payloads(symbols, depth)
+
+    async def tick():
+        for symbol, (mx_raw, lbank_raw) in payloads.items():
+            tick_started = time.perf_counter()
+            mx_book = service.decode_orderbook('mx', symbol, mx_raw)
+            lbank_book = service.decode_orderbook('lbank', symbol, lbank_raw)
+            metric_symbol = (REGISTRY.symbol(symbol),)
+            FETCH_SECONDS.observe(time.perf_counter() - tick_started, metric_symbol)
+            spreads = calculator.calculate_all({'mx': mx_book, 'lbank': lbank_book})
+            await manager.broadcast_tick(MarketTick(versioner, symbol, mx_book, lbank_book, spreads))
+            TICKS.inc(("broadcast",))
+            TICK_SECONDS.observe(time.perf_counter() - tick_started, metric_symbol)
+        for client in manager.clients.values():
+            client._pending.clear()
+
+    async def timed(enabled: bool) -> float:
+        REGISTRY.enabled = enabled
+        started = time.perf_counter()
+        await tick()
+        return time.perf_counter() - started
+
+    # 預熱，同時建立所有標籤組合
+    for _ in range(5):
+        await timed(True)
+
+    # 逐tick交替，相鄰一組內的CPU狀態相近；組內順序輪替，抵消先後順序的影響
+    enabled_times, disabled_times = [], []
+    for index in range(pairs):
+        times = {}
+        for enabled in ((True, False) if index % 2 == 0 else (False, True)):
+            times[enabled] = await timed(enabled)
+        enabled_times.append(times[True])
+        disabled_times.append(times[False])
+    REGISTRY.enabled = True
+
+    ratios = sorted(on / off for on, off in zip(enabled_times, disabled_times))
+    quartiles = statistics.quantiles(ratios, n=4)
+    measured = statistics.median(ratios) - 1
+    margin = 1.58 * (quartiles[2] - quartiles[0]) / math.sqrt(len(ratios))
+
+    before = instrument_counts()
+    await tick()
+    after = instrument_counts()
+    observations, increments = after[0] - before[0], after[1] - before[1]
+    observe_seconds, inc_seconds = per_call_seconds(list(payloads))
+    disabled_median = statistics.median(disabled_times)
+
+    started = time.perf_counter()
+    rendered = REGISTRY.render()
+    render_seconds = time.perf_counter() - started
+    return {
+        "symbols": symbols,
+        "clients": clients,
+        "pairs": pairs,
+        "tick_ms_metrics_on": round(statistics.median(enabled_times) * 1000, 3),
+        "tick_ms_metrics_off": round(disabled_median * 1000, 3),
+        "overhead": measured,
+        "overhead_margin": margin,
+        "observations_per_tick": observations,
+        "increments_per_tick": increments,
+        "observe_ns": round(observe_seconds * 1e9, 1),
+        "inc_ns": round(inc_seconds * 1e9, 1),
+        "estimated_overhead": (observations * observe_seconds + increments * inc_seconds) / disabled_median,
+        "render_ms": round(render_seconds * 1000, 3),
+        "render_bytes": len(rendered),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="指標收集開銷")
+    parser.add_argument("--symbols", type=int, default=20)
+    parser.add_argument("--depth", type=int, default=20)
+    parser.add_argument("--clients", type=int, default=10)
+    parser.add_argument("--pairs", type=int, default=1000, help="開啟/關閉交替的tick組數")
+    parser.add_argument("--max-overhead", type=float, default=0.01, help="開銷上限（比例）")
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args.symbols, args.depth, args.clients, args.pairs))
+    print(f"tick（{result['symbols']} 交易對, {result['clients']} 客戶端, {result['pairs']} 組）: "
+          f"開啟 {result['tick_ms_metrics_on']} ms, 關閉 {result['tick_ms_metrics_off']} ms")
+    print(f"實測開銷: {result['overhead']:+.2%} ± {result['overhead_margin']:.2%}（上限 {args.max_overhead:.0%}）")
+    print(f"估計開銷: 每tick {result['observations_per_tick']} 次直方圖記錄 x {result['observe_ns']} ns + "
+          f"{result['increments_per_tick']:g} 次計數器遞增 x {result['inc_ns']} ns = {result['estimated_overhead']:.3%}")
+    print(f"/api/metrics 渲染: {result['render_ms']} ms, {result['render_bytes']:,} bytes")
+
+    if (result["estimated_overhead"] > args.max_overhead
+            or result["overhead"] - result["overhead_margin"] > args.max_overhead):
+        print("失敗: 指標開銷超過上限")
+        sys.exit(1)
+    if result["overhead"] + result["overhead_margin"] > args.max_overhead:
+        print("無法判斷: 實測信賴區間跨過上限，可增加 --pairs")
+        sys.exit(2)
+    print("通過")
@@ -0,0 +1,82 @@
+"""
+MX合約 / LBank 深度響應樣本
+
+格式與交易所REST響應一致（MX: /api/v1/contract/depth，LBank: /v1/depth.do），
+以固定種子產生，不需要網路；也可以用 --payload-dir 指定實際錄製的響應檔案：
+    mx_depth_<depth>.json, lbank_depth_<depth>.json
+"""
+
+import json
+import os
+import random
+import time
+from typing import Dict, List, Optional, Tuple
+
+# 模擬MX合約的面值：每張0.01個幣（深度數量以張計）
+CONTRACT_SIZE = 0.01
+
+
+def _levels(rng: random.Random, mid: float, tick: float, depth: int, side: int, as_str: bool) -> List[list]:
+    levels = []
+    for i in range(depth):
+        price = round(mid + side * tick * (i + 1), 4)
+        quantity = round(rng.uniform(0.01, 50), 4)
+        if as_str:
+            levels.append([f"{price:.4f}", f"{quantity:.4f}"])
+        else:
+            # MX合約價位格式: [price, 張數, 訂單數]
+            levels.append([price, int(quantity / CONTRACT_SIZE) + 1, rng.randint(1, 20)])
+    return levels
+
+
+def mx_depth(depth: int, mid: float = 100.0, seed: int = 0) -> dict:
+    rng = random.Random(seed)
+    return {
+        "success": True,
+        "code": 0,
+        "data": {
+            "asks": _levels(rng, mid, 0.01, depth, 1, False),
+            "bids": _levels(rng, mid, 0.01, depth, -1, False),
+            "version": 1000000 + seed,
+            "timestamp": int(time.time() * 1000),
+        },
+    }
+
+
+def lbank_depth(depth: int, mid: float = 100.02, seed: int = 0) -> dict:
+    rng = random.Random(seed + 1)
+    return {
+        "result": "true",
+        "data": {
+            "asks": _levels(rng, mid, 0.01, depth, 1, True),
+            "bids": _levels(rng, mid, 0.01, depth, -1, True),
+            "timestamp": int(time.time() * 1000),
+        },
+        "error_code": 0,
+        "ts": int(time.time() * 1000),
+    }
+
+
+def load_payloads(depth: int, payload_dir: Optional[str] = None, seed: int = 0) -> Tuple[bytes, bytes]:
+    """返回 (MX響應, LBank響應) 原始bytes；有錄製檔案時優先使用"""
+    if payload_dir:
+        mx_path = os.path.join(payload_dir, f"mx_depth_{depth}.json")
+        lbank_path = os.path.join(payload_dir, f"lbank_depth_{depth}.json")
+        if os.path.exists(mx_path) and os.path.exists(lbank_path):
+            with open(mx_path, 'rb') as f:
+                mx_raw = f.read()
+            with open(lbank_path, 'rb') as f:
+                lbank_raw = f.read()
+            return mx_raw, lbank_raw
+    return (
+        json.dumps(mx_depth(depth, seed=seed)).encode(),
+        json.dumps(lbank_depth(depth, seed=seed)).encode(),
+    )
+
+
+def symbol_payloads(symbols: int, depth: int, payload_dir: Optional[str] = None) -> Dict[str, Tuple[bytes, bytes]]:
+    """多個交易對的響應（每個交易對不同種子）"""
+    return {
+        f"SYM{i}/USDT": load_payloads(depth, payload_dir, seed=i)
+        for i in range(symbols)
+    }
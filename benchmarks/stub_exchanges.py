@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+本地 MX合約 / LBank 模擬交易所（壓力測試用）
+
+提供應用會呼叫的端點（交易對列表與精度、連接預熱、深度），響應格式與交易所一致；
+深度響應在 --latency-ms ± --jitter-ms 的延遲後送出，timestamp 欄位為實際送出時間（毫秒），
+客戶端以此計算「交易所響應 -> 客戶端收到」的延遲。
+價格隨機遊走、數量每次重新產生，確保每次輪詢都有變化而被廣播；
+--payload-dir 指定錄製的響應時（mx_depth_<depth>.json, lbank_depth_<depth>.json）以其為模板，只擾動最優一檔數量
+
+用法（通常由 benchmarks/load_test.py 啟動）:
+    python benchmarks/stub_exchanges.py --port 8799 --symbols 50 --latency-ms 30 --jitter-ms 20
+    MX_BASE_URL=http://127.0.0.1:8799 LBANK_BASE_URL=http://127.0.0.1:8799 uvicorn app.main:app
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from typing import Dict, List, Optional
+
+from aiohttp import web
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from payloads import CONTRACT_SIZE, lbank_depth, load_payloads, mx_depth  # noqa: E402
+
+
+def stub_symbols(count: int) -> List[str]:
+    """模擬交易所上的交易對（兩邊相同）"""
+    return [f"SYM{i}/USDT" for i in range(count)]
+
+
+class StubExchanges:
+    """同一個HTTP伺服器同時模擬兩個交易所（路徑不重疊）"""
+
+    def __init__(
+        self,
+        symbols: int = 50,
+        depth: int = 20,
+        latency_ms: float = 30.0,
+        jitter_ms: float = 20.0,
+        payload_dir: Optional[str] = None,
+        seed: int = 0
+    ):
+        self.symbols = stub_symbols(symbols)
+        self.depth = depth
+        self.latency = latency_ms / 1000
+        self.jitter = jitter_ms / 1000
+        self.rng = random.Random(seed)
+        self.mids: Dict[str, float] = {}
+        self.requests: int = 0
+        self.templates = None
+        if payload_dir:
+            mx_raw, lbank_raw = load_payloads(depth, payload_dir)
+            self.templates = (json.loads(mx_raw), json.loads(lbank_raw))
+
+    def _mid(self, symbol: str) -> float:
+        mid = self.mids.get(symbol, 100.0) + self.rng.choice((-0.01, 0.0, 0.01))
+        self.mids[symbol] = mid = max(mid, 1.0)
+        return mid
+
+    async def _delay(self):
+        self.requests += 1
+        delay = self.latency + self.rng.uniform(-self.jitter, self.jitter)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def _perturb(self, template: dict) -> dict:
+        """錄製的響應：只改變最優一檔的數量（保留原本的數值型別）"""
+        body = json.loads(json.dumps(template))
+        data = body.get("data", body)
+        for side in ("bids", "asks"):
+            levels = data.get(side) or []
+            if levels:
+                quantity = levels[0][1]
+                factor = self.rng.uniform(0.5, 1.5)
+                if isinstance(quantity, str):
+                    levels[0][1] = f"{float(quantity) * factor:.4f}"
+                elif isinstance(quantity, int):
+                    levels[0][1] = max(1, int(quantity * factor))
+                else:
+                    levels[0][1] = round(quantity * factor, 4)
+        return body
+
+    @staticmethod
+    def _symbol(raw: str) -> str:
+        return raw.upper().replace("_", "/")
+
+    async def mx_depth(self, request: web.Request) -> web.Response:
+        symbol = self._symbol(request.match_info["symbol"])
+        await self._delay()
+        if self.templates:
+            body = self._perturb(self.templates[0])
+        else:
+            body = mx_depth(self.depth, mid=self._mid(symbol), seed=self.rng.randrange(1 << 30))
+        body["data"]["timestamp"] = int(time.time() * 1000)
+        return web.json_response(body)
+
+    async def lbank_depth(self, request: web.Request) -> web.Response:
+        symbol = self._symbol(request.query.get("symbol", ""))
+        depth = int(request.query.get("size", self.depth))
+        await self._delay()
+        if self.templates:
+            body = self._perturb(self.templates[1])
+        else:
+            body = lbank_depth(depth, mid=self.mids.get(symbol, 100.0) + 0.02, seed=self.rng.randrange(1 << 30))
+        body["data"]["timestamp"] = body["ts"] = int(time.time() * 1000)
+        return web.json_response(body)
+
+    async def mx_contracts(self, request: web.Request) -> web.Response:
+        return web.json_response({"success": True, "code": 0, "data": [
+            {"symbol": symbol.replace("/", "_"), "priceScale": 4, "volScale": 0, "contractSize": CONTRACT_SIZE} for symbol in self.symbols
+        ]})
+
+    async def lbank_pairs(self, request: web.Request) -> web.Response:
+        return web.json_response([symbol.replace("/", "_").lower() for symbol in self.symbols])
+
+    async def lbank_accuracy(self, request: web.Request) -> web.Response:
+        return web.json_response({"result": "true", "data": [
+            {"symbol": symbol.replace("/", "_").lower(), "priceAccuracy": "4", "quantityAccuracy": "4"}
+            for symbol in self.symbols
+        ]})
+
+    async def ping(self, request: web.Request) -> web.Response:
+        return web.json_response({"success": True, "data": int(time.time() * 1000)})
+
+    def application(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get("/api/v1/contract/depth/{symbol}", self.mx_depth)
+        app.router.add_get("/api/v1/contract/detail", self.mx_contracts)
+        app.router.add_get("/api/v1/contract/ping", self.ping)
+        app.router.add_get("/v1/depth.do", self.lbank_depth)
+        app.router.add_get("/v1/currencyPairs.do", self.lbank_pairs)
+        app.router.add_get("/v2/accuracy.do", self.lbank_accuracy)
+        app.router.add_get("/v2/timestamp.do", self.ping)
+        return app
+
+    async def start(self, host: str = "127.0.0.1", port: int = 8799) -> web.AppRunner:
+        runner = web.AppRunner(self.application(), access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, host, port).start()
+        return runner
+
+
+async def serve(args):
+    stub = StubExchanges(args.symbols, args.depth, args.latency_ms, args.jitter_ms, args.payload_dir)
+    await stub.start(args.host, args.port)
+    print(f"模擬交易所: http://{args.host}:{args.port}，{args.symbols} 個交易對，"
+          f"深度 {args.depth}，延遲 {args.latency_ms}±{args.jitter_ms} ms", flush=True)
+    await asyncio.Event().wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="本地模擬交易所")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8799)
+    parser.add_argument("--symbols", type=int, default=50)
+    parser.add_argument("--depth", type=int, default=20)
+    parser.add_argument("--latency-ms", type=float, default=30)
+    parser.add_argument("--jitter-ms", type=float, default=20)
+    parser.add_argument("--payload-dir", default=None, help="錄製的深度響應目錄")
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
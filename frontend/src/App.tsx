@@ -51,6 +51,8 @@ const App: React.FC = () => {
     
     websocket.onopen = () => {
       console.log('WebSocket連接已建立:', wsUrl);
+      // 每個連接訂閱自己的交易對組合，不影響其他使用者
+      websocket.send(JSON.stringify({ type: 'subscribe', mx_symbol: mxSymbol, lbank_symbol: lbankSymbol }));
       setIsConnected(true);
       setIsInitializing(false);
     };
@@ -60,6 +62,11 @@ const App: React.FC = () => {
         const data: MarketUpdate = JSON.parse(event.data);
         console.log('收到WebSocket數據:', data.type, data.symbol, data.mode);
         
+        if (data.type === 'error') {
+          console.error('訂閱交易對失敗:', data.message);
+          return;
+        }
+        
         if (data.type === 'market_update' && data.symbol === currentSymbol) {
           // 更新訂單簿數據（總是更新，不依賴模式）
           setMxOrderBook(data.mx_orderbook);
@@ -118,7 +125,7 @@ const App: React.FC = () => {
     };
     
     setWs(websocket);
-  }, [currentSymbol]);
+  }, [currentSymbol, mxSymbol, lbankSymbol]);
 
   // 載入可用交易對
   const loadAvailableSymbols = async () => {
@@ -134,28 +141,13 @@ const App: React.FC = () => {
     }
   };
 
-  // 切換交易對
-  const handleSymbolChange = async (symbol: string) => {
-    try {
-        const apiUrl = process.env.NODE_ENV === 'development' ? 'http://localhost:8001' : '';
-      const response = await fetch(`${apiUrl}/api/symbol`, {
-        method: 'POST',
-        headers: {
-          'Content-Type': 'application/json',
-        },
-        body: JSON.stringify({ symbol }),
-      });
-      
-      if (response.ok) {
-        setCurrentSymbol(symbol);
-        setMxSymbol(symbol);
-        setLbankSymbol(symbol);
-        // 清空圖表數據
-        setChartData([]);
-      }
-    } catch (error) {
-      console.error('切換交易對失敗:', error);
-    }
+  // 切換交易對（重新連接後以WebSocket訂閱，只影響本頁面）
+  const handleSymbolChange = (symbol: string) => {
+    setCurrentSymbol(symbol);
+    setMxSymbol(symbol);
+    setLbankSymbol(symbol);
+    // 清空圖表數據
+    setChartData([]);
   };
 
   // 切換交易模式
@@ -178,32 +170,13 @@ const App: React.FC = () => {
     setSpreadData(null);
   };
 
-  // 處理自選幣種
-  const handleCustomSymbolsChange = useCallback(async (request: CustomSymbolRequest) => {
-    try {
-      const apiUrl = process.env.NODE_ENV === 'development' ? 'http://localhost:8001' : '';
-      const response = await fetch(`${apiUrl}/api/symbol/custom`, {
-        method: 'POST',
-        headers: {
-          'Content-Type': 'application/json',
-        },
-        body: JSON.stringify(request),
-      });
-      
-      const data = await response.json();
-      
-      if (data.status === 'success') {
-        setCurrentSymbol(data.mx_symbol);
-        setMxSymbol(data.mx_symbol);
-        setLbankSymbol(data.lbank_symbol);
-        // 清空圖表數據
-        setChartData([]);
-      } else {
-        console.error('設置自選幣種失敗:', data.message);
-      }
-    } catch (error) {
-      console.error('設置自選幣種失敗:', error);
-    }
+  // 處理自選幣種（重新連接後以WebSocket訂閱，幣種不存在時伺服器回覆error）
+  const handleCustomSymbolsChange = useCallback((request: CustomSymbolRequest) => {
+    setCurrentSymbol(request.mx_symbol);
+    setMxSymbol(request.mx_symbol);
+    setLbankSymbol(request.lbank_symbol);
+    // 清空圖表數據
+    setChartData([]);
   }, []);
 
   // 初始化
@@ -220,7 +193,7 @@ const App: React.FC = () => {
     };
   }, []);
 
-  // 當交易對改變時重新連接（模式改變不需要重新連接）
+  // 當交易對改變時重新連接並訂閱新的交易對（模式改變不需要重新連接）
   useEffect(() => {
     if (ws) {
       console.log('交易對改變，關閉舊連接');
@@ -232,7 +205,48 @@ const App: React.FC = () => {
     }, 100);
     
     return () => clearTimeout(timer);
-  }, [currentSymbol]);
+  }, [currentSymbol, lbankSymbol]);
+
+  // 交易對或模式改變時，以最近5分鐘的歷史價差預先填充圖表
+  useEffect(() => {
+    let cancelled = false;
+    const loadHistory = async () => {
+      try {
+        const apiUrl = process.env.NODE_ENV === 'development' ? 'http://localhost:8001' : '';
+        const end = Date.now() / 1000;
+        const params = new URLSearchParams({
+          symbol: mxSymbol,
+          lbank_symbol: lbankSymbol,
+          mode: tradingMode,
+          start: String(end - 300),
+          end: String(end),
+          resolution: '1',
+        });
+        const response = await fetch(`${apiUrl}/api/history?${params}`);
+        const data = await response.json();
+        if (cancelled || data.status !== 'success' || !data.t.length) return;
+
+        const history: ChartDataPoint[] = data.t.map((t: number, i: number) => ({
+          timestamp: t * 1000,
+          spread: data.last_spread[i],
+          spread_percentage: data.last[i],
+          time: new Date(t * 1000).toLocaleTimeString()
+        }));
+        // 只補上第一個即時數據點之前的歷史
+        setChartData(prev => {
+          const first = prev[0]?.timestamp ?? Infinity;
+          return [...history.filter(point => point.timestamp < first), ...prev].slice(-300);
+        });
+      } catch (error) {
+        console.error('載入歷史價差失敗:', error);
+      }
+    };
+    loadHistory();
+
+    return () => {
+      cancelled = true;
+    };
+  }, [mxSymbol, lbankSymbol, tradingMode]);
 
   return (
     <div className="min-h-screen bg-bg-dark text-white p-4">
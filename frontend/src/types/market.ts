@@ -25,6 +25,9 @@ export interface SpreadData {
   sell_exchange: string;
   timestamp: string;
   color: string;
+  skew_ms?: number;
+  book_age_ms?: number;
+  stale?: boolean;
 }
 
 export interface MarketUpdate {
@@ -35,6 +38,7 @@ export interface MarketUpdate {
   lbank_orderbook: OrderBook;
   spread_data: SpreadData;
   timestamp: string;
+  message?: string; // type為error時的錯誤訊息
 }
 
 export interface ChartDataPoint {
@@ -4,6 +4,7 @@ LBMX即時價差監控系統啟動腳本
 """
 
 import uvicorn
+import subprocess
 import sys
 import os
 
@@ -17,6 +18,10 @@ if __name__ == "__main__":
     # 檢查是否為生產環境
     is_production = os.environ.get("ENVIRONMENT") == "production"
     
+    # 多web進程模式：一個抓取進程連接交易所，WEB_WORKERS 個web進程經狀態匯流排讀取並服務客戶端
+    web_workers = int(os.environ.get("WEB_WORKERS", 1))
+    fetcher = None
+    
     # 配置
     config = {
         "app": "app.main:app",
@@ -27,10 +32,21 @@ if __name__ == "__main__":
         "access_log": True,
     }
     
+    if web_workers > 1:
+        fetcher_port = os.environ.get("FETCHER_PORT", "8002")
+        fetcher = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", fetcher_port],
+            env={**os.environ, "PROCESS_ROLE": "fetcher"}
+        )
+        os.environ["PROCESS_ROLE"] = "web"
+        config.update(workers=web_workers, reload=False)  # 多進程不支援自動重載
+    
     print("🚀 啟動LBMX即時價差監控系統...")
     print(f"📍 服務地址: http://0.0.0.0:{port}")
     print(f"📊 API文檔: http://0.0.0.0:{port}/docs")
     print(f"🌍 環境: {'生產' if is_production else '開發'}")
+    if fetcher:
+        print(f"⚙️  web進程: {web_workers}，抓取進程: http://127.0.0.1:{fetcher_port}")
     print("=" * 50)
     
     try:
@@ -40,3 +56,7 @@ if __name__ == "__main__":
     except Exception as e:
         print(f"❌ 啟動失敗: {e}")
         sys.exit(1)
+    finally:
+        if fetcher:
+            fetcher.terminate()
+            fetcher.wait()
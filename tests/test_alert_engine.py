@@ -0,0 +1,51 @@
+from datetime import datetime
+
+from app.models.market_data import SpreadData
+from app.services.alert_engine import AlertEngine
+
+
+def spread(percentage: float, ts: float) -> SpreadData:
+    return SpreadData(
+        symbol="ABC/USDT", mode="mx_buy_lbank_sell", buy_exchange="Mexc", sell_exchange="LBank",
+        buy_price=1.0, sell_price=1.1, max_quantity=1.0, spread=0.1, spread_percentage=percentage,
+        timestamp=datetime.fromtimestamp(ts),
+    )
+
+
+def test_state_is_kept_per_pair():
+    engine = AlertEngine()
+    engine.add_rule({"kind": "above", "threshold": 1.0, "hold_ms": 1000})
+
+    assert engine.evaluate(spread(2.0, 1000.0), "ABC/USDT") == []
+    # 同一MX交易對的自選組合有自己的狀態，不會接續上面的持續時間
+    assert engine.evaluate(spread(2.0, 1001.5), "ABC/USDT|XYZ/USDT") == []
+    events = engine.evaluate(spread(2.0, 1001.5), "ABC/USDT")
+    assert [(event["event"], event["symbol"]) for event in events] == [("triggered", "ABC/USDT")]
+
+
+def test_rule_symbol_matches_pair_key():
+    engine = AlertEngine()
+    engine.add_rule({"kind": "above", "threshold": 1.0, "symbol": "ABC/USDT|XYZ/USDT"})
+
+    assert engine.evaluate(spread(2.0, 1000.0), "ABC/USDT") == []
+    events = engine.evaluate(spread(2.0, 1000.0), "ABC/USDT|XYZ/USDT")
+    assert [event["symbol"] for event in events] == ["ABC/USDT|XYZ/USDT"]
+
+
+def test_stale_spread_is_not_evaluated():
+    engine = AlertEngine()
+    engine.add_rule({"kind": "above", "threshold": 1.0, "hold_ms": 1000})
+
+    stale = spread(5.0, 1000.0)
+    stale.stale = True
+    assert engine.evaluate(stale, "ABC/USDT") == []
+    assert engine.get_stats()["skipped_stale"] == 1
+
+    assert engine.evaluate(spread(2.0, 1001.0), "ABC/USDT") == []
+    stale = spread(2.0, 1001.5)
+    stale.stale = True
+    assert engine.evaluate(stale, "ABC/USDT") == []
+    # 未對齊的價差中斷了持續時間，需要由對齊的價差重新累計
+    assert engine.evaluate(spread(2.0, 1002.2), "ABC/USDT") == []
+    events = engine.evaluate(spread(2.0, 1003.2), "ABC/USDT")
+    assert [event["event"] for event in events] == ["triggered"]
@@ -0,0 +1,80 @@
+import json
+from datetime import datetime
+
+import numpy as np
+
+from app.models.compact_orderbook import CompactOrderBook, lossless_precision
+from app.models.market_data import OrderBook, OrderBookEntry
+from app.services.exchange_service import ExchangeService
+from app.services.spread_calculator import SpreadCalculator
+from app.services.symbol_cache import SymbolSnapshot
+
+
+def make_orderbook(exchange, bids, asks, price_precision, quantity_precision):
+    return OrderBook(
+        exchange=exchange,
+        symbol="ABC/USDT",
+        bids=[OrderBookEntry(price=price, quantity=quantity) for price, quantity in bids],
+        asks=[OrderBookEntry(price=price, quantity=quantity) for price, quantity in asks],
+        timestamp=datetime.now(),
+        price_precision=price_precision,
+        quantity_precision=quantity_precision,
+    )
+
+
+def test_lossless_precision_raises_scale_for_fractional_values():
+    assert lossless_precision(np.array([1.0, 20.0]), 0) == 0
+    assert lossless_precision(np.array([0.4, 3.0]), 0) == 1
+    assert lossless_precision(np.array([0.1234]), 2) == 4
+    assert lossless_precision(np.array([1e-12]), 0) == 8  # 超過上限時取上限
+    assert lossless_precision(np.array([65000.5]), 4) == 4
+
+
+def test_mismatched_precisions_keep_lbank_fractional_size():
+    # MX合約：數量精度0（張數）；LBank：數量有小數
+    mx = make_orderbook("Mexc", [(99.0, 5)], [(100.0, 5)], 2, 0)
+    lbank = make_orderbook("LBank", [(101.0, 0.4)], [(102.0, 0.4)], 2, 0)
+
+    compact_mx = CompactOrderBook.from_orderbook(mx)
+    compact_lbank = CompactOrderBook.from_orderbook(lbank)
+
+    assert compact_mx.quantity_precision == 0
+    assert compact_lbank.quantity_precision >= 1
+    _, quantities = compact_lbank.float_levels('bids')
+    assert quantities.tolist() == [0.4]
+
+    calculator = SpreadCalculator()
+    executable = calculator.calculate_executable_spread(compact_mx, compact_lbank, 'mx_buy_lbank_sell')
+    assert abs(executable["max_quantity"] - 0.4) < 1e-12
+    from_orderbooks = calculator.calculate_executable_spread(mx, lbank, 'mx_buy_lbank_sell')
+    assert abs(executable["max_quantity"] - from_orderbooks["max_quantity"]) < 1e-12
+
+
+def test_books_with_different_scales_are_not_equal():
+    a = CompactOrderBook.from_levels("LBank", "ABC/USDT", [[1, 1]], [[2, 1]], price_precision=0, quantity_precision=0)
+    b = CompactOrderBook.from_levels("LBank", "ABC/USDT", [[1, 1]], [[2, 1]], price_precision=2, quantity_precision=0)
+    assert a.same_levels(a.top(10))
+    assert not a.same_levels(b)
+
+
+def test_each_venue_uses_its_own_precision():
+    service = ExchangeService()
+    service.symbol_cache.snapshot = SymbolSnapshot(
+        {"mx": ["ABC/USDT"], "lbank": ["ABC/USDT"]},
+        {
+            "mx": {"ABC/USDT": {"price_precision": 2, "quantity_precision": 0}},
+            "lbank": {"ABC/USDT": {"price_precision": 3, "quantity_precision": 4}},
+        },
+    )
+    assert service.precision_for('mx', 'ABC/USDT')['quantity_precision'] == 0
+    assert service.precision_for('lbank', 'ABC/USDT')['quantity_precision'] == 4
+    # 沒有精度資訊的交易所使用該交易所的預設值，不沿用MX的精度
+    assert service.precision_for('lbank', 'XYZ/USDT') == service.adapters['lbank'].default_precision
+
+    body = json.dumps({
+        "result": "true",
+        "data": {"bids": [["101.0", "0.4"]], "asks": [["102.0", "0.4"]], "timestamp": 1700000000000},
+    }).encode()
+    orderbook = service.decode_orderbook('lbank', 'ABC/USDT', body)
+    assert (orderbook.price_precision, orderbook.quantity_precision) == (3, 4)
+    assert CompactOrderBook.from_orderbook(orderbook).float_levels('asks')[1].tolist() == [0.4]
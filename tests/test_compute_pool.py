@@ -0,0 +1,47 @@
+import json
+
+from app.services.compute_pool import _compute, output_size, output_views
+
+
+def test_worker_scales_each_venue_with_its_own_precision():
+    venues = ["mx", "lbank"]
+    bodies = [
+        json.dumps({"success": True, "code": 0, "data": {
+            "bids": [[99.0, 5, 1]], "asks": [[100.0, 5, 1]], "timestamp": 1700000000000}}).encode(),
+        json.dumps({"result": "true", "data": {
+            "bids": [["101.0", "0.4"]], "asks": [["102.0", "0.4"]], "timestamp": 1700000000000}}).encode(),
+    ]
+    source = b"".join(bodies)
+    spans = [(0, len(bodies[0])), (len(bodies[0]), len(bodies[1]))]
+    # 配置精度不符：LBank數量精度0，但數據有小數
+    precisions = [(2, 0, 1.0), (2, 0, 1.0)]
+    target = bytearray(output_size(1, len(venues), 5))
+
+    errors = _compute(memoryview(source), target, spans, precisions, venues, 5)
+
+    assert errors == []
+    levels, counts, scales, exchange_times, results = output_views(target, 1, len(venues), 5)
+    assert scales[0].tolist() == [[2, 0], [2, 1]]
+    # mx買 -> lbank賣：可執行數量為LBank的0.4，而不是被截斷成0
+    assert abs(results[0, 0, 1, 5] - 0.4) < 1e-12
+
+
+def test_worker_converts_mx_contracts_to_coins():
+    venues = ["mx", "lbank"]
+    bodies = [
+        json.dumps({"success": True, "code": 0, "data": {
+            "bids": [[99.0, 30, 1]], "asks": [[100.0, 30, 1]], "timestamp": 1700000000000}}).encode(),
+        json.dumps({"result": "true", "data": {
+            "bids": [["101.0", "5"]], "asks": [["102.0", "5"]], "timestamp": 1700000000000}}).encode(),
+    ]
+    source = b"".join(bodies)
+    spans = [(0, len(bodies[0])), (len(bodies[0]), len(bodies[1]))]
+    # MX 30張 x 每張0.1幣 = 3幣
+    precisions = [(2, 1, 0.1), (2, 0, 1.0)]
+    target = bytearray(output_size(1, len(venues), 5))
+
+    assert _compute(memoryview(source), target, spans, precisions, venues, 5) == []
+    levels, counts, scales, exchange_times, results = output_views(target, 1, len(venues), 5)
+    assert abs(levels[0, 0, 0, 0, 1] - 3.0) < 1e-12
+    # mx買 -> lbank賣：可執行數量受MX的3幣限制，而不是30
+    assert abs(results[0, 0, 1, 5] - 3.0) < 1e-12
@@ -0,0 +1,135 @@
+import json
+
+import pytest
+
+from app.services import depth_decoders
+from app.services.depth_decoders import LBANK_DECODER, MX_DECODER, DepthDecodeError, to_coins
+
+
+def mx_body(bids, asks, **extra) -> bytes:
+    data = {"asks": asks, "bids": bids, "version": 1, "timestamp": 1700000000123}
+    return json.dumps({"success": True, "code": 0, "data": data, **extra}).encode()
+
+
+def lbank_body(bids, asks, result="true") -> bytes:
+    return json.dumps({
+        "result": result,
+        "data": {"asks": asks, "bids": bids, "timestamp": 1700000000456},
+        "error_code": 0,
+        "ts": 1700000000789,
+    }).encode()
+
+
+MX_BIDS = [[99.5, 120, 3], [99.4, 80, 1], [99.3, 5, 2]]
+MX_ASKS = [[99.6, 10, 1], [99.7, 20, 4], [99.8, 30, 1]]
+LBANK_BIDS = [["99.51", "1.25"], ["99.41", "0.5"], ["99.31", "3"]]
+LBANK_ASKS = [["99.61", "0.75"], ["99.71", "2"], ["99.81", "4.5"]]
+
+
+def test_mx_success():
+    levels = MX_DECODER.decode(mx_body(MX_BIDS, MX_ASKS), 2)
+    assert levels.bids.tolist() == [[99.5, 120.0], [99.4, 80.0]]
+    assert levels.asks.tolist() == [[99.6, 10.0], [99.7, 20.0]]
+    assert levels.exchange_time == 1700000000123
+
+
+def test_lbank_success():
+    levels = LBANK_DECODER.decode(lbank_body(LBANK_BIDS, LBANK_ASKS), 2)
+    assert levels.bids.tolist() == [[99.51, 1.25], [99.41, 0.5]]
+    assert levels.asks.tolist() == [[99.61, 0.75], [99.71, 2.0]]
+    assert levels.exchange_time == 1700000000456
+
+
+def test_lbank_falls_back_to_ts():
+    body = json.dumps({"result": "true", "data": {"asks": LBANK_ASKS, "bids": LBANK_BIDS}, "ts": 1700000000789})
+    assert LBANK_DECODER.decode(body.encode(), 2).exchange_time == 1700000000789
+
+
+@pytest.mark.parametrize("body", [
+    b'{"success":false,"code":1001,"message":"contract not exists"}',
+    b'{"success": false, "code": 0, "data": {"bids": [[1, 1, 1]], "asks": [[2, 1, 1]]}}',
+    b'{"success":true,"code":0,"data":null}',
+    b'{"success":true,"code":0,"data":[]}',
+    b'<html>502 Bad Gateway</html>',
+])
+def test_mx_errors(body):
+    with pytest.raises(DepthDecodeError):
+        MX_DECODER.decode(body, 5)
+
+
+@pytest.mark.parametrize("body", [
+    b'{"result":"false","error_code":10008,"msg":"currency pair nonsupport"}',
+    b'{"result": false, "error_code": 10008}',
+    b'{"result":"true","data":null}',
+    b'not json',
+])
+def test_lbank_errors(body):
+    with pytest.raises(DepthDecodeError):
+        LBANK_DECODER.decode(body, 5)
+
+
+def test_empty_sides():
+    levels = MX_DECODER.decode(mx_body([], MX_ASKS), 5)
+    assert levels.bids.shape == (0, 2)
+    assert len(levels.asks) == 3
+    levels = LBANK_DECODER.decode(lbank_body(LBANK_BIDS, []), 5)
+    assert len(levels.bids) == 3
+    assert levels.asks.shape == (0, 2)
+
+
+def test_pretty_printed_json():
+    compact = MX_DECODER.decode(mx_body(MX_BIDS, MX_ASKS), 2)
+    pretty = json.dumps(json.loads(mx_body(MX_BIDS, MX_ASKS)), indent=4).encode()
+    levels = MX_DECODER.decode(pretty, 2)
+    assert levels.bids.tolist() == compact.bids.tolist()
+    assert levels.asks.tolist() == compact.asks.tolist()
+    assert levels.exchange_time == compact.exchange_time
+
+    body = json.dumps(json.loads(lbank_body(LBANK_BIDS, LBANK_ASKS)), indent="\t").encode().replace(b":", b" :\r\n")
+    assert LBANK_DECODER.decode(body, 3).asks.tolist() == [[99.61, 0.75], [99.71, 2.0], [99.81, 4.5]]
+
+
+def test_lbank_result_bool_and_string():
+    as_string = LBANK_DECODER.decode(lbank_body(LBANK_BIDS, LBANK_ASKS, result="true"), 3)
+    as_bool = LBANK_DECODER.decode(lbank_body(LBANK_BIDS, LBANK_ASKS, result=True), 3)
+    assert as_bool.bids.tolist() == as_string.bids.tolist()
+    # 完整解碼路徑也接受布林值
+    assert LBANK_DECODER.decode_full(lbank_body(LBANK_BIDS, LBANK_ASKS, result=True), 3).bids.tolist() == \
+        as_string.bids.tolist()
+
+
+def test_depth_larger_than_available_levels():
+    levels = MX_DECODER.decode(mx_body(MX_BIDS, MX_ASKS), 100)
+    assert len(levels.bids) == 3 and len(levels.asks) == 3
+    levels = LBANK_DECODER.decode(lbank_body(LBANK_BIDS, LBANK_ASKS), 100)
+    assert len(levels.bids) == 3 and len(levels.asks) == 3
+
+
+def test_full_decode_fallback(monkeypatch):
+    body = mx_body(MX_BIDS, MX_ASKS)
+    expected = MX_DECODER.decode(body, 2)
+    # 截取結果無法解碼時改走完整解碼，結果相同
+    monkeypatch.setattr(depth_decoders, "slice_levels", lambda body, key, depth: b"[[1.0,")
+    levels = MX_DECODER.decode(body, 2)
+    assert levels.bids.tolist() == expected.bids.tolist()
+    assert levels.asks.tolist() == expected.asks.tolist()
+    assert levels.exchange_time == expected.exchange_time
+
+    # 不指定深度時直接完整解碼，保留全部價位
+    assert len(MX_DECODER.decode(body).bids) == 3
+
+
+def test_flat_lbank_payload_without_envelope():
+    body = json.dumps({"bids": LBANK_BIDS, "asks": LBANK_ASKS}).encode()
+    levels = LBANK_DECODER.decode(body, 2)
+    assert levels.bids.tolist() == [[99.51, 1.25], [99.41, 0.5]]
+    assert levels.exchange_time is None
+
+
+def test_to_coins_rounds_to_quantity_precision():
+    levels = MX_DECODER.decode(mx_body([[99.5, 1815, 1]], [[99.6, 7, 1]]), 5)
+    # 0.01 x 1815 在浮點下是 18.150000000000002
+    assert to_coins(levels.bids, 0.01, 2).tolist() == [[99.5, 18.15]]
+    assert to_coins(levels.asks, 0.01, 2).tolist() == [[99.6, 0.07]]
+    assert levels.bids.tolist() == [[99.5, 1815.0]]
+    assert to_coins(levels.bids[:0], 0.01, 2).shape == (0, 2)
@@ -0,0 +1,95 @@
+import json
+
+import numpy as np
+
+from app.services.depth_engine import DepthIndex, ExecutableSpreadEngine
+from app.services.exchange_service import ExchangeService
+from app.services.exchanges.mexc import contract_precision
+from app.services.symbol_cache import SymbolSnapshot
+
+
+def make_index(levels):
+    return DepthIndex(np.array([price for price, _ in levels], dtype=np.float64),
+                      np.array([quantity for _, quantity in levels], dtype=np.float64))
+
+
+def test_prefix_sums():
+    index = make_index([(100.0, 1.0), (101.0, 2.0), (103.0, 0.5)])
+    assert index.cum_quantity.tolist() == [1.0, 3.0, 3.5]
+    assert index.cum_notional.tolist() == [100.0, 302.0, 353.5]
+    assert index.total_quantity == 3.5
+    assert index.total_notional == 353.5
+
+
+def test_notional_for_quantity_walks_levels():
+    index = make_index([(100.0, 1.0), (101.0, 2.0), (103.0, 0.5)])
+    quantities = np.array([0.0, 0.5, 1.0, 2.0, 3.0, 3.25, 3.5])
+    expected = [0.0, 50.0, 100.0, 201.0, 302.0, 327.75, 353.5]
+    assert np.allclose(index.notional_for_quantity(quantities), expected)
+    # 超過總深度的部分截斷
+    assert float(index.notional_for_quantity(10.0)) == 353.5
+
+
+def test_quantity_for_notional_inverts_notional():
+    index = make_index([(100.0, 1.0), (101.0, 2.0), (103.0, 0.5)])
+    notionals = np.array([0.0, 50.0, 100.0, 201.0, 302.0, 327.75, 353.5])
+    expected = [0.0, 0.5, 1.0, 2.0, 3.0, 3.25, 3.5]
+    assert np.allclose(index.quantity_for_notional(notionals), expected)
+    assert float(index.quantity_for_notional(1e9)) == 3.5
+
+
+def test_price_at_assigns_exact_boundary_to_filled_level():
+    index = make_index([(100.0, 1.0), (101.0, 2.0), (103.0, 0.5)])
+    # 恰好吃完第一檔時仍屬第一檔，超過總深度時停在最後一檔
+    assert index.price_at(np.array([0.5, 1.0, 1.0001, 3.0, 3.2, 99.0])).tolist() == [
+        100.0, 100.0, 101.0, 101.0, 103.0, 103.0]
+
+
+def test_empty_index():
+    index = make_index([])
+    assert index.total_quantity == 0.0
+    assert index.notional_for_quantity(np.array([1.0])).tolist() == [0.0]
+    assert index.quantity_for_notional(np.array([1.0])).tolist() == [0.0]
+    result = ExecutableSpreadEngine.analyze_indexes(index, make_index([(101.0, 1.0)]), include_curve=False)
+    assert result["max_quantity"] == 0.0
+
+
+def test_analyze_indexes_stops_at_last_profitable_level():
+    asks = make_index([(100.0, 1.0), (102.0, 5.0)])
+    bids = make_index([(103.0, 2.0), (101.0, 5.0)])
+    result = ExecutableSpreadEngine.analyze_indexes(asks, bids, include_curve=False)
+    # 0-1: 103-100，1-2: 103-102，2之後 101-102 虧損
+    assert result["max_quantity"] == 2.0
+    assert np.isclose(result["max_profit"], 206.0 - 202.0)
+    assert np.isclose(result["vwap_buy_price"], 101.0)
+
+
+def test_contract_precision_reports_quantity_in_coins():
+    info = contract_precision({"symbol": "BTC_USDT", "priceScale": 1, "volScale": 0, "contractSize": 0.0001})
+    assert info == {"price_precision": 1, "quantity_precision": 4, "contract_size": 0.0001}
+    # 沒有合約面值時按每張1幣處理
+    assert contract_precision({"priceScale": 4, "volScale": 0})["contract_size"] == 1.0
+
+
+def test_mx_depth_is_converted_from_contracts_to_coins():
+    service = ExchangeService()
+    service.symbol_cache.snapshot = SymbolSnapshot(
+        {"mx": ["ABC/USDT"], "lbank": ["ABC/USDT"]},
+        {"mx": {"ABC/USDT": {"price_precision": 2, "quantity_precision": 1, "contract_size": 0.1}}},
+    )
+    body = json.dumps({"success": True, "code": 0, "data": {
+        "bids": [[99.0, 30, 1]], "asks": [[100.0, 25, 1]], "timestamp": 1700000000000}}).encode()
+    orderbook = service.decode_orderbook('mx', 'ABC/USDT', body)
+    assert orderbook.bids[0].quantity == 3.0
+    assert orderbook.asks[0].quantity == 2.5
+    assert np.isclose(DepthIndex.from_entries(orderbook.asks).total_notional, 250.0)
+
+
+def test_cache_without_contract_size_is_stale():
+    snapshot = SymbolSnapshot.from_dict({
+        "symbols": {"mx": ["ABC/USDT"], "lbank": ["ABC/USDT"]},
+        "precision": {"mx": {"ABC/USDT": {"price_precision": 2, "quantity_precision": 0}}},
+        "updated_at": {"mx": 1700000000.0, "lbank": 1700000000.0},
+    })
+    assert snapshot.updated_at_by_venue["mx"] == 0.0
+    assert snapshot.updated_at_by_venue["lbank"] == 1700000000.0
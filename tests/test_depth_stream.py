@@ -0,0 +1,125 @@
+import asyncio
+import json
+
+import aiohttp
+from aiohttp import web
+
+from app.services.depth_stream import DepthStreamManager
+
+
+class StubMx:
+    """MX合約的WebSocket深度推送與REST快照"""
+
+    def __init__(self):
+        self.ws = None
+        self.subscribed = asyncio.Event()
+        self.snapshot = {"bids": [[100.0, 1, 1]], "asks": [[101.0, 1, 1]], "version": 100}
+        self.release_snapshot = asyncio.Event()
+        self.release_snapshot.set()
+        self.snapshot_requests = 0
+
+    async def handle_ws(self, request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        self.ws = ws
+        async for msg in ws:
+            if json.loads(msg.data).get("method") == "sub.depth":
+                self.subscribed.set()
+        return ws
+
+    async def handle_depth(self, request):
+        self.snapshot_requests += 1
+        await self.release_snapshot.wait()
+        return web.json_response({"success": True, "code": 0, "data": self.snapshot})
+
+    async def push(self, version, bids):
+        await self.ws.send_str(json.dumps({
+            "channel": "push.depth", "symbol": "ABC_USDT", "ts": 1700000000000,
+            "data": {"bids": bids, "asks": [], "version": version},
+        }))
+
+
+class StubExchangeService:
+    def __init__(self, base_url):
+        self.base_url = base_url
+        self.session = aiohttp.ClientSession()
+
+    async def get_mx_depth_snapshot(self, symbol):
+        async with self.session.get(f"{self.base_url}/depth/{symbol.replace('/', '_')}") as response:
+            return (await response.json())["data"]
+
+
+async def until(condition, timeout=5.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline, "timed out"
+        await asyncio.sleep(0.01)
+
+
+def test_gap_triggers_resync_and_replays_buffered_diffs_in_order():
+    async def main():
+        stub = StubMx()
+        app = web.Application()
+        app.router.add_get("/ws", stub.handle_ws)
+        app.router.add_get("/depth/{symbol}", stub.handle_depth)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        base_url = f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}"
+
+        service = StubExchangeService(base_url)
+        manager = DepthStreamManager(service, base_url.replace("http", "ws") + "/ws", "")
+        feed = manager.mx_feed
+        feed.start()
+        try:
+            await feed.subscribe("ABC/USDT")
+            await stub.subscribed.wait()
+            await until(lambda: feed.get_book("ABC/USDT") is not None)
+            book = feed.get_book("ABC/USDT")
+            assert book.sequence == 100 and feed.resync_count == 1
+
+            await stub.push(101, [[99.0, 5, 1]])
+            await until(lambda: book.sequence == 101)
+
+            # 跳過102：觸發重新同步，快照返回前收到的增量先緩存
+            stub.release_snapshot.clear()
+            stub.snapshot = {"bids": [[100.0, 1, 1], [99.0, 5, 1]], "asks": [[101.0, 1, 1]], "version": 102}
+            await stub.push(103, [[98.0, 3, 1]])
+            await until(lambda: feed.gap_count == 1 and stub.snapshot_requests == 2)
+            assert not book.synced
+            await stub.push(104, [[99.0, 1, 1]])
+            await stub.push(105, [[99.0, 2, 1], [98.0, 0, 0]])
+            await until(lambda: len(feed._pending.get("ABC/USDT", [])) == 3)
+
+            stub.release_snapshot.set()
+            await until(lambda: book.synced)
+            assert feed.resync_count == 2
+            assert book.sequence == 105
+            # 103 -> 104 -> 105 依序套用：98 先加入後移除，99 最後為2
+            assert book.bids == {100.0: 1.0, 99.0: 2.0}
+        finally:
+            await feed.stop()
+            await service.session.close()
+            await runner.cleanup()
+
+    asyncio.run(main())
+
+
+def test_wait_for_update_wakes_only_its_own_pair():
+    async def main():
+        manager = DepthStreamManager(None, "", "")
+        version = manager.pair_version("ABC/USDT", "ABC/USDT")
+
+        waiting = asyncio.create_task(manager.wait_for_update("ABC/USDT", "ABC/USDT", version, timeout=5))
+        await asyncio.sleep(0.01)
+        manager.notify("Mexc", "XYZ/USDT")
+        manager.notify("LBank", "XYZ/USDT")
+        await asyncio.sleep(0.01)
+        assert not waiting.done()
+
+        manager.notify("LBank", "ABC/USDT")
+        assert await asyncio.wait_for(waiting, 1) == version + 1
+        assert manager._waiters == {}
+
+    asyncio.run(main())
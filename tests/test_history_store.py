@@ -0,0 +1,112 @@
+import asyncio
+import os
+from datetime import datetime
+
+from app.models.market_data import SpreadData
+from app.services.history_store import RAW_SEGMENT_CAPACITY, HistoryStore, SpreadSeries
+
+T0 = 1_700_000_000.0
+
+
+def spread_at(ts: float, symbol: str = "ABC/USDT") -> SpreadData:
+    return SpreadData(
+        symbol=symbol, mode="mx_buy_lbank_sell", buy_exchange="Mexc", sell_exchange="LBank",
+        buy_price=1.0, sell_price=1.1, max_quantity=1.0, spread=0.1, spread_percentage=10.0,
+        timestamp=datetime.fromtimestamp(ts),
+    )
+
+
+def open_fds() -> int:
+    return len(os.listdir("/proc/self/fd"))
+
+
+def fill(store: HistoryStore, symbols, points: int):
+    for i in range(points):
+        for symbol in symbols:
+            store.record(spread_at(T0 + i, symbol))
+    store.flush()
+
+
+def test_segments_do_not_hold_file_descriptors(tmp_path):
+    before = open_fds()
+    store = HistoryStore(str(tmp_path), ring_capacity=256)
+    fill(store, [f"S{n}/USDT" for n in range(3)], RAW_SEGMENT_CAPACITY * 2)
+
+    result = asyncio.run(store.query("S0/USDT", "mx_buy_lbank_sell", T0, T0 + RAW_SEGMENT_CAPACITY * 2, 0))
+    assert len(result["t"]) == RAW_SEGMENT_CAPACITY * 2
+    assert open_fds() == before
+    asyncio.run(store.close())
+
+
+def test_retention_deletes_old_segments(tmp_path):
+    store = HistoryStore(str(tmp_path), ring_capacity=256, max_age=RAW_SEGMENT_CAPACITY)
+    fill(store, ["ABC/USDT"], RAW_SEGMENT_CAPACITY * 3)
+    raw = os.path.join(str(tmp_path), "ABC_USDT", "mx_buy_lbank_sell", "raw")
+    assert len(os.listdir(raw)) == 3
+
+    deleted = store.apply_retention(now=T0 + RAW_SEGMENT_CAPACITY * 3)
+    assert deleted >= 1
+    assert len(os.listdir(raw)) == 2
+    # 刪除後查詢只返回保留的資料，最新檔案段不受影響
+    result = asyncio.run(store.query("ABC/USDT", "mx_buy_lbank_sell", T0, T0 + RAW_SEGMENT_CAPACITY * 3, 0))
+    assert result["t"][0] == T0 + RAW_SEGMENT_CAPACITY
+    assert result["t"][-1] == T0 + RAW_SEGMENT_CAPACITY * 3 - 1
+
+    store.max_age, store.max_bytes = None, 1
+    store.apply_retention()
+    assert len(os.listdir(raw)) == 1
+    asyncio.run(store.close())
+
+
+def test_custom_pair_has_its_own_series(tmp_path):
+    store = HistoryStore(str(tmp_path), ring_capacity=16)
+    store.record(spread_at(T0), "ABC/USDT")
+    custom = spread_at(T0 + 1)
+    custom.spread_percentage = -3.0
+    store.record(custom, "ABC/USDT|XYZ/USDT")
+
+    plain = asyncio.run(store.query("ABC/USDT", "mx_buy_lbank_sell", T0, T0 + 10, 0))
+    pair = asyncio.run(store.query("ABC/USDT|XYZ/USDT", "mx_buy_lbank_sell", T0, T0 + 10, 0))
+    assert plain["last"] == [10.0]
+    assert pair["last"] == [-3.0]
+
+
+def test_add_never_writes_to_disk(tmp_path):
+    series = SpreadSeries(str(tmp_path), ring_capacity=16)
+    for i in range(100):
+        series.add(T0 + i, 0.1, 10.0, 1.0, 1.1)
+    raw = os.path.join(str(tmp_path), "raw")
+    # 環形緩衝滿一半時只移到待寫入列表，檔案段要等 write()
+    assert os.listdir(raw) == []
+    assert sum(len(records) for records in series.raw.pending) + series.unflushed == 100
+
+    series.flush()
+    assert len(series.query(T0, T0 + 100, 0)["t"]) == 100
+
+
+def test_view_is_consistent_while_writing(tmp_path):
+    series = SpreadSeries(str(tmp_path), ring_capacity=16)
+    for i in range(40):
+        series.add(T0 + i, 0.1, 10.0, 1.0, 1.1)
+    series.take()
+    # 快照在寫入前取得：寫入完成後讀取，記錄既不重複也不遺漏
+    view = series.view()
+    series.write()
+    assert series.query(T0, T0 + 40, 0, view)["t"] == [T0 + i for i in range(40)]
+    assert series.query(T0, T0 + 40, 0)["t"] == [T0 + i for i in range(40)]
+
+
+def test_flush_loop_writes_in_background(tmp_path):
+    async def scenario():
+        store = HistoryStore(str(tmp_path), ring_capacity=16, flush_interval=0.01)
+        store.start()
+        for i in range(50):
+            store.record(spread_at(T0 + i))
+        await asyncio.sleep(0.2)
+        raw = os.path.join(str(tmp_path), "ABC_USDT", "mx_buy_lbank_sell", "raw")
+        assert len(os.listdir(raw)) == 1
+        result = await store.query("ABC/USDT", "mx_buy_lbank_sell", T0, T0 + 50, 0)
+        await store.close()
+        return result
+
+    assert len(asyncio.run(scenario())["t"]) == 50
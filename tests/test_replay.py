@@ -0,0 +1,32 @@
+import asyncio
+import json
+from datetime import datetime
+
+from app.services.capture import CaptureWriter
+from app.services.replay import ReplayEngine
+
+T0 = 1_700_000_000.0
+
+MX_BODY = json.dumps({"success": True, "code": 0, "data": {
+    "bids": [[99.0, 5, 1]], "asks": [[100.0, 5, 1]], "timestamp": 1700000000000}}).encode()
+LBANK_BODY = json.dumps({"result": "true", "data": {
+    "bids": [["101.0", "5"]], "asks": [["102.0", "5"]], "timestamp": 1700000000000}}).encode()
+
+
+def test_replayed_spreads_carry_the_capture_time(tmp_path):
+    async def scenario():
+        writer = CaptureWriter(str(tmp_path))
+        writer.record("mx", "ABC/USDT", MX_BODY, received_at=datetime.fromtimestamp(T0))
+        writer.record("lbank", "ABC/USDT", LBANK_BODY, received_at=datetime.fromtimestamp(T0 + 1.5))
+        await writer.close()
+
+        replayed = []
+        engine = ReplayEngine(str(tmp_path))
+        await engine.run(lambda ts, spread_data: replayed.append((ts, spread_data)))
+        return replayed
+
+    replayed = asyncio.run(scenario())
+    assert replayed
+    for ts, spread_data in replayed:
+        assert ts == T0 + 1.5
+        assert spread_data.timestamp == datetime.fromtimestamp(T0 + 1.5)
@@ -0,0 +1,71 @@
+import asyncio
+
+from aiohttp import web
+
+from app.services.transport import VenueTransport
+
+
+async def serve(handler):
+    app = web.Application()
+    app.router.add_get("/depth", handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}/depth"
+
+
+def test_hedged_error_response_does_not_win():
+    async def main():
+        calls = []
+
+        async def handler(request):
+            calls.append(len(calls))
+            if len(calls) == 1:
+                await asyncio.sleep(0.2)
+                return web.Response(body=b"ok")
+            return web.Response(status=503)
+
+        runner, url = await serve(handler)
+        transport = VenueTransport("stub", min_samples=1, hedge_max_ratio=1.0, hedge_min_delay=0.02)
+        await transport.start()
+        try:
+            transport.latency.add(0.01)
+            # 第二個（hedge）請求先返回503，仍等待第一個請求的200
+            assert await transport.get(url) == (200, b"ok")
+            assert len(calls) == 2
+            assert transport.breaker.state == "closed"
+        finally:
+            await transport.close()
+            await runner.cleanup()
+
+    asyncio.run(main())
+
+
+def test_cancelled_probe_releases_half_open_breaker():
+    async def main():
+        release = asyncio.Event()
+
+        async def handler(request):
+            await release.wait()
+            return web.Response(body=b"ok")
+
+        runner, url = await serve(handler)
+        transport = VenueTransport("stub", hedge=False, failure_threshold=1, reset_timeout=0.0)
+        await transport.start()
+        try:
+            transport.breaker.record_failure()
+            task = asyncio.create_task(transport.get(url))
+            await asyncio.sleep(0.05)
+            assert transport.breaker.state == "half_open"
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            # 試探被取消後，下一個請求可以再次試探
+            assert transport.breaker.allow()
+        finally:
+            release.set()
+            await transport.close()
+            await runner.cleanup()
+
+    asyncio.run(main())
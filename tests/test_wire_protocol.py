@@ -0,0 +1,62 @@
+import asyncio
+import json
+from datetime import datetime
+
+from app.models.market_data import OrderBook, OrderBookEntry, SpreadData
+from app.services.connection_manager import ClientConnection
+from app.services.wire_protocol import PROTOCOL_DELTA, BookVersioner, MarketTick
+
+
+def book(exchange: str, bid: float) -> OrderBook:
+    return OrderBook(
+        exchange=exchange, symbol="ABC/USDT", timestamp=datetime.now(),
+        bids=[OrderBookEntry(price=bid, quantity=1.0)], asks=[OrderBookEntry(price=bid + 1, quantity=1.0)],
+    )
+
+
+def tick(versioner: BookVersioner, bid: float) -> MarketTick:
+    spread = SpreadData(
+        symbol="ABC/USDT", mode="mx_buy_lbank_sell", buy_exchange="Mexc", sell_exchange="LBank",
+        buy_price=bid + 1, sell_price=bid, max_quantity=1.0, spread=-1.0, spread_percentage=-1.0,
+        timestamp=datetime.now(),
+    )
+    return MarketTick(versioner, "ABC/USDT", book("Mexc", bid), book("LBank", bid), {spread.mode: spread})
+
+
+class StubWebSocket:
+    def __init__(self, fail: bool = False):
+        self.fail = fail
+        self.frames = []
+
+    async def send_text(self, text: str):
+        if self.fail:
+            raise ConnectionError("closed")
+        self.frames.append(json.loads(text))
+
+
+def test_diff_base_is_the_version_written_to_the_connection():
+    versioner = BookVersioner()
+    client = ClientConnection(StubWebSocket(), max_queue=8, protocol=PROTOCOL_DELTA)
+
+    first = tick(versioner, 100.0)
+    assert json.loads(first.render(client))["books"]["mx"]["full"]
+    # 只產生訊息、沒有送達時不記錄版本，下一則仍是完整快照
+    second = tick(versioner, 101.0)
+    assert json.loads(second.render(client))["books"]["mx"]["full"]
+
+    second.delivered(client)
+    third = json.loads(tick(versioner, 102.0).render(client))["books"]["mx"]
+    assert third["base"] == 2 and third["seq"] == 3
+
+
+def test_failed_send_does_not_advance_the_base():
+    async def main():
+        versioner = BookVersioner()
+        client = ClientConnection(StubWebSocket(fail=True), max_queue=8, protocol=PROTOCOL_DELTA)
+        errors = []
+        client.start(errors.append)
+        client.enqueue(tick(versioner, 100.0), "ABC/USDT")
+        await asyncio.sleep(0.01)
+        assert errors and client.book_versions == {}
+
+    asyncio.run(main())